@@ -0,0 +1,112 @@
+from PySide6.QtCore import Qt, QEvent, QRect, QSize, QPersistentModelIndex, Signal
+from PySide6.QtGui import QIcon
+from PySide6.QtWidgets import QToolTip
+from qfluentwidgets import TableItemDelegate
+from ..utils.attachment_utils import get_attachment_icon_path
+
+# 模型中附件路径、附件文件是否存在所在的数据角色；记录ID使用 Qt.UserRole
+ATTACHMENT_PATH_ROLE = Qt.UserRole + 2
+ATTACHMENT_EXISTS_ROLE = Qt.UserRole + 3
+
+
+class AttachmentCell:
+    """附件列单元格的按钮接口
+
+    提供与 create_attachment_button 所建按钮相同的 property/setProperty/mapToGlobal 等方法，
+    使 handle_attachment 等附件工具无需修改即可用于基于模型的表格。附件路径的读写经
+    模型的 ATTACHMENT_PATH_ROLE 完成，界面随模型的 dataChanged 重绘。
+    """
+
+    def __init__(self, view, index, item_type):
+        self.view = view
+        self.index = QPersistentModelIndex(index)
+        self.item_type = item_type
+
+    def property(self, name):
+        if not self.index.isValid():
+            return None
+        if name == "item_id":
+            return self.index.data(Qt.UserRole)
+        if name == "item_type":
+            return self.item_type
+        if name == "attachment_path":
+            return self.index.data(ATTACHMENT_PATH_ROLE)
+        return None
+
+    def setProperty(self, name, value):
+        if name == "attachment_path" and self.index.isValid():
+            self.view.model().setData(self.view.model().index(self.index.row(), self.index.column()),
+                                      value, ATTACHMENT_PATH_ROLE)
+
+    def setIcon(self, icon):
+        pass  # 图标由 AttachmentDelegate 按附件路径绘制
+
+    def setToolTip(self, text):
+        pass
+
+    def rect(self):
+        cell = self.view.visualRect(self.view.model().index(self.index.row(), self.index.column()))
+        return QRect(0, 0, cell.width(), cell.height())
+
+    def mapToGlobal(self, point):
+        cell = self.view.visualRect(self.view.model().index(self.index.row(), self.index.column()))
+        return self.view.viewport().mapToGlobal(cell.topLeft() + point)
+
+
+class AttachmentDelegate(TableItemDelegate):
+    """在附件列直接绘制附件图标，替代逐行创建的附件按钮控件
+
+    单击附件列时发出 attachment_clicked(cell)，cell 为 AttachmentCell，可直接传给附件处理函数。
+    """
+
+    attachment_clicked = Signal(object)
+
+    BUTTON_SIZE = 28
+    ICON_SIZE = 18
+
+    def __init__(self, parent, column, item_type):
+        super().__init__(parent)
+        self.column = column
+        self.item_type = item_type
+        self.attach_icon = QIcon(get_attachment_icon_path('attach.svg'))
+        self.add_icon = QIcon(get_attachment_icon_path('add_outline.svg'))
+
+    def _button_rect(self, cell_rect):
+        rect = QRect(0, 0, self.BUTTON_SIZE, self.BUTTON_SIZE)
+        rect.moveCenter(cell_rect.center())
+        return rect
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        if index.column() == self.column:
+            option.text = ""
+
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        if index.column() != self.column:
+            return
+        icon = self.attach_icon if index.data(ATTACHMENT_EXISTS_ROLE) else self.add_icon
+        icon_rect = QRect(0, 0, self.ICON_SIZE, self.ICON_SIZE)
+        icon_rect.moveCenter(option.rect.center())
+        icon.paint(painter, icon_rect)
+
+    def helpEvent(self, event, view, option, index):
+        if index.column() == self.column and event.type() == QEvent.ToolTip:
+            text = "管理附件" if index.data(ATTACHMENT_EXISTS_ROLE) else "添加附件"
+            QToolTip.showText(event.globalPos(), text, view)
+            return True
+        return super().helpEvent(event, view, option, index)
+
+    def editorEvent(self, event, model, option, index):
+        if (index.column() == self.column and event.type() == QEvent.MouseButtonRelease
+                and event.button() == Qt.LeftButton
+                and self._button_rect(option.rect).contains(event.position().toPoint())):
+            self.attachment_clicked.emit(AttachmentCell(self.parent(), index, self.item_type))
+            return True
+        return super().editorEvent(event, model, option, index)
+
+    def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
+        if index.column() == self.column:
+            return QSize(max(size.width(), self.BUTTON_SIZE), max(size.height(), self.BUTTON_SIZE))
+        return size
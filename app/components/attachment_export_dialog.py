@@ -0,0 +1,215 @@
+import os
+import time
+from datetime import datetime
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QButtonGroup, QFileDialog)
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from qfluentwidgets import (PushButton, FluentIcon, CheckBox, RadioButton, LineEdit, ProgressBar,
+                            BodyLabel, Dialog)
+from ..utils.export_utils import AttachmentExporter
+from ..utils.ui_utils import UIUtils
+
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class _ExportSignals(QObject):
+    progress = Signal(object, object)  # (已写入字节数, 总字节数)，字节数可能超出 32 位整数
+    finished = Signal(object)  # ExportResult 或异常
+
+
+class _ExportRunnable(QRunnable):
+    # 进度信号的最小间隔（秒），避免大量小块复制时刷屏
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, exporter, signals, dialog):
+        super().__init__()
+        self.exporter = exporter
+        self.signals = signals
+        self.dialog = dialog
+        self._last_progress = 0.0
+
+    def _progress(self, done, total):
+        now = time.monotonic()
+        if now - self._last_progress >= self.PROGRESS_INTERVAL or done >= total:
+            self._last_progress = now
+            self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            result = self.exporter.run(self._progress, lambda: self.dialog.cancel_requested)
+        except Exception as e:
+            result = e
+        self.signals.finished.emit(result)
+
+
+class AttachmentExportDialog(QDialog):
+    """附件导出对话框：选择导出位置和格式，在后台线程导出并显示进度，可取消"""
+
+    # 导出结果中最多列出的失败文件数
+    MAX_ERROR_LINES = 10
+
+    def __init__(self, items, default_name, title="导出附件", parent=None):
+        """
+        Args:
+            items: ExportItem 列表
+            default_name: 导出的文件夹或 ZIP 文件名（不含扩展名）
+            title: 对话框标题
+            parent: 父窗口，导出结果显示在父窗口上
+        """
+        super().__init__(parent)
+        self.items = items
+        self.default_name = default_name
+        self.cancel_requested = False
+        self.running = False
+        self.target = None  # 导出目标，开始导出后确定
+        self.setWindowTitle(title)
+        self.setup_ui()
+
+    def setup_ui(self):
+        """设置UI界面"""
+        self.resize(480, 260)
+        layout = QVBoxLayout(self)
+        layout.setSpacing(16)
+        layout.setContentsMargins(20, 20, 20, 20)
+
+        file_count = len(set(item.source for item in self.items))
+        layout.addWidget(BodyLabel(f"共 {len(self.items)} 条记录，{file_count} 个附件文件"))
+
+        # 导出位置
+        dir_layout = QHBoxLayout()
+        dir_layout.addWidget(QLabel("导出位置："))
+        self.dir_edit = LineEdit()
+        self.dir_edit.setText(os.path.expanduser("~"))
+        dir_layout.addWidget(self.dir_edit)
+        self.browse_button = PushButton("选择", self, FluentIcon.FOLDER)
+        self.browse_button.clicked.connect(self.select_directory)
+        dir_layout.addWidget(self.browse_button)
+        layout.addLayout(dir_layout)
+
+        # 导出格式
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("导出格式："))
+        self.format_group = QButtonGroup(self)
+        self.folder_radio = RadioButton("文件夹")
+        self.zip_radio = RadioButton("ZIP 压缩包")
+        self.format_group.addButton(self.folder_radio)
+        self.format_group.addButton(self.zip_radio)
+        self.folder_radio.setChecked(True)
+        format_layout.addWidget(self.folder_radio)
+        format_layout.addWidget(self.zip_radio)
+        format_layout.addStretch()
+        layout.addLayout(format_layout)
+
+        self.manifest_checkbox = CheckBox("生成清单（记录信息、文件大小及 SHA-256）")
+        self.manifest_checkbox.setChecked(True)
+        layout.addWidget(self.manifest_checkbox)
+
+        # 进度
+        self.progress_bar = ProgressBar()
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setValue(0)
+        self.progress_label = BodyLabel("")
+        self.progress_label.setStyleSheet("color: #666;")
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.progress_label)
+        self.progress_bar.hide()
+        self.progress_label.hide()
+
+        # 按钮组
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.cancel_button = PushButton("取消")
+        self.cancel_button.setIcon(FluentIcon.CANCEL)
+        self.export_button = PushButton("导出")
+        self.export_button.setIcon(FluentIcon.SAVE)
+        button_layout.addWidget(self.cancel_button)
+        button_layout.addWidget(self.export_button)
+        layout.addLayout(button_layout)
+
+        self.cancel_button.clicked.connect(self.reject)
+        self.export_button.clicked.connect(self.start_export)
+
+    def select_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择导出目录", self.dir_edit.text())
+        if directory:
+            self.dir_edit.setText(directory)
+
+    def _choose_target(self, directory, as_zip):
+        """确定导出目标：有未完成的导出时询问是否继续，目标已存在时添加时间后缀"""
+        suffix = ".zip" if as_zip else ""
+        target = os.path.join(directory, self.default_name + suffix)
+        if AttachmentExporter.is_incomplete(target):
+            dialog = Dialog("继续导出", f"“{os.path.basename(target)}”上次导出未完成，是否继续上次的导出？\n"
+                            "选择“取消”将导出到新的位置。", self)
+            if dialog.exec():
+                return target
+        elif not os.path.exists(target):
+            return target
+        return os.path.join(directory, f"{self.default_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}")
+
+    def start_export(self):
+        directory = self.dir_edit.text().strip()
+        if not directory or not os.path.isdir(directory):
+            UIUtils.show_warning(self, "警告", "请选择有效的导出目录")
+            return
+        as_zip = self.zip_radio.isChecked()
+        target = self._choose_target(directory, as_zip)
+        self.target = target
+        exporter = AttachmentExporter(self.items, target, as_zip=as_zip,
+                                      manifest=self.manifest_checkbox.isChecked())
+
+        for widget in (self.dir_edit, self.browse_button, self.folder_radio, self.zip_radio,
+                       self.manifest_checkbox, self.export_button):
+            widget.setEnabled(False)
+        self.progress_bar.show()
+        self.progress_label.show()
+        self.progress_label.setText("正在准备…")
+
+        self.running = True
+        self.signals = _ExportSignals(self)
+        self.signals.progress.connect(self.on_progress)
+        self.signals.finished.connect(self.on_finished)
+        QThreadPool.globalInstance().start(_ExportRunnable(exporter, self.signals, self))
+
+    def on_progress(self, done, total):
+        self.progress_bar.setValue(int(done * 1000 / total) if total else 1000)
+        self.progress_label.setText(f"{_format_size(done)} / {_format_size(total)}")
+
+    def on_finished(self, result):
+        self.running = False
+        parent = self.parentWidget() or self
+        self.accept()
+
+        if isinstance(result, Exception):
+            message = f"导出附件时发生错误：{result}"
+            if AttachmentExporter.is_incomplete(self.target):
+                message += "\n已完成的文件已保留，再次导出到同一目录时可继续"
+            UIUtils.show_error(parent, "导出错误", message)
+            return
+        if result.cancelled:
+            UIUtils.show_info(parent, "已取消", f"导出已取消，已完成的文件保留在：\n{result.target}\n再次导出到同一目录时可继续")
+            return
+
+        total = result.exported + result.resumed
+        problems = [f"文件不存在: {path}" for path in result.missing] + result.errors
+        if problems:
+            lines = problems[:self.MAX_ERROR_LINES]
+            if len(problems) > self.MAX_ERROR_LINES:
+                lines.append(f"…… 共 {len(problems)} 个文件未导出")
+            UIUtils.show_warning(parent, "导出警告",
+                                 f"成功导出 {total} 个附件到：\n{result.target}\n以下文件未导出：\n" + "\n".join(lines))
+        else:
+            UIUtils.show_success(parent, "成功", f"成功导出 {total} 个附件到：\n{result.target}")
+
+    def reject(self):
+        """导出过程中关闭或点击取消时请求取消，等待后台线程结束"""
+        if self.running:
+            self.cancel_requested = True
+            self.cancel_button.setEnabled(False)
+            self.progress_label.setText("正在取消…")
+            return
+        super().reject()
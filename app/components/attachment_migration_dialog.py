@@ -0,0 +1,114 @@
+import logging
+import time
+from PySide6.QtWidgets import QDialog, QVBoxLayout
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from qfluentwidgets import ProgressBar, BodyLabel
+from ..utils.attachment_store import migrate_legacy_attachments
+from ..utils.ui_utils import UIUtils
+
+
+class _MigrationSignals(QObject):
+    progress = Signal(int, int)  # (已处理路径数, 路径总数)
+    finished = Signal(object)  # MigrationResult 或异常
+
+
+class _MigrationRunnable(QRunnable):
+    # 进度信号的最小间隔（秒），避免大量小文件时刷屏
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, sessions, legacy, signals):
+        super().__init__()
+        self.sessions = sessions
+        self.legacy = legacy
+        self.signals = signals
+        self._last_progress = 0.0
+
+    def _progress(self, done, total):
+        now = time.monotonic()
+        if now - self._last_progress >= self.PROGRESS_INTERVAL or done >= total:
+            self._last_progress = now
+            self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            result = migrate_legacy_attachments(self.sessions, self._progress, self.legacy)
+        except Exception as e:
+            logging.exception("迁移旧版附件失败")
+            result = e
+        self.signals.finished.emit(result)
+
+
+class AttachmentMigrationDialog(QDialog):
+    """旧版附件迁移进度对话框：在后台线程将旧附件迁入附件存储并显示进度，完成后自动关闭
+
+    迁移按批提交，中途退出程序时下次启动从未完成的文件继续，因此迁移过程中不能取消，
+    关闭按钮被忽略。
+    """
+
+    def __init__(self, sessions, legacy, parent=None):
+        """
+        Args:
+            sessions: 会话注册表
+            legacy: 待迁移的旧附件路径，见 legacy_attachment_paths()
+            parent: 父窗口
+        """
+        super().__init__(parent)
+        self.sessions = sessions
+        self.legacy = legacy
+        self.result = None
+        self.running = False
+        self.setWindowTitle("迁移旧版附件")
+        self.setup_ui()
+
+    def setup_ui(self):
+        """设置UI界面"""
+        self.resize(420, 140)
+        layout = QVBoxLayout(self)
+        layout.setSpacing(16)
+        layout.setContentsMargins(20, 20, 20, 20)
+
+        layout.addWidget(BodyLabel(f"正在将 {len(self.legacy)} 个旧版附件迁入附件存储，请稍候…"))
+        self.progress_bar = ProgressBar()
+        self.progress_bar.setRange(0, len(self.legacy))
+        self.progress_bar.setValue(0)
+        self.progress_label = BodyLabel(f"0 / {len(self.legacy)}")
+        self.progress_label.setStyleSheet("color: #666;")
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.progress_label)
+
+    def exec(self):
+        self.running = True
+        self.signals = _MigrationSignals(self)
+        self.signals.progress.connect(self.on_progress)
+        self.signals.finished.connect(self.on_finished)
+        QThreadPool.globalInstance().start(_MigrationRunnable(self.sessions, self.legacy, self.signals))
+        return super().exec()
+
+    def on_progress(self, done, total):
+        self.progress_bar.setValue(done)
+        self.progress_label.setText(f"{done} / {total}")
+
+    def on_finished(self, result):
+        self.running = False
+        self.result = result
+        self.accept()
+
+    def reject(self):
+        """迁移过程中忽略关闭"""
+        if self.running:
+            return
+        super().reject()
+
+    def show_result(self, parent):
+        """在父窗口上显示迁移结果"""
+        result = self.result
+        if isinstance(result, Exception):
+            UIUtils.show_error(parent, "附件迁移错误", f"迁移旧版附件时发生错误：{result}\n下次启动时将重试")
+            return
+        message = f"已迁移 {result.migrated} 个旧版附件"
+        if result.missing or result.skipped:
+            UIUtils.show_warning(parent, "附件迁移",
+                                 f"{message}，{result.missing} 个文件不存在，"
+                                 f"{result.skipped} 个文件无法读取已跳过（下次启动时重试）")
+        else:
+            UIUtils.show_success(parent, "附件迁移", message)
@@ -7,6 +7,9 @@ from ..models.database import BudgetCategory
 from ..utils.ui_utils import UIUtils
 
 class BatchImportDialog(QDialog):
+    # 导入结果中最多列出的未导入行数
+    MAX_ERROR_LINES = 10
+
     def __init__(self, project_id, parent=None):
         super().__init__(parent)
         self.project_id = project_id
@@ -34,7 +37,8 @@ class BatchImportDialog(QDialog):
             "1. 费用类别、开支内容和报账金额为必填项\n"
             "2. 费用类别必须是系统预设的类别之一\n"
             "3. 报账金额必须大于0\n"
-            "4. 报账日期格式为YYYY-MM-DD，可为空"
+            "4. 报账日期格式为YYYY-MM-DD，可为空\n"
+            "5. 不符合要求的行将被跳过，导入后列出行号和原因"
         )
         instruction_label.setStyleSheet("color: #666; margin: 10px 0;")
         layout.addWidget(instruction_label)
@@ -132,7 +136,7 @@ class BatchImportDialog(QDialog):
             )
 
     def import_data(self):
-        """导入数据"""
+        """导入数据：分块读取、校验并批量写入，不合格的行跳过并列出原因"""
         if not self.file_path.text() or self.file_path.text() == "未选择文件":
             UIUtils.show_warning(
                 title='警告',
@@ -140,129 +144,49 @@ class BatchImportDialog(QDialog):
                 parent=self
             )
             return
-            
-        try:
-            # 读取文件
-            file_path = self.file_path.text()
-            if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path)
-            else:
-                df = pd.read_excel(file_path, sheet_name='支出信息')
-                
-            # 数据验证
-            required_columns = ['费用类别', '开支内容', '报账金额']
-            optional_columns = ['规格型号', '供应商', '报账日期', '备注'] 
-            
-            # 检查必要列
-            missing_required = [col for col in required_columns if col not in df.columns]
-            if missing_required:
-                UIUtils.show_warning(
-                    title='警告',
-                    content=f'文件缺少必要列！\n缺失列：{', '.join(missing_required)}\n必须包含：{', '.join(required_columns)}',
-                    parent=self
-                )
-                return
-
-            # 检查必填字段是否为空
-            empty_required = []
-            for col in required_columns:
-                if df[col].isna().any():
-                    empty_required.append(col)
-            
-            if empty_required:
-                UIUtils.show_warning(
-                    title='警告',
-                    content=f'以下必填列存在空值：{', '.join(empty_required)}',
-                    parent=self
-                )
-                return
 
-            # 检查费用类别是否有效
-            valid_categories = [category.value for category in BudgetCategory]
-            invalid_categories = df[~df['费用类别'].isin(valid_categories)]['费用类别'].unique()
-            
-            if len(invalid_categories) > 0:
-                UIUtils.show_warning(
-                    title='警告',
-                    content=f'存在无效的费用类别：{', '.join(invalid_categories)}\n有效的费用类别包括：{', '.join(valid_categories)}',
-                    parent=self
-                )
-                return
-
-            # 检查金额格式
-            try:
-                df['报账金额'] = pd.to_numeric(df['报账金额'])
-            except Exception:
-                UIUtils.show_warning(
-                    title='警告',
-                    content='报账金额列包含无效的数字格式',
-                    parent=self
-                )
-                return
-
-            if (df['报账金额'] <= 0).any():
-                UIUtils.show_warning(
-                    title='警告',
-                    content='报账金额必须大于0',
-                    parent=self
-                )
-                return
-
-            # 检查日期格式
-            if '报账日期' in df.columns and not df['报账日期'].isna().all():
-                try:
-                    df['报账日期'] = pd.to_datetime(df['报账日期'], format=None)
-                    df['报账日期'] = df['报账日期'].dt.strftime('%Y-%m-%d')
-                    df['报账日期'] = pd.to_datetime(df['报账日期'])
-                except Exception as e:
-                    UIUtils.show_warning(
-                        title='警告',
-                        content='无法识别报账日期格式，请使用常见的日期格式，如：YYYY-MM-DD、YYYY/MM/DD、DD/MM/YYYY等',
-                        parent=self
-                    )
-                    return
-            else:
-                df['报账日期'] = pd.Timestamp.now()
+        if not self.parent():
+            return
 
-            # 添加缺失的可选列
-            for col in optional_columns:
-                if col not in df.columns:
-                    df[col] = None
+        try:
+            # 发送信号或调用主窗口的导入方法
+            result = self.parent().import_expenses(self.file_path.text())
 
-            # 将数据转换为字典列表
-            expenses = []
-            for _, row in df.iterrows():
-                expense = {
-                    '类别': row['费用类别'],
-                    '开支内容': row['开支内容'],
-                    '报账金额': float(row['报账金额']),
-                    '规格型号': row['规格型号'] if pd.notna(row['规格型号']) else None,
-                    '供应商': row['供应商'] if pd.notna(row['供应商']) else None,
-                    '报账日期': row['报账日期'].to_pydatetime() if pd.notna(row['报账日期']) else datetime.now(),
-                    '备注': row['备注'] if pd.notna(row['备注']) else None
-                }
-                expenses.append(expense)
-                
-            # 发送信号或调用主窗口的添加方法
-            if self.parent():
-                self.parent().add_expenses(expenses)
-                
-            UIUtils.show_success(
-                title='成功',
-                content=f'成功导入 {len(expenses)} 条记录！',
-                parent=self
-            )
-            self.accept()
-            
         except pd.errors.EmptyDataError:
             UIUtils.show_error(
                 title='错误',
                 content='导入的文件为空！',
                 parent=self
             )
+            return
+        except ValueError as e:
+            UIUtils.show_warning(
+                title='警告',
+                content=str(e),
+                parent=self
+            )
+            return
         except Exception as e:
             UIUtils.show_error(
                 title='错误',
                 content=f'导入失败: {str(e)}',
                 parent=self
-            )
\ No newline at end of file
+            )
+            return
+
+        if result.errors:
+            details = "\n".join(f"第 {error.row} 行：{error.message}" for error in result.errors[:self.MAX_ERROR_LINES])
+            if len(result.errors) > self.MAX_ERROR_LINES:
+                details += f"\n……共 {len(result.errors)} 行"
+            UIUtils.show_warning(
+                title='部分记录未导入',
+                content=f'成功导入 {result.imported} 条记录，{len(result.errors)} 行未导入：\n{details}',
+                parent=self.parent()
+            )
+        else:
+            UIUtils.show_success(
+                title='成功',
+                content=f'成功导入 {result.imported} 条记录！',
+                parent=self.parent()
+            )
+        self.accept()
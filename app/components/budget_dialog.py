@@ -13,10 +13,10 @@ from PySide6.QtCore import Qt, QDate, Signal
 from qfluentwidgets import (
     SpinBox, DoubleSpinBox, PushButton, BodyLabel, FluentIcon, ComboBox, ToolTipFilter, ToolTipPosition # Added ComboBox for selection
 )
-from ..models.database import BudgetCategory, Budget, BudgetItem, sessionmaker
-from sqlalchemy.orm import sessionmaker
+from ..models.database import BudgetCategory, Budget, BudgetItem
+from ..models.session import SessionRegistry
+from ..models.budget_usage import get_budget_usage
 from ..utils.ui_utils import UIUtils
-from sqlalchemy import func
 
 class TotalBudgetDialog(QDialog):
     budget_plan_imported = Signal(dict) # Signal to emit imported budget data
@@ -29,10 +29,11 @@ class TotalBudgetDialog(QDialog):
     - 预算子项管理
     """
     
-    def __init__(self, project, engine, parent=None, budget=None): # Added project and engine parameters
+    def __init__(self, project, engine, parent=None, budget=None, sessions=None): # Added project and engine parameters
         super().__init__(parent)
         self.project = project # Use passed project
         self.engine = engine # Use passed engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         self.budget = budget
         self.is_new = budget is None
         self.engine = engine # Store the engine, it's needed for importing budget plans
@@ -119,8 +120,7 @@ class TotalBudgetDialog(QDialog):
         
     def load_budget_data(self):
         """加载已有的总预算数据"""
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             # 查询总预算
             total_budget = session.query(Budget).filter(
@@ -157,8 +157,7 @@ class TotalBudgetDialog(QDialog):
             UIUtils.show_error(title="错误", content="数据库引擎未初始化，无法导入预算计划。", parent=self)
             return
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             budget_plans = session.query(BudgetPlan).all()
             if not budget_plans:
@@ -247,8 +246,7 @@ class TotalBudgetDialog(QDialog):
                 
     def update_balance_amounts(self):
         """更新各费用类别的结余金额显示"""
-        Session = sessionmaker(bind=self.engine) # Use self.engine
-        session = Session()
+        session = self.sessions()
         
         try:
             # 获取总预算
@@ -264,19 +262,12 @@ class TotalBudgetDialog(QDialog):
                 ).all()
                 
                 # 获取所有年度预算的支出总和（按类别）
-                category_totals = {}
+                usage = get_budget_usage(session, self.project.id)
+                category_totals = {
+                    category: usage.annual_spent(category) / 10000
+                    for category in BudgetCategory
+                }
                 total_balance = 0.0  # 初始化总结余
-                for category in BudgetCategory:
-                    category_spent = session.query(func.sum(BudgetItem.spent_amount)).filter(
-                        BudgetItem.budget_id.in_(
-                            session.query(Budget.id).filter(
-                                Budget.project_id == self.project.id, # Use self.project.id
-                                Budget.year.isnot(None)  # 只计算年度预算
-                            )
-                        ),
-                        BudgetItem.category == category
-                    ).scalar() or 0.0
-                    category_totals[category] = category_spent
                 
                 # 更新结余金额显示
                 for category in BudgetCategory:
@@ -338,10 +329,11 @@ class BudgetDialog(QDialog):
     # 定义信号
     budget_updated = Signal()
     
-    def __init__(self, project, engine, parent=None, budget=None): # Added project and engine parameters
+    def __init__(self, project, engine, parent=None, budget=None, sessions=None): # Added project and engine parameters
         super().__init__(parent)
         self.project = project # Use passed project
         self.engine = engine # Use passed engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         self.budget = budget
         self.is_new = budget is None
         self.setup_ui()
@@ -483,8 +475,7 @@ class BudgetDialog(QDialog):
             
         self.year_spin.setValue(self.budget.year)
             
-        Session = sessionmaker(bind=self.engine) # Use self.engine
-        session = Session()
+        session = self.sessions()
         try:
             budget_items = session.query(BudgetItem).filter_by(
                 budget_id=self.budget.id
@@ -507,8 +498,7 @@ class BudgetDialog(QDialog):
             UIUtils.show_error(title="错误", content="数据库引擎未初始化，无法导入预算计划。", parent=self)
             return
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             budget_plans = session.query(BudgetPlan).all()
             if not budget_plans:
@@ -597,8 +587,7 @@ class BudgetDialog(QDialog):
         
     def update_balance_amounts(self):
         """更新各费用类别的结余金额显示"""
-        Session = sessionmaker(bind=self.engine) # Use self.engine
-        session = Session()
+        session = self.sessions()
         
         try:
             # 获取总预算
@@ -614,19 +603,12 @@ class BudgetDialog(QDialog):
                 ).all()
                 
                 # 获取所有年度预算的支出总和（按类别）
-                category_totals = {}
+                usage = get_budget_usage(session, self.project.id)
+                category_totals = {
+                    category: usage.annual_spent(category) / 10000
+                    for category in BudgetCategory
+                }
                 total_balance = 0.0  # 初始化总结余
-                for category in BudgetCategory:
-                    category_spent = session.query(func.sum(BudgetItem.spent_amount)).filter(
-                        BudgetItem.budget_id.in_(
-                            session.query(Budget.id).filter(
-                                Budget.project_id == self.project.id, # Use self.project.id
-                                Budget.year.isnot(None)  # 只计算年度预算
-                            )
-                        ),
-                        BudgetItem.category == category
-                    ).scalar() or 0.0
-                    category_totals[category] = category_spent
                 
                 # 更新结余金额显示
                 for category in BudgetCategory:
@@ -656,8 +638,7 @@ class BudgetDialog(QDialog):
             )
             return
             
-        Session = sessionmaker(bind=self.engine) # Use self.engine
-        session = Session()
+        session = self.sessions()
         
         try:
             # 开始事务
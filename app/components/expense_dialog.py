@@ -187,6 +187,6 @@ class ExpenseDialog(QDialog):
              self.voucher_btn.setText("选择凭证文件")
              self.voucher_btn.setToolTip("")
 
-    def add_expenses(self, expenses_data):
-        """批量添加支出"""
-        self.parent().add_expenses(expenses_data)
+    def import_expenses(self, file_path):
+        """从文件批量导入支出，返回 ImportResult"""
+        return self.parent().import_expenses(file_path)
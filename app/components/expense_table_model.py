@@ -0,0 +1,269 @@
+"""
+支出表格的模型/视图实现
+
+ExpenseTableModel 以列存储方式保存支出数据（数值列使用 array，文本列使用 list），
+不为每个单元格创建 QTableWidgetItem；视图按需通过 canFetchMore/fetchMore 分批加入行，
+附件列由 AttachmentDelegate 绘制。排序经 ExpenseProxyModel 转交模型，在全部数据上
+按列存储计算排列顺序，不移动数据本身。
+"""
+
+import os
+from array import array
+from collections import namedtuple
+from operator import attrgetter
+from datetime import date
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from ..models.database import BudgetCategory
+from .attachment_delegate import ATTACHMENT_PATH_ROLE, ATTACHMENT_EXISTS_ROLE
+from ..utils.attachment_cache import attachment_path_cache
+
+# 模型读取的支出字段，查询时可只选取这些列
+EXPENSE_FIELDS = ('id', 'category', 'content', 'specification', 'supplier',
+                  'amount', 'date', 'remarks', 'voucher_path')
+
+ExpenseRecord = namedtuple('ExpenseRecord', EXPENSE_FIELDS)
+_read_fields = attrgetter(*EXPENSE_FIELDS)
+
+_CATEGORIES = list(BudgetCategory)
+_CATEGORY_INDEX = {category: i for i, category in enumerate(_CATEGORIES)}
+
+
+class ExpenseTableModel(QAbstractTableModel):
+    """支出表格模型"""
+
+    HEADERS = ["支出ID", "费用类别", "开支内容", "规格型号", "供应商",
+               "报账金额(元)", "报账日期", "备注", "凭证附件"]
+    ID_COLUMN = 0
+    AMOUNT_COLUMN = 5
+    DATE_COLUMN = 6
+    ATTACHMENT_COLUMN = 8
+
+    # 每次 fetchMore 加入的行数
+    FETCH_BATCH = 200
+
+    _ALIGNMENTS = {
+        2: Qt.AlignLeft | Qt.AlignVCenter,
+        5: Qt.AlignRight | Qt.AlignVCenter,
+    }
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._clear()
+
+    def _clear(self):
+        self._ids = array('q')
+        self._categories = array('b')
+        self._amounts = array('d')
+        self._dates = array('l')  # date.toordinal()
+        self._texts = {field: [] for field in ('content', 'specification', 'supplier', 'remarks')}
+        self._voucher_paths = []
+        self._voucher_exists = {}  # {存储下标: 附件文件是否存在}，绘制时按需检查并缓存
+        self._order = array('l')  # 显示行 -> 存储下标
+        self._fetched = 0
+
+    def set_expenses(self, expenses):
+        """替换表格数据
+
+        Args:
+            expenses: 可迭代的支出对象或查询结果行，需具有 EXPENSE_FIELDS 中的属性
+        """
+        self.beginResetModel()
+        self._clear()
+        contents, specifications, suppliers, remarks = (
+            self._texts['content'], self._texts['specification'], self._texts['supplier'], self._texts['remarks'])
+        for (expense_id, category, content, specification, supplier,
+             amount, expense_date, remark, voucher_path) in map(_read_fields, expenses):
+            self._ids.append(expense_id)
+            self._categories.append(_CATEGORY_INDEX.get(category, -1))
+            self._amounts.append(amount or 0.0)
+            self._dates.append(expense_date.toordinal() if expense_date else 0)
+            contents.append(content or "")
+            specifications.append(specification or "")
+            suppliers.append(supplier or "")
+            remarks.append(remark or "")
+            self._voucher_paths.append(voucher_path)
+        self._order = self._sorted_order()
+        self._fetched = min(self.FETCH_BATCH, len(self._ids))
+        self.endResetModel()
+
+    def total_count(self):
+        """数据总行数（含尚未加入视图的行）"""
+        return len(self._ids)
+
+    def record(self, position):
+        """按存储下标返回一条 ExpenseRecord"""
+        category = self._categories[position]
+        ordinal = self._dates[position]
+        return ExpenseRecord(
+            id=self._ids[position],
+            category=_CATEGORIES[category] if category >= 0 else None,
+            content=self._texts['content'][position],
+            specification=self._texts['specification'][position],
+            supplier=self._texts['supplier'][position],
+            amount=self._amounts[position],
+            date=date.fromordinal(ordinal) if ordinal else None,
+            remarks=self._texts['remarks'][position],
+            voucher_path=self._voucher_path(position),
+        )
+
+    def records(self):
+        """按当前排序依次返回全部支出（含尚未加入视图的行）"""
+        for position in self._order:
+            yield self.record(position)
+
+    # --- QAbstractTableModel 接口 ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._fetched < len(self._ids)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.FETCH_BATCH, len(self._ids) - self._fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return section + 1
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def _display(self, position, column):
+        if column == 0:
+            return str(self._ids[position])
+        if column == 1:
+            category = self._categories[position]
+            return _CATEGORIES[category].value if category >= 0 else ""
+        if column == 2:
+            return self._texts['content'][position]
+        if column == 3:
+            return self._texts['specification'][position]
+        if column == 4:
+            return self._texts['supplier'][position]
+        if column == 5:
+            return self._amounts[position]
+        if column == 6:
+            ordinal = self._dates[position]
+            return date.fromordinal(ordinal).strftime("%Y-%m-%d") if ordinal else ""
+        if column == 7:
+            return self._texts['remarks'][position]
+        return None
+
+    def _voucher_path(self, position):
+        """凭证路径，附件变更后尚未重新加载时以附件路径缓存为准"""
+        return attachment_path_cache.resolve('expense', self._ids[position], self._voucher_paths[position])
+
+    def _attachment_exists(self, position):
+        exists = self._voucher_exists.get(position)
+        if exists is None:
+            path = self._voucher_path(position)
+            exists = bool(path) and os.path.exists(path)
+            self._voucher_exists[position] = exists
+        return exists
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._fetched:
+            return None
+        position = self._order[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            return self._display(position, column)
+        if role == Qt.ToolTipRole:
+            value = self._display(position, column)
+            return str(value) if value not in (None, "") else None
+        if role == Qt.TextAlignmentRole:
+            return self._ALIGNMENTS.get(column, Qt.AlignCenter)
+        if role == Qt.UserRole:
+            return self._ids[position]
+        if role == ATTACHMENT_PATH_ROLE:
+            return self._voucher_path(position)
+        if role == ATTACHMENT_EXISTS_ROLE:
+            return self._attachment_exists(position)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        """仅支持更新附件路径（附件上传、替换、删除后由附件工具调用）"""
+        if role != ATTACHMENT_PATH_ROLE or not index.isValid():
+            return False
+        position = self._order[index.row()]
+        self._voucher_paths[position] = value
+        self._voucher_exists.pop(position, None)
+        self.dataChanged.emit(index, index, [ATTACHMENT_PATH_ROLE, ATTACHMENT_EXISTS_ROLE])
+        return True
+
+    def _sort_key(self, column):
+        """返回按存储下标取排序键的函数"""
+        if column == 0:
+            return self._ids.__getitem__
+        if column == 1:
+            return lambda position: _CATEGORIES[self._categories[position]].value if self._categories[position] >= 0 else ""
+        if column == 5:
+            return self._amounts.__getitem__
+        if column == 6:
+            return self._dates.__getitem__
+        if column == self.ATTACHMENT_COLUMN:
+            return self._attachment_exists
+        field = {2: 'content', 3: 'specification', 4: 'supplier', 7: 'remarks'}[column]
+        return self._texts[field].__getitem__
+
+    def _sorted_order(self):
+        """按当前排序列计算显示顺序，未排序时保持载入顺序"""
+        positions = range(len(self._ids))
+        if self._sort_column < 0:
+            return array('l', positions)
+        return array('l', sorted(positions, key=self._sort_key(self._sort_column),
+                                 reverse=self._sort_order == Qt.DescendingOrder))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """在全部数据（含尚未加入视图的行）上排序，只重排显示顺序"""
+        if column < 0 or column >= len(self.HEADERS):
+            return
+        self._sort_column = column
+        self._sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        old_order = self._order
+        self._order = self._sorted_order()
+        # 已加入视图的行位置变化，更新持久索引（保持选中状态）
+        new_rows = {position: row for row, position in enumerate(self._order)}
+        old_indexes = self.persistentIndexList()
+        new_indexes = []
+        for index in old_indexes:
+            row = new_rows[old_order[index.row()]]
+            if row >= self._fetched:
+                new_indexes.append(QModelIndex())
+            else:
+                new_indexes.append(self.index(row, index.column()))
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+
+class ExpenseProxyModel(QSortFilterProxyModel):
+    """支出表格的排序/筛选代理
+
+    排序转交 ExpenseTableModel 在全部数据上完成（代理自身只能对已加入视图的行排序）；
+    行的筛选在查询时由 FilterUtils.filter_query 在数据库中完成，代理不再过滤。
+    """
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        source = self.sourceModel()
+        if source is not None:
+            source.sort(column, order)
@@ -21,18 +21,18 @@ class ProjectDialog(QDialog):
         
     def load_history_data(self):
         """从数据库加载历史数据"""
-        from ..models.database import sessionmaker, Project
+        from ..models.database import Project
+        session = None
         try:
             parent = self.parent()
             while parent:
-                if hasattr(parent, 'engine'):
-                    engine = parent.engine
+                if hasattr(parent, 'sessions'):
+                    sessions = parent.sessions
                     break
                 parent = parent.parent()
             else:
-                raise AttributeError("无法找到包含engine属性的父窗口")
-            Session = sessionmaker(bind=engine)
-            session = Session()
+                raise AttributeError("无法找到包含sessions属性的父窗口")
+            session = sessions()
             
             # 获取项目类别历史记录
             project_type = session.query(Project.project_type).distinct().all()
@@ -0,0 +1,193 @@
+from PySide6.QtWidgets import QVBoxLayout, QGridLayout, QLabel
+from PySide6.QtCore import Qt
+from qfluentwidgets import ElevatedCardWidget, BodyLabel
+
+TITLE_STYLE = "font-size: 14px; color: #666;"
+CODE_STYLE = "font-size: 18px; font-weight: bold;"
+VALUE_STYLE = "font-size: 18px; font-weight: bold;"
+TASK_VALUE_STYLE = "font-size: 16px; font-weight: bold;"
+CRITICAL_STYLE = "font-size: 14px; color: #c0392b;"
+UNIT_SPAN = "<span style='font-size: 14px; font-weight: normal;'> {}</span>"
+
+
+def _label(text="", style=None):
+    label = QLabel(text)
+    label.setAlignment(Qt.AlignCenter)
+    if style:
+        label.setStyleSheet(style)
+    return label
+
+
+def _set_text(label, text):
+    """文字有变化时才更新，避免无谓的重新布局"""
+    if label.text() != text:
+        label.setText(text)
+
+
+def _separator():
+    line = QLabel()
+    line.setStyleSheet("background-color: #ccc;")
+    line.setFixedWidth(1)
+    return line
+
+
+class FundCard(ElevatedCardWidget):
+    """项目经费卡片：财务编号、总预算、总支出、执行率"""
+
+    def __init__(self, project_id, parent=None):
+        super().__init__(parent)
+        self.project_id = project_id
+        self.setFixedHeight(80)  # 设置卡片高度
+        card_layout = QVBoxLayout(self)
+        card_layout.setContentsMargins(15, 15, 15, 15)
+
+        grid_layout = QGridLayout()
+        grid_layout.setSpacing(10)
+        self.code_label = _label(style=CODE_STYLE)
+        grid_layout.addWidget(self.code_label, 0, 0, 2, 1, alignment=Qt.AlignCenter)
+        grid_layout.addWidget(_separator(), 0, 1, 2, 1)
+        for column, title in enumerate(("总预算", "总支出", "执行率"), start=2):
+            grid_layout.addWidget(_label(title, TITLE_STYLE), 0, column, alignment=Qt.AlignCenter)
+        self.budget_label = _label(style=VALUE_STYLE)
+        self.spent_label = _label(style=VALUE_STYLE)
+        self.rate_label = _label(style=VALUE_STYLE)
+        for column, label in enumerate((self.budget_label, self.spent_label, self.rate_label), start=2):
+            grid_layout.addWidget(label, 1, column, alignment=Qt.AlignCenter)
+
+        grid_layout.setColumnStretch(0, 1) # Project code column
+        grid_layout.setColumnStretch(1, 0) # Separator column (fixed width)
+        for column in (2, 3, 4):
+            grid_layout.setColumnStretch(column, 1)
+        grid_layout.setRowStretch(0, 1)
+        grid_layout.setRowStretch(1, 1)
+        card_layout.addLayout(grid_layout)
+
+    def update_values(self, project):
+        """按项目经费快照（financial_code、total_budget、total_spent）更新显示"""
+        total_spent = project.total_spent / 10000  # 转换为万元
+        execution_rate = (project.total_spent / (project.total_budget * 10000)) * 100 if project.total_budget > 0 else 0
+        _set_text(self.code_label, project.financial_code if project.financial_code else "--")
+        _set_text(self.budget_label, f"{project.total_budget:.2f}" + UNIT_SPAN.format("万元"))
+        _set_text(self.spent_label, f"{total_spent:.2f}" + UNIT_SPAN.format("万元"))
+        _set_text(self.rate_label, f"{execution_rate:.2f}" + UNIT_SPAN.format("%"))
+
+
+class TaskCard(ElevatedCardWidget):
+    """项目进度卡片：一级任务的编码、名称、进度，及关键路径"""
+
+    def __init__(self, project_id, parent=None):
+        super().__init__(parent)
+        self.project_id = project_id
+        self.grid = QGridLayout(self)
+        self.grid.setContentsMargins(15, 15, 15, 15)
+        self.grid.setSpacing(10)
+
+        self.code_label = _label(style=CODE_STYLE)
+        self.code_label.setFixedWidth(100) # 设置固定宽度
+        self.grid.addWidget(self.code_label, 0, 0, -1, 1, alignment=Qt.AlignCenter)
+        self.grid.addWidget(_separator(), 0, 1, -1, 1)
+        for column, title in enumerate(("任务编码", "任务名称", "任务进度"), start=2):
+            self.grid.addWidget(_label(title, TITLE_STYLE), 0, column, alignment=Qt.AlignCenter)
+
+        self.rows = []  # [(编码, 名称, 进度)] 各任务行的标签
+        self.critical_label = _label(style=CRITICAL_STYLE)
+        self.critical_label.setWordWrap(True)
+        self.critical_label.hide()
+
+        self.grid.setColumnStretch(0, 1) # Project code column
+        self.grid.setColumnStretch(1, 0) # Separator column (fixed width)
+        self.grid.setColumnStretch(2, 1) # "编码" column
+        self.grid.setColumnStretch(3, 2) # "名称" column (wider)
+        self.grid.setColumnStretch(4, 1) # "进度" column
+
+    def _resize_rows(self, count):
+        """任务行数变化时增删行，关键路径标签始终在最后一行"""
+        if count == len(self.rows):
+            return
+        while len(self.rows) > count:
+            for label in self.rows.pop():
+                self.grid.removeWidget(label)
+                label.deleteLater()
+        while len(self.rows) < count:
+            row = len(self.rows) + 1
+            labels = tuple(_label(style=TASK_VALUE_STYLE) for _ in range(3))
+            for column, label in enumerate(labels, start=2):
+                self.grid.addWidget(label, row, column, alignment=Qt.AlignCenter)
+            self.rows.append(labels)
+        self.grid.removeWidget(self.critical_label)
+        self.grid.addWidget(self.critical_label, count + 1, 2, 1, 3, alignment=Qt.AlignCenter)
+
+    def update_values(self, financial_code, tasks, critical_path):
+        """更新显示
+
+        Args:
+            financial_code: 项目财务编号
+            tasks: 一级任务（TaskNode，进度为汇总后的进度）
+            critical_path: 关键路径概要（CriticalPathSummary），未计算时为 None
+        """
+        _set_text(self.code_label, financial_code or "--")
+        self._resize_rows(len(tasks))
+        for i, (task, (code_label, name_label, progress_label)) in enumerate(zip(tasks, self.rows)):
+            _set_text(code_label, task.code if task.code else str(i + 1))
+            _set_text(name_label, task.name)
+            _set_text(progress_label, f"{task.progress or 0:.2f}" + UNIT_SPAN.format("%"))
+
+        # 关键路径及预计完成日期（保存甘特图时计算）
+        if critical_path is None:
+            self.critical_label.hide()
+        else:
+            critical_text = " → ".join(critical_path.tasks) or "无"
+            _set_text(self.critical_label, f"关键路径：{critical_text}　预计完成：{critical_path.finish:%Y-%m-%d}")
+            self.critical_label.show()
+
+
+class KeyedCardList:
+    """按键（项目ID）复用卡片的列表
+
+    每次刷新只为新增的键创建卡片、删除已不存在的键的卡片，其余卡片原地更新数值，
+    顺序变化时才移动卡片。列表为空时显示提示文字。
+    """
+
+    def __init__(self, layout, create, empty_text):
+        """
+        Args:
+            layout: 放置卡片的布局（QVBoxLayout）
+            create: 创建卡片的函数，接收键
+            empty_text: 没有卡片时显示的提示
+        """
+        self.layout = layout
+        self.create = create
+        self.cards = {}  # {键: 卡片}
+        self.empty_label = BodyLabel(empty_text)
+        self.empty_label.setAlignment(Qt.AlignCenter)
+        self.empty_label.hide()
+        self.layout.addWidget(self.empty_label)
+
+    def sync(self, items, update, changed=None):
+        """按顺序同步卡片
+
+        Args:
+            items: [(键, 数据)]，按显示顺序排列
+            update: update(卡片, 数据)，更新卡片显示
+            changed: 数据有变化的键，只更新这些卡片（新建的卡片总会更新）；为 None 时全部更新
+        """
+        keys = {key for key, _ in items}
+        for key in self.cards.keys() - keys:
+            card = self.cards.pop(key)
+            self.layout.removeWidget(card)
+            card.deleteLater()
+
+        for index, (key, data) in enumerate(items):
+            card = self.cards.get(key)
+            if card is None:
+                card = self.cards[key] = self.create(key)
+                self.layout.insertWidget(index, card)
+            else:
+                if self.layout.indexOf(card) != index:
+                    self.layout.removeWidget(card)
+                    self.layout.insertWidget(index, card)
+                if changed is not None and key not in changed:
+                    continue
+            update(card, data)
+
+        self.empty_label.setVisible(not items)
@@ -500,8 +500,8 @@ GanttMaster.prototype.loadProject = function (project) {
     var task = project.tasks[i];
     task.start += this.serverClientTimeOffset;
     task.end += this.serverClientTimeOffset;
-    //set initial collapsed status
-    task.collapsed=collTasks.indexOf(task.id)>=0;
+    //set initial collapsed status: 保存在数据库中的折叠状态（子任务未加载的任务必为折叠）或本地记录的折叠状态
+    task.collapsed=!!task.collapsed || collTasks.indexOf(task.id)>=0;
   }
 
 
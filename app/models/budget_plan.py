@@ -0,0 +1,238 @@
+"""
+预算编制计划读取
+
+预算编制界面的树形结构为 预算计划 → 预算类别 → 预算项（可再有子项）。每个类别在
+budget_plan_items 中有一行 parent_id 为空的类别行（保存类别金额和备注），预算项以
+parent_id 指向类别行或上级预算项，同级的行按 position、id 排列（旧数据的 position
+为空，按 id 排列）。
+
+load_plan_trees() 用一条查询读取全部计划的明细行，按 parent_id 建立索引后在内存中
+一遍构建各计划的树，不再按 计划 × 类别 × 父级 逐层查询。返回的节点不依赖会话，
+可在后台线程中读取后交给界面。
+
+保存时界面只提交自上次加载或保存以来的变更集（新增、修改、删除的计划及明细行），
+apply_plan_changes() 以批量语句写入：
+
+- 新增的计划和明细行以临时键（tmp_ 开头）标识，批量插入后临时键映射为数据库ID返回
+  给界面；明细行按父行先于子行的顺序分批插入，子行的 parent_id 引用本次新增的父行时
+  替换为其数据库ID；
+- 修改的计划和明细行只更新变化的字段，按主键批量更新；
+- 删除的明细行连同其子孙行一并删除，删除的计划连同其全部明细行一并删除。
+"""
+
+from dataclasses import dataclass, field
+from sqlalchemy import select, update
+from .database import BudgetPlan, BudgetPlanItem
+
+TEMP_ID_PREFIX = 'tmp_'
+_IN_CHUNK_SIZE = 500  # 每条 IN 查询的参数个数
+
+# 界面可修改的计划字段、明细行字段
+PLAN_FIELDS = ('name', 'total_amount', 'remarks')
+ITEM_FIELDS = ('category', 'name', 'specification', 'unit_price', 'quantity', 'amount', 'remarks', 'position')
+
+# 构建明细树需要的列
+_ITEM_COLUMNS = ('id', 'plan_id', 'parent_id', 'category', 'name', 'specification',
+                 'unit_price', 'quantity', 'amount', 'remarks', 'position')
+
+
+@dataclass(eq=False)
+class PlanItemNode:
+    """预算编制明细树中的一行"""
+    id: int
+    category: object  # BudgetCategory，可为空
+    name: str
+    specification: str
+    unit_price: float
+    quantity: int
+    amount: float
+    remarks: str
+    position: int = None
+    children: list = field(default_factory=list)
+
+
+@dataclass(eq=False)
+class PlanTree:
+    """一个预算计划及其明细树"""
+    id: int
+    name: str
+    total_amount: float
+    remarks: str
+    categories: dict = field(default_factory=dict)  # {BudgetCategory: 类别行 PlanItemNode}
+    item_count: int = 0  # 明细行数（含类别行）
+
+
+def build_plan_items(rows):
+    """由同一计划的明细行构建明细树
+
+    每个类别取第一条类别行（parent_id 为空）作为根；父级不存在的行不显示，与逐层
+    查询时相同。
+
+    Args:
+        rows: 按 position、id 排序的明细行，需含 _ITEM_COLUMNS 中的字段
+
+    Returns:
+        dict: {BudgetCategory: 类别行 PlanItemNode}
+    """
+    nodes = {}
+    categories = {}
+    for row in rows:
+        node = PlanItemNode(row['id'], row['category'], row['name'], row['specification'],
+                            row['unit_price'], row['quantity'], row['amount'], row['remarks'], row['position'])
+        nodes[row['id']] = node
+        if row['parent_id'] is None and row['category'] is not None:
+            categories.setdefault(row['category'], node)
+    for row in rows:
+        parent = nodes.get(row['parent_id']) if row['parent_id'] is not None else None
+        if parent is not None:
+            parent.children.append(nodes[row['id']])
+    return categories
+
+
+def load_plan_trees(session):
+    """读取全部预算计划及其明细树
+
+    Args:
+        session: 数据库会话
+
+    Returns:
+        list[PlanTree]: 按计划ID排序
+    """
+    plan_table = BudgetPlan.__table__
+    item_table = BudgetPlanItem.__table__
+    plans = session.execute(select(plan_table.c.id, plan_table.c.name, plan_table.c.total_amount,
+                                   plan_table.c.remarks).order_by(plan_table.c.id)).all()
+    rows_by_plan = {}
+    statement = select(*(item_table.c[column] for column in _ITEM_COLUMNS)).order_by(
+        item_table.c.position, item_table.c.id)
+    for row in session.execute(statement).mappings():
+        rows_by_plan.setdefault(row['plan_id'], []).append(row)
+
+    trees = []
+    for plan in plans:
+        rows = rows_by_plan.get(plan.id, [])
+        trees.append(PlanTree(plan.id, plan.name, plan.total_amount or 0.0, plan.remarks,
+                              build_plan_items(rows), len(rows)))
+    return trees
+
+
+@dataclass
+class PlanChangeset:
+    """预算编制变更集
+
+    新增的计划和明细行的 id 为临时键；新增明细行的 plan_id、parent_id 可以是数据库ID，
+    也可以是本次新增的计划或明细行的临时键。
+    """
+    plans_added: list = field(default_factory=list)  # {'id': 临时键, PLAN_FIELDS...}
+    plans_changed: list = field(default_factory=list)  # {'id': 计划ID, 变化的字段...}
+    plans_deleted: list = field(default_factory=list)  # 计划ID
+    items_added: list = field(default_factory=list)  # {'id': 临时键, 'plan_id', 'parent_id', ITEM_FIELDS...}
+    items_changed: list = field(default_factory=list)  # {'id': 明细行ID, 变化的字段...}
+    items_deleted: list = field(default_factory=list)  # 明细行ID，子孙行一并删除
+
+    def is_empty(self):
+        return not (self.plans_added or self.plans_changed or self.plans_deleted
+                    or self.items_added or self.items_changed or self.items_deleted)
+
+
+@dataclass
+class PlanSaveResult:
+    """保存结果"""
+    id_map: dict = field(default_factory=dict)  # {临时键: 数据库ID}，含本次新增的计划和明细行
+    added: int = 0
+    changed: int = 0
+    deleted: int = 0
+
+
+def is_temp_id(value):
+    return isinstance(value, str) and value.startswith(TEMP_ID_PREFIX)
+
+
+def _chunks(items, size=_IN_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _with_descendants(session, item_ids):
+    """返回明细行及其全部子孙行的ID，每层一次查询"""
+    table = BudgetPlanItem.__table__
+    found = set(item_ids)
+    frontier = list(found)
+    while frontier:
+        children = []
+        for chunk in _chunks(frontier):
+            children.extend(session.execute(select(table.c.id).where(table.c.parent_id.in_(chunk))).scalars())
+        frontier = [item_id for item_id in children if item_id not in found]
+        found.update(frontier)
+    return found
+
+
+def _insert(session, table, rows):
+    """批量插入，返回按参数顺序排列的新行ID"""
+    return session.execute(table.insert().returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+
+
+def apply_plan_changes(session, changes):
+    """将变更集写入数据库
+
+    在调用方的事务中执行，不提交。
+
+    Args:
+        session: 数据库会话
+        changes: PlanChangeset
+
+    Returns:
+        PlanSaveResult: 新增计划及明细行的ID映射和写入行数
+
+    Raises:
+        ValueError: 新增的明细行引用了不在变更集中的临时键
+    """
+    result = PlanSaveResult()
+    if changes.is_empty():
+        return result
+    plans = BudgetPlan.__table__
+    items = BudgetPlanItem.__table__
+
+    # 1. 删除计划及其明细行、删除明细行及其子孙行
+    for chunk in _chunks(changes.plans_deleted):
+        result.deleted += session.execute(items.delete().where(items.c.plan_id.in_(chunk))).rowcount
+        result.deleted += session.execute(plans.delete().where(plans.c.id.in_(chunk))).rowcount
+    if changes.items_deleted:
+        for chunk in _chunks(_with_descendants(session, changes.items_deleted)):
+            result.deleted += session.execute(items.delete().where(items.c.id.in_(chunk))).rowcount
+
+    # 2. 新增计划
+    if changes.plans_added:
+        rows = [{name: data.get(name) for name in PLAN_FIELDS} for data in changes.plans_added]
+        result.id_map.update(zip((data['id'] for data in changes.plans_added), _insert(session, plans, rows)))
+        result.added += len(rows)
+
+    # 3. 新增明细行：父行已有数据库ID的行为一批，逐批插入
+    pending = changes.items_added
+    while pending:
+        ready, waiting = [], []
+        for data in pending:
+            parent_id = data.get('parent_id')
+            (waiting if is_temp_id(parent_id) and parent_id not in result.id_map else ready).append(data)
+        if not ready:
+            raise ValueError(f"新增的明细行引用了不存在的父行: {waiting[0].get('parent_id')}")
+        rows = []
+        for data in ready:
+            plan_id = result.id_map.get(data['plan_id'], data['plan_id'])
+            parent_id = result.id_map.get(data.get('parent_id'), data.get('parent_id'))
+            if is_temp_id(plan_id):
+                raise ValueError(f"新增的明细行引用了不存在的计划: {plan_id}")
+            rows.append({'plan_id': plan_id, 'parent_id': parent_id, **{name: data.get(name) for name in ITEM_FIELDS}})
+        result.id_map.update(zip((data['id'] for data in ready), _insert(session, items, rows)))
+        result.added += len(rows)
+        pending = waiting
+
+    # 4. 修改：按主键批量更新，键相同的行合并为一次 executemany
+    if changes.plans_changed:
+        session.execute(update(BudgetPlan), changes.plans_changed)
+        result.changed += len(changes.plans_changed)
+    if changes.items_changed:
+        session.execute(update(BudgetPlanItem), changes.items_changed)
+        result.changed += len(changes.items_changed)
+    return result
@@ -0,0 +1,204 @@
+"""
+预算执行统计模块
+
+从预算执行汇总表（budget_rollups，由支出触发器增量维护）一次性读取任意一组项目的
+支出情况（按项目、年度、费用类别），并提供汇总表的校验与重建命令：
+
+    python -m app.models.budget_usage --verify
+    python -m app.models.budget_usage --rebuild
+"""
+
+from dataclasses import dataclass, field
+from sqlalchemy import func, text
+from .database import Budget, BudgetCategory, BudgetItem, BudgetRollup, Expense, BUDGET_ROLLUP_REBUILD
+
+
+@dataclass
+class ProjectBudgetUsage:
+    """单个项目的预算执行情况
+
+    金额单位说明：total_budget 与 Budget.total_amount 一致（万元），
+    各项支出与 Expense.amount 一致（元）。
+    """
+    project_id: int
+    total_budget: float = 0.0  # 总预算额（万元）
+    total_spent: float = 0.0  # 总支出（元）
+    category_spent: dict = field(default_factory=lambda: {category: 0.0 for category in BudgetCategory})  # {类别: 元}
+    year_spent: dict = field(default_factory=dict)  # {年度: 元}
+    year_category_spent: dict = field(default_factory=dict)  # {(年度, 类别): 元}
+
+    @property
+    def remaining(self):
+        """总结余（万元）"""
+        return self.total_budget - self.total_spent / 10000
+
+    @property
+    def execution_rate(self):
+        """总执行率（%）"""
+        if self.total_budget > 0:
+            return (self.total_spent / (self.total_budget * 10000)) * 100
+        return 0.0
+
+    def spent(self, year=None, category=None):
+        """按年度和/或类别取支出金额（元），参数为空表示不限定"""
+        if year is None and category is None:
+            return self.total_spent
+        if year is None:
+            return self.category_spent.get(category, 0.0)
+        if category is None:
+            return self.year_spent.get(year, 0.0)
+        return self.year_category_spent.get((year, category), 0.0)
+
+    def annual_spent(self, category=None):
+        """所有年度预算下的支出合计（元），不含直接挂在总预算下的支出"""
+        if category is None:
+            return sum(self.year_spent.values())
+        return sum(amount for (year, cat), amount in self.year_category_spent.items() if cat == category)
+
+
+def query_budget_usage(session, project_ids=None):
+    """批量获取项目预算执行情况
+
+    支出直接读取预先汇总的 项目 × 年度 × 类别 数据，总预算额另用一次查询获取，
+    查询次数与项目数量和支出笔数无关。
+
+    Args:
+        session: SQLAlchemy session
+        project_ids: 项目ID列表，为 None 时统计全部项目
+
+    Returns:
+        dict: {项目ID: ProjectBudgetUsage}，未产生支出的项目同样包含在内
+    """
+    if project_ids is not None:
+        project_ids = list(project_ids)
+        if not project_ids:
+            return {}
+
+    usages = {}
+
+    def usage_for(project_id):
+        if project_id not in usages:
+            usages[project_id] = ProjectBudgetUsage(project_id=project_id)
+        return usages[project_id]
+
+    # 总预算额（year 为 NULL 的预算）
+    budget_query = session.query(Budget.project_id, Budget.total_amount).filter(Budget.year.is_(None))
+    if project_ids is not None:
+        budget_query = budget_query.filter(Budget.project_id.in_(project_ids))
+        for project_id in project_ids:
+            usage_for(project_id)
+    for project_id, total_amount in budget_query:
+        usage_for(project_id).total_budget = total_amount or 0.0
+
+    # 读取 项目 × 年度 × 类别 汇总数据
+    spent_query = session.query(
+        BudgetRollup.project_id, BudgetRollup.year, BudgetRollup.category, BudgetRollup.spent_amount
+    )
+    if project_ids is not None:
+        spent_query = spent_query.filter(BudgetRollup.project_id.in_(project_ids))
+
+    for project_id, year, category, amount in spent_query:
+        amount = amount or 0.0
+        usage = usage_for(project_id)
+        usage.total_spent += amount
+        usage.category_spent[category] = usage.category_spent.get(category, 0.0) + amount
+        if year is not None:
+            usage.year_spent[year] = usage.year_spent.get(year, 0.0) + amount
+            usage.year_category_spent[(year, category)] = usage.year_category_spent.get((year, category), 0.0) + amount
+
+    return usages
+
+
+def get_budget_usage(session, project_id, budget_id=None):
+    """获取单个项目的预算使用情况
+
+    Args:
+        session: SQLAlchemy session
+        project_id: 项目ID
+        budget_id: 预算ID（可选，保留以兼容旧调用）
+
+    Returns:
+        ProjectBudgetUsage: 项目预算执行情况
+    """
+    try:
+        return query_budget_usage(session, [project_id])[project_id]
+    except Exception as e:
+        session.rollback()
+        raise e
+
+
+def verify_budget_rollups(session, tolerance=0.005):
+    """校验汇总表及预算已支出金额是否与支出明细一致
+
+    Args:
+        session: SQLAlchemy session
+        tolerance: 允许的金额误差
+
+    Returns:
+        list: 不一致项的描述列表，为空表示没有偏差
+    """
+    drifts = []
+
+    actual = {
+        (budget_id, category): (amount or 0.0, count)
+        for budget_id, category, amount, count in session.query(
+            Expense.budget_id, Expense.category, func.sum(Expense.amount), func.count(Expense.id)
+        ).group_by(Expense.budget_id, Expense.category)
+    }
+    stored = {
+        (row.budget_id, row.category): (row.spent_amount or 0.0, row.expense_count)
+        for row in session.query(BudgetRollup)
+    }
+    for key in sorted(set(actual) | set(stored), key=lambda k: (k[0], k[1].name)):
+        actual_amount, actual_count = actual.get(key, (0.0, 0))
+        stored_amount, stored_count = stored.get(key, (0.0, 0))
+        if abs(actual_amount - stored_amount) > tolerance or actual_count != stored_count:
+            drifts.append(
+                f"汇总表 预算ID {key[0]} {key[1].value}: 记录 {stored_amount:.2f} 元/{stored_count} 笔，"
+                f"实际 {actual_amount:.2f} 元/{actual_count} 笔"
+            )
+
+    budget_actual = {}
+    for (budget_id, category), (amount, _) in actual.items():
+        budget_actual[budget_id] = budget_actual.get(budget_id, 0.0) + amount
+    for budget in session.query(Budget):
+        expected = budget_actual.get(budget.id, 0.0) / 10000
+        if abs((budget.spent_amount or 0.0) - expected) > tolerance / 10000:
+            drifts.append(f"预算ID {budget.id}: 已支出 {budget.spent_amount or 0.0:.6f} 万元，实际 {expected:.6f} 万元")
+    for item in session.query(BudgetItem):
+        expected = actual.get((item.budget_id, item.category), (0.0, 0))[0] / 10000
+        if abs((item.spent_amount or 0.0) - expected) > tolerance / 10000:
+            drifts.append(
+                f"预算ID {item.budget_id} {item.category.value}: 已支出 {item.spent_amount or 0.0:.6f} 万元，实际 {expected:.6f} 万元"
+            )
+
+    return drifts
+
+
+def rebuild_budget_rollups(session):
+    """按支出明细重建汇总表及预算已支出金额（在调用方的事务中执行，需由调用方提交）"""
+    for sql in BUDGET_ROLLUP_REBUILD:
+        session.execute(text(sql))
+
+
+if __name__ == "__main__":
+    import argparse
+    from sqlalchemy.orm import Session
+    from .database import get_engine
+    # 注册定义在视图模块中的模型，Actionlog 的关系映射依赖它们
+    from ..views.projecting_interface import project_document, project_outcome  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="校验或重建预算执行汇总表")
+    parser.add_argument('--rebuild', action='store_true', help="按支出明细重建汇总表")
+    parser.add_argument('--verify', action='store_true', help="仅检查汇总表是否存在偏差（默认）")
+    args = parser.parse_args()
+
+    with Session(get_engine()) as session:
+        drifts = verify_budget_rollups(session)
+        for drift in drifts:
+            print(drift)
+        print(f"发现 {len(drifts)} 处偏差" if drifts else "汇总表与支出明细一致")
+        if args.rebuild:
+            rebuild_budget_rollups(session)
+            session.commit()
+            print("汇总表已重建")
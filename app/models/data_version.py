@@ -0,0 +1,167 @@
+"""
+数据新鲜度
+
+界面切换回来时，若其依赖的表自上次加载后没有被修改，就不必重新查询。DataVersionTracker
+为每个引擎记录两类变化：
+
+- 本进程的写入：通过引擎事件记录每条 INSERT/UPDATE/DELETE 写入的表，提交后按表累加
+  写入计数，回滚的写入不计；
+- 其它进程（或其它工具）对同一数据库文件的写入：用一个只读的监视连接读取
+  PRAGMA data_version，它在其它连接提交后变化。本进程提交后随即记下新的值，
+  之后再变化即说明有外部写入，此时全部令牌失效。
+
+界面通过 DataFreshness 使用：
+
+    self.freshness = DataFreshness(engine, ('expenses', 'budgets', 'budget_items'))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.freshness.is_stale():
+            self.reload()              # reload 开始查询前调用 self.freshness.mark_fresh()
+
+令牌在查询开始前取得，查询期间发生的写入会使下一次检查判定为过期。
+"""
+
+import re
+import sqlite3
+import threading
+import weakref
+from sqlalchemy import event
+
+# 无法确定写入的表时使用的键，使全部令牌失效
+_UNKNOWN_TABLE = '*'
+
+# 从文本 SQL 中取出写入的表名
+_WRITE_PATTERN = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+'
+    r'["`\[]?(\w+)', re.IGNORECASE)
+_WRITE_PREFIXES = ('INSERT', 'REPLACE', 'UPDATE', 'DELETE')
+
+# 连接记录 info 中保存本次事务写入的表、已提交待计数的表
+_WRITTEN_KEY = 'data_version_written'
+_COMMITTED_KEY = 'data_version_committed'
+
+
+def _written_table(statement, context):
+    """返回语句写入的表名，不是写入语句时返回 None"""
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        table = getattr(getattr(context.compiled, 'statement', None), 'table', None)
+        name = getattr(table, 'name', None)
+        if name:
+            return name
+    if not statement.lstrip()[:7].upper().startswith(_WRITE_PREFIXES):
+        return None
+    match = _WRITE_PATTERN.match(statement)
+    return match.group(1) if match else _UNKNOWN_TABLE
+
+
+class DataVersionTracker:
+    """记录数据库各表的写入计数及外部修改"""
+
+    # {引擎: 跟踪器}
+    _trackers = weakref.WeakKeyDictionary()
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._counters = {}  # {表名: 已提交的写入次数}
+        self._epoch = 0  # 检测到外部修改或无法确定表名的写入时加一
+        self._watch = None  # 监视 data_version 的连接，内存数据库不需要
+        self._known_version = None
+        database = engine.url.database
+        if engine.dialect.name == 'sqlite' and database and database != ':memory:':
+            self._watch = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+            self._known_version = self._data_version()
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'commit', self._on_commit)
+        event.listen(engine, 'rollback', self._on_rollback)
+        event.listen(engine, 'checkin', self._on_checkin)
+        DataVersionTracker._trackers[engine] = self
+
+    @classmethod
+    def for_engine(cls, engine):
+        """返回引擎对应的跟踪器，不存在时创建"""
+        tracker = cls._trackers.get(engine)
+        if tracker is None:
+            tracker = cls(engine)
+        return tracker
+
+    def _data_version(self):
+        return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_external(self):
+        """data_version 与本进程最近一次提交后的值不同时，说明有外部写入（调用方持有锁）"""
+        if self._watch is None:
+            return
+        version = self._data_version()
+        if version != self._known_version:
+            self._known_version = version
+            self._epoch += 1
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        table = _written_table(statement, context)
+        if table is not None:
+            conn.info.setdefault(_WRITTEN_KEY, set()).add(table)
+
+    def _on_commit(self, conn):
+        # 在真正提交之前触发：先检查此前是否有外部写入，写入计数在连接归还连接池（提交完成）后累加
+        written = conn.info.pop(_WRITTEN_KEY, None)
+        if written:
+            with self._lock:
+                self._check_external()
+            conn.info.setdefault(_COMMITTED_KEY, set()).update(written)
+
+    def _on_rollback(self, conn):
+        conn.info.pop(_WRITTEN_KEY, None)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        if connection_record is None:
+            return
+        committed = connection_record.info.pop(_COMMITTED_KEY, None)
+        if not committed:
+            return
+        with self._lock:
+            if _UNKNOWN_TABLE in committed:
+                self._epoch += 1
+            for table in committed:
+                self._counters[table] = self._counters.get(table, 0) + 1
+            if self._watch is not None:
+                self._known_version = self._data_version()  # 本进程的提交不算外部修改
+
+    def token(self, tables):
+        """返回这些表的新鲜度令牌，两次取得的令牌相同说明期间这些表没有被修改"""
+        with self._lock:
+            self._check_external()
+            return (self._epoch,) + tuple(self._counters.get(table, 0) for table in tables)
+
+    def counters(self):
+        """返回各表已提交的写入次数"""
+        with self._lock:
+            return dict(self._counters)
+
+
+class DataFreshness:
+    """界面数据的新鲜度：记录上次加载时所依赖的表的令牌"""
+
+    def __init__(self, engine, tables):
+        """
+        Args:
+            engine: 数据库引擎，为 None 时始终判定为过期
+            tables: 界面数据依赖的表名（含由触发器同步更新的表）
+        """
+        self.tracker = DataVersionTracker.for_engine(engine) if engine is not None else None
+        self.tables = tuple(tables)
+        self._token = None
+
+    def is_stale(self):
+        """自上次 mark_fresh() 后依赖的表是否被修改过（从未加载时为 True）"""
+        return self.tracker is None or self._token != self.tracker.token(self.tables)
+
+    def mark_fresh(self):
+        """在开始加载数据前调用"""
+        if self.tracker is not None:
+            self._token = self.tracker.token(self.tables)
+
+    def invalidate(self):
+        """使下一次检查判定为过期，如切换了显示的项目而尚未加载"""
+        self._token = None
@@ -1,9 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, Date, DateTime, Enum as SQLEnum, UniqueConstraint, func, text, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, DateTime, Enum as SQLEnum, UniqueConstraint, Index, text, Boolean, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker, backref
 from enum import Enum
 from datetime import datetime
+from contextlib import contextmanager
+import logging
 import os
+from .engine import create_db_engine
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -52,6 +57,7 @@ class Budget(Base):
     expenses = relationship("Expense", back_populates="budget", cascade="all, delete-orphan")
 
     __table_args__ = (
+        # 该唯一约束的自动索引以 project_id 开头，同时服务于按项目查询预算
         UniqueConstraint('project_id', 'year', 
             name='uix_project_year',
             sqlite_on_conflict='FAIL'  # SQLite特定的冲突处理
@@ -67,7 +73,7 @@ class BudgetItem(Base):
     __tablename__ = 'budget_items'
     
     id = Column(Integer, primary_key=True)
-    budget_id = Column(Integer, ForeignKey('budgets.id'), nullable=False)
+    budget_id = Column(Integer, ForeignKey('budgets.id'), nullable=False, index=True)
     category = Column(SQLEnum(BudgetCategory), nullable=False)  # 使用 SQLAlchemy 的 Enum
     amount = Column(Float, default=0.0)  # 预算金额
     spent_amount = Column(Float, default=0.0)  # 已支出金额
@@ -93,7 +99,7 @@ class BudgetPlanItem(Base):
     
     id = Column(Integer, primary_key=True)
     plan_id = Column(Integer, ForeignKey('budget_plans.id'), nullable=False)
-    parent_id = Column(Integer, ForeignKey('budget_plan_items.id'))  # 父级ID，用于构建树形结构
+    parent_id = Column(Integer, ForeignKey('budget_plan_items.id'), index=True)  # 父级ID，用于构建树形结构
     category = Column(SQLEnum(BudgetCategory), nullable=True)  # 预算类别，可为空
     name = Column(String(100))  # 课题名称/预算内容
     specification = Column(String(100))  # 型号规格/简要内容
@@ -101,12 +107,16 @@ class BudgetPlanItem(Base):
     quantity = Column(Integer, default=0)  # 数量
     amount = Column(Float, default=0.0)  # 经费数额
     remarks = Column(String(200))  # 备注
+    position = Column(Integer)  # 在同级中的顺序，为空时按ID排在前面
     
     # 建立与预算编制主表的多对一关系
     plan = relationship("BudgetPlan", back_populates="items")
     # 建立自引用关系，用于树形结构
     children = relationship("BudgetPlanItem", backref=backref('parent', remote_side=[id]))
 
+    # 预算编制界面按 计划 × 类别 × 父级 逐层加载明细
+    __table_args__ = (Index('ix_budget_plan_items_plan_category_parent', 'plan_id', 'category', 'parent_id'),)
+
 class Actionlog(Base):
     """操作记录"""
     __tablename__ = 'actionlogs'
@@ -123,7 +133,7 @@ class Actionlog(Base):
     action = Column(String(50), nullable=False)  # 操作：新增/编辑/删除
     description = Column(String(200), nullable=False)  # 操作描述
     operator = Column(String(50), nullable=False)  # 操作人
-    timestamp = Column(DateTime, default=datetime.now)  # 操作时间
+    timestamp = Column(DateTime, default=datetime.now, index=True)  # 操作时间
     
     # 变更前后的详细信息
     old_data = Column(String(500))  # 变更前的数据，JSON格式
@@ -159,11 +169,200 @@ class Expense(Base):
     project = relationship("Project", backref="expenses")
     budget = relationship("Budget", back_populates="expenses")
 
+    __table_args__ = (
+        # 支出列表按预算筛选并按日期倒序显示，索引同时满足过滤和排序
+        Index('ix_expenses_budget_date', 'budget_id', 'date'),
+        # 按项目（及类别）筛选支出；单独按 project_id 的查询同样可使用该索引的前缀
+        Index('ix_expenses_project_category', 'project_id', 'category'),
+        # 附件存储按路径统计凭证文件的引用数
+        Index('ix_expenses_voucher_path', 'voucher_path'),
+    )
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
     
 
+class BudgetRollup(Base):
+    """预算执行汇总（项目 × 年度 × 费用类别）
+
+    由 expenses 表上的触发器在每次新增、修改、删除支出时增量维护，
+    同一触发器同时维护 Budget.spent_amount 与 BudgetItem.spent_amount，视图无需手工累加。
+    """
+    __tablename__ = 'budget_rollups'
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey('projects.id'), nullable=False, index=True)
+    budget_id = Column(Integer, ForeignKey('budgets.id'), nullable=False)
+    year = Column(Integer)  # 与 Budget.year 一致，None 表示总预算
+    category = Column(SQLEnum(BudgetCategory), nullable=False)  # 费用类别
+    spent_amount = Column(Float, default=0.0)  # 已支出金额（元）
+    expense_count = Column(Integer, default=0)  # 支出笔数
+
+    __table_args__ = (UniqueConstraint('budget_id', 'category', name='uix_rollup_budget_category'),)
+
+
+# 支出写入时维护汇总表及预算已支出金额的触发器（金额：汇总表为元，预算表为万元）
+BUDGET_ROLLUP_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_insert
+    AFTER INSERT ON expenses
+    BEGIN
+        INSERT INTO budget_rollups (project_id, budget_id, year, category, spent_amount, expense_count)
+        VALUES (NEW.project_id, NEW.budget_id, (SELECT year FROM budgets WHERE id = NEW.budget_id),
+                NEW.category, COALESCE(NEW.amount, 0), 1)
+        ON CONFLICT (budget_id, category) DO UPDATE SET
+            spent_amount = spent_amount + excluded.spent_amount,
+            expense_count = expense_count + 1;
+        UPDATE budget_items SET spent_amount = COALESCE(spent_amount, 0) + COALESCE(NEW.amount, 0) / 10000.0
+            WHERE budget_id = NEW.budget_id AND category = NEW.category;
+        UPDATE budgets SET spent_amount = COALESCE(spent_amount, 0) + COALESCE(NEW.amount, 0) / 10000.0
+            WHERE id = NEW.budget_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_delete
+    AFTER DELETE ON expenses
+    BEGIN
+        UPDATE budget_rollups SET
+            spent_amount = spent_amount - COALESCE(OLD.amount, 0),
+            expense_count = expense_count - 1
+            WHERE budget_id = OLD.budget_id AND category = OLD.category;
+        DELETE FROM budget_rollups
+            WHERE budget_id = OLD.budget_id AND category = OLD.category AND expense_count <= 0;
+        UPDATE budget_items SET spent_amount = COALESCE(spent_amount, 0) - COALESCE(OLD.amount, 0) / 10000.0
+            WHERE budget_id = OLD.budget_id AND category = OLD.category;
+        UPDATE budgets SET spent_amount = COALESCE(spent_amount, 0) - COALESCE(OLD.amount, 0) / 10000.0
+            WHERE id = OLD.budget_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_update
+    AFTER UPDATE OF project_id, budget_id, category, amount ON expenses
+    BEGIN
+        UPDATE budget_rollups SET
+            spent_amount = spent_amount - COALESCE(OLD.amount, 0),
+            expense_count = expense_count - 1
+            WHERE budget_id = OLD.budget_id AND category = OLD.category;
+        DELETE FROM budget_rollups
+            WHERE budget_id = OLD.budget_id AND category = OLD.category AND expense_count <= 0;
+        UPDATE budget_items SET spent_amount = COALESCE(spent_amount, 0) - COALESCE(OLD.amount, 0) / 10000.0
+            WHERE budget_id = OLD.budget_id AND category = OLD.category;
+        UPDATE budgets SET spent_amount = COALESCE(spent_amount, 0) - COALESCE(OLD.amount, 0) / 10000.0
+            WHERE id = OLD.budget_id;
+
+        INSERT INTO budget_rollups (project_id, budget_id, year, category, spent_amount, expense_count)
+        VALUES (NEW.project_id, NEW.budget_id, (SELECT year FROM budgets WHERE id = NEW.budget_id),
+                NEW.category, COALESCE(NEW.amount, 0), 1)
+        ON CONFLICT (budget_id, category) DO UPDATE SET
+            spent_amount = spent_amount + excluded.spent_amount,
+            expense_count = expense_count + 1;
+        UPDATE budget_items SET spent_amount = COALESCE(spent_amount, 0) + COALESCE(NEW.amount, 0) / 10000.0
+            WHERE budget_id = NEW.budget_id AND category = NEW.category;
+        UPDATE budgets SET spent_amount = COALESCE(spent_amount, 0) + COALESCE(NEW.amount, 0) / 10000.0
+            WHERE id = NEW.budget_id;
+    END
+    """,
+]
+
+# 根据现有支出重新生成汇总表
+BUDGET_ROLLUP_REBUILD = [
+    "DELETE FROM budget_rollups",
+    """
+    INSERT INTO budget_rollups (project_id, budget_id, year, category, spent_amount, expense_count)
+    SELECT e.project_id, e.budget_id, b.year, e.category, COALESCE(SUM(e.amount), 0), COUNT(e.id)
+    FROM expenses e JOIN budgets b ON b.id = e.budget_id
+    GROUP BY e.budget_id, e.category
+    """,
+    """
+    UPDATE budget_items SET spent_amount = COALESCE((
+        SELECT spent_amount FROM budget_rollups r
+        WHERE r.budget_id = budget_items.budget_id AND r.category = budget_items.category
+    ), 0) / 10000.0
+    """,
+    """
+    UPDATE budgets SET spent_amount = COALESCE((
+        SELECT SUM(spent_amount) FROM budget_rollups r WHERE r.budget_id = budgets.id
+    ), 0) / 10000.0
+    """,
+]
+
+
+def install_budget_rollup(connection, rebuild=False):
+    """创建汇总表触发器，rebuild 为 True 时按现有支出重建汇总数据"""
+    for ddl in BUDGET_ROLLUP_TRIGGERS:
+        connection.execute(text(ddl))
+    if rebuild:
+        for sql in BUDGET_ROLLUP_REBUILD:
+            connection.execute(text(sql))
+
+
+BUDGET_ROLLUP_TRIGGER_NAMES = ('trg_expenses_rollup_insert', 'trg_expenses_rollup_delete', 'trg_expenses_rollup_update')
+
+
+@contextmanager
+def budget_rollup_suspended(connection):
+    """批量写入支出期间暂停汇总表触发器，结束后恢复
+
+    暂停期间由调用方按批次调用 apply_budget_rollup_delta 更新汇总。pysqlite 只在 DML
+    之前隐式开启事务，DDL 在事务外执行时会立即提交，因此删除触发器之前先显式开启事务，
+    使触发器的删除与恢复都属于调用方的事务：事务回滚时删除一并撤销，触发器保持原样。
+    """
+    dbapi_connection = connection.connection.driver_connection
+    if not dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN")
+    for name in BUDGET_ROLLUP_TRIGGER_NAMES:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    try:
+        yield
+    finally:
+        install_budget_rollup(connection)
+
+
+def apply_budget_rollup_delta(connection, project_id, budget_id, deltas):
+    """将一批新增支出的合计累加到汇总表、预算子项和预算的已支出金额
+
+    Args:
+        connection: 数据库连接
+        project_id: 项目ID
+        budget_id: 预算ID
+        deltas: {BudgetCategory: (金额合计（元）, 笔数)}
+    """
+    if not deltas:
+        return
+    rows = [
+        {"project_id": project_id, "budget_id": budget_id, "category": category.name,
+         "amount": float(amount), "count": int(count)}
+        for category, (amount, count) in deltas.items()
+    ]
+    connection.execute(text("""
+        INSERT INTO budget_rollups (project_id, budget_id, year, category, spent_amount, expense_count)
+        VALUES (:project_id, :budget_id, (SELECT year FROM budgets WHERE id = :budget_id), :category, :amount, :count)
+        ON CONFLICT (budget_id, category) DO UPDATE SET
+            spent_amount = spent_amount + excluded.spent_amount,
+            expense_count = expense_count + excluded.expense_count
+    """), rows)
+    connection.execute(text("""
+        UPDATE budget_items SET spent_amount = COALESCE(spent_amount, 0) + :amount / 10000.0
+        WHERE budget_id = :budget_id AND category = :category
+    """), rows)
+    connection.execute(text("""
+        UPDATE budgets SET spent_amount = COALESCE(spent_amount, 0) + :amount / 10000.0 WHERE id = :budget_id
+    """), {"budget_id": budget_id, "amount": sum(row["amount"] for row in rows)})
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def _budget_rollup_created(target, connection, tables=(), **kw):
+    """建表完成后确保触发器存在；汇总表为本次新建时（新库或旧库升级）用已有支出填充"""
+    install_budget_rollup(connection, rebuild=BudgetRollup.__table__ in tables)
+
+
+class SchemaVersion(Base):
+    """数据库结构版本记录，每执行一个迁移步骤写入一行（见 migrations.py）"""
+    __tablename__ = 'schema_version'
+
+    version = Column(Integer, primary_key=True)  # 迁移版本号
+    description = Column(String(200))  # 迁移说明
+    applied_at = Column(DateTime, default=datetime.now)  # 执行时间
 
 
 class GanttTask(Base):
@@ -192,7 +391,10 @@ class GanttTask(Base):
 
     project = relationship("Project", backref="gantt_tasks")
 
-    __table_args__ = (UniqueConstraint('project_id', 'gantt_id', name='uix_project_gantt_id'),)
+    __table_args__ = (
+        UniqueConstraint('project_id', 'gantt_id', name='uix_project_gantt_id'),
+        Index('ix_gantt_tasks_project_level', 'project_id', 'level'),
+    )
 
 class GanttDependency(Base):
     """甘特图任务依赖关系"""
@@ -203,316 +405,91 @@ class GanttDependency(Base):
     predecessor_gantt_id = Column(String(50), nullable=False) # 前置任务的 gantt_id
     successor_gantt_id = Column(String(50), nullable=False) # 后置任务的 gantt_id
     type = Column(String(10)) # 依赖类型，例如 'FS' (Finish-to-Start)
+    lag = Column(Integer, default=0) # 延迟（天）
 
     project = relationship("Project", backref="gantt_dependencies")
 
     # 唯一约束：同一个项目下的依赖关系应该是唯一的
     __table_args__ = (UniqueConstraint('project_id', 'predecessor_gantt_id', 'successor_gantt_id', name='uix_project_dependency'),)
 
+class GanttTaskSchedule(Base):
+    """甘特图任务的进度计算结果（关键路径法，见 gantt_schedule.py），保存甘特图时重新计算"""
+    __tablename__ = 'gantt_task_schedules'
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey('projects.id'), nullable=False)
+    gantt_id = Column(String(50), nullable=False) # 任务的 gantt_id
+    early_start = Column(Date) # 最早开始
+    early_finish = Column(Date) # 最早完成（最后一个工作日）
+    late_start = Column(Date) # 最迟开始
+    late_finish = Column(Date) # 最迟完成（最后一个工作日）
+    total_float = Column(Integer) # 总时差（工作日）
+    free_float = Column(Integer) # 自由时差（工作日）
+    is_critical = Column(Boolean, default=False) # 是否在关键路径上
+    is_summary = Column(Boolean, default=False) # 是否为父任务（日期由子任务决定）
+    calculated_at = Column(DateTime, default=datetime.now) # 计算时间
 
+    __table_args__ = (
+        UniqueConstraint('project_id', 'gantt_id', name='uix_project_task_schedule'),
+        Index('ix_gantt_task_schedules_project_critical', 'project_id', 'is_critical'),
+    )
 
-def get_budget_usage(session, project_id, budget_id=None):
-    """获取预算使用情况
-    
-    Args:
-        session: SQLAlchemy session
-        project_id: 项目ID
-        budget_id: 预算ID（可选）
-    
-    Returns:
-        dict: 包含预算使用情况的字典
-    """
-    try:
-        # 查询总预算
-        total_budget = session.query(Budget).filter(
-            Budget.project_id == project_id,
-            Budget.year.is_(None)
-        ).first()
-
-        if not total_budget:
-            return {
-                "total_budget": 0.0,
-                "total_spent": 0.0,
-                "remaining": 0.0,
-                "category_spent": {category: 0.0 for category in BudgetCategory}
-            }
-
-        # 查询年度预算
-        annual_budgets = session.query(Budget).filter(
-            Budget.project_id == project_id,
-            Budget.year.isnot(None)
-        ).all()
-
-        # 计算总支出
-        total_spent = session.query(func.sum(Expense.amount)).filter(
-            Expense.project_id == project_id
-        ).scalar() or 0.0
-
-        # 计算各科目支出
-        category_spent = {}
-        for category in BudgetCategory:
-            spent = session.query(func.sum(Expense.amount)).filter(
-                Expense.project_id == project_id,
-                Expense.category == category
-            ).scalar() or 0.0
-            category_spent[category] = spent
-
-        return {
-            "total_budget": total_budget.total_amount,
-            "total_spent": total_spent,
-            "remaining": total_budget.total_amount - total_spent,
-            "category_spent": category_spent
-        }
 
-    except Exception as e:
-        session.rollback()
-        raise e
 
-def migrate_db(engine):
-    """迁移数据库"""
-    from sqlalchemy import text
-    
-    connection = engine.connect()
-    transaction = connection.begin()
-    
-    # 执行项目任务表迁移
-    try:
-        result = connection.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='gantt_tasks'"))
-        if result.fetchone():
-            result = connection.execute(text("PRAGMA table_info(gantt_tasks)"))
-            columns = [row[1] for row in result.fetchall()]
-            if 'responsible' not in columns:
-                connection.execute(text("ALTER TABLE gantt_tasks ADD COLUMN responsible VARCHAR(50)"))
-                print("成功添加 responsible 列到 gantt_tasks 表")
-            if 'order' not in columns: # 添加对 order 列的检查
-                connection.execute(text("ALTER TABLE gantt_tasks ADD COLUMN \"order\" INTEGER DEFAULT 0")) # 添加 order 列，注意关键字加双引号
-                print("成功添加 order 列到 gantt_tasks 表")
-    except Exception as e:
-        print(f"迁移 gantt_tasks 表失败: {e}")
+def migrate_db(engine, progress=None):
+    """迁移数据库
 
+    按 schema_version 表记录的版本执行尚未执行的迁移步骤（见 migrations.py），
+    结构已是最新时仅读取一次版本号。
 
-    result = connection.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='project_outcomes'")) # 更新表名
-    if result.fetchone():
-        result = connection.execute(text("PRAGMA table_info(project_outcomes)")) # 更新表名
-        columns = [row[1] for row in result.fetchall()]
-        
-        if 'submit_date' not in columns:
-            connection.execute(text("ALTER TABLE project_outcomes ADD COLUMN submit_date DATE")) # 更新表名
-
-    result = connection.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='projects'"))
-    if result.fetchone():
-        result = connection.execute(text("PRAGMA table_info(projects)"))
-        columns = [row[1] for row in result.fetchall()]
-        if 'director' not in columns:
-            try:
-                connection.execute(text("ALTER TABLE projects ADD COLUMN director VARCHAR(50)"))
-                print("成功添加 director 列到 projects 表")
-            except Exception as e:
-                print(f"添加 director 列失败: {e}")
-                # 如果需要，可以在这里回滚事务或采取其他错误处理措施
+    Args:
+        engine: 数据库引擎
+        progress: 进度回调，接收一条文字消息，默认写入日志
 
-    try:
-        result = connection.execute(
-            text("SELECT name FROM sqlite_master WHERE type='table' AND name='expenses'")
-        )
-        if result.fetchone():
-            result = connection.execute(text("PRAGMA table_info(expenses)"))
-            columns = [row[1] for row in result.fetchall()]
-            
-            if 'voucher_path' not in columns:
-                # 创建临时表
-                connection.execute(text("""
-                    CREATE TABLE expenses_temp (
-                        id INTEGER PRIMARY KEY,
-                        project_id INTEGER NOT NULL,
-                        budget_id INTEGER NOT NULL,
-                        category TEXT NOT NULL,
-                        content TEXT NOT NULL,
-                        specification TEXT,
-                        supplier TEXT,
-                        amount FLOAT,
-                        date DATE,
-                        remarks TEXT,
-                        voucher_path TEXT
-                    )
-                """))
-                
-                # 复制数据到临时表
-                connection.execute(text("""
-                    INSERT INTO expenses_temp (
-                        id, project_id, budget_id, category, content,
-                        specification, supplier, amount, date, remarks
-                    )
-                    SELECT id, project_id, budget_id, category, content,
-                           specification, supplier, amount, date, remarks
-                    FROM expenses
-                """))
-                
-                # 删除原表
-                connection.execute(text("DROP TABLE expenses"))
-                
-                # 重命名临时表
-                connection.execute(text("ALTER TABLE expenses_temp RENAME TO expenses"))
-                
-                # 提交事务
-                transaction.commit()
-                print("成功添加voucher_path列")
-        
-        result = connection.execute(
-            text("SELECT name FROM sqlite_master WHERE type='table' AND name='actionlogs'")
-        )
-        if result.fetchone():
-            result = connection.execute(text("PRAGMA table_info(actionlogs)"))
-            columns = {row[1]: row[2] for row in result.fetchall()}
-            
-            # 需要迁移的情况：
-            # 2. 缺少新增的字段
-            needs_migration = (
-                ('timestamp' in columns and columns['timestamp'] != 'DATETIME') or
-                'old_data' not in columns or
-                'new_data' not in columns or
-                'category' not in columns or
-                'amount' not in columns or
-                'related_info' not in columns or
-                'gantt_task_id' not in columns or # 检查新字段
-                'project_document_id' not in columns or # 检查新字段
-                'project_outcome_id' not in columns # 检查新字段
-            )
-            
-            if needs_migration:
-                # 创建临时表，包含所有新字段和外键
-                connection.execute(text("""
-                    CREATE TABLE actionlogs_temp (
-                        id INTEGER PRIMARY KEY,
-                        project_id INTEGER,
-                        budget_id INTEGER,
-                        expense_id INTEGER,
-                        gantt_task_id INTEGER,     -- 新增字段
-                        project_document_id INTEGER, -- 新增字段
-                        project_outcome_id INTEGER,  -- 新增字段
-                        type TEXT NOT NULL,
-                        action TEXT NOT NULL,
-                        description TEXT NOT NULL,
-                        operator TEXT NOT NULL,
-                        timestamp DATETIME,
-                        old_data TEXT,
-                        new_data TEXT,
-                        category TEXT,
-                        amount FLOAT,
-                        related_info TEXT,
-                        FOREIGN KEY(project_id) REFERENCES projects (id),
-                        FOREIGN KEY(budget_id) REFERENCES budgets (id),
-                        FOREIGN KEY(expense_id) REFERENCES expenses (id),
-                        FOREIGN KEY(gantt_task_id) REFERENCES gantt_tasks (id),
-                        FOREIGN KEY(project_document_id) REFERENCES project_documents (id),
-                        FOREIGN KEY(project_outcome_id) REFERENCES project_outcomes (id)
-                    )
-                """))
-                
-                # 复制数据到临时表，为新字段插入 NULL
-                connection.execute(text("""
-                    INSERT INTO actionlogs_temp (
-                        id, project_id, budget_id, expense_id, type,
-                        action, description, operator, timestamp,
-                        old_data, new_data, category, amount, related_info,
-                        gantt_task_id, project_document_id, project_outcome_id
-                    )
-                    SELECT
-                        id, project_id, budget_id, expense_id, type,
-                        action, description, operator, datetime(timestamp),
-                        old_data, new_data, category, amount, related_info,
-                        NULL, NULL, NULL -- 为新字段插入 NULL
-                    FROM actionlogs
-                """))
-                
-                # 删除原表
-                connection.execute(text("DROP TABLE actionlogs"))
-                
-                # 重命名临时表
-                connection.execute(text("ALTER TABLE actionlogs_temp RENAME TO actionlogs"))
-                
-                # 提交事务
-                transaction.commit()
-                print("成功更新actionlogs表结构，添加了新字段并修正了timestamp列类型")
-            else:
-                 print("actionlogs 表结构无需更新") # 添加无需更新的提示
-        
-    except Exception as e:
-        print(f"数据库迁移失败: {str(e)}")
-        transaction.rollback()
+    Returns:
+        int: 迁移后的结构版本
 
+    Raises:
+        Exception: 某一步骤失败时记录日志后抛出，结构停留在失败步骤之前的版本
+    """
+    from .migrations import run_migrations
     try:
-        result = connection.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='project_outcomes'"))
-        if result.fetchone():
-            result = connection.execute(text("PRAGMA table_info(project_outcomes)"))
-            columns = [row[1] for row in result.fetchall()]
-            if 'attachment_path' not in columns:
-                connection.execute(text("ALTER TABLE project_outcomes ADD COLUMN attachment_path VARCHAR(500)"))
-                transaction.commit() # Commit this specific change
-                print("成功添加 attachment_path 列到 project_outcomes 表")
-            else:
-                 print("project_outcomes 表结构无需更新") # 添加无需更新的提示
-    except Exception as e:
-        print(f"迁移 project_outcomes 表失败: {e}")
+        return run_migrations(engine, progress)
+    except Exception:
+        logger.exception("数据库迁移失败")
+        raise
 
-    # 检查并迁移 budget_plan_items 表
-    try:
-        result = connection.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='budget_plan_items'"))
-        if result.fetchone():
-            result = connection.execute(text("PRAGMA table_info(budget_plan_items)"))
-            columns = [row[1] for row in result.fetchall()]
-            needs_commit = False # 标记是否需要提交事务
-
-            # 定义模型应有的列及其 SQLite 类型
-            expected_columns = {
-                "plan_id": "INTEGER",
-                "parent_id": "INTEGER",
-                "category": "TEXT", # SQLEnum maps to TEXT
-                "name": "TEXT",     # String maps to TEXT
-                "specification": "TEXT",
-                "unit_price": "FLOAT", # Float maps to FLOAT or REAL
-                "quantity": "INTEGER",
-                "amount": "FLOAT",
-                "remarks": "TEXT"
-            }
-
-            # 检查并添加所有缺失的列
-            for col_name, col_type in expected_columns.items():
-                if col_name not in columns:
-                    print(f"尝试添加 {col_name} 列 ({col_type}) 到 budget_plan_items 表...")
-                    try:
-                        connection.execute(text(f"ALTER TABLE budget_plan_items ADD COLUMN {col_name} {col_type}"))
-                        needs_commit = True
-                    except Exception as alter_err:
-                         print(f"添加列 {col_name} 失败: {alter_err}")
-                         # 如果添加列失败，可能需要回滚并停止迁移
-                         if transaction.is_active:
-                              transaction.rollback()
-                         raise alter_err # 重新抛出错误，中断迁移
-
-            # 如果进行了修改，则提交事务
-            if needs_commit:
-                transaction.commit()
-                print("budget_plan_items 表结构更新提交成功")
-            else:
-                print("budget_plan_items 表结构无需更新")
-    except Exception as e:
-        print(f"迁移 budget_plan_items 表失败: {e}")
-        if transaction.is_active: # 如果事务仍然活跃，则回滚
-             transaction.rollback()
+def create_missing_indexes(connection):
+    """为已存在的表补建模型中声明的索引
 
-    finally:
-        if transaction.is_active:
-             print("Warning: Transaction was still active during migration finalization. Rolling back.")
-             transaction.rollback()
-        connection.close()
+    create_all 只在新建表时创建索引，旧数据库需通过此函数补建。
+    视图模块中定义的模型（项目文档、成果、学术活动）需在调用前导入，其索引才会被包含。
+
+    Args:
+        connection: 数据库连接，在调用方的事务中执行
+
+    Returns:
+        list: 本次新建的索引名称
+    """
+    created = []
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(connection)
+                created.append(index.name)
+    return created
 
 def init_db(db_path):
     """初始化数据库"""
     # 获取程序根目录
     root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     db_path = os.path.join(root_dir, db_path)
-    engine = create_engine(f'sqlite:///{db_path}')
+    engine = create_db_engine(db_path)
     Base.metadata.create_all(engine)
     return engine
 
@@ -521,7 +498,7 @@ def get_engine():
     # 获取程序根目录
     root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     db_path = os.path.join(root_dir, 'database', 'database.db')
-    engine = create_engine(f'sqlite:///{db_path}')
+    engine = create_db_engine(db_path)
     return engine
 
 def add_project_to_db(engine, name, financial_code, project_code, project_type, start_date, end_date, total_budget=None):
@@ -574,7 +551,7 @@ def add_project_to_db(engine, name, financial_code, project_code, project_type,
 if __name__ == "__main__":
     # 初始化数据库
     db_path = "database/database.db"
-    engine = create_engine(f'sqlite:///{db_path}')
+    engine = create_db_engine(db_path)
     # 创建新表
     Base.metadata.create_all(engine)
     # 运行迁移脚本（如果需要更复杂的迁移）
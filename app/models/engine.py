@@ -0,0 +1,109 @@
+"""
+数据库引擎工厂
+
+统一创建 SQLite 引擎，并在每个连接建立时通过 connect 事件应用性能相关的 PRAGMA
+（WAL 日志、同步级别、内存映射、页缓存等）。默认配置可被数据库目录下的
+db_config.json 覆盖，例如：
+
+    {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -65536
+    }
+"""
+
+import json
+import logging
+import os
+from sqlalchemy import create_engine, event
+
+CONFIG_FILENAME = 'db_config.json'
+
+# 默认 SQLite 调优配置
+DEFAULT_SQLITE_SETTINGS = {
+    "journal_mode": "WAL",  # 写前日志：读写互不阻塞，提交无需整库回滚日志
+    "synchronous": "NORMAL",  # WAL 模式下仅在检查点时 fsync，断电最多丢失最近的提交
+    "mmap_size": 256 * 1024 * 1024,  # 内存映射读取上限（字节）
+    "cache_size": -64 * 1024,  # 页缓存大小，负数表示 KiB（即 64 MB）
+    "temp_store": "MEMORY",  # 临时表和排序使用内存
+    # 旧版本写入的操作记录仍引用已删除的支出、任务等记录，开启外键约束会导致删除失败，
+    # 因此默认关闭，可在配置文件中开启
+    "foreign_keys": False,
+    "busy_timeout": 5000,  # 数据库被锁定时的等待时间（毫秒）
+}
+
+# 旧版本行为：回滚日志 + 完全同步，仅用于性能对比
+LEGACY_SQLITE_SETTINGS = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+    "mmap_size": 0,
+    "cache_size": -2000,
+    "temp_store": "DEFAULT",
+    "foreign_keys": False,
+    "busy_timeout": 0,
+}
+
+
+def load_sqlite_settings(config_path=None):
+    """读取 SQLite 调优配置
+
+    Args:
+        config_path: 配置文件路径，文件不存在或格式错误时使用默认配置
+
+    Returns:
+        dict: 合并默认值后的配置
+    """
+    settings = dict(DEFAULT_SQLITE_SETTINGS)
+    if config_path and os.path.exists(config_path):
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                overrides = json.load(f)
+            settings.update({key: value for key, value in overrides.items() if key in DEFAULT_SQLITE_SETTINGS})
+        except (OSError, ValueError) as e:
+            logging.warning(f"读取数据库配置 {config_path} 失败，使用默认配置: {e}")
+    return settings
+
+
+def _pragma_statements(settings):
+    """将配置转换为 PRAGMA 语句列表"""
+    statements = []
+    for key in ("journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout"):
+        value = settings.get(key)
+        if value is not None:
+            statements.append(f"PRAGMA {key}={int(value) if isinstance(value, (int, float)) else value}")
+    if settings.get("foreign_keys") is not None:
+        statements.append(f"PRAGMA foreign_keys={'ON' if settings['foreign_keys'] else 'OFF'}")
+    return statements
+
+
+def create_db_engine(db_path, settings=None, config_path=None, **engine_kwargs):
+    """创建应用 SQLite 调优配置的数据库引擎
+
+    Args:
+        db_path: 数据库文件路径
+        settings: 调优配置字典，为 None 时从 config_path（默认为数据库目录下的 db_config.json）读取
+        config_path: 配置文件路径
+        **engine_kwargs: 透传给 create_engine 的参数
+
+    Returns:
+        Engine: SQLAlchemy 引擎
+    """
+    if settings is None:
+        if config_path is None:
+            config_path = os.path.join(os.path.dirname(os.path.abspath(db_path)), CONFIG_FILENAME)
+        settings = load_sqlite_settings(config_path)
+
+    engine = create_engine(f'sqlite:///{db_path}', **engine_kwargs)
+    statements = _pragma_statements(settings)
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return engine
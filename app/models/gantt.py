@@ -0,0 +1,520 @@
+"""
+甘特图任务持久化
+
+甘特图页面保存时只提交自上次加载或保存以来的变更集（新增、修改、删除的任务及依赖连线），
+apply_gantt_changes() 以批量语句写入：
+
+- 新增任务批量插入，临时ID（tmp_ 开头）替换为数据库ID，映射关系返回给页面；
+- 修改的任务只更新变化的字段，按主键批量更新；
+- 删除的任务连同其依赖一并删除；
+- 依赖按 (前置任务, 后续任务) 增删，不再整体删除重建；
+- 每个新增、修改、删除的任务写入一条操作记录，修改只记录变化的字段；
+- 任务日期、工期、层级或依赖有变化时重新计算关键路径（见 app.models.gantt_schedule）。
+
+变更集格式（JSON）：
+
+    {
+        "added": [{"id": "tmp_1", "name": "...", "start": 毫秒, ..., "order": 行号}],
+        "changed": [{"id": "12", "start": 毫秒, "end": 毫秒, "order": 行号}],
+        "deleted": ["13"],
+        "links": {"added": [{"from": "12", "to": "tmp_1", "lag": 0}],
+                  "removed": [{"from": "12", "to": "14"}]},
+        "lazy": ["15"]
+    }
+
+任务字段沿用 jQueryGantt 的命名（见 TASK_FIELDS），order 为任务在完整计划中的位置。
+lazy 为页面上子任务尚未加载的折叠任务（见 app.models.gantt_payload）：这些任务被删除、移动、
+改变层级或顺序时，未加载的子孙任务随之删除、平移、调整层级和顺序。
+
+父任务进度由子任务按工期加权汇总：build_task_tree() 按 order 和 level 重建任务树，
+rollup_progress() 一遍后序汇总；load_task_trees() 也供首页的项目进度概览使用。
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .database import Actionlog, GanttDependency, GanttTask
+from .gantt_schedule import ScheduleCycleError, refresh_schedule
+
+logger = logging.getLogger(__name__)
+
+# jQueryGantt 任务字段 -> GanttTask 列
+TASK_FIELDS = {
+    'name': 'name',
+    'code': 'code',
+    'level': 'level',
+    'status': 'status',
+    'start': 'start_date',
+    'duration': 'duration',
+    'end': 'end_date',
+    'startIsMilestone': 'start_is_milestone',
+    'endIsMilestone': 'end_is_milestone',
+    'progress': 'progress',
+    'progressByWorklog': 'progress_by_worklog',
+    'description': 'description',
+    'collapsed': 'collapsed',
+    'hasChild': 'has_child',
+    'responsible': 'responsible',
+    'order': 'order',
+}
+
+# 新增任务缺少某字段时的默认值
+_TASK_DEFAULTS = {
+    'name': '',
+    'level': 0,
+    'start_is_milestone': False,
+    'end_is_milestone': False,
+    'progress': 0.0,
+    'progress_by_worklog': False,
+    'collapsed': False,
+    'has_child': False,
+    'order': 0,
+}
+
+# 只改变这些字段（如插入任务后其后各行的 order 顺延）时不写操作记录
+_QUIET_COLUMNS = {'order', 'collapsed'}
+
+# 影响父任务进度汇总的字段
+_ROLLUP_COLUMNS = {'progress', 'duration', 'level', 'order'}
+
+# 影响进度计算（关键路径）的字段
+_SCHEDULE_COLUMNS = {'start_date', 'end_date', 'duration', 'level', 'order'}
+
+# 操作记录中保存的任务字段
+_LOG_COLUMNS = ('name', 'code', 'level', 'status', 'start_date', 'duration', 'end_date', 'progress', 'responsible')
+
+_IN_CHUNK_SIZE = 500  # 每条 IN 查询的参数个数
+_EPOCH = datetime(1970, 1, 1)
+
+TEMP_ID_PREFIX = 'tmp_'
+DEFAULT_DEPENDENCY_TYPE = 'FS'
+
+
+@dataclass
+class GanttChangeset:
+    """甘特图变更集"""
+    added: list = field(default_factory=list)  # 新增任务的完整字段
+    changed: list = field(default_factory=list)  # 修改的任务，只含 id 和变化的字段
+    deleted: list = field(default_factory=list)  # 删除的任务ID
+    links_added: list = field(default_factory=list)  # 新增或修改延迟的依赖 {'from', 'to', 'lag'}
+    links_removed: list = field(default_factory=list)  # 删除的依赖 {'from', 'to'}
+    lazy: list = field(default_factory=list)  # 子任务未加载到页面的任务ID
+
+    @classmethod
+    def from_json(cls, data):
+        """由页面提交的变更集（已解析的 JSON）构造"""
+        links = data.get('links') or {}
+        return cls(
+            added=list(data.get('added') or []),
+            changed=list(data.get('changed') or []),
+            deleted=[str(task_id) for task_id in data.get('deleted') or []],
+            links_added=list(links.get('added') or []),
+            links_removed=list(links.get('removed') or []),
+            lazy=[str(task_id) for task_id in data.get('lazy') or []],
+        )
+
+    def is_empty(self):
+        return not (self.added or self.changed or self.deleted or self.links_added or self.links_removed)
+
+
+@dataclass
+class GanttSaveResult:
+    """保存结果"""
+    id_map: dict = field(default_factory=dict)  # {临时ID: 数据库ID}，仅含本次新增的任务
+    progress: dict = field(default_factory=dict)  # {任务ID: 进度}，本次重新汇总后进度变化的父任务
+    schedule: object = None  # 重新计算的进度（gantt_schedule.Schedule），本次保存未影响进度计算时为 None
+    schedule_error: str = None  # 进度无法计算的原因（如依赖存在循环）
+    added: int = 0
+    changed: int = 0
+    deleted: int = 0
+
+
+def _ms_to_datetime(value):
+    """jQueryGantt 的毫秒时间戳转换为 UTC 时间（不带时区，与数据库中保存的一致）"""
+    return _EPOCH + timedelta(milliseconds=value) if value is not None else None
+
+
+def datetime_to_ms(value):
+    """数据库中的时间转换为 jQueryGantt 的毫秒时间戳"""
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1000) if value is not None else None
+
+
+def _clamp_progress(value):
+    try:
+        return max(0.0, min(100.0, float(value)))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def task_values(data):
+    """将页面提交的任务字段转换为 GanttTask 的列值，只转换 data 中出现的字段"""
+    values = {}
+    for key, column in TASK_FIELDS.items():
+        if key not in data:
+            continue
+        value = data[key]
+        if column in ('start_date', 'end_date'):
+            value = _ms_to_datetime(value)
+        elif column == 'progress':
+            value = _clamp_progress(value)
+        values[column] = value
+    return values
+
+
+def _log_value(value):
+    return str(value) if isinstance(value, datetime) else value
+
+
+def _dumps(data):
+    return json.dumps(data, default=str, ensure_ascii=False)
+
+
+def _chunks(items, size=_IN_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _load_rows(session, project_id, gantt_ids):
+    """按 gantt_id 读取任务行，返回 {gantt_id: 行}"""
+    table = GanttTask.__table__
+    rows = {}
+    for chunk in _chunks(gantt_ids):
+        statement = select(table).where(table.c.project_id == project_id, table.c.gantt_id.in_(chunk))
+        for row in session.execute(statement).mappings():
+            rows[row['gantt_id']] = row
+    return rows
+
+
+def apply_gantt_changes(session, project, changes, operator="系统用户"):
+    """将变更集写入数据库
+
+    在调用方的事务中执行，不提交。
+
+    Args:
+        session: 数据库会话
+        project: 甘特图所属项目
+        changes: GanttChangeset
+        operator: 写入操作记录的操作人
+
+    Returns:
+        GanttSaveResult: 新增任务的ID映射及重新汇总后进度变化的父任务
+    """
+    result = GanttSaveResult()
+    if changes.is_empty():
+        return result
+
+    project_id = project.id
+    if changes.lazy:
+        changes = _expand_lazy_changes(session, project_id, changes)
+    related_info = f"项目: {project.financial_code}"
+    now = datetime.now()
+    logs = []
+
+    def log(task_pk, action, name, gantt_id, old_data=None, new_data=None):
+        logs.append({
+            'project_id': project_id, 'gantt_task_id': task_pk, 'type': "任务", 'action': action,
+            'description': f"{action}任务：{name} (ID: {gantt_id})", 'operator': operator, 'timestamp': now,
+            'old_data': old_data, 'new_data': new_data, 'related_info': related_info,
+        })
+
+    deleted_ids = set(changes.deleted)
+    persistent_added = [str(data['id']) for data in changes.added if not str(data['id']).startswith(TEMP_ID_PREFIX)]
+    existing = _load_rows(session, project_id,
+                          set(deleted_ids) | {str(data['id']) for data in changes.changed} | set(persistent_added))
+
+    # 页面认为是新增、数据库中已存在的任务按修改处理
+    added, changed = [], list(changes.changed)
+    for data in changes.added:
+        (changed if str(data['id']) in existing else added).append(data)
+
+    needs_rollup = bool(added or deleted_ids)
+    needs_schedule = bool(added or deleted_ids or changes.links_added or changes.links_removed)
+
+    # 1. 删除任务及其依赖
+    if deleted_ids:
+        dependencies = GanttDependency.__table__
+        tasks = GanttTask.__table__
+        for chunk in _chunks(deleted_ids):
+            session.execute(dependencies.delete().where(
+                dependencies.c.project_id == project_id,
+                dependencies.c.predecessor_gantt_id.in_(chunk) | dependencies.c.successor_gantt_id.in_(chunk)
+            ))
+            session.execute(tasks.delete().where(tasks.c.project_id == project_id, tasks.c.gantt_id.in_(chunk)))
+        for gantt_id in deleted_ids:
+            row = existing.get(gantt_id)
+            if row is not None:
+                log(row['id'], "删除", row['name'], gantt_id,
+                    old_data=_dumps({'id': gantt_id, **{column: _log_value(row[column]) for column in _LOG_COLUMNS}}))
+                result.deleted += 1
+
+    # 2. 新增任务：批量插入，临时ID替换为数据库ID
+    if added:
+        rows = []
+        for data in added:
+            values = {**_TASK_DEFAULTS, **task_values(data)}
+            values['name'] = values['name'] or ''
+            rows.append({'project_id': project_id, 'gantt_id': str(data['id']), **values})
+        table = GanttTask.__table__
+        inserted = session.execute(
+            table.insert().returning(table.c.id, table.c.gantt_id, sort_by_parameter_order=True), rows
+        ).all()
+        renamed = []
+        for pk, gantt_id in inserted:
+            if gantt_id.startswith(TEMP_ID_PREFIX):
+                result.id_map[gantt_id] = str(pk)
+                renamed.append({'pk': pk, 'new_gantt_id': str(pk)})
+        if renamed:
+            session.execute(
+                table.update().where(table.c.id == bindparam('pk')).values(gantt_id=bindparam('new_gantt_id')),
+                renamed
+            )
+        for (pk, gantt_id), values in zip(inserted, rows):
+            final_id = result.id_map.get(gantt_id, gantt_id)
+            log(pk, "新增", values['name'], final_id,
+                new_data=_dumps({'id': final_id, **{column: _log_value(values.get(column)) for column in _LOG_COLUMNS}}))
+        result.added = len(inserted)
+
+    # 3. 修改任务：只更新与数据库中不同的字段
+    updates = []
+    for data in changed:
+        gantt_id = str(data['id'])
+        row = existing.get(gantt_id)
+        if row is None or gantt_id in deleted_ids:
+            logger.warning("甘特图任务 %s 不存在，忽略修改", gantt_id)
+            continue
+        values = {column: value for column, value in task_values(data).items() if row[column] != value}
+        if not values:
+            continue
+        updates.append({'id': row['id'], **values})
+        needs_rollup = needs_rollup or bool(_ROLLUP_COLUMNS & values.keys())
+        needs_schedule = needs_schedule or bool(_SCHEDULE_COLUMNS & values.keys())
+        if values.keys() - _QUIET_COLUMNS:
+            log(row['id'], "编辑", values.get('name', row['name']), gantt_id,
+                old_data=_dumps({'id': gantt_id, **{column: _log_value(row[column]) for column in values}}),
+                new_data=_dumps({'id': gantt_id, **{column: _log_value(value) for column, value in values.items()}}))
+    if updates:
+        # 按主键批量更新，键相同的行合并为一次 executemany
+        session.execute(update(GanttTask), updates)
+        result.changed = len(updates)
+
+    # 4. 依赖：按 (前置任务, 后续任务) 增删
+    dependencies = GanttDependency.__table__
+    if changes.links_removed:
+        session.execute(dependencies.delete().where(
+            dependencies.c.project_id == project_id,
+            dependencies.c.predecessor_gantt_id == bindparam('predecessor'),
+            dependencies.c.successor_gantt_id == bindparam('successor'),
+        ), [{'predecessor': str(link['from']), 'successor': str(link['to'])} for link in changes.links_removed])
+    links = []
+    for link in changes.links_added:
+        predecessor = result.id_map.get(str(link['from']), str(link['from']))
+        successor = result.id_map.get(str(link['to']), str(link['to']))
+        if predecessor in deleted_ids or successor in deleted_ids:
+            continue
+        links.append({'project_id': project_id, 'predecessor_gantt_id': predecessor,
+                      'successor_gantt_id': successor, 'type': DEFAULT_DEPENDENCY_TYPE,
+                      'lag': int(link.get('lag') or 0)})
+    if links:
+        statement = sqlite_insert(dependencies)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=['project_id', 'predecessor_gantt_id', 'successor_gantt_id'],
+            set_={'lag': statement.excluded.lag, 'type': statement.excluded.type},
+        ), links)
+
+    if logs:
+        session.execute(Actionlog.__table__.insert(), logs)
+
+    # 5. 重新汇总父任务进度
+    if needs_rollup:
+        result.progress = recalculate_parent_progress(session, project_id)
+
+    # 6. 重新计算关键路径
+    if needs_schedule:
+        try:
+            result.schedule = refresh_schedule(session, project_id)
+        except ScheduleCycleError as e:
+            result.schedule_error = str(e)
+            logger.warning("项目 %s 的进度无法计算: %s", project_id, e)
+    return result
+
+
+def subtree_ends(levels):
+    """计算每个任务的子树范围
+
+    任务按 order 排列时为任务树的先序遍历（见 build_task_tree），任务 i 的子孙任务为
+    其后 level 大于它的连续任务。
+
+    Args:
+        levels: 按 order 排列的任务层级
+
+    Returns:
+        list[int]: 每个任务子树之后第一个任务的位置，任务 i 的子孙任务为 [i + 1, ends[i])
+    """
+    ends = [len(levels)] * len(levels)
+    stack = []
+    for index, level in enumerate(levels):
+        level = level or 0
+        while stack and (levels[stack[-1]] or 0) >= level:
+            ends[stack.pop()] = index
+        stack.append(index)
+    return ends
+
+
+def _expand_lazy_changes(session, project_id, changes):
+    """将子任务未加载的任务的删除、移动和调整层级、顺序展开到其子孙任务"""
+    lazy = set(changes.lazy)
+    deleted = lazy & set(changes.deleted)
+    moved = {str(data['id']): data for data in changes.changed if str(data['id']) in lazy}
+    if not (deleted or moved):
+        return changes
+
+    table = GanttTask.__table__
+    rows = session.execute(
+        select(table.c.gantt_id, table.c.level, table.c.order, table.c.start_date, table.c.end_date)
+        .where(table.c.project_id == project_id).order_by(table.c.order, table.c.id)
+    ).all()
+    ends = subtree_ends([row.level for row in rows])
+    positions = {row.gantt_id: index for index, row in enumerate(rows)}
+
+    extra_deleted, extra_changed = [], []
+    for gantt_id in deleted:
+        index = positions.get(gantt_id)
+        if index is not None:
+            extra_deleted.extend(row.gantt_id for row in rows[index + 1:ends[index]])
+    for gantt_id, data in moved.items():
+        index = positions.get(gantt_id)
+        if index is None or gantt_id in deleted:
+            continue
+        task = rows[index]
+        level_delta = data['level'] - (task.level or 0) if data.get('level') is not None else 0
+        # 整体移动任务条时开始、结束日期平移相同的时间，子孙任务随之平移
+        shift = 0
+        if data.get('start') is not None and data.get('end') is not None \
+                and task.start_date is not None and task.end_date is not None:
+            start_delta = data['start'] - datetime_to_ms(task.start_date)
+            if start_delta == data['end'] - datetime_to_ms(task.end_date):
+                shift = start_delta
+        for offset, child in enumerate(rows[index + 1:ends[index]], start=1):
+            delta = {'id': child.gantt_id}
+            if level_delta:
+                delta['level'] = (child.level or 0) + level_delta
+            if data.get('order') is not None:
+                delta['order'] = data['order'] + offset
+            if shift and child.start_date is not None and child.end_date is not None:
+                delta['start'] = datetime_to_ms(child.start_date) + shift
+                delta['end'] = datetime_to_ms(child.end_date) + shift
+            if len(delta) > 1:
+                extra_changed.append(delta)
+    return replace(changes, deleted=changes.deleted + extra_deleted, changed=changes.changed + extra_changed)
+
+
+@dataclass(eq=False)
+class TaskNode:
+    """任务树中的一个任务"""
+    id: int
+    gantt_id: str
+    project_id: int
+    name: str
+    code: str
+    level: int
+    duration: int
+    progress: float  # 叶子任务为保存的进度，父任务为由子任务汇总的进度
+    stored_progress: float  # 数据库中保存的进度
+    parent: "TaskNode" = None
+    children: list = field(default_factory=list)
+
+    @property
+    def weight(self):
+        """汇总进度时的权重：工期（天），为空或小于 1 时按 1 计"""
+        return max(self.duration or 1, 1)
+
+
+# 构建任务树需要的列
+_TREE_COLUMNS = ('id', 'gantt_id', 'project_id', 'name', 'code', 'level', 'duration', 'progress')
+
+
+def build_task_tree(rows):
+    """由按顺序排列的任务行重建任务树
+
+    甘特图任务按 order 排列时即为树的先序遍历，level 为深度：每个任务的父任务是它之前
+    最近的一个 level 更小的任务。层级跳跃（如 0 之后直接是 2）时挂到最近的上级任务下。
+
+    Args:
+        rows: 按 order 排序的同一项目的任务行，需含 _TREE_COLUMNS 中的字段
+
+    Returns:
+        list[TaskNode]: 全部任务，按先序排列（父任务总在子任务之前）
+    """
+    nodes = []
+    stack = []
+    for row in rows:
+        node = TaskNode(row['id'], row['gantt_id'], row['project_id'], row['name'], row['code'],
+                        row['level'] or 0, row['duration'], row['progress'], row['progress'])
+        while stack and stack[-1].level >= node.level:
+            stack.pop()
+        if stack:
+            node.parent = stack[-1]
+            stack[-1].children.append(node)
+        stack.append(node)
+        nodes.append(node)
+    return nodes
+
+
+def rollup_progress(nodes):
+    """按工期加权，自下而上汇总父任务进度
+
+    nodes 为 build_task_tree 返回的先序列表，逆序遍历时子任务总在父任务之前，
+    一遍即可完成汇总，每个任务只访问一次。
+    """
+    for node in reversed(nodes):
+        if not node.children:
+            continue
+        total_weight = weighted_progress = 0
+        for child in node.children:
+            weight = child.weight
+            total_weight += weight
+            weighted_progress += _clamp_progress(child.progress or 0) * weight
+        node.progress = round(weighted_progress / total_weight, 2)
+    return nodes
+
+
+def load_task_trees(session, project_ids=None):
+    """读取项目的任务树并汇总父任务进度（不写入数据库）
+
+    Args:
+        session: 数据库会话
+        project_ids: 项目ID列表，为 None 时读取全部项目
+
+    Returns:
+        dict: {项目ID: 该项目按先序排列的 TaskNode 列表}，按项目ID排序
+    """
+    table = GanttTask.__table__
+    statement = select(*(table.c[column] for column in _TREE_COLUMNS)).order_by(
+        table.c.project_id, table.c.order, table.c.id)
+    if project_ids is not None:
+        statement = statement.where(table.c.project_id.in_(list(project_ids)))
+    rows_by_project = {}
+    for row in session.execute(statement).mappings():
+        rows_by_project.setdefault(row['project_id'], []).append(row)
+    return {project_id: rollup_progress(build_task_tree(rows)) for project_id, rows in rows_by_project.items()}
+
+
+def recalculate_parent_progress(session, project_id):
+    """重新汇总项目中父任务的进度，只更新有变化的父任务
+
+    Returns:
+        dict: {任务ID: 新进度}
+    """
+    nodes = load_task_trees(session, [project_id]).get(project_id, [])
+    changed = [node for node in nodes if node.children and node.progress != node.stored_progress]
+    if changed:
+        table = GanttTask.__table__
+        session.execute(
+            table.update().where(table.c.id == bindparam('pk')).values(progress=bindparam('new_progress')),
+            [{'pk': node.id, 'new_progress': node.progress} for node in changed]
+        )
+    return {node.gantt_id: node.progress for node in changed}
@@ -0,0 +1,257 @@
+"""
+甘特图页面数据的分页加载
+
+甘特图页面打开项目时不再一次收到整个计划：
+
+- open_view() 按任务的 collapsed 列确定可见任务（顶层任务及展开任务的子任务），折叠任务的子孙
+  任务不发送，页面上以 hiddenCount 标记其未加载的子孙任务数；
+- 可见任务按 PAGE_SIZE 分页，页面逐页请求后一次载入；
+- 展开未加载子任务的折叠任务时，页面再请求该任务的子树（subtree_payload()）。
+
+每个任务的 JSON 在读取计划时编码一次（安装了 orjson 时使用 orjson），按项目缓存在
+gantt_payload_cache 中；分页、展开时只拼接已编码的片段。保存甘特图或删除项目后调用
+gantt_payload_cache.invalidate() 使该项目的缓存失效。
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import select
+from .database import GanttDependency, GanttTask
+from .gantt import datetime_to_ms, subtree_ends
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库
+    orjson = None
+
+# 每页发送的任务数
+PAGE_SIZE = 500
+
+# 默认最多缓存的项目数
+DEFAULT_MAX_PROJECTS = 8
+
+# 生成任务 JSON 需要的列
+_PAYLOAD_COLUMNS = ('gantt_id', 'name', 'progress', 'progress_by_worklog', 'description', 'code', 'level', 'status',
+                    'start_date', 'duration', 'end_date', 'start_is_milestone', 'end_is_milestone', 'collapsed',
+                    'has_child', 'responsible')
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), check_circular=False)
+
+
+def encode(data):
+    """编码为紧凑的 JSON 字符串（数据中不能有 datetime 等非 JSON 类型）"""
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return _json_encoder.encode(data)
+
+
+def _task_fragment(row):
+    """任务的 JSON，去掉末尾的 }，发送时再补上 depends 和 hiddenCount"""
+    progress = float(row.progress) if row.progress is not None else 0.0
+    return encode({
+        "id": row.gantt_id,
+        "name": row.name,
+        "progress": max(0.0, min(100.0, progress)),
+        "progressByWorklog": bool(row.progress_by_worklog),
+        "relevance": 0,
+        "type": "",
+        "typeId": "",
+        "description": row.description,
+        "code": row.code,
+        "level": row.level or 0,
+        "status": row.status,
+        "canWrite": True,
+        "start": datetime_to_ms(row.start_date),
+        "duration": row.duration,
+        "end": datetime_to_ms(row.end_date),
+        "startIsMilestone": bool(row.start_is_milestone),
+        "endIsMilestone": bool(row.end_is_milestone),
+        "collapsed": bool(row.collapsed),
+        "assigs": [],
+        "hasChild": bool(row.has_child),
+        "responsible": row.responsible,
+    })[:-1]
+
+
+@dataclass
+class GanttPlan:
+    """项目的甘特图计划，任务按 order 排列"""
+    project_id: int
+    ids: list  # gantt_id
+    levels: list
+    collapsed: list
+    fragments: list  # 各任务已编码的 JSON 片段
+    ends: list  # 各任务子树之后第一个任务的位置，见 subtree_ends()
+    predecessors: dict  # {后续任务ID: [(前置任务ID, 延迟天数)]}
+    successors: dict  # {前置任务ID: [(后续任务ID, 延迟天数)]}
+    positions: dict  # {gantt_id: 位置}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _visible(self, start, end, expand_all=False):
+        """[start, end) 中可见的任务位置及折叠任务未加载的子孙任务数"""
+        rows, hidden = [], {}
+        index = start
+        while index < end:
+            rows.append(index)
+            subtree_end = self.ends[index]
+            if self.collapsed[index] and subtree_end > index + 1 and not expand_all:
+                hidden[index] = subtree_end - index - 1
+                index = subtree_end
+            else:
+                index += 1
+        return rows, hidden
+
+    def task_json(self, index, depends, hidden):
+        return f'{self.fragments[index]},"depends":{encode(depends)},"hiddenCount":{hidden.get(index, 0)}}}'
+
+    def open_view(self):
+        """页面打开项目时的可见任务"""
+        rows, hidden = self._visible(0, len(self.ids))
+        return GanttView(self, rows, hidden)
+
+    def subtree_payload(self, gantt_ids, expand_all=False):
+        """折叠任务的子树
+
+        Args:
+            gantt_ids: 要展开的任务ID
+            expand_all: 是否连同其中的折叠任务一并展开
+
+        Returns:
+            str: {"subtrees": [{"id", "level", "tasks"}], "links": [[前置任务ID, 后续任务ID, 延迟]]}，
+                 tasks 的 depends 为空，依赖连线由 links 给出（含与子树外任务之间的连线）
+        """
+        subtrees, loaded = [], []
+        for gantt_id in gantt_ids:
+            index = self.positions.get(str(gantt_id))
+            if index is None:
+                continue
+            rows, hidden = self._visible(index + 1, self.ends[index], expand_all)
+            loaded.extend(rows)
+            tasks = ','.join(self.task_json(row, "", hidden) for row in rows)
+            subtrees.append(f'{{"id":{encode(self.ids[index])},"level":{self.levels[index]},"tasks":[{tasks}]}}')
+
+        links = []
+        for row in loaded:
+            gantt_id = self.ids[row]
+            links.extend((predecessor, gantt_id, lag) for predecessor, lag in self.predecessors.get(gantt_id, ()))
+            links.extend((gantt_id, successor, lag) for successor, lag in self.successors.get(gantt_id, ()))
+        return f'{{"subtrees":[{",".join(subtrees)}],"links":{encode(sorted(set(links)))}}}'
+
+
+class GanttView:
+    """页面当前载入的可见任务，按页发送"""
+
+    def __init__(self, plan, rows, hidden):
+        self.plan = plan
+        self.rows = rows
+        self.hidden = hidden  # {位置: 未加载的子孙任务数}
+        self._row_numbers = {plan.ids[index]: number for number, index in enumerate(rows, start=1)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _depends(self, gantt_id):
+        """jQueryGantt 的依赖字符串：可见前置任务的行号（从1开始），有延迟时为“行号:延迟天数”"""
+        items = []
+        for predecessor, lag in self.plan.predecessors.get(gantt_id, ()):
+            number = self._row_numbers.get(predecessor)
+            if number is not None:
+                items.append(f"{number}:{lag}" if lag else str(number))
+        return ','.join(items)
+
+    def page(self, start, size=PAGE_SIZE):
+        """从第 start 个可见任务开始的一页，返回 {"start", "tasks"} 的 JSON 字符串"""
+        start = max(int(start), 0)
+        tasks = ','.join(self.plan.task_json(index, self._depends(self.plan.ids[index]), self.hidden)
+                         for index in self.rows[start:start + size])
+        return f'{{"start":{start},"tasks":[{tasks}]}}'
+
+
+def load_plan(session, project_id):
+    """读取项目的甘特图计划并编码各任务"""
+    tasks = GanttTask.__table__
+    rows = session.execute(
+        select(*(tasks.c[column] for column in _PAYLOAD_COLUMNS)).where(tasks.c.project_id == project_id).order_by(tasks.c.order, tasks.c.id)
+    ).all()
+    dependencies = GanttDependency.__table__
+    links = session.execute(
+        select(dependencies.c.predecessor_gantt_id, dependencies.c.successor_gantt_id, dependencies.c.lag)
+        .where(dependencies.c.project_id == project_id).order_by(dependencies.c.id)
+    ).all()
+
+    ids = [row.gantt_id for row in rows]
+    levels = [row.level or 0 for row in rows]
+    positions = {gantt_id: index for index, gantt_id in enumerate(ids)}
+    predecessors, successors = {}, {}
+    for predecessor, successor, lag in links:
+        if predecessor in positions and successor in positions:
+            predecessors.setdefault(successor, []).append((predecessor, lag or 0))
+            successors.setdefault(predecessor, []).append((successor, lag or 0))
+    return GanttPlan(
+        project_id=project_id,
+        ids=ids,
+        levels=levels,
+        collapsed=[bool(row.collapsed) for row in rows],
+        fragments=[_task_fragment(row) for row in rows],
+        ends=subtree_ends(levels),
+        predecessors=predecessors,
+        successors=successors,
+        positions=positions,
+    )
+
+
+class GanttPayloadCache:
+    """按项目缓存已编码的甘特图计划，容量有限，超出时淘汰最久未使用的项目"""
+
+    def __init__(self, max_projects=DEFAULT_MAX_PROJECTS):
+        self.max_projects = max_projects
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # 每次失效加一，读取期间发生失效时不缓存读取结果
+        self.hits = self.misses = 0
+
+    def get(self, sessions, project_id):
+        """返回项目的计划，未缓存时从数据库读取
+
+        Args:
+            sessions: 会话注册表
+            project_id: 项目ID
+        """
+        with self._lock:
+            plan = self._plans.get(project_id)
+            if plan is not None:
+                self._plans.move_to_end(project_id)
+                self.hits += 1
+                return plan
+            self.misses += 1
+            generation = self._generation
+        with sessions.read() as session:
+            plan = load_plan(session, project_id)
+        with self._lock:
+            if generation != self._generation:
+                return plan
+            self._plans[project_id] = plan
+            self._plans.move_to_end(project_id)
+            while len(self._plans) > self.max_projects:
+                self._plans.popitem(last=False)
+        return plan
+
+    def invalidate(self, project_id=None):
+        """使项目的缓存失效；project_id 为 None 时清空全部缓存"""
+        with self._lock:
+            self._generation += 1
+            if project_id is None:
+                self._plans.clear()
+            else:
+                self._plans.pop(project_id, None)
+
+    def __len__(self):
+        return len(self._plans)
+
+
+# 甘特图页面共用的计划缓存
+gantt_payload_cache = GanttPayloadCache()
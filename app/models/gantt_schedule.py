@@ -0,0 +1,428 @@
+"""
+甘特图进度计算（关键路径法）
+
+不依赖甘特图页面，在 Python 中按任务和依赖计算各任务的最早/最迟开始和完成日期、总时差、
+自由时差及关键路径，结果保存在 gantt_task_schedules 表中，首页和导出直接读取。
+
+- 日期按工作日计算（周六、周日休息，与 jQueryGantt 的 isHoliday 一致），工期和依赖延迟均为工作日；
+- 依赖类型 FS（完成-开始）、SS（开始-开始）、FF（完成-完成）、SF（开始-完成），未知类型按 FS 处理；
+- 计划中的开始日期作为“不早于”约束，任务只会因依赖推后，不会提前；
+- 父任务拆分为开始、完成两个节点：开始节点在所有子任务之前，完成节点在所有子任务之后，
+  指向父任务的依赖作用于相应的节点，依赖父任务即依赖其全部子任务；
+- 依赖图按拓扑排序一遍前推、一遍后推，复杂度 O(V+E)；存在循环依赖时抛出 ScheduleCycleError。
+
+compute_schedule() 只做计算；refresh_schedule() 读取项目的任务和依赖，计算并保存结果，
+保存甘特图后由 apply_gantt_changes() 调用。
+"""
+
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from sqlalchemy import Date, String, bindparam, select, type_coerce
+from .database import GanttDependency, GanttTask, GanttTaskSchedule
+
+logger = logging.getLogger(__name__)
+
+DEPENDENCY_TYPES = ('FS', 'SS', 'FF', 'SF')
+DEFAULT_DEPENDENCY_TYPE = 'FS'
+
+# TaskSchedule 中保存到 gantt_task_schedules 表的字段（gantt_id 之外）
+_RESULT_FIELDS = ('early_start', 'early_finish', 'late_start', 'late_finish', 'total_float', 'free_float',
+                  'is_critical', 'is_summary')
+
+_MONDAY = date(2024, 1, 1).toordinal()  # 任一周一，工作日序号的起点
+
+
+def to_workday(day):
+    """日期转换为工作日序号，周末转换为下一个工作日"""
+    weeks, weekday = divmod(day.toordinal() - _MONDAY, 7)
+    return weeks * 5 + min(weekday, 5)
+
+
+def from_workday(index):
+    """工作日序号转换为日期"""
+    weeks, weekday = divmod(index, 5)
+    return date.fromordinal(_MONDAY + weeks * 7 + weekday)
+
+
+class ScheduleCycleError(ValueError):
+    """依赖关系中存在循环"""
+
+    def __init__(self, cycle):
+        self.cycle = cycle  # 循环中的任务ID，按依赖方向排列
+        super().__init__(f"任务依赖存在循环: {' -> '.join(cycle + cycle[:1])}")
+
+
+@dataclass
+class ScheduleTask:
+    """参与计算的任务"""
+    gantt_id: str
+    level: int
+    start: date = None  # 计划开始日期，为空时按项目最早的开始日期
+    duration: int = None  # 工期（工作日），为空时按开始、结束日期计算
+
+
+@dataclass
+class TaskSchedule:
+    """任务的计算结果，完成日期为最后一个工作日"""
+    gantt_id: str
+    early_start: date
+    early_finish: date
+    late_start: date
+    late_finish: date
+    total_float: int
+    free_float: int
+    is_critical: bool
+    is_summary: bool
+
+
+@dataclass
+class Schedule:
+    """项目的计算结果"""
+    tasks: dict = field(default_factory=dict)  # {任务ID: TaskSchedule}，按任务顺序排列
+    finish: date = None  # 项目最早完成日期
+    critical_path: list = field(default_factory=list)  # 关键路径上的（非父）任务ID，按最早开始排列
+
+
+def _finish_date(start, finish):
+    """完成节点序号（不含）转换为最后一个工作日"""
+    return from_workday(max(finish - 1, start))
+
+
+def compute_schedule(tasks, dependencies):
+    """计算进度
+
+    Args:
+        tasks: 按 order 排列的 ScheduleTask（任务树的先序遍历，level 为深度）
+        dependencies: (前置任务ID, 后续任务ID, 依赖类型, 延迟工作日) 序列，引用不存在任务的依赖被忽略
+
+    Returns:
+        Schedule
+
+    Raises:
+        ScheduleCycleError: 依赖关系（含父子关系）中存在循环
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return Schedule()
+
+    # 1. 父子关系：每个任务的父任务为之前最近的层级更小的任务
+    parents = [None] * len(tasks)
+    is_summary = [False] * len(tasks)
+    stack = []
+    for index, task in enumerate(tasks):
+        while stack and tasks[stack[-1]].level >= task.level:
+            stack.pop()
+        if stack:
+            parents[index] = stack[-1]
+            is_summary[stack[-1]] = True
+        stack.append(index)
+
+    # 2. 节点：普通任务一个节点，父任务开始、完成两个零工期节点
+    starts = [to_workday(task.start) for task in tasks if task.start is not None]
+    project_start = min(starts) if starts else to_workday(date.today())
+    durations, lower_bounds, owners = [], [], []
+    start_node, finish_node = [0] * len(tasks), [0] * len(tasks)
+
+    def add_node(owner, duration, lower_bound):
+        durations.append(duration)
+        lower_bounds.append(lower_bound)
+        owners.append(owner)
+        return len(durations) - 1
+
+    for index, task in enumerate(tasks):
+        start = to_workday(task.start) if task.start is not None else project_start
+        if is_summary[index]:
+            start_node[index] = add_node(index, 0, start)
+            finish_node[index] = add_node(index, 0, project_start)
+        else:
+            duration = task.duration if task.duration is not None and task.duration >= 0 else 1
+            start_node[index] = finish_node[index] = add_node(index, duration, start)
+
+    # 3. 边 (后续节点, 类型, 延迟)
+    edges = [[] for _ in durations]
+    indegree = [0] * len(durations)
+
+    def add_edge(source, target, kind, lag):
+        edges[source].append((target, kind, lag))
+        indegree[target] += 1
+
+    for index in range(len(tasks)):
+        if is_summary[index]:
+            add_edge(start_node[index], finish_node[index], 'SS', 0)
+        parent = parents[index]
+        if parent is not None:
+            add_edge(start_node[parent], start_node[index], 'SS', 0)
+            add_edge(finish_node[index], finish_node[parent], 'FF', 0)
+
+    positions = {task.gantt_id: index for index, task in enumerate(tasks)}
+    for predecessor, successor, kind, lag in dependencies:
+        source, target = positions.get(predecessor), positions.get(successor)
+        if source is None or target is None or source == target:
+            continue
+        kind = kind if kind in DEPENDENCY_TYPES else DEFAULT_DEPENDENCY_TYPE
+        source = finish_node[source] if kind in ('FS', 'FF') else start_node[source]
+        target = start_node[target] if kind in ('FS', 'SS') else finish_node[target]
+        add_edge(source, target, kind, lag or 0)
+
+    # 4. 前推：按拓扑顺序计算最早开始
+    early_start = list(lower_bounds)
+    early_finish = [0] * len(durations)
+    order = []
+    remaining = list(indegree)
+    queue = deque(node for node, count in enumerate(remaining) if count == 0)
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        finish = early_finish[node] = early_start[node] + durations[node]
+        for target, kind, lag in edges[node]:
+            if kind == 'FS':
+                bound = finish + lag
+            elif kind == 'SS':
+                bound = early_start[node] + lag
+            elif kind == 'FF':
+                bound = finish + lag - durations[target]
+            else:  # SF
+                bound = early_start[node] + lag - durations[target]
+            if bound > early_start[target]:
+                early_start[target] = bound
+            remaining[target] -= 1
+            if remaining[target] == 0:
+                queue.append(target)
+    if len(order) < len(durations):
+        raise ScheduleCycleError(_find_cycle(edges, remaining, owners, tasks))
+
+    # 5. 后推：按拓扑逆序计算最迟完成和时差
+    project_finish = max(early_finish)
+    late_finish = [project_finish] * len(durations)
+    late_start = [0] * len(durations)
+    free_float = [0] * len(durations)
+    for node in reversed(order):
+        latest = project_finish
+        slack = project_finish - early_finish[node]
+        for target, kind, lag in edges[node]:
+            if kind == 'FS':
+                latest = min(latest, late_start[target] - lag)
+                slack = min(slack, early_start[target] - early_finish[node] - lag)
+            elif kind == 'SS':
+                latest = min(latest, late_start[target] - lag + durations[node])
+                slack = min(slack, early_start[target] - early_start[node] - lag)
+            elif kind == 'FF':
+                latest = min(latest, late_finish[target] - lag)
+                slack = min(slack, early_finish[target] - early_finish[node] - lag)
+            else:  # SF
+                latest = min(latest, late_finish[target] - lag + durations[node])
+                slack = min(slack, early_finish[target] - early_start[node] - lag)
+        late_finish[node] = latest
+        late_start[node] = latest - durations[node]
+        free_float[node] = max(slack, 0)
+
+    # 6. 汇总到任务
+    schedule = Schedule(finish=from_workday(max(project_finish - 1, project_start)))
+    for index, task in enumerate(tasks):
+        first, last = start_node[index], finish_node[index]
+        total_float = min(late_start[first] - early_start[first], late_start[last] - early_start[last])
+        schedule.tasks[task.gantt_id] = TaskSchedule(
+            gantt_id=task.gantt_id,
+            early_start=from_workday(early_start[first]),
+            early_finish=_finish_date(early_start[first], early_finish[last]),
+            late_start=from_workday(late_start[first]),
+            late_finish=_finish_date(late_start[first], late_finish[last]),
+            total_float=total_float,
+            free_float=free_float[last],
+            is_critical=total_float <= 0,
+            is_summary=is_summary[index],
+        )
+    critical = [index for index in range(len(tasks)) if not is_summary[index]
+                and schedule.tasks[tasks[index].gantt_id].is_critical]
+    critical.sort(key=lambda index: early_start[start_node[index]])
+    schedule.critical_path = [tasks[index].gantt_id for index in critical]
+    return schedule
+
+
+def _find_cycle(edges, remaining, owners, tasks):
+    """在拓扑排序未能处理的节点中找出一个循环，返回其中的任务ID
+
+    未处理的节点（remaining 大于 0）都至少有一个未处理的前置节点，沿前置节点回溯必然回到走过的节点。
+    """
+    predecessors = {}
+    for source, targets in enumerate(edges):
+        if remaining[source] > 0:
+            for target, _, _ in targets:
+                if remaining[target] > 0:
+                    predecessors.setdefault(target, source)
+    node = next(iter(predecessors))
+    visited = {}
+    path = []
+    while node not in visited:
+        visited[node] = len(path)
+        path.append(node)
+        node = predecessors[node]
+    gantt_ids = []
+    for node in reversed(path[visited[node]:]):
+        gantt_id = tasks[owners[node]].gantt_id
+        if gantt_id not in gantt_ids:
+            gantt_ids.append(gantt_id)
+    return gantt_ids
+
+
+def _raw(column):
+    """按数据库中保存的原始值读取列，不做类型转换"""
+    return type_coerce(column, String)
+
+
+def _workdays(start, end):
+    """开始、结束日期之间的工作日数（含两端）"""
+    return max(to_workday(end) - to_workday(start) + (0 if end.weekday() >= 5 else 1), 1)
+
+
+def load_schedule_inputs(bind, project_id):
+    """读取项目的任务和依赖
+
+    Args:
+        bind: 会话或连接
+
+    Returns:
+        (list[ScheduleTask], list[tuple]): 任务和依赖，格式见 compute_schedule
+    """
+    table = GanttTask.__table__
+    # 日期按数据库中的文本读取，只取日期部分，比逐行转换为 datetime 快得多
+    rows = bind.execute(
+        select(table.c.gantt_id, table.c.level, _raw(table.c.start_date), _raw(table.c.end_date), table.c.duration)
+        .where(table.c.project_id == project_id).order_by(table.c.order, table.c.id)
+    ).all()
+    tasks = []
+    for gantt_id, level, start, end, duration in rows:
+        start = date.fromisoformat(start[:10]) if start else None
+        if duration is None and start is not None and end:
+            duration = _workdays(start, date.fromisoformat(end[:10]))
+        tasks.append(ScheduleTask(gantt_id, level or 0, start, duration))
+    dependencies = GanttDependency.__table__
+    links = bind.execute(
+        select(dependencies.c.predecessor_gantt_id, dependencies.c.successor_gantt_id,
+               dependencies.c.type, dependencies.c.lag)
+        .where(dependencies.c.project_id == project_id).order_by(dependencies.c.id)
+    ).all()
+    return tasks, [tuple(link) for link in links]
+
+
+def _stored_values(task):
+    """计算结果在数据库中保存的原始值，顺序同 _RESULT_FIELDS"""
+    return (task.early_start.isoformat(), task.early_finish.isoformat(), task.late_start.isoformat(),
+            task.late_finish.isoformat(), task.total_float, task.free_float, int(task.is_critical),
+            int(task.is_summary))
+
+
+def refresh_schedule(bind, project_id):
+    """重新计算项目的进度并保存结果（在调用方的事务中执行）
+
+    只写入与已保存结果不同的任务，移动个别任务时不必重写整个项目的结果。
+
+    Args:
+        bind: 会话或连接
+        project_id: 项目ID
+
+    Returns:
+        Schedule
+
+    Raises:
+        ScheduleCycleError: 依赖存在循环，此时已删除该项目原有的计算结果
+    """
+    table = GanttTaskSchedule.__table__
+    try:
+        schedule = compute_schedule(*load_schedule_inputs(bind, project_id))
+    except ScheduleCycleError:
+        bind.execute(table.delete().where(table.c.project_id == project_id))
+        raise
+
+    # 已保存的结果同样按原始值读取（日期为 YYYY-MM-DD 文本，布尔值为 0/1）后比较
+    columns = [table.c[name] for name in _RESULT_FIELDS]
+    saved = {row[0]: tuple(row[1:]) for row in bind.execute(
+        select(table.c.gantt_id, *(_raw(column) if isinstance(column.type, Date) else column for column in columns))
+        .where(table.c.project_id == project_id)
+    )}
+    stale = [{'b_gantt_id': gantt_id} for gantt_id in saved.keys() - schedule.tasks.keys()]
+    inserted, updated = [], []
+    now = datetime.now()
+    for gantt_id, task in schedule.tasks.items():
+        previous = saved.get(gantt_id)
+        if previous == _stored_values(task):
+            continue
+        values = {name: getattr(task, name) for name in _RESULT_FIELDS}
+        values['calculated_at'] = now
+        if previous is None:
+            values['project_id'] = project_id
+            values['gantt_id'] = gantt_id
+            inserted.append(values)
+        else:
+            values['b_gantt_id'] = gantt_id
+            updated.append(values)
+
+    matches = (table.c.project_id == project_id) & (table.c.gantt_id == bindparam('b_gantt_id'))
+    if stale:
+        bind.execute(table.delete().where(matches), stale)
+    if updated:
+        bind.execute(table.update().where(matches).values({name: bindparam(name) for name in updated[0]
+                                                           if name != 'b_gantt_id'}), updated)
+    if inserted:
+        bind.execute(table.insert(), inserted)
+    return schedule
+
+
+def refresh_all_schedules(bind):
+    """重新计算全部项目的进度，返回 {项目ID: Schedule}，存在循环依赖的项目不在结果中"""
+    project_ids = bind.execute(select(GanttTask.__table__.c.project_id).distinct()).scalars().all()
+    schedules = {}
+    for project_id in project_ids:
+        try:
+            schedules[project_id] = refresh_schedule(bind, project_id)
+        except ScheduleCycleError as e:
+            logger.warning("项目 %s 的进度无法计算: %s", project_id, e)
+    return schedules
+
+
+def load_schedule(bind, project_id):
+    """读取已保存的计算结果，返回 {任务ID: TaskSchedule}"""
+    table = GanttTaskSchedule.__table__
+    rows = bind.execute(select(table).where(table.c.project_id == project_id)).mappings()
+    return {row['gantt_id']: TaskSchedule(**{name: row[name] for name in TaskSchedule.__dataclass_fields__})
+            for row in rows}
+
+
+@dataclass
+class CriticalPathSummary:
+    """项目关键路径概要"""
+    finish: date  # 项目最早完成日期
+    tasks: list  # 关键路径上的（非父）任务名称，按最早开始排列
+
+
+def load_critical_paths(bind, project_ids=None):
+    """读取各项目已保存的关键路径
+
+    Args:
+        bind: 会话或连接
+        project_ids: 项目ID列表，为 None 时读取全部项目
+
+    Returns:
+        dict: {项目ID: CriticalPathSummary}，没有计算结果的项目不在结果中
+    """
+    schedules = GanttTaskSchedule.__table__
+    tasks = GanttTask.__table__
+    statement = (
+        select(schedules.c.project_id, schedules.c.early_finish, schedules.c.is_critical,
+               schedules.c.is_summary, tasks.c.name)
+        .join(tasks, (tasks.c.project_id == schedules.c.project_id) & (tasks.c.gantt_id == schedules.c.gantt_id))
+        .order_by(schedules.c.project_id, schedules.c.early_start, tasks.c.order)
+    )
+    if project_ids is not None:
+        statement = statement.where(schedules.c.project_id.in_(list(project_ids)))
+    summaries = {}
+    for row in bind.execute(statement):
+        summary = summaries.get(row.project_id)
+        if summary is None:
+            summary = summaries[row.project_id] = CriticalPathSummary(row.early_finish, [])
+        summary.finish = max(summary.finish, row.early_finish)
+        if row.is_critical and not row.is_summary:
+            summary.tasks.append(row.name)
+    return summaries
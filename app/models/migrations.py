@@ -0,0 +1,300 @@
+"""
+数据库版本迁移
+
+schema_version 表记录已执行的迁移版本。启动时只需一次查询读取当前版本，
+结构已是最新时不再探测任何表；否则按版本号顺序执行尚未执行的迁移步骤，
+每个步骤连同版本记录在独立事务中提交，失败时整步回滚，下次启动从该步骤重试。
+
+新增迁移：编写 step(connection, progress) 函数并追加到 MIGRATIONS 末尾，版本号递增。
+步骤需保持幂等（新建数据库由 create_all 直接建成最新结构，也会依次执行全部步骤）。
+运行环境不满足步骤的条件时（如 SQLite 版本过低）步骤抛出 MigrationSkipped，版本记为已跳过，
+后续步骤照常执行。
+"""
+
+import logging
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from .database import GanttTaskSchedule, SchemaVersion, create_missing_indexes
+from .search import install_search_index, trigram_supported
+
+# 重建大表时每批复制的行数
+REBUILD_BATCH_SIZE = 5000
+
+
+def _columns(connection, table):
+    """返回表的 {列名: 类型}，表不存在时返回空字典"""
+    return {row[1]: row[2] for row in connection.execute(text(f'PRAGMA table_info("{table}")'))}
+
+
+def _add_missing_columns(connection, table, columns, progress):
+    """为表补充缺失的列
+
+    Args:
+        columns: {列名: 列定义}，列定义为 ALTER TABLE ADD COLUMN 中列名之后的部分
+    """
+    existing = _columns(connection, table)
+    if not existing:
+        return
+    for name, definition in columns.items():
+        if name not in existing:
+            connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{name}" {definition}'))
+            progress(f"成功添加 {name} 列到 {table} 表")
+
+
+def rebuild_table(connection, table, create_sql, target_columns, source_columns, progress, batch_size=REBUILD_BATCH_SIZE):
+    """按新结构重建表，分批复制数据并报告进度
+
+    在调用方的事务中执行：先按 create_sql 创建临时表 {table}_new，按主键顺序分批复制数据，
+    再删除原表并将临时表改名。
+
+    Args:
+        connection: 数据库连接
+        table: 表名
+        create_sql: 创建临时表的语句，表名须为 {table}_new
+        target_columns: 临时表中接收数据的列
+        source_columns: 原表中对应的列或表达式
+        progress: 进度回调，接收一条文字消息
+        batch_size: 每批复制的行数
+    """
+    total = connection.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar() or 0
+    connection.execute(text(f'DROP TABLE IF EXISTS "{table}_new"'))
+    connection.execute(text(create_sql))
+
+    insert_sql = text(
+        f'INSERT INTO "{table}_new" ({", ".join(target_columns)}) '
+        f'SELECT {", ".join(source_columns)} FROM "{table}" WHERE id > :last_id ORDER BY id LIMIT :limit'
+    )
+    last_id = -1
+    copied = 0
+    while True:
+        result = connection.execute(insert_sql, {"last_id": last_id, "limit": batch_size})
+        if result.rowcount <= 0:
+            break
+        copied += result.rowcount
+        last_id = connection.execute(text(f'SELECT MAX(id) FROM "{table}_new"')).scalar()
+        progress(f"重建 {table} 表: {copied}/{total}")
+
+    connection.execute(text(f'DROP TABLE "{table}"'))
+    connection.execute(text(f'ALTER TABLE "{table}_new" RENAME TO "{table}"'))
+
+
+def _migrate_gantt_task_columns(connection, progress):
+    """甘特图任务增加负责人、排序字段"""
+    _add_missing_columns(connection, 'gantt_tasks', {
+        'responsible': 'VARCHAR(50)',
+        'order': 'INTEGER DEFAULT 0',
+    }, progress)
+
+
+def _migrate_project_director(connection, progress):
+    """项目增加负责人字段"""
+    _add_missing_columns(connection, 'projects', {'director': 'VARCHAR(50)'}, progress)
+
+
+def _migrate_expense_voucher(connection, progress):
+    """支出增加凭证路径字段（新增列在末尾，直接 ADD COLUMN 即可，无需重建表）"""
+    _add_missing_columns(connection, 'expenses', {'voucher_path': 'VARCHAR(500)'}, progress)
+
+
+def _migrate_actionlog_columns(connection, progress):
+    """操作记录增加变更详情和任务/文档/成果关联字段，并将 timestamp 修正为 DATETIME 类型"""
+    columns = _columns(connection, 'actionlogs')
+    if not columns:
+        return
+    new_columns = ('old_data', 'new_data', 'category', 'amount', 'related_info',
+                   'gantt_task_id', 'project_document_id', 'project_outcome_id')
+    if columns.get('timestamp', 'DATETIME') == 'DATETIME' and all(name in columns for name in new_columns):
+        return
+
+    rebuild_table(
+        connection, 'actionlogs',
+        """
+        CREATE TABLE actionlogs_new (
+            id INTEGER PRIMARY KEY,
+            project_id INTEGER,
+            budget_id INTEGER,
+            expense_id INTEGER,
+            gantt_task_id INTEGER,
+            project_document_id INTEGER,
+            project_outcome_id INTEGER,
+            type VARCHAR(50) NOT NULL,
+            action VARCHAR(50) NOT NULL,
+            description VARCHAR(200) NOT NULL,
+            operator VARCHAR(50) NOT NULL,
+            timestamp DATETIME,
+            old_data VARCHAR(500),
+            new_data VARCHAR(500),
+            category VARCHAR(50),
+            amount FLOAT,
+            related_info VARCHAR(200),
+            FOREIGN KEY(project_id) REFERENCES projects (id),
+            FOREIGN KEY(budget_id) REFERENCES budgets (id),
+            FOREIGN KEY(expense_id) REFERENCES expenses (id),
+            FOREIGN KEY(gantt_task_id) REFERENCES gantt_tasks (id),
+            FOREIGN KEY(project_document_id) REFERENCES project_documents (id),
+            FOREIGN KEY(project_outcome_id) REFERENCES project_outcome (id)
+        )
+        """,
+        ['id', 'project_id', 'budget_id', 'expense_id', 'type', 'action', 'description', 'operator', 'timestamp',
+         'old_data', 'new_data', 'category', 'amount', 'related_info',
+         'gantt_task_id', 'project_document_id', 'project_outcome_id'],
+        ['id', 'project_id', 'budget_id', 'expense_id', 'type', 'action', 'description', 'operator', 'datetime(timestamp)'] +
+        [name if name in columns else 'NULL' for name in new_columns],
+        progress,
+    )
+    progress("成功更新 actionlogs 表结构")
+
+
+def _migrate_outcome_columns(connection, progress):
+    """项目成果增加投稿日期、附件路径字段"""
+    _add_missing_columns(connection, 'project_outcome', {
+        'submit_date': 'DATE',
+        'attachment_path': 'VARCHAR(500)',
+    }, progress)
+
+
+def _migrate_budget_plan_item_columns(connection, progress):
+    """预算编制明细补齐树形结构及明细字段"""
+    _add_missing_columns(connection, 'budget_plan_items', {
+        'plan_id': 'INTEGER',
+        'parent_id': 'INTEGER',
+        'category': 'TEXT',
+        'name': 'TEXT',
+        'specification': 'TEXT',
+        'unit_price': 'FLOAT',
+        'quantity': 'INTEGER',
+        'amount': 'FLOAT',
+        'remarks': 'TEXT',
+    }, progress)
+
+
+def _migrate_budget_plan_item_position(connection, progress):
+    """预算编制明细增加同级排序字段"""
+    _add_missing_columns(connection, 'budget_plan_items', {'position': 'INTEGER'}, progress)
+
+
+def _migrate_hot_indexes(connection, progress):
+    """补建热点查询索引"""
+    created = create_missing_indexes(connection)
+    if created:
+        progress(f"成功创建索引: {', '.join(created)}")
+
+
+class MigrationSkipped(Exception):
+    """迁移步骤因运行环境不满足条件而跳过，版本照常记录，后续步骤继续执行"""
+
+
+def _migrate_search_index(connection, progress):
+    """创建全文索引及同步触发器，并为已有数据建立索引
+
+    SQLite 不支持 trigram 分词器（3.34 以下）时跳过，检索和筛选使用 LIKE 查询。
+    """
+    if not trigram_supported():
+        raise MigrationSkipped(f"SQLite {sqlite3.sqlite_version} 不支持 FTS5 trigram 分词器")
+    install_search_index(connection, rebuild=True)
+    progress("成功创建全文索引")
+
+
+def _migrate_gantt_dependency_lag(connection, progress):
+    """甘特图依赖增加延迟字段"""
+    _add_missing_columns(connection, 'gantt_dependencies', {'lag': 'INTEGER DEFAULT 0'}, progress)
+
+
+def _migrate_gantt_task_schedules(connection, progress):
+    """创建甘特图进度计算结果表，并计算已有项目的关键路径"""
+    from .gantt_schedule import refresh_all_schedules
+    GanttTaskSchedule.__table__.create(connection, checkfirst=True)
+    schedules = refresh_all_schedules(connection)
+    progress(f"成功计算 {len(schedules)} 个项目的关键路径")
+
+
+# (版本号, 说明, 迁移函数)，按版本号递增排列
+MIGRATIONS = [
+    (1, "甘特图任务增加负责人、排序字段", _migrate_gantt_task_columns),
+    (2, "项目增加负责人字段", _migrate_project_director),
+    (3, "支出增加凭证路径字段", _migrate_expense_voucher),
+    (4, "操作记录增加变更详情及关联字段", _migrate_actionlog_columns),
+    (5, "项目成果增加投稿日期、附件路径字段", _migrate_outcome_columns),
+    (6, "预算编制明细补齐字段", _migrate_budget_plan_item_columns),
+    (7, "创建热点查询索引", _migrate_hot_indexes),
+    (8, "创建全文索引", _migrate_search_index),
+    (9, "创建附件路径索引", _migrate_hot_indexes),
+    (10, "甘特图依赖增加延迟字段", _migrate_gantt_dependency_lag),
+    (11, "创建甘特图进度计算结果表", _migrate_gantt_task_schedules),
+    (12, "预算编制明细增加排序字段", _migrate_budget_plan_item_position),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+@contextmanager
+def _step_transaction(engine):
+    """迁移步骤事务
+
+    pysqlite 默认不会在 DDL 语句前开启事务，这里切换到自动提交模式并显式
+    BEGIN/COMMIT，使 ALTER TABLE、建表、复制数据和版本记录作为整体提交或回滚。
+    """
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+
+def get_schema_version(engine):
+    """读取当前数据库结构版本，尚未记录版本时返回 0"""
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except OperationalError:
+        # 版本表不存在（未经 create_all 的旧数据库）
+        SchemaVersion.__table__.create(engine, checkfirst=True)
+        return 0
+
+
+def _record_version(connection, version, description):
+    connection.execute(
+        SchemaVersion.__table__.insert(),
+        {"version": version, "description": description, "applied_at": datetime.now()}
+    )
+
+
+def run_migrations(engine, progress=None):
+    """执行尚未执行的迁移步骤
+
+    Args:
+        engine: 数据库引擎
+        progress: 进度回调，接收一条文字消息，默认写入日志
+
+    Returns:
+        int: 迁移后的结构版本
+
+    Raises:
+        Exception: 某一步骤失败时抛出，该步骤已回滚，之前的步骤保持已提交
+    """
+    progress = progress or logging.info
+    current = get_schema_version(engine)
+    if current >= LATEST_VERSION:
+        return current
+
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        progress(f"执行数据库迁移 {version}: {description}")
+        try:
+            with _step_transaction(engine) as connection:
+                step(connection, progress)
+                _record_version(connection, version, description)
+        except MigrationSkipped as e:
+            progress(f"跳过数据库迁移 {version}: {e}")
+            with _step_transaction(engine) as connection:
+                _record_version(connection, version, f"{description}（已跳过：{e}）")
+        current = version
+    return current
@@ -0,0 +1,326 @@
+"""
+全文检索模块
+
+在 SQLite FTS5 虚拟表 search_index 中为支出、项目文档、项目成果和学术活动建立统一的
+全文索引，使用 trigram 分词器（按连续三个字符切分，适用于中文等无空格分词的文本）。
+索引由各源表上的触发器在新增、修改、删除时同步维护。
+
+索引行的 rowid 由 源记录ID × 来源数 + 来源编号 计算得到，触发器按 rowid 直接定位，
+无需扫描索引表。
+
+trigram 分词器需要 SQLite 3.34 及以上版本。不支持时不创建索引表，检索和筛选改为在各
+源表上逐列 LIKE 查询。
+"""
+
+import logging
+import sqlite3
+import weakref
+from functools import lru_cache
+from dataclasses import dataclass
+from sqlalchemy import text, column, Integer
+from sqlalchemy.exc import OperationalError
+
+SEARCH_TABLE = 'search_index'
+
+# 检索来源：{实体名: 配置}
+# code: rowid 中的来源编号；title: 标题列；body: 拼接为正文的列
+SEARCH_SOURCES = {
+    'expense': {
+        'label': '支出',
+        'table': 'expenses',
+        'code': 0,
+        'title': 'content',
+        'body': ['specification', 'supplier', 'remarks'],
+        'project_column': 'project_id',
+    },
+    'document': {
+        'label': '项目文档',
+        'table': 'project_documents',
+        'code': 1,
+        'title': 'name',
+        'body': ['description', 'keywords'],
+        'project_column': 'project_id',
+    },
+    'outcome': {
+        'label': '项目成果',
+        'table': 'project_outcome',
+        'code': 2,
+        'title': 'name',
+        'body': ['authors', 'journal', 'description'],
+        'project_column': 'project_id',
+    },
+    'activity': {
+        'label': '学术活动',
+        'table': 'academic_activities',
+        'code': 3,
+        'title': 'name',
+        'body': ['description', 'participants', 'location'],
+        'project_column': None,
+    },
+}
+SOURCE_COUNT = len(SEARCH_SOURCES)
+
+# trigram 分词器下，少于 3 个字符的检索词无法使用 MATCH，改用 LIKE
+MIN_MATCH_LENGTH = 3
+
+
+@dataclass
+class SearchHit:
+    """一条检索结果"""
+    entity: str  # 实体名，见 SEARCH_SOURCES
+    entity_id: int  # 源记录ID
+    project_id: int  # 所属项目ID，学术活动为 None
+    title: str  # 标题
+    snippet: str  # 带高亮标记的匹配片段
+    score: float  # 相关度，越小越相关（bm25），LIKE 检索时为 0
+
+    @property
+    def label(self):
+        return SEARCH_SOURCES[self.entity]['label']
+
+
+def entity_for_table(table_name):
+    """返回数据表对应的实体名，未建立索引的表返回 None"""
+    for entity, source in SEARCH_SOURCES.items():
+        if source['table'] == table_name:
+            return entity
+    return None
+
+
+def indexed_columns(entity):
+    """返回实体参与全文索引的列名集合"""
+    source = SEARCH_SOURCES[entity]
+    return {source['title'], *source['body']}
+
+
+def _row_values(source, prefix):
+    """触发器中写入索引行的各列表达式"""
+    rowid = f"{prefix}.id * {SOURCE_COUNT} + {source['code']}"
+    project = f"{prefix}.{source['project_column']}" if source['project_column'] else "NULL"
+    body = " || ' ' || ".join(f"COALESCE({prefix}.{column}, '')" for column in source['body'])
+    return rowid, project, f"COALESCE({prefix}.{source['title']}, '')", body
+
+
+def _trigger_statements(entity, source):
+    """生成某一来源表的同步触发器"""
+    table = source['table']
+    rowid, project, title, body = _row_values(source, 'new')
+    old_rowid = _row_values(source, 'old')[0]
+    insert = (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, entity, entity_id, project_id, title, body) "
+        f"VALUES ({rowid}, '{entity}', new.id, {project}, {title}, {body});"
+    )
+    delete = f"DELETE FROM {SEARCH_TABLE} WHERE rowid = {old_rowid};"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+    ]
+
+
+def _existing_tables(connection):
+    return {row[0] for row in connection.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))}
+
+
+@lru_cache(maxsize=None)
+def trigram_supported():
+    """当前 SQLite 是否支持 FTS5 及 trigram 分词器
+
+    在内存数据库中尝试创建一张使用 trigram 分词器的 FTS5 表，结果在进程内缓存。
+    """
+    probe = sqlite3.connect(':memory:')
+    try:
+        probe.execute("CREATE VIRTUAL TABLE probe USING fts5(body, tokenize = 'trigram')")
+        return True
+    except sqlite3.OperationalError as e:
+        logging.warning(f"SQLite {sqlite3.sqlite_version} 不支持 FTS5 trigram 分词器: {e}")
+        return False
+    finally:
+        probe.close()
+
+
+def install_search_index(connection, rebuild=True):
+    """创建全文索引表及同步触发器
+
+    Args:
+        connection: 数据库连接，在调用方的事务中执行
+        rebuild: 是否按源表现有数据重建索引
+    """
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "entity UNINDEXED, entity_id UNINDEXED, project_id UNINDEXED, title, body, "
+        "tokenize = 'trigram')"
+    ))
+    tables = _existing_tables(connection)
+    for entity, source in SEARCH_SOURCES.items():
+        if source['table'] in tables:
+            for ddl in _trigger_statements(entity, source):
+                connection.execute(text(ddl))
+    if rebuild:
+        rebuild_search_index(connection)
+    _availability[connection.engine] = True
+
+
+def rebuild_search_index(connection):
+    """清空并按源表重建全文索引"""
+    connection.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    tables = _existing_tables(connection)
+    for entity, source in SEARCH_SOURCES.items():
+        if source['table'] not in tables:
+            continue
+        rowid, project, title, body = _row_values(source, 'src')
+        connection.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, entity, entity_id, project_id, title, body) "
+            f"SELECT {rowid}, '{entity}', src.id, {project}, {title}, {body} FROM {source['table']} AS src"
+        ))
+
+
+_availability = weakref.WeakKeyDictionary()
+
+
+def search_available(bind):
+    """全文索引是否可用（索引表已创建），按引擎缓存结果
+
+    Args:
+        bind: Session、Connection 或 Engine
+    """
+    engine = bind.get_bind() if hasattr(bind, 'get_bind') else getattr(bind, 'engine', bind)
+    if engine not in _availability:
+        with engine.connect() as connection:
+            _availability[engine] = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": SEARCH_TABLE}
+            ).first() is not None
+    return _availability[engine]
+
+
+def _terms(keyword):
+    return [term for term in (keyword or '').split() if term]
+
+
+def _like_clause(terms, params, title='title', body='body'):
+    """逐词生成标题或正文 LIKE 检索词的条件，各词之间为 AND"""
+    conditions = []
+    for i, term in enumerate(terms):
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        params[f'like_{i}'] = f'%{escaped}%'
+        conditions.append(f"({title} LIKE :like_{i} ESCAPE '\\' OR {body} LIKE :like_{i} ESCAPE '\\')")
+    return ' AND '.join(conditions)
+
+
+def _where_clause(terms, params):
+    """按检索词生成 search_index 上的过滤条件
+
+    所有检索词长度均不少于 3 个字符时使用 MATCH（可按相关度排序），否则逐词使用 LIKE。
+
+    Args:
+        terms: 检索词列表，需同时匹配；每个词按连续的字符串匹配
+
+    Returns:
+        (条件 SQL, 是否使用 MATCH)
+    """
+    if all(len(term) >= MIN_MATCH_LENGTH for term in terms):
+        params['match'] = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+        return f"{SEARCH_TABLE} MATCH :match", True
+    return _like_clause(terms, params), False
+
+
+def matching_ids_sql(entity, keyword):
+    """返回查询某一实体中匹配记录ID的子查询，供拼接到源表查询的 IN 条件中
+
+    关键词整体作为一个连续的字符串匹配（不按空格拆分），与筛选时逐列包含关键词的语义一致。
+    索引中各列拼接为一段文本，结果是逐列匹配结果的超集，调用方仍需保留逐列条件。
+
+    Returns:
+        TextualSelect: 绑定好参数的 SELECT entity_id 语句，可直接用于 Model.id.in_(...)
+    """
+    params = {'entity': entity}
+    where, _ = _where_clause([keyword] if keyword else [], params)
+    return text(
+        f"SELECT entity_id FROM {SEARCH_TABLE} WHERE {where} AND entity = :entity"
+    ).bindparams(**params).columns(column('entity_id', Integer))
+
+
+def _search_sources(session, terms, entities, project_id, limit):
+    """未建立全文索引时在各源表上逐词 LIKE 检索，结果按记录ID倒序"""
+    params = {'limit': limit}
+    tables = _existing_tables(session)
+    selects = []
+    for entity, source in SEARCH_SOURCES.items():
+        if (entities and entity not in entities) or source['table'] not in tables:
+            continue
+        if project_id is not None and not source['project_column']:
+            continue
+        _, project, title, body = _row_values(source, 'src')
+        where = _like_clause(terms, params, title, body)
+        if project_id is not None:
+            params['project_id'] = project_id
+            where += f" AND {project} = :project_id"
+        selects.append(
+            f"SELECT '{entity}' AS entity, src.id AS entity_id, {project} AS project_id, "
+            f"{title} AS title, {body} AS body FROM {source['table']} AS src WHERE {where}"
+        )
+    if not selects:
+        return []
+
+    rows = session.execute(text(
+        f"SELECT entity, entity_id, project_id, title, trim(substr(title || ' ' || body, 1, 48)) "
+        f"FROM ({' UNION ALL '.join(selects)}) ORDER BY entity_id DESC LIMIT :limit"
+    ), params).fetchall()
+    return [
+        SearchHit(entity=row[0], entity_id=row[1], project_id=row[2], title=row[3], snippet=row[4], score=0)
+        for row in rows
+    ]
+
+
+def search(session, keyword, entities=None, project_id=None, limit=50, highlight=('<b>', '</b>')):
+    """全文检索
+
+    Args:
+        session: SQLAlchemy session 或 connection
+        keyword: 检索词，多个词以空格分隔（需同时匹配）
+        entities: 限定的实体名列表，为 None 时检索全部来源
+        project_id: 限定的项目ID
+        limit: 最多返回的条数
+        highlight: 匹配片段中高亮标记的起止字符串
+
+    Returns:
+        list[SearchHit]: 按相关度排序的检索结果；未建立全文索引时在源表上 LIKE 检索，不排序
+    """
+    if not _terms(keyword):
+        return []
+    if not search_available(session):
+        return _search_sources(session, _terms(keyword), entities, project_id, limit)
+
+    params = {'limit': limit, 'open': highlight[0], 'close': highlight[1]}
+    where, use_match = _where_clause(_terms(keyword), params)
+    if entities:
+        names = []
+        for i, entity in enumerate(entities):
+            params[f'entity_{i}'] = entity
+            names.append(f':entity_{i}')
+        where += f" AND entity IN ({', '.join(names)})"
+    if project_id is not None:
+        params['project_id'] = project_id
+        where += " AND project_id = :project_id"
+
+    if use_match:
+        columns = f"snippet({SEARCH_TABLE}, -1, :open, :close, '…', 16), bm25({SEARCH_TABLE}, 0, 0, 0, 10.0, 1.0)"
+        order = "ORDER BY 7"
+    else:
+        # LIKE 检索不支持 snippet，返回正文开头并且不排序
+        columns = "trim(substr(title || ' ' || body, 1, 48)), 0"
+        order = "ORDER BY rowid DESC"
+
+    try:
+        rows = session.execute(text(
+            f"SELECT entity, entity_id, project_id, title, body, {columns} FROM {SEARCH_TABLE} "
+            f"WHERE {where} {order} LIMIT :limit"
+        ), params).fetchall()
+    except OperationalError as e:
+        logging.warning(f"全文检索失败: {e}")
+        return []
+
+    return [
+        SearchHit(entity=row[0], entity_id=row[1], project_id=row[2], title=row[3], snippet=row[5], score=row[6])
+        for row in rows
+    ]
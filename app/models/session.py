@@ -0,0 +1,96 @@
+"""
+应用级数据库会话管理
+
+SessionRegistry 在 run.py 中随引擎创建一次，由主窗口传递给各界面，替代各方法中
+临时构造的 sessionmaker(bind=engine)：
+
+    session = self.sessions()                  # 手动管理的会话，用法同 sessionmaker()()
+
+    with self.sessions.unit_of_work() as session:
+        ...                                    # 正常结束时提交，异常时回滚，最后关闭
+
+    with self.sessions.read() as session:
+        ...                                    # 只读，不提交
+
+同一线程内嵌套的工作单元会加入外层工作单元，共用一个会话（及其标识映射），
+由最外层负责提交和关闭。
+"""
+
+import threading
+import weakref
+from contextlib import contextmanager
+from sqlalchemy.orm import sessionmaker
+
+
+class SessionRegistry:
+    """数据库会话注册表"""
+
+    # {引擎: 注册表}，供未经注入的旧代码按引擎取回同一个注册表
+    _registries = weakref.WeakKeyDictionary()
+
+    def __init__(self, engine, expire_on_commit=False, autoflush=True):
+        """
+        Args:
+            engine: 数据库引擎
+            expire_on_commit: 提交后是否使已加载对象过期。界面在提交后仍会读取对象显示，
+                默认不过期，避免会话关闭后访问属性出错及重复加载
+            autoflush: 查询前是否自动 flush 未提交的修改
+        """
+        self.engine = engine
+        self.factory = sessionmaker(bind=engine, expire_on_commit=expire_on_commit, autoflush=autoflush)
+        self._local = threading.local()
+        SessionRegistry._registries[engine] = self
+
+    @classmethod
+    def for_engine(cls, engine):
+        """返回引擎对应的注册表，不存在时创建"""
+        registry = cls._registries.get(engine)
+        if registry is None:
+            registry = cls(engine)
+        return registry
+
+    def __call__(self, **options):
+        """创建一个新会话，由调用方负责关闭
+
+        Args:
+            **options: 覆盖默认配置，如 expire_on_commit、autoflush
+        """
+        return self.factory(**options)
+
+    @property
+    def current(self):
+        """当前线程中进行中的工作单元会话，没有时为 None"""
+        return getattr(self._local, 'session', None)
+
+    @contextmanager
+    def unit_of_work(self, commit=True, **options):
+        """工作单元
+
+        Args:
+            commit: 正常结束时是否提交
+            **options: 覆盖默认的会话配置（仅对最外层工作单元生效）
+
+        Yields:
+            Session: 数据库会话
+        """
+        outer = self.current
+        if outer is not None:
+            yield outer
+            return
+
+        session = self.factory(**options)
+        self._local.session = session
+        try:
+            yield session
+            if commit:
+                session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            self._local.session = None
+            session.close()
+
+    def read(self, **options):
+        """只读工作单元，结束时不提交"""
+        return self.unit_of_work(commit=False, **options)
@@ -0,0 +1,142 @@
+"""
+附件路径缓存
+
+附件上传、替换或删除后，表格中的按钮立即显示新路径，而界面持有的记录快照要到下次加载
+才会更新。attachment_path_cache 记录这些变更：键为 (item_type, item_id)，值为最新的附件路径，
+按键查询时优先于记录中的路径。
+
+- 容量有限，超出 max_entries 时淘汰最久未使用的项；
+- 通过 track() 登记的模型在 ORM 插入、更新附件路径列、删除时自动失效对应的项
+  （SQLite 会复用已删除行的ID，插入时同样需要失效），批量 update/delete 语句失效该类型的全部项；
+- stats() 返回命中、未命中、淘汰和失效次数。
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from ..models.database import Expense
+
+# 默认最多缓存的条目数
+DEFAULT_MAX_ENTRIES = 4096
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """缓存统计"""
+    hits: int
+    misses: int
+    evictions: int  # 因超出容量被淘汰的条目数
+    invalidations: int  # 因记录变更被失效的条目数
+    size: int
+    max_entries: int
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class AttachmentPathCache:
+    """有界、随记录变更失效的附件路径缓存，可在多个线程中使用"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._tracked = {}  # {模型类: item_type}
+        self._listening = False
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def resolve(self, item_type, item_id, default=None):
+        """返回记录的最新附件路径：缓存中有变更时返回缓存的路径，否则返回 default（记录中的路径）"""
+        key = (item_type, item_id)
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, item_type, item_id, path):
+        """记录附件变更后的路径（删除附件时为 None）"""
+        key = (item_type, item_id)
+        with self._lock:
+            self._entries[key] = path
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, item_type, item_id=None):
+        """失效某条记录的缓存；item_id 为 None 时失效该类型的全部记录"""
+        with self._lock:
+            if item_id is not None:
+                if self._entries.pop((item_type, item_id), _MISSING) is not _MISSING:
+                    self.invalidations += 1
+                return
+            keys = [key for key in self._entries if key[0] == item_type]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, self.invalidations,
+                              len(self._entries), self.max_entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- ORM 失效钩子 ---
+
+    def track(self, model, item_type, attribute):
+        """登记保存附件路径的模型，记录插入、附件路径变更或删除时失效对应的缓存项
+
+        Args:
+            model: ORM 模型类
+            item_type: 附件按钮使用的记录类型，如 'expense'、'document'
+            attribute: 附件路径属性名
+        """
+        if model in self._tracked:
+            return
+        self._tracked[model] = item_type
+
+        def invalidate_row(mapper, connection, target):
+            self.invalidate(item_type, target.id)
+
+        def invalidate_if_changed(mapper, connection, target):
+            if inspect(target).attrs[attribute].history.has_changes():
+                self.invalidate(item_type, target.id)
+
+        event.listen(model, 'after_insert', invalidate_row)
+        event.listen(model, 'after_update', invalidate_if_changed)
+        event.listen(model, 'after_delete', invalidate_row)
+
+        if not self._listening:
+            event.listen(Session, 'do_orm_execute', self._on_orm_execute)
+            self._listening = True
+
+    def _on_orm_execute(self, orm_execute_state):
+        """批量 update/delete 语句不经过逐行事件，失效该类型的全部项"""
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        mapper = orm_execute_state.bind_mapper
+        item_type = self._tracked.get(mapper.class_) if mapper is not None else None
+        if item_type is not None:
+            self.invalidate(item_type)
+
+
+# 应用共用的附件路径缓存。视图模块中定义的模型（文档、成果、学术活动）在各自模块中登记
+attachment_path_cache = AttachmentPathCache()
+attachment_path_cache.track(Expense, 'expense', 'voucher_path')
@@ -0,0 +1,353 @@
+"""
+内容寻址附件存储
+
+凭证、文档、成果和活动附件按内容的 SHA-256 保存，相同内容只保存一份：
+
+    attachment_store/<哈希前两位>/<哈希>/<首次保存时的文件名>
+
+同一张发票被多条支出或多个项目引用时共用一个文件；文件名不同的两个文件也不会互相覆盖。
+
+引用计数不单独保存：ATTACHMENT_COLUMNS 中各列指向某一路径的行数即该文件的引用数。
+记录删除或改指其他文件并提交后调用 release()，已无引用的文件随即删除；
+collect_garbage() 清理存储中没有任何引用的文件（如保存后未提交即退出留下的文件）；
+migrate_legacy_attachments() 将旧版按项目目录保存的附件一次性迁入存储。
+
+命令行：
+    python -m app.utils.attachment_store migrate   # 迁移旧附件
+    python -m app.utils.attachment_store gc        # 清理无引用的文件
+"""
+
+import hashlib
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.orm import Session
+from .attachment_utils import ROOT_DIR, sanitize_filename, ensure_directory_exists
+from .attachment_cache import attachment_path_cache
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = os.path.join(ROOT_DIR, 'attachment_store')
+_TEMP_DIR = os.path.join(STORE_DIR, '.tmp')
+
+# 引用附件文件的 (表名, 列名)
+ATTACHMENT_COLUMNS = [
+    ('expenses', 'voucher_path'),
+    ('project_documents', 'file_path'),
+    ('project_outcome', 'attachment_path'),
+    ('academic_activities', 'attachment_path'),
+]
+
+# 写入后多久之内的无引用文件不被垃圾回收（秒），保护保存后尚未提交引用的文件
+GC_GRACE_SECONDS = 3600
+
+# 迁移时每个事务处理的旧路径数
+MIGRATION_BATCH_SIZE = 200
+
+_COPY_BUFFER_SIZE = 1024 * 1024
+_IN_CHUNK_SIZE = 500  # 每条 IN 查询的参数个数
+
+
+@dataclass
+class MigrationResult:
+    """旧附件迁移结果"""
+    migrated: int = 0  # 改为指向存储的旧路径数
+    blobs: int = 0  # 这些路径对应的存储文件数（内容相同的合并为一个）
+    missing: int = 0  # 记录中存在但文件已不存在的路径数
+    skipped: int = 0  # 无法读取或复制而跳过的路径数，下次迁移时重试
+
+
+def _normalize(path):
+    return os.path.normpath(os.path.abspath(path))
+
+
+def _is_under(path, directory):
+    return _normalize(path).startswith(directory + os.sep)
+
+
+def is_stored(path):
+    """路径是否位于附件存储中"""
+    return bool(path) and _is_under(path, STORE_DIR)
+
+
+def _blob_in(directory):
+    """返回哈希目录中保存的文件，不存在时返回 None"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return None
+    return os.path.join(directory, names[0]) if names else None
+
+
+def _copy_with_digest(source_path, target_path):
+    """复制文件并计算内容的 SHA-256，只读取一遍源文件"""
+    digest = hashlib.sha256()
+    with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+        while True:
+            chunk = source.read(_COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            target.write(chunk)
+    return digest.hexdigest()
+
+
+def store_file(source_path):
+    """将文件保存到附件存储
+
+    内容相同的文件已存在时直接返回已有文件（保留其首次保存时的文件名），不再复制。
+
+    Args:
+        source_path: 要保存的文件
+
+    Returns:
+        str: 存储中的文件路径，写入记录的附件路径列
+
+    Raises:
+        OSError: 读取或写入文件失败
+    """
+    if is_stored(source_path) and os.path.isfile(source_path):
+        return _normalize(source_path)
+
+    ensure_directory_exists(_TEMP_DIR)
+    temp_path = os.path.join(_TEMP_DIR, uuid.uuid4().hex)
+    try:
+        digest = _copy_with_digest(source_path, temp_path)
+        directory = os.path.join(STORE_DIR, digest[:2], digest)
+        existing = _blob_in(directory)
+        if existing:
+            os.utime(existing)  # 刷新修改时间，避免引用提交前被垃圾回收
+            return existing
+        ensure_directory_exists(directory)
+        name = sanitize_filename(os.path.basename(source_path)) or digest
+        target_path = os.path.join(directory, name)
+        os.replace(temp_path, target_path)
+        return target_path
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _connection(bind):
+    return bind.connection() if isinstance(bind, Session) else bind
+
+
+def _attachment_columns(bind):
+    """数据库中实际存在的附件路径列"""
+    tables = set(inspect(_connection(bind)).get_table_names())
+    return [(table, column) for table, column in ATTACHMENT_COLUMNS if table in tables]
+
+
+def reference_counts(bind, paths):
+    """统计各路径被记录引用的次数
+
+    Args:
+        bind: 会话或连接
+        paths: 文件路径
+
+    Returns:
+        dict: {规范化的路径: 引用数}，没有引用的路径不在结果中
+    """
+    # 同时按原样和规范化后的路径查询，兼容未经规范化保存的旧路径
+    variants = {}
+    for path in paths:
+        if path:
+            variants[path] = _normalize(path)
+            variants.setdefault(variants[path], variants[path])
+    candidates = list(variants)
+
+    counts = {}
+    for table, column in _attachment_columns(bind):
+        statement = text(
+            f'SELECT "{column}", COUNT(*) FROM "{table}" WHERE "{column}" IN :paths GROUP BY "{column}"'
+        ).bindparams(bindparam('paths', expanding=True))
+        for start in range(0, len(candidates), _IN_CHUNK_SIZE):
+            for path, count in bind.execute(statement, {'paths': candidates[start:start + _IN_CHUNK_SIZE]}):
+                key = variants[path]
+                counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+def _recorded_paths(bind):
+    """记录中出现的全部附件路径（原样）"""
+    paths = set()
+    for table, column in _attachment_columns(bind):
+        rows = bind.execute(text(f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL'))
+        paths.update(path for path, in rows if path)
+    return paths
+
+
+def referenced_paths(bind):
+    """所有被记录引用的附件路径（规范化后）"""
+    return {_normalize(path) for path in _recorded_paths(bind)}
+
+
+def _remove_empty_parents(path):
+    """删除存储中因文件删除而变空的哈希目录"""
+    directory = os.path.dirname(path)
+    while directory != STORE_DIR and _is_under(directory, STORE_DIR):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning("无法删除附件 %s: %s", path, e)
+        return False
+    if is_stored(path):
+        _remove_empty_parents(path)
+    return True
+
+
+def release(bind, paths):
+    """释放附件：删除其中已没有任何记录引用的文件
+
+    在引用这些文件的记录删除或改指其他文件、事务提交之后调用。只删除存储及程序目录下的文件，
+    用户在程序目录以外指定的文件不会被删除。
+
+    Args:
+        bind: 会话或连接
+        paths: 不再被原记录引用的文件路径，可包含 None
+
+    Returns:
+        int: 删除的文件数
+    """
+    paths = {_normalize(path) for path in paths if path}
+    if not paths:
+        return 0
+    counts = reference_counts(bind, paths)
+    removed = 0
+    for path in paths:
+        if counts.get(path) or not _is_under(path, ROOT_DIR) or not os.path.isfile(path):
+            continue
+        removed += _remove(path)
+    return removed
+
+
+def collect_garbage(bind, grace_seconds=GC_GRACE_SECONDS):
+    """删除存储中没有任何记录引用的文件
+
+    Args:
+        bind: 会话或连接
+        grace_seconds: 最近这段时间内写入的文件不删除（可能属于尚未提交的记录）
+
+    Returns:
+        (int, int): 删除的文件数和释放的字节数
+    """
+    if not os.path.isdir(STORE_DIR):
+        return 0, 0
+    referenced = referenced_paths(bind)
+    deadline = time.time() - grace_seconds
+    removed = freed = 0
+    for directory, _, names in os.walk(STORE_DIR):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if path in referenced or stat.st_mtime > deadline:
+                continue
+            if _remove(path):
+                removed += 1
+                freed += stat.st_size
+    logger.info("附件垃圾回收：删除 %d 个文件，释放 %d 字节", removed, freed)
+    return removed, freed
+
+
+def legacy_attachment_paths(bind):
+    """记录中尚未迁入存储的旧附件路径，按路径排序"""
+    return sorted(path for path in _recorded_paths(bind) if not is_stored(path))
+
+
+def migrate_legacy_attachments(sessions, progress=None, legacy=None):
+    """将旧版按项目目录保存的附件迁入存储
+
+    按批将文件复制到存储并把记录中的路径改为存储路径，每批提交后删除程序目录下的原文件。
+    已迁移的路径不再处理，中断后再次执行从未完成的路径继续；没有旧路径时只执行几条查询。
+    可在工作线程中调用。
+
+    Args:
+        sessions: 会话注册表
+        progress: 进度回调 progress(已处理路径数, 路径总数)，每处理一个路径调用一次；
+            为 None 时每批写入一条日志
+        legacy: 待迁移的旧路径，默认由 legacy_attachment_paths() 查询
+
+    Returns:
+        MigrationResult: 迁移结果
+    """
+    result = MigrationResult()
+    if legacy is None:
+        with sessions.read() as session:
+            legacy = legacy_attachment_paths(session)
+    if not legacy:
+        return result
+
+    blobs = set()
+    done = 0
+    for start in range(0, len(legacy), MIGRATION_BATCH_SIZE):
+        mapping = {}
+        for path in legacy[start:start + MIGRATION_BATCH_SIZE]:
+            if not os.path.isfile(path):
+                result.missing += 1
+            else:
+                try:
+                    mapping[path] = store_file(path)
+                except OSError as e:
+                    result.skipped += 1
+                    logger.warning("无法迁移附件 %s: %s", path, e)
+            done += 1
+            if progress is not None:
+                progress(done, len(legacy))
+        if not mapping:
+            continue
+
+        with sessions.unit_of_work() as session:
+            for table, column in _attachment_columns(session):
+                session.execute(
+                    text(f'UPDATE "{table}" SET "{column}" = :new WHERE "{column}" = :old'),
+                    [{'old': old, 'new': new} for old, new in mapping.items()]
+                )
+        attachment_path_cache.clear()  # 路径由 SQL 直接改写，不经过 ORM 事件
+        for old in mapping:
+            if _is_under(old, ROOT_DIR):
+                _remove(old)
+        result.migrated += len(mapping)
+        blobs.update(mapping.values())
+        if progress is None:
+            logger.info("迁移附件: %d/%d", done, len(legacy))
+
+    result.blobs = len(blobs)
+    logger.info("附件迁移完成：%d 个文件合并为 %d 个，%d 个文件不存在，%d 个文件无法读取已跳过",
+                result.migrated, result.blobs, result.missing, result.skipped)
+    return result
+
+
+def main(argv=None):
+    import argparse
+    from ..models.database import get_engine
+    from ..models.session import SessionRegistry
+
+    parser = argparse.ArgumentParser(description="附件存储维护")
+    parser.add_argument('command', choices=('migrate', 'gc'), help="migrate: 迁移旧附件；gc: 清理无引用的文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    sessions = SessionRegistry(get_engine())
+    if args.command == 'migrate':
+        migrate_legacy_attachments(sessions)
+    else:
+        with sessions.read() as session:
+            collect_garbage(session)
+
+
+if __name__ == '__main__':
+    main()
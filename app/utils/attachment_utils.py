@@ -10,10 +10,7 @@ import re # Import regex for sanitization
 import datetime # Import datetime for timestamp
 from enum import Enum # 导入Enum用于类型检查
 from ..utils.ui_utils import UIUtils # Assuming UIUtils is in the parent directory
-
-# 全局缓存，用于存储 item_id 到其最新 attachment_path 的映射
-# 键为 (item_type, item_id)，值为附件路径 (str) 或 None
-_attachment_path_cache = {}
+from .attachment_cache import attachment_path_cache
 
 UTILS_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR = os.path.abspath(os.path.join(UTILS_DIR, '..', '..')) # Go up two levels to project root
@@ -63,19 +60,9 @@ def create_attachment_button(item_id, attachment_path, handle_attachment_func, p
     btn.setProperty("item_id", item_id)
     btn.setProperty("item_type", item_type) # Store item type
 
-    cache_key = (item_type, item_id)
-    
-    # 确定要用于显示的附件路径
-    path_to_use_for_display = attachment_path # 默认使用参数传入的路径
+    # 附件变更后记录尚未重新加载时，缓存中保存着最新的路径，优先使用
+    path_to_use_for_display = attachment_path_cache.resolve(item_type, item_id, attachment_path)
 
-    if cache_key in _attachment_path_cache:
-        # 如果缓存中存在此项的记录，优先使用缓存的路径
-        path_to_use_for_display = _attachment_path_cache[cache_key]
-    else:
-        # 如果缓存中不存在，说明是首次加载或缓存被清除
-        # 使用参数传入的路径，并用它初始化缓存
-        _attachment_path_cache[cache_key] = attachment_path
-    
     # 确保按钮的 'attachment_path' 属性与我们决定用于显示的路径一致
     btn.setProperty("attachment_path", path_to_use_for_display)
 
@@ -382,6 +369,7 @@ def execute_attachment_action(action_type, item_id, btn, session, item, get_item
         base_folder: 基础文件夹名称
         parent_widget: 父窗口对象
     """
+    from .attachment_store import store_file, release  # attachment_store 依赖本模块，在此处导入
     try:
         if not item:
             item = get_item_func(session, item_id)
@@ -389,7 +377,7 @@ def execute_attachment_action(action_type, item_id, btn, session, item, get_item
                 UIUtils.show_error(parent_widget, "错误", f"执行操作时找不到ID为 {item_id} 的项")
                 return
 
-        # 获取项目对象，用于路径生成
+        # 获取关联的项目对象，确认其存在
         project = None
         if project_attr:
             from ..models.database import Project
@@ -428,32 +416,12 @@ def execute_attachment_action(action_type, item_id, btn, session, item, get_item
                 return  # 用户取消
 
             old_path = current_path
-            new_path = None
-            
-            # 根据项目类型生成不同的路径
-            item_type_str = btn.property("item_type")
-            if item_type_str == 'activity' and hasattr(item, 'type'):
-                new_path = generate_attachment_path(None, None, source_file_path, base_folder, 
-                                                  item_type='activity', activity_type_enum=item.type)
-            elif item_type_str == 'expense' and project:
-                new_path = generate_attachment_path(project, None, source_file_path, base_folder, 
-                                                  item_type='expense', expense=item)
-            elif project and hasattr(item, 'doc_type'):
-                new_path = generate_attachment_path(project, item.doc_type, source_file_path, base_folder)
-            elif project and hasattr(item, 'type'):
-                new_path = generate_attachment_path(project, item.type, source_file_path, base_folder)
-            else:
-                UIUtils.show_error(parent_widget, "错误", "无法确定项目类型，无法生成附件保存路径")
-                return
-
-            if not new_path:
-                UIUtils.show_error(parent_widget, "错误", "无法生成附件保存路径")
-                return
 
             # --- 事务开始 ---
+            new_path = None
             try:
-                ensure_directory_exists(os.path.dirname(new_path))
-                shutil.copy2(source_file_path, new_path)
+                # 附件按内容保存到附件存储，相同内容的文件只保存一份
+                new_path = store_file(source_file_path)
 
                 setattr(item, attachment_attr, new_path)
                 # 如果有上传时间字段，可以更新
@@ -465,17 +433,13 @@ def execute_attachment_action(action_type, item_id, btn, session, item, get_item
                 # 更新缓存
                 item_type_for_cache = btn.property("item_type")
                 if item_type_for_cache is not None: # 确保 item_type 可获取
-                    _attachment_path_cache[(item_type_for_cache, item_id)] = new_path
+                    attachment_path_cache.put(item_type_for_cache, item_id, new_path)
                 else:
                     print(f"Warning: Could not update cache for item_id {item_id} due to missing item_type on button.")
 
-
-                # 如果是替换且路径变化，删除旧文件
-                if old_path and os.path.exists(old_path) and os.path.normpath(old_path) != os.path.normpath(new_path):
-                    try:
-                        os.remove(old_path)
-                    except OSError as e:
-                        print(f"警告: 无法删除旧附件 {old_path}: {e}")
+                # 旧文件不再被任何记录引用时删除
+                if old_path and os.path.normpath(old_path) != os.path.normpath(new_path):
+                    release(session, [old_path])
 
                 # 更新按钮
                 btn.setIcon(QIcon(get_attachment_icon_path('attach.svg')))
@@ -487,16 +451,9 @@ def execute_attachment_action(action_type, item_id, btn, session, item, get_item
             except Exception as e:
                 session.rollback()
                 UIUtils.show_error(parent_widget, "错误", f"更新附件失败: {e}")
-                # 清理可能已复制的文件
-                if os.path.exists(new_path):
-                    session.expire(item)
-                    db_path_after_rollback = getattr(get_item_func(session, item_id), attachment_attr, None)
-                    if db_path_after_rollback != new_path:
-                        try:
-                            print(f"尝试删除孤立文件: {new_path}")
-                            os.remove(new_path)
-                        except Exception as remove_err:
-                            print(f"删除孤立文件时出错 {new_path}: {remove_err}")
+                # 新保存的文件没有被其他记录引用时删除
+                if new_path:
+                    release(session, [new_path])
             # --- 事务结束 ---
 
         elif action_type == "delete":
@@ -508,14 +465,15 @@ def execute_attachment_action(action_type, item_id, btn, session, item, get_item
             if confirm_dialog.exec():
                 # --- 事务开始 ---
                 try:
-                    os.remove(current_path)
                     setattr(item, attachment_attr, None)  # 在数据库中将路径设为None
                     session.commit()
+                    # 文件不再被其他记录引用时删除
+                    release(session, [current_path])
 
                     # 更新缓存
                     item_type_for_cache = btn.property("item_type")
                     if item_type_for_cache is not None: # 确保 item_type 可获取
-                        _attachment_path_cache[(item_type_for_cache, item_id)] = None
+                        attachment_path_cache.put(item_type_for_cache, item_id, None)
                     else:
                         print(f"Warning: Could not update cache for item_id {item_id} due to missing item_type on button during delete.")
 
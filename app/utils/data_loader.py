@@ -0,0 +1,248 @@
+"""
+后台数据加载
+
+DataLoader 在线程池中执行数据库查询，查询结果在 GUI 线程中交给回调，避免 SQLite 查询
+阻塞界面：
+
+    self.loader = DataLoader(self.sessions, self)
+    self.loader.load('documents', self._fetch_documents, self._populate_table)
+
+- 查询函数接收一个只读会话，在工作线程中运行，应返回不可变的数据快照（查询结果行，
+  或用 snapshot() 转换的 ORM 对象），不能返回仍依赖会话的 ORM 对象。
+- 同一个键的新请求会取消该键尚未完成的旧请求：排队中的直接移出线程池，执行中的中断
+  SQLite 查询，已完成但尚未送达的结果被丢弃。用户快速切换项目时只会显示最后一次的结果。
+- 每次加载记录排队、查询和界面更新三段耗时，超过 SLOW_LOAD_MS 时输出警告日志，
+  可用 DataLoader.slowest() 查看最慢的加载。
+"""
+
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from dataclasses import dataclass
+from functools import lru_cache
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from sqlalchemy import inspect
+
+# 超过该耗时（毫秒）的加载输出警告日志
+SLOW_LOAD_MS = 200
+
+# 后台查询线程数。SQLite 同一时刻只有一个写入者，读取在 WAL 模式下可以并发
+MAX_LOADER_THREADS = 4
+
+_pool = None
+
+
+def loader_pool():
+    """所有 DataLoader 共用的线程池"""
+    global _pool
+    if _pool is None:
+        _pool = QThreadPool()
+        _pool.setMaxThreadCount(MAX_LOADER_THREADS)
+    return _pool
+
+
+@lru_cache(maxsize=None)
+def _snapshot_type(name, fields):
+    return namedtuple(name, fields)
+
+
+def snapshot(objects, fields=None, **computed):
+    """将 ORM 对象转换为不可变的命名元组列表，可在会话关闭后、跨线程使用
+
+    Args:
+        objects: ORM 对象序列
+        fields: 要复制的属性名，默认为映射的全部列
+        **computed: 额外字段，{字段名: 函数(对象)}，例如关联对象的快照
+
+    Returns:
+        list[namedtuple]: 与对象同名属性的只读快照
+    """
+    rows = []
+    row_type = None
+    for obj in objects:
+        if row_type is None:
+            names = tuple(fields) if fields else tuple(inspect(obj).mapper.column_attrs.keys())
+            row_type = _snapshot_type(f"{type(obj).__name__}Row", names + tuple(computed))
+            getters = [lambda o, name=name: getattr(o, name) for name in names] + list(computed.values())
+        rows.append(row_type._make(getter(obj) for getter in getters))
+    return rows
+
+
+def snapshot_one(obj, fields=None, **computed):
+    """单个 ORM 对象的快照，obj 为 None 时返回 None"""
+    if obj is None:
+        return None
+    return snapshot([obj], fields, **computed)[0]
+
+
+@dataclass
+class LoadTiming:
+    """一次加载的耗时（毫秒）"""
+    owner: str  # 发起加载的界面类名
+    key: str  # 加载的键
+    queued_ms: float  # 在线程池中排队的时间
+    query_ms: float  # 工作线程中执行查询的时间
+    deliver_ms: float  # 结果送达 GUI 线程并完成界面更新的时间
+
+    @property
+    def total_ms(self):
+        return self.queued_ms + self.query_ms + self.deliver_ms
+
+
+class _LoadRequest:
+    """一次加载请求及其状态"""
+
+    def __init__(self, key, generation, query, on_loaded, on_error):
+        self.key = key
+        self.generation = generation
+        self.query = query
+        self.on_loaded = on_loaded
+        self.on_error = on_error
+        self.cancelled = False
+        self.result = None
+        self.error = None
+        self.runnable = None
+        self.dbapi_connection = None  # 执行中的 SQLite 连接，取消时用于中断查询
+        self.lock = threading.Lock()
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+
+class _LoadRunnable(QRunnable):
+    def __init__(self, loader, request):
+        super().__init__()
+        self.request = request
+        self.sessions = loader.sessions
+        self.finished = loader._finished
+        self.setAutoDelete(False)  # 由请求持有，取消时用于 tryTake
+
+    def run(self):
+        request = self.request
+        if request.cancelled:
+            return
+        request.started = time.perf_counter()
+        try:
+            with self.sessions.read() as session:
+                with request.lock:
+                    if request.cancelled:
+                        return
+                    request.dbapi_connection = session.connection().connection.dbapi_connection
+                try:
+                    request.result = request.query(session)
+                finally:
+                    with request.lock:
+                        request.dbapi_connection = None
+        except Exception as e:
+            request.error = e
+        request.finished = time.perf_counter()
+        try:
+            self.finished.emit(request)
+        except RuntimeError:
+            pass  # 所属界面已销毁
+
+
+class DataLoader(QObject):
+    """界面的后台数据加载器，随所属界面销毁"""
+
+    # 工作线程完成查询后发出，经排队连接在 GUI 线程中处理
+    _finished = Signal(object)
+
+    # 最近的加载耗时，所有 DataLoader 共用
+    timings = deque(maxlen=500)
+
+    def __init__(self, sessions, parent=None, pool=None):
+        """
+        Args:
+            sessions: 会话注册表
+            parent: 所属界面，加载结果在其销毁后不再送达
+            pool: 线程池，默认使用 loader_pool()
+        """
+        super().__init__(parent)
+        self.sessions = sessions
+        self.pool = pool or loader_pool()
+        self.owner = type(parent).__name__ if parent is not None else "DataLoader"
+        self._generations = {}  # {键: 最新请求的代数}
+        self._pending = {}  # {键: 未完成的请求}
+        self._finished.connect(self._deliver)
+
+    def load(self, key, query, on_loaded, on_error=None):
+        """在后台执行查询，完成后在 GUI 线程中调用 on_loaded(result)
+
+        Args:
+            key: 加载的键，同键的新请求取消旧请求
+            query: 查询函数 query(session)，在工作线程中执行，返回不可变数据
+            on_loaded: 结果回调
+            on_error: 出错回调 on_error(exception)，默认只记录日志
+        """
+        self.cancel(key)
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        request = _LoadRequest(key, generation, query, on_loaded, on_error)
+        request.runnable = _LoadRunnable(self, request)
+        self._pending[key] = request
+        self.pool.start(request.runnable)
+        return request
+
+    def cancel(self, key):
+        """取消某个键尚未完成的请求"""
+        request = self._pending.pop(key, None)
+        if request is None:
+            return
+        with request.lock:
+            request.cancelled = True
+            connection = request.dbapi_connection
+        if self.pool.tryTake(request.runnable):
+            return
+        if connection is not None:
+            try:
+                connection.interrupt()
+            except Exception:
+                pass
+
+    def cancel_all(self):
+        for key in list(self._pending):
+            self.cancel(key)
+
+    def is_loading(self, key):
+        return key in self._pending
+
+    def _deliver(self, request):
+        if self._pending.get(request.key) is request:
+            del self._pending[request.key]
+        if request.cancelled or request.generation != self._generations.get(request.key):
+            return  # 已被更新的请求取代
+
+        delivered = time.perf_counter()
+        try:
+            if request.error is not None:
+                if request.on_error is not None:
+                    request.on_error(request.error)
+                else:
+                    logging.error(f"{self.owner} 加载 {request.key} 失败: {request.error}")
+            else:
+                request.on_loaded(request.result)
+        finally:
+            self._record(request, delivered)
+
+    def _record(self, request, delivered):
+        timing = LoadTiming(
+            owner=self.owner,
+            key=request.key,
+            queued_ms=(request.started - request.submitted) * 1000,
+            query_ms=(request.finished - request.started) * 1000,
+            deliver_ms=(time.perf_counter() - request.finished) * 1000,
+        )
+        DataLoader.timings.append(timing)
+        message = (f"{timing.owner} 加载 {timing.key}: 排队 {timing.queued_ms:.1f} ms，"
+                   f"查询 {timing.query_ms:.1f} ms，界面 {timing.deliver_ms:.1f} ms")
+        if timing.total_ms > SLOW_LOAD_MS:
+            logging.warning(message)
+        else:
+            logging.debug(message)
+
+    @staticmethod
+    def slowest(count=10):
+        """最近耗时最长的加载，用于定位慢界面"""
+        return sorted(DataLoader.timings, key=lambda timing: timing.total_ms, reverse=True)[:count]
@@ -1,7 +1,7 @@
-from sqlalchemy.orm import Session
 from typing import TypeVar, Callable
 from functools import wraps
 from PySide6.QtWidgets import QMessageBox
+from ..models.session import SessionRegistry
 
 T = TypeVar('T')
 
@@ -11,7 +11,7 @@ class DBUtils:
         """数据库会话装饰器，统一处理会话的创建、提交、回滚和关闭
         
         Args:
-            engine: SQLAlchemy引擎实例
+            engine: SQLAlchemy引擎实例或会话注册表
             show_error: 是否显示错误消息框
             
         Returns:
@@ -20,7 +20,8 @@ class DBUtils:
         def decorator(func: Callable[..., T]) -> Callable[..., T]:
             @wraps(func)
             def wrapper(*args, **kwargs) -> T:
-                session = Session(engine)
+                sessions = engine if isinstance(engine, SessionRegistry) else SessionRegistry.for_engine(engine)
+                session = sessions()
                 try:
                     result = func(*args, session=session, **kwargs)
                     session.commit()
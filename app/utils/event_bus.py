@@ -0,0 +1,156 @@
+"""
+数据变更事件总线
+
+界面修改数据后发布变更事件（实体类型、操作、实体ID及所属项目ID），关心这些数据的界面
+订阅后只更新受影响的项目或行，不再由全局信号触发各界面整体重新加载：
+
+    event_bus().publish(EntityKind.EXPENSE, Operation.CREATED, expense_ids, project_ids=[project_id])
+
+    event_bus().changed.connect(self._on_data_changed)
+
+    def _on_data_changed(self, changes):
+        if changes.affects(EntityKind.BUDGET, EntityKind.EXPENSE):
+            self.reload(changes.project_ids(EntityKind.BUDGET, EntityKind.EXPENSE))
+
+- 事件在 COALESCE_MS 的窗口内合并：窗口从第一个事件开始计时（不随后续事件顺延），
+  窗口内同一实体类型、同一操作的事件合并为一个，ID 取并集。批量导入 500 条支出
+  只送达一次变更。
+- 订阅者通过 changed 信号接收 ChangeSet，订阅者销毁时 Qt 自动断开连接。
+- 只能在 GUI 线程中发布；stats() 返回发布、送达及被合并的事件数。
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+from PySide6.QtCore import QObject, QTimer, Signal
+
+# 事件合并窗口（毫秒）
+COALESCE_MS = 50
+
+_bus = None
+
+
+class EntityKind(Enum):
+    """变更的实体类型"""
+    PROJECT = "project"
+    BUDGET = "budget"  # 预算及预算子项
+    EXPENSE = "expense"
+    GANTT = "gantt"  # 甘特图任务及依赖（项目进度）
+
+
+class Operation(Enum):
+    """变更操作"""
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
+
+@dataclass(frozen=True)
+class DomainEvent:
+    """一次数据变更"""
+    kind: EntityKind
+    operation: Operation
+    ids: frozenset  # 变更的实体ID，未知时为空
+    project_ids: frozenset  # 所属项目ID，项目变更时与 ids 相同
+
+
+class ChangeSet:
+    """合并窗口内的全部变更，每个（实体类型，操作）至多一个事件"""
+
+    def __init__(self, events):
+        self.events = tuple(events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def __len__(self):
+        return len(self.events)
+
+    def affects(self, *kinds):
+        """是否包含这些实体类型的变更"""
+        return any(event.kind in kinds for event in self.events)
+
+    def ids(self, kind, *operations):
+        """某实体类型变更的实体ID，可按操作筛选"""
+        return {entity_id for event in self.events
+                if event.kind is kind and (not operations or event.operation in operations)
+                for entity_id in event.ids}
+
+    def project_ids(self, *kinds):
+        """这些实体类型（默认全部）的变更涉及的项目ID"""
+        return {project_id for event in self.events
+                if not kinds or event.kind in kinds
+                for project_id in event.project_ids}
+
+
+@dataclass
+class EventBusStats:
+    """事件总线计数"""
+    published: int = 0  # 发布的事件数
+    delivered: int = 0  # 合并后送达的事件数
+    coalesced: int = 0  # 并入同一窗口内已有事件的事件数
+    batches: int = 0  # 送达次数
+
+
+class EventBus(QObject):
+    """合并变更事件并按窗口送达订阅者"""
+    changed = Signal(object)  # ChangeSet
+
+    def __init__(self, coalesce_ms=COALESCE_MS, parent=None):
+        super().__init__(parent)
+        self._pending = {}  # {(实体类型, 操作): (ID集合, 项目ID集合)}
+        self._stats = EventBusStats()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(coalesce_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def publish(self, kind, operation, ids=(), project_ids=None):
+        """发布变更事件，在合并窗口结束时送达
+
+        Args:
+            kind: 实体类型（EntityKind）
+            operation: 操作（Operation）
+            ids: 变更的实体ID
+            project_ids: 所属项目ID；项目变更时默认与 ids 相同
+        """
+        if project_ids is None and kind is EntityKind.PROJECT:
+            project_ids = ids
+        self._stats.published += 1
+        key = (kind, operation)
+        if key in self._pending:
+            self._stats.coalesced += 1
+            pending_ids, pending_projects = self._pending[key]
+        else:
+            pending_ids, pending_projects = self._pending[key] = (set(), set())
+        pending_ids.update(ids)
+        pending_projects.update(project_ids or ())
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """立即送达尚未送达的事件"""
+        self._timer.stop()
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        changes = ChangeSet(DomainEvent(kind, operation, frozenset(ids), frozenset(project_ids))
+                            for (kind, operation), (ids, project_ids) in pending.items())
+        self._stats.delivered += len(changes)
+        self._stats.batches += 1
+        self.changed.emit(changes)
+
+    def has_pending(self):
+        """是否有尚未送达的事件"""
+        return bool(self._pending)
+
+    def stats(self):
+        """返回计数的副本"""
+        return EventBusStats(**vars(self._stats))
+
+
+def event_bus():
+    """应用内共用的事件总线"""
+    global _bus
+    if _bus is None:
+        _bus = EventBus()
+    return _bus
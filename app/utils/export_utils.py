@@ -0,0 +1,371 @@
+"""
+附件批量导出
+
+AttachmentExporter 将一组附件导出到文件夹或 ZIP 压缩包，在调用方的工作线程中运行：
+
+- 导出到文件夹时用线程池并行复制；导出为 ZIP 时逐个文件流式写入压缩包，不在内存中缓存文件；
+- 复制的同时计算 SHA-256（附件存储中的文件直接取路径中的哈希），可附带清单 清单.csv，
+  列出每个文件对应的记录字段、文件名、大小和哈希；
+- 每完成一个文件追加一行到导出日志 <目标>.export-journal。导出被取消或程序中断后，
+  对同一目标再次导出会跳过已完成的文件继续（文件名对应的附件路径、大小及可得的哈希须与
+  日志一致）；导出结束后删除日志。ZIP 在完成前写入
+  <目标>.part，取消时正常关闭，续传时以追加模式打开（程序异常退出导致压缩包损坏时重新导出）；
+  附件在复制途中读取失败时截去不完整的条目并中止导出，同样保留供续传。
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from .attachment_store import is_stored
+
+logger = logging.getLogger(__name__)
+
+# 导出到文件夹时并行复制的线程数
+EXPORT_THREADS = 4
+
+MANIFEST_NAME = "清单.csv"
+JOURNAL_SUFFIX = ".export-journal"
+PART_SUFFIX = ".part"
+
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class ExportCancelled(Exception):
+    """导出被取消"""
+
+
+@dataclass
+class ExportItem:
+    """一个待导出的附件"""
+    source: str  # 附件路径
+    info: dict  # 清单中与该附件对应的记录字段，如 {'支出ID': 1, '金额(元)': 100.0}
+
+
+@dataclass
+class ExportResult:
+    """导出结果"""
+    target: str  # 导出的文件夹或 ZIP 文件
+    exported: int = 0  # 本次导出的文件数
+    resumed: int = 0  # 续传时跳过的已完成文件数
+    missing: list = field(default_factory=list)  # 不存在的附件路径
+    errors: list = field(default_factory=list)  # 复制失败的文件及原因
+    bytes: int = 0  # 本次写入的字节数
+    cancelled: bool = False
+    elapsed: float = 0.0  # 耗时（秒）
+
+
+def _unique_names(sources):
+    """为各附件分配导出文件名，重名时依次添加 _1、_2 后缀
+
+    按附件顺序确定，同一组附件每次得到相同的文件名，续传时据此匹配已完成的文件。
+    """
+    names = {}
+    used = set()
+    for source in sources:
+        base, ext = os.path.splitext(os.path.basename(source))
+        name = base + ext
+        counter = 1
+        while name.lower() in used:
+            name = f"{base}_{counter}{ext}"
+            counter += 1
+        used.add(name.lower())
+        names[source] = name
+    return names
+
+
+def _stored_digest(path):
+    """附件存储中的文件直接返回路径中的内容哈希，其他文件返回 None"""
+    if not is_stored(path):
+        return None
+    digest = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return digest if len(digest) == 64 else None
+
+
+class AttachmentExporter:
+    """附件导出任务"""
+
+    def __init__(self, items, target, as_zip=False, manifest=True, threads=EXPORT_THREADS):
+        """
+        Args:
+            items: ExportItem 列表；多条记录引用同一文件时只导出一次，清单中各占一行
+            target: 导出的文件夹路径，或 ZIP 文件路径
+            as_zip: 是否导出为 ZIP 压缩包
+            manifest: 是否写入清单
+            threads: 导出到文件夹时并行复制的线程数
+        """
+        self.items = items
+        self.target = target
+        self.as_zip = as_zip
+        self.manifest = manifest
+        self.threads = threads
+        self.journal_path = target + JOURNAL_SUFFIX
+        self.names = _unique_names(dict.fromkeys(item.source for item in items))
+        self._lock = threading.Lock()
+        self._completed = {}  # {文件名: {'source': ..., 'sha256': ..., 'size': ...}}
+
+    @staticmethod
+    def is_incomplete(target):
+        """目标是否有未完成的导出（可续传）"""
+        return os.path.exists(target + JOURNAL_SUFFIX)
+
+    def run(self, progress=None, cancelled=None):
+        """执行导出
+
+        Args:
+            progress: 进度回调 progress(已写入字节数, 总字节数)，在工作线程中调用
+            cancelled: 返回是否已取消的函数。导出到文件夹时复制过程中定期检查；
+                ZIP 条目写入后无法撤回，在两个文件之间检查
+
+        Returns:
+            ExportResult: 导出结果；取消时 cancelled 为 True，已完成的部分保留供续传
+
+        Raises:
+            OSError: 导出为 ZIP 时附件在复制途中读取失败或压缩包写入失败。未完成的压缩包和
+                导出日志保留供续传，不会生成目标文件
+        """
+        self._progress = progress or (lambda done, total: None)
+        self._cancelled = cancelled or (lambda: False)
+        result = ExportResult(self.target)
+        started = time.perf_counter()
+
+        # 统计各文件大小，不存在的附件记入结果
+        sizes = {}
+        for source in self.names:
+            try:
+                sizes[source] = os.path.getsize(source)
+            except OSError:
+                result.missing.append(source)
+        self._total = sum(sizes.values())
+
+        self._load_journal(sizes)
+        archive = self._open_zip() if self.as_zip else None
+        pending = []
+        done = 0
+        for source, size in sizes.items():
+            if self.names[source] in self._completed:
+                result.resumed += 1
+                done += size
+            else:
+                pending.append(source)
+        self._done = done
+        self._progress(self._done, self._total)
+
+        try:
+            if archive is not None:
+                self._export_zip(archive, pending, result)
+            else:
+                self._export_directory(pending, result)
+        except ExportCancelled:
+            result.cancelled = True
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    # --- 导出日志 ---
+
+    def _load_journal(self, sizes):
+        """读取导出日志中已完成的文件
+
+        日志中的文件须对应本次同名的附件：路径和大小一致，附件存储中的文件哈希也一致。
+        不一致说明两次导出之间选择的附件有变化，导出到文件夹时重新复制该文件；导出为 ZIP
+        时已写入的条目无法替换，放弃日志重新导出。导出到文件夹时还只保留目标中仍完整存在的
+        文件。
+
+        Args:
+            sizes: {附件路径: 当前大小}，不含不存在的附件
+        """
+        self._completed = {}
+        entries = {}
+        try:
+            with open(self.journal_path, encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 中断时写了一半的行
+                    entries[entry['name']] = entry
+        except FileNotFoundError:
+            return
+
+        sources = {name: source for source, name in self.names.items()}
+        for name, entry in entries.items():
+            source = sources.get(name)
+            if source is not None and self._matches(source, sizes.get(source), entry):
+                self._completed[name] = {'source': source, 'sha256': entry['sha256'], 'size': entry['size']}
+        if self.as_zip:
+            if len(self._completed) < len(entries):
+                logger.info("导出的附件与上次不同，重新导出: %s", self.target)
+                self._completed = {}
+        else:
+            self._completed = {
+                name: entry for name, entry in self._completed.items()
+                if os.path.isfile(os.path.join(self.target, name))
+                and os.path.getsize(os.path.join(self.target, name)) == entry['size']
+            }
+
+    @staticmethod
+    def _matches(source, size, entry):
+        """日志中的一行是否与附件一致"""
+        if size != entry['size'] or entry.get('source') != source:
+            return False
+        known = _stored_digest(source)
+        return known is None or known == entry['sha256']
+
+    def _record(self, name, source, digest, size):
+        """记录一个已完成的文件"""
+        with self._lock:
+            self._completed[name] = {'source': source, 'sha256': digest, 'size': size}
+            self._journal.write(json.dumps({'name': name, 'source': source, 'sha256': digest, 'size': size},
+                                           ensure_ascii=False) + "\n")
+            self._journal.flush()
+
+    def _advance(self, size, interruptible):
+        with self._lock:
+            self._done += size
+            done = self._done
+        self._progress(done, self._total)
+        if interruptible and self._cancelled():
+            raise ExportCancelled()
+
+    # --- 复制 ---
+
+    def _copy(self, source, stream, target, interruptible):
+        """将已打开的附件 stream 流式写入已打开的 target，返回 (SHA-256, 字节数)"""
+        known = _stored_digest(source)
+        digest = None if known else hashlib.sha256()
+        size = 0
+        while True:
+            chunk = stream.read(_COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            target.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+            size += len(chunk)
+            self._advance(len(chunk), interruptible)
+        return known or digest.hexdigest(), size
+
+    def _export_directory(self, pending, result):
+        os.makedirs(self.target, exist_ok=True)
+
+        def copy_one(source):
+            if self._cancelled():
+                raise ExportCancelled()
+            name = self.names[source]
+            destination = os.path.join(self.target, name)
+            part = destination + PART_SUFFIX
+            try:
+                with open(source, 'rb') as stream, open(part, 'wb') as target:
+                    sha256, size = self._copy(source, stream, target, interruptible=True)
+                os.replace(part, destination)
+            except BaseException:
+                if os.path.exists(part):
+                    os.remove(part)
+                raise
+            self._record(name, source, sha256, size)
+            return size
+
+        cancelled = False
+        with open(self.journal_path, 'a', encoding='utf-8') as self._journal:
+            with ThreadPoolExecutor(max_workers=max(1, self.threads)) as executor:
+                futures = [(executor.submit(copy_one, source), source) for source in pending]
+                for future, source in futures:
+                    try:
+                        size = future.result()
+                    except ExportCancelled:
+                        cancelled = True
+                        continue
+                    except OSError as e:
+                        result.errors.append(f"{os.path.basename(source)}: {e}")
+                        continue
+                    result.exported += 1
+                    result.bytes += size
+        if cancelled:
+            raise ExportCancelled()
+
+        if self.manifest:
+            with open(os.path.join(self.target, MANIFEST_NAME), 'w', encoding='utf-8-sig', newline='') as stream:
+                self._write_manifest(stream)
+        os.remove(self.journal_path)
+
+    def _open_zip(self):
+        """打开 ZIP 临时文件；续传时以追加模式打开，文件损坏时重新开始"""
+        part = self.target + PART_SUFFIX
+        if os.path.exists(part) and self._completed:
+            try:
+                archive = zipfile.ZipFile(part, 'a', zipfile.ZIP_STORED, allowZip64=True)
+                existing = set(archive.namelist())
+                self._completed = {name: entry for name, entry in self._completed.items() if name in existing}
+                if not existing - set(self._completed):
+                    return archive
+                # 压缩包中有日志未记录的条目，续传会写入重名条目
+                archive.close()
+                logger.warning("未完成的压缩包与导出日志不一致，重新导出: %s", part)
+            except zipfile.BadZipFile:
+                logger.warning("未完成的压缩包已损坏，重新导出: %s", part)
+        self._completed = {}
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        # 附件多为 PDF、图片等已压缩格式，按存储方式写入，不再压缩
+        return zipfile.ZipFile(part, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def _export_zip(self, archive, pending, result):
+        with archive, open(self.journal_path, 'a', encoding='utf-8') as self._journal:
+            for source in pending:
+                if self._cancelled():
+                    raise ExportCancelled()  # 关闭压缩包（写入目录）后保留，供续传
+                name = self.names[source]
+                # 先打开附件，打不开时跳过该文件，压缩包中不留条目
+                try:
+                    stream = open(source, 'rb')
+                except OSError as e:
+                    result.errors.append(f"{os.path.basename(source)}: {e}")
+                    continue
+                # 复制途中失败时写入句柄关闭仍会写入不完整的条目：将其从压缩包中截去后
+                # 中止导出，未完成的压缩包和日志保留供续传
+                with stream:
+                    try:
+                        with archive.open(name, 'w', force_zip64=True) as target:
+                            sha256, size = self._copy(source, stream, target, interruptible=False)
+                    except BaseException:
+                        self._discard_last_entry(archive, name)
+                        raise
+                self._record(name, source, sha256, size)
+                result.exported += 1
+                result.bytes += size
+
+            if self.manifest:
+                stream = io.StringIO()
+                self._write_manifest(stream)
+                archive.writestr(MANIFEST_NAME, stream.getvalue().encode('utf-8-sig'))
+        os.replace(self.target + PART_SUFFIX, self.target)
+        os.remove(self.journal_path)
+
+    @staticmethod
+    def _discard_last_entry(archive, name):
+        """截去压缩包末尾刚写入的条目，关闭压缩包时中央目录从该条目的起始位置写入"""
+        if not archive.filelist or archive.filelist[-1].filename != name:
+            return
+        info = archive.filelist.pop()
+        archive.NameToInfo.pop(name, None)
+        archive.start_dir = info.header_offset
+        archive.fp.seek(info.header_offset)
+        archive.fp.truncate()
+
+    def _write_manifest(self, stream):
+        fields = list(dict.fromkeys(key for item in self.items for key in item.info))
+        writer = csv.writer(stream)
+        writer.writerow(fields + ["文件", "大小(字节)", "SHA-256"])
+        for item in self.items:
+            entry = self._completed.get(self.names[item.source])
+            if entry is None:
+                continue  # 文件不存在或导出失败
+            writer.writerow([item.info.get(key, "") for key in fields] +
+                            [self.names[item.source], entry['size'], entry['sha256']])
@@ -1,6 +1,8 @@
 
-from datetime import datetime
+from datetime import datetime, time, timedelta
 from enum import Enum # Import Enum for type checking
+from sqlalchemy import inspect, and_, or_, false, DateTime
+from ..models.search import entity_for_table, indexed_columns, matching_ids_sql, search_available
 
 class FilterUtils:
 
@@ -125,4 +127,170 @@ class FilterUtils:
             if match:
                 filtered_list.append(item)
 
-        return filtered_list
\ No newline at end of file
+        return filtered_list
+
+    # 按枚举/类型筛选的条件键
+    ENUM_FILTER_KEYS = ('category', 'doc_type', 'outcome_type', 'status')
+
+    @staticmethod
+    def _column(model, attr):
+        """返回模型上映射为数据库列的属性，非列属性（如 Python property）返回 None"""
+        if attr in inspect(model).column_attrs.keys():
+            return getattr(model, attr)
+        return None
+
+    @staticmethod
+    def _enum_condition(column, enum_value):
+        """枚举筛选条件：与 _matches_enum 一致，按枚举的显示值（value）匹配"""
+        enum_class = getattr(column.type, 'enum_class', None)
+        if enum_class is None:
+            return column == enum_value
+        members = [member for member in enum_class if member.value == enum_value]
+        return column.in_(members) if members else false()
+
+    @staticmethod
+    def _date_conditions(column, start_date, end_date):
+        """日期范围条件：与 _matches_date_range 一致，空日期视为不匹配"""
+        if isinstance(start_date, datetime): start_date = start_date.date()
+        if isinstance(end_date, datetime): end_date = end_date.date()
+        conditions = [column.isnot(None)]
+        if isinstance(column.type, DateTime):
+            # 日期时间列按日期比较：结束日期当天的任意时刻都包含在内
+            if start_date is not None:
+                conditions.append(column >= datetime.combine(start_date, time.min))
+            if end_date is not None:
+                conditions.append(column < datetime.combine(end_date + timedelta(days=1), time.min))
+        else:
+            if start_date is not None:
+                conditions.append(column >= start_date)
+            if end_date is not None:
+                conditions.append(column <= end_date)
+        return conditions
+
+    @staticmethod
+    def _keyword_condition(model, keyword, attributes, fulltext):
+        """关键词条件：任一检索列包含整个关键词（ILIKE）
+
+        检索列与全文索引的列一致时，先用全文索引缩小候选记录，再逐列判断，结果与不使用
+        索引时相同。
+        """
+        columns = [FilterUtils._column(model, attr) for attr in attributes]
+        if any(column is None for column in columns):
+            return None
+        pattern = '%' + keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        condition = or_(*[column.ilike(pattern, escape='\\') for column in columns])
+        if fulltext:
+            entity = entity_for_table(getattr(model, '__tablename__', None))
+            if entity and set(attributes) == indexed_columns(entity):
+                return and_(model.id.in_(matching_ids_sql(entity, keyword)), condition)
+        return condition
+
+    @staticmethod
+    def build_conditions(model, filter_criteria, attribute_mapping=None, fulltext=False):
+        """
+        将 apply_filters 的筛选条件编译为 SQL 条件。
+
+        filter_criteria 和 attribute_mapping 的含义与 apply_filters 相同。映射到数据库列的条件
+        转为 WHERE 子句；映射到非列属性的条件无法在 SQL 中表达，原样放入剩余条件，
+        由调用方用 apply_filters 在 Python 中过滤。
+
+        Args:
+            model: SQLAlchemy 模型类。
+            filter_criteria: 筛选条件字典。
+            attribute_mapping: (可选) 筛选键到模型属性名的映射。
+            fulltext: 是否可使用全文索引（见 app.models.search）匹配关键词。关键词按空格
+                分为多个词，需同时匹配。
+
+        Returns:
+            (conditions, residual_criteria): SQL 条件列表，以及需在 Python 中处理的剩余条件字典。
+        """
+        if attribute_mapping is None:
+            attribute_mapping = {}
+
+        conditions = []
+        residual = {}
+
+        keyword = filter_criteria.get('keyword')
+        keyword_attributes = filter_criteria.get('keyword_attributes', [])
+        if keyword and keyword_attributes:
+            attributes = [attribute_mapping.get(attr, attr) for attr in keyword_attributes]
+            condition = FilterUtils._keyword_condition(model, keyword, attributes, fulltext)
+            if condition is not None:
+                conditions.append(condition)
+            else:
+                residual['keyword'] = keyword
+                residual['keyword_attributes'] = keyword_attributes
+
+        for key, filter_value in filter_criteria.items():
+            if key in ('keyword', 'keyword_attributes', 'end_date', 'max_amount'):
+                continue
+
+            if key == 'start_date':
+                column = FilterUtils._column(model, attribute_mapping.get('date', 'date'))
+                if column is None:
+                    residual['start_date'] = filter_criteria.get('start_date')
+                    residual['end_date'] = filter_criteria.get('end_date')
+                else:
+                    conditions.extend(FilterUtils._date_conditions(
+                        column, filter_criteria.get('start_date'), filter_criteria.get('end_date')))
+
+            elif key == 'min_amount':
+                column = FilterUtils._column(model, attribute_mapping.get('amount', 'amount'))
+                min_amount = filter_criteria.get('min_amount')
+                max_amount = filter_criteria.get('max_amount')
+                if column is None:
+                    residual['min_amount'] = min_amount
+                    residual['max_amount'] = max_amount
+                else:
+                    conditions.append(column.isnot(None))
+                    if min_amount is not None:
+                        conditions.append(column >= min_amount)
+                    if max_amount is not None:
+                        conditions.append(column <= max_amount)
+
+            elif key in FilterUtils.ENUM_FILTER_KEYS:
+                if filter_value is None or filter_value.startswith("全部"):
+                    continue
+                column = FilterUtils._column(model, attribute_mapping.get(key, key))
+                if column is None:
+                    residual[key] = filter_value
+                else:
+                    conditions.append(FilterUtils._enum_condition(column, filter_value))
+
+        return conditions, residual
+
+    @staticmethod
+    def filter_query(query, model, filter_criteria, attribute_mapping=None, limit=None, offset=None):
+        """
+        在数据库中执行筛选，返回匹配的对象列表。
+
+        可编译为 SQL 的条件直接加入 query 的 WHERE 子句（排序、分页也在数据库中完成），
+        全文索引可用时关键词通过索引匹配；
+        映射到非列属性的条件在取回结果后用 apply_filters 过滤，此时分页在 Python 中进行。
+
+        Args:
+            query: 已限定范围和排序的查询，例如按项目过滤的 session.query(Model)。
+            model: 查询的模型类。
+            filter_criteria: 筛选条件字典，格式同 apply_filters。
+            attribute_mapping: (可选) 筛选键到模型属性名的映射，格式同 apply_filters。
+            limit: (可选) 最多返回的条数。
+            offset: (可选) 跳过的条数。
+
+        Returns:
+            过滤后的对象列表。
+        """
+        fulltext = bool(filter_criteria.get('keyword')) and search_available(query.session)
+        conditions, residual = FilterUtils.build_conditions(model, filter_criteria, attribute_mapping, fulltext)
+        if conditions:
+            query = query.filter(*conditions)
+
+        if not residual:
+            if offset:
+                query = query.offset(offset)
+            if limit is not None:
+                query = query.limit(limit)
+            return query.all()
+
+        items = FilterUtils.apply_filters(query.all(), residual, attribute_mapping)
+        start = offset or 0
+        return items[start:start + limit] if limit is not None else items[start:]
@@ -0,0 +1,264 @@
+"""
+支出批量导入
+
+按块读取导入文件（Excel 使用 openpyxl 只读模式逐行读取，CSV 使用 pandas 分块读取），
+每块以向量化方式校验各列，合格的行按批写入数据库：
+
+- 支出以 executemany 批量写入，对应的操作记录由一条 INSERT ... SELECT 生成；
+- 写入期间暂停支出汇总触发器，每批按费用类别聚合一次后累加到汇总表和预算已支出金额；
+- 不合格的行记录行号和原因，不影响同一批中其他行的导入。
+
+整个文件在一个事务中导入，数据库出错时全部回滚。
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, text, bindparam, DateTime
+from ..models.database import BudgetCategory, Expense, budget_rollup_suspended, apply_budget_rollup_delta
+
+SHEET_NAME = '支出信息'
+REQUIRED_COLUMNS = ['费用类别', '开支内容', '报账金额']
+OPTIONAL_COLUMNS = ['规格型号', '供应商', '报账日期', '备注']
+
+# 每块读取和写入的行数
+CHUNK_SIZE = 2000
+
+_CATEGORIES = {category.value: category for category in BudgetCategory}
+
+# 支出表中保存的类别名转换为操作记录中的类别文字
+_CATEGORY_LABEL_SQL = "CASE category " + " ".join(
+    f"WHEN '{category.name}' THEN '{category.value}'" for category in BudgetCategory
+) + " END"
+
+
+@dataclass
+class ImportRowError:
+    """一行未能导入的原因"""
+    row: int  # 文件中的行号（表头为第 1 行）
+    message: str
+
+
+@dataclass
+class ImportResult:
+    """导入结果"""
+    imported: int = 0  # 成功导入的行数
+    errors: list = field(default_factory=list)  # list[ImportRowError]
+    elapsed: float = 0.0  # 耗时（秒）
+
+    @property
+    def processed(self):
+        return self.imported + len(self.errors)
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _excel_chunks(file_path, chunk_size):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if SHEET_NAME not in workbook.sheetnames:
+            raise ValueError(f"文件中没有名为“{SHEET_NAME}”的工作表")
+        rows = workbook[SHEET_NAME].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise pd.errors.EmptyDataError("导入的文件为空")
+        header = [str(name).strip() if name is not None else '' for name in header]
+        width = len(header)
+
+        values, numbers = [], []
+        for number, row in enumerate(rows, start=2):
+            if all(value is None or (isinstance(value, str) and not value.strip()) for value in row):
+                continue  # 跳过空行
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            values.append(row)
+            numbers.append(number)
+            if len(values) >= chunk_size:
+                yield pd.DataFrame(values, columns=header, index=numbers)
+                values, numbers = [], []
+        if values:
+            yield pd.DataFrame(values, columns=header, index=numbers)
+    finally:
+        workbook.close()
+
+
+def read_chunks(file_path, chunk_size=CHUNK_SIZE):
+    """逐块读取导入文件
+
+    Yields:
+        DataFrame: 一块数据，列为表头，索引为文件中的行号
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.csv':
+        for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype=str):
+            chunk.index = chunk.index + 2
+            chunk.columns = [str(name).strip() for name in chunk.columns]
+            yield chunk
+    elif extension == '.xls':
+        # openpyxl 不支持旧版 .xls，整表读取后再分块
+        df = pd.read_excel(file_path, sheet_name=SHEET_NAME)
+        df.index = df.index + 2
+        df.columns = [str(name).strip() for name in df.columns]
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        yield from _excel_chunks(file_path, chunk_size)
+
+
+def check_columns(columns):
+    """检查表头是否包含全部必要列，缺少时抛出 ValueError"""
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(
+            f"文件缺少必要列！\n缺失列：{'、'.join(missing)}\n必须包含：{'、'.join(REQUIRED_COLUMNS)}"
+        )
+
+
+def _text(series):
+    """转换为去除首尾空白的文本列，空值为 None"""
+    text = series.astype('string').str.strip()
+    text = text.mask(text == '')
+    return text.astype(object).where(text.notna(), None)
+
+
+def validate_chunk(df):
+    """校验一块导入数据
+
+    Args:
+        df: read_chunks 生成的数据块
+
+    Returns:
+        (DataFrame, list[ImportRowError]): 合格的记录（列为 Expense 的字段）及不合格行的原因
+    """
+    df = df.reindex(columns=REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
+    df = df.replace(r'^\s*$', np.nan, regex=True)
+
+    category = _text(df['费用类别'])
+    content = _text(df['开支内容'])
+    raw_amount = df['报账金额']
+    amount = pd.to_numeric(raw_amount, errors='coerce')
+    raw_date = df['报账日期']
+    parsed_date = pd.to_datetime(raw_date, errors='coerce', format='mixed')
+
+    checks = [
+        (category.isna(), "费用类别为空"),
+        (category.notna() & ~category.isin(_CATEGORIES), "费用类别无效"),
+        (content.isna(), "开支内容为空"),
+        (raw_amount.isna(), "报账金额为空"),
+        (raw_amount.notna() & amount.isna(), "报账金额格式无效"),
+        (amount <= 0, "报账金额必须大于0"),
+        (raw_date.notna() & parsed_date.isna(), "无法识别报账日期格式"),
+    ]
+
+    invalid = pd.Series(False, index=df.index)
+    messages = {}
+    for mask, message in checks:
+        invalid |= mask
+        for row in df.index[mask]:
+            messages.setdefault(row, []).append(message)
+    errors = [ImportRowError(int(row), "；".join(reasons)) for row, reasons in sorted(messages.items())]
+
+    valid = ~invalid
+    today = date.today()
+    dates = parsed_date[valid]
+    records = pd.DataFrame({
+        'category': category[valid].map(_CATEGORIES),
+        'content': content[valid],
+        'specification': _text(df['规格型号'][valid]),
+        'supplier': _text(df['供应商'][valid]),
+        'amount': amount[valid].astype(float),
+        'date': dates.dt.date.astype(object).where(dates.notna(), today),  # 日期为空时使用当天
+        'remarks': _text(df['备注'][valid]),
+    }, index=df.index[valid])
+    return records, errors
+
+
+class ExpenseImporter:
+    """将导入文件中的支出写入某一年度预算"""
+
+    def __init__(self, sessions, project_id, budget_id, operator, related_info, chunk_size=CHUNK_SIZE):
+        """
+        Args:
+            sessions: 会话注册表
+            project_id: 项目ID
+            budget_id: 预算ID
+            operator: 写入操作记录的操作人
+            related_info: 写入操作记录的相关信息
+            chunk_size: 每块读取和写入的行数
+        """
+        self.sessions = sessions
+        self.project_id = project_id
+        self.budget_id = budget_id
+        self.operator = operator
+        self.related_info = related_info
+        self.chunk_size = chunk_size
+
+    def run(self, file_path, progress=None):
+        """导入文件
+
+        Args:
+            file_path: Excel 或 CSV 文件路径
+            progress: 进度回调 progress(已处理行数)，每块调用一次
+
+        Returns:
+            ImportResult: 导入结果
+
+        Raises:
+            ValueError: 文件缺少必要列或没有支出工作表
+            pandas.errors.EmptyDataError: 文件为空
+        """
+        result = ImportResult()
+        started = time.perf_counter()
+        with self.sessions.unit_of_work() as session:
+            connection = session.connection()
+            with budget_rollup_suspended(connection):
+                for index, chunk in enumerate(read_chunks(file_path, self.chunk_size)):
+                    if index == 0:
+                        check_columns(chunk.columns)
+                    records, errors = validate_chunk(chunk)
+                    result.errors.extend(errors)
+                    if len(records):
+                        self._write_batch(connection, records)
+                        result.imported += len(records)
+                    if progress is not None:
+                        progress(result.processed)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def _write_batch(self, connection, records):
+        """写入一批合格的支出、操作记录，并按类别累加汇总"""
+        columns = {name: records[name].tolist() for name in records.columns}
+        # 导入在写事务中进行，其他连接无法同时写入，本批支出的ID均大于写入前的最大ID
+        last_id = connection.execute(text("SELECT COALESCE(MAX(id), 0) FROM expenses")).scalar()
+        connection.execute(insert(Expense.__table__), [
+            {'project_id': self.project_id, 'budget_id': self.budget_id, 'category': category,
+             'content': content, 'specification': specification, 'supplier': supplier,
+             'amount': amount, 'date': expense_date, 'remarks': remarks}
+            for category, content, specification, supplier, amount, expense_date, remarks in zip(
+                columns['category'], columns['content'], columns['specification'], columns['supplier'],
+                columns['amount'], columns['date'], columns['remarks'])
+        ])
+
+        # 每条支出一条操作记录，由 INSERT ... SELECT 一次生成
+        connection.execute(text(f"""
+            INSERT INTO actionlogs (project_id, budget_id, expense_id, type, action, description,
+                                    operator, timestamp, category, amount, related_info)
+            SELECT project_id, budget_id, id, :type, :action,
+                   '批量导入支出：' || content || '，金额：' || printf('%.2f', amount) || '元',
+                   :operator, :timestamp, {_CATEGORY_LABEL_SQL}, amount, :related_info
+            FROM expenses WHERE id > :last_id ORDER BY id
+        """).bindparams(bindparam('timestamp', type_=DateTime)), {
+            'type': "支出", 'action': "批量导入", 'operator': self.operator, 'timestamp': datetime.now(),
+            'related_info': self.related_info, 'last_id': last_id,
+        })
+
+        totals = records.groupby('category', sort=False)['amount'].agg(['sum', 'count'])
+        apply_budget_rollup_delta(connection, self.project_id, self.budget_id, {
+            category: (amount, count) for category, (amount, count) in zip(totals.index, totals.itertuples(index=False))
+        })
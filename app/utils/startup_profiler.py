@@ -0,0 +1,115 @@
+"""
+启动耗时统计
+
+以 python run.py --profile-startup 启动时启用，记录：
+
+- 各模块的导入耗时：累计耗时（含其导入的子模块）和自身耗时；
+- 启动各阶段（初始化数据库、创建主窗口等）及各界面的创建耗时。
+
+主窗口首次显示后调用 report() 输出报告，之后（空闲时或切换页面时）创建的界面逐个输出。
+未启用时 measure() 只多一次判断，各处的统计代码可以常驻。
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 报告中列出的导入耗时最多的模块数
+TOP_IMPORTS = 30
+
+_enabled = False
+_started = None
+_reported = False
+_imports = []  # [(模块名, 累计耗时, 自身耗时, 是否由其它被统计的模块导入)]
+_phases = []  # [(名称, 耗时)]
+_local = threading.local()
+
+
+class _TimingLoader:
+    """包装模块加载器，统计 exec_module 的耗时，其余属性转给原加载器"""
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(0.0)  # 子模块导入耗时之和
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            _imports.append((module.__name__, elapsed, elapsed - children, bool(stack)))
+
+
+class _TimingFinder:
+    """放在 sys.meta_path 最前面，用其后的查找器查找模块，再包装找到的加载器"""
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimingLoader(spec.loader)
+                return spec
+        return None
+
+
+def enable():
+    """开始统计，需在导入其它模块之前调用"""
+    global _enabled, _started
+    if _enabled:
+        return
+    _enabled = True
+    _started = time.perf_counter()
+    sys.meta_path.insert(0, _TimingFinder())
+
+
+@contextmanager
+def measure(name):
+    """统计一段代码的耗时，未启用时不做任何事"""
+    if not _enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _phases.append((name, elapsed))
+        if _reported:
+            print(f"[启动耗时] {name}: {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+def report(stream=None):
+    """输出启动耗时报告（只输出一次），此后记录的耗时逐条输出"""
+    global _reported
+    if not _enabled or _reported:
+        return
+    _reported = True
+    stream = stream or sys.stderr
+    total = time.perf_counter() - _started
+    print(f"[启动耗时] 启动后 {total * 1000:.1f} ms 首次显示主窗口", file=stream)
+    print("[启动耗时] 各阶段:", file=stream)
+    for name, elapsed in _phases:
+        print(f"    {elapsed * 1000:8.1f} ms  {name}", file=stream)
+
+    total_imports = sum(elapsed for _, elapsed, _, nested in _imports if not nested)
+    print(f"[启动耗时] 导入模块 {len(_imports)} 个，共 {total_imports * 1000:.1f} ms，"
+          f"累计耗时最多的 {TOP_IMPORTS} 个（累计 / 自身）:", file=stream)
+    for name, elapsed, own, _ in sorted(_imports, key=lambda item: item[1], reverse=True)[:TOP_IMPORTS]:
+        print(f"    {elapsed * 1000:8.1f} ms  {own * 1000:8.1f} ms  {name}", file=stream)
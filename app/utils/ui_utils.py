@@ -2,8 +2,9 @@ from PySide6.QtWidgets import (QTableWidget, QTableWidgetItem, QTreeWidget, QTre
                              QHBoxLayout)
 from PySide6.QtGui import QFont # Import QFont
 from qfluentwidgets import TitleLabel, PrimaryPushButton, FluentIcon, InfoBar, TableWidget, ComboBox
-from ..models.database import Project, sessionmaker # Import Project model and sessionmaker
-from sqlalchemy import Engine # Import Engine type hint
+from ..models.database import Project # Import Project model
+from ..models.session import SessionRegistry
+from .event_bus import EntityKind, Operation
 import os
 
 class UIUtils:
@@ -11,21 +12,21 @@ class UIUtils:
   
     @staticmethod
     def set_table_style(table: TableWidget):
-        """设置表格通用样式"""
+        """设置表格通用样式，同样适用于基于模型的 TableView"""
         table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: transparent;
                 border: 1px solid rgba(0, 0, 0, 0.1);
                 border-radius: 8px;
                 selection-background-color: rgba(0, 0, 0, 0.05);
                 selection-color: black;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 4px 8px;
                 border: none;
                 height: 32px;
             }
-            QTableWidget::item:hover {
+            QTableView::item:hover {
                 background-color: rgba(0, 0, 0, 0.03);
             }
             QHeaderView::section {
@@ -56,7 +57,8 @@ class UIUtils:
         table.setSelectionBehavior(QTableWidget.SelectRows)
         table.setSelectionMode(QTableWidget.ExtendedSelection)
 
-        table.itemChanged.connect(UIUtils.set_item_tooltip)
+        if isinstance(table, QTableWidget):
+            table.itemChanged.connect(UIUtils.set_item_tooltip)
 
     @staticmethod
     def set_tree_style(tree):
@@ -186,12 +188,12 @@ class UIUtils:
         return icon_path
 
     @staticmethod
-    def create_project_selector(engine: Engine, parent=None) -> ComboBox:
+    def create_project_selector(sessions: SessionRegistry, parent=None) -> ComboBox:
         """
         创建并填充一个包含所有项目的 ComboBox。
 
         Args:
-            engine: SQLAlchemy 数据库引擎实例。
+            sessions: 应用级数据库会话注册表。
             parent: 父控件。
 
         Returns:
@@ -207,8 +209,7 @@ class UIUtils:
         font.setBold(True)    # 设置字体加粗
         combo_box.setFont(font)
 
-        Session = sessionmaker(bind=engine)
-        session = Session()
+        session = sessions()
         try:
             projects = session.query(Project).order_by(Project.financial_code).all()
             if not projects:
@@ -226,3 +227,59 @@ class UIUtils:
             session.close()
 
         return combo_box
+
+    @staticmethod
+    def apply_project_changes(combo_box: ComboBox, sessions: SessionRegistry, changes) -> bool:
+        """
+        按项目变更事件增量更新 create_project_selector 创建的下拉框，只查询变更的项目。
+
+        新增的项目按财务编号插入，删除的项目移除，修改的项目更新文字和数据。更新期间屏蔽
+        下拉框的信号，选中的项目不变，不会触发界面重新加载。
+
+        Args:
+            combo_box: 项目选择下拉框。
+            sessions: 应用级数据库会话注册表。
+            changes: 事件总线送达的变更（ChangeSet）。
+
+        Returns:
+            当前选中的项目是否已被删除。此时已选中第一项，由调用方按新的选中项更新界面。
+        """
+        deleted = changes.ids(EntityKind.PROJECT, Operation.DELETED)
+        changed = changes.ids(EntityKind.PROJECT, Operation.CREATED, Operation.UPDATED) - deleted
+        projects = {}
+        if changed:
+            with sessions.read() as session:
+                projects = {project.id: project for project in
+                            session.query(Project).filter(Project.id.in_(changed))}
+
+        current = combo_box.currentData()
+        current_id = current.id if isinstance(current, Project) else None
+        combo_box.blockSignals(True)
+        try:
+            for index in reversed(range(combo_box.count())):
+                data = combo_box.itemData(index)
+                if not isinstance(data, Project):
+                    continue
+                if data.id == current_id and data.id in projects:
+                    # 选中的项目原位更新
+                    project = projects.pop(data.id)
+                    combo_box.setItemText(index, f"{project.financial_code} ")
+                    combo_box.setItemData(index, project)
+                elif data.id in deleted or data.id in projects:
+                    combo_box.removeItem(index)
+
+            for project in projects.values():
+                index = combo_box.count()
+                for i in range(combo_box.count()):
+                    data = combo_box.itemData(i)
+                    if isinstance(data, Project) and (data.financial_code or "") > (project.financial_code or ""):
+                        index = i
+                        break
+                combo_box.insertItem(index, f"{project.financial_code} ", userData=project)
+
+            current_removed = current_id is not None and current_id in deleted
+            if current_removed:
+                combo_box.setCurrentIndex(0)
+        finally:
+            combo_box.blockSignals(False)
+        return current_removed
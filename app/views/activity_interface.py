@@ -4,20 +4,23 @@ from PySide6.QtCore import Qt, QPoint, QDate
 from PySide6.QtGui import QIcon
 from qfluentwidgets import TitleLabel, FluentIcon, LineEdit, ComboBox, DateEdit, CompactDateEdit, BodyLabel, PushButton, TableWidget, TableItemDelegate, Dialog, RoundMenu, Action, PlainTextEdit, ToolTipFilter, ToolTipPosition
 from ..utils.ui_utils import UIUtils
-from ..models.database import Base, sessionmaker, Actionlog
-from sqlalchemy.orm import sessionmaker
+from ..models.database import Base, Actionlog
+from ..models.session import SessionRegistry
 from sqlalchemy import Column, Integer, String, Date, ForeignKey, Enum as SQLEnum, Engine
 from enum import Enum
 from datetime import datetime
 from ..utils.attachment_utils import (
     create_attachment_button,
-    sanitize_filename, ensure_directory_exists, get_timestamp_str, get_attachment_icon_path,
+    sanitize_filename, ensure_directory_exists, get_attachment_icon_path,
     view_attachment, download_attachment, ROOT_DIR,
     generate_attachment_path, handle_attachment, execute_attachment_action
 )
+from ..utils.attachment_store import store_file, release
+from ..utils.attachment_cache import attachment_path_cache
+from ..utils.export_utils import ExportItem
+from ..components.attachment_export_dialog import AttachmentExportDialog
 from ..utils.filter_utils import FilterUtils
-import pandas as pd
-import shutil
+from ..utils.data_loader import DataLoader, snapshot
 
 class ActivityType(Enum):
     CONFERENCE = "学术会议"
@@ -42,12 +45,14 @@ class AcademicActivity(Base):
     type = Column(SQLEnum(ActivityType), nullable=False)  # 活动类型
     status = Column(SQLEnum(ActivityStatus), default=ActivityStatus.PLANNED)  # 活动状态
     organizer = Column(String(200))  # 主办方
-    start_date = Column(Date)  # 开始日期
+    start_date = Column(Date, index=True)  # 开始日期
     end_date = Column(Date)  # 结束日期
     location = Column(String(200))  # 活动地点
     participants = Column(String(500))  # 参与人员
     description = Column(String(500))  # 活动描述
-    attachment_path = Column(String(500))  # 附件文件路径
+    attachment_path = Column(String(500), index=True)  # 附件文件路径（附件存储按路径统计引用数）
+
+attachment_path_cache.track(AcademicActivity, 'activity', 'attachment_path')
 
 ACTIVITY_ATTACHMENTS_DIR = os.path.join(ROOT_DIR, "activities")
 
@@ -245,11 +250,12 @@ class ActivityDialog(QDialog):
             self.current_attachment_path = None
 
 class ActivityInterface(QWidget):
-    def __init__(self, engine: Engine, parent=None):
+    def __init__(self, engine: Engine, parent=None, sessions=None):
         super().__init__(parent=parent)
         self.engine = engine
-        self.all_activities = []
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         self.current_activities = []
+        self.loader = DataLoader(self.sessions, self)
         self.setup_ui()
         self.load_activities()
 
@@ -371,25 +377,24 @@ class ActivityInterface(QWidget):
         self.activity_table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.activity_table.customContextMenuRequested.connect(self.show_activity_context_menu)
 
+    def _activity_query(self, session):
+        return session.query(AcademicActivity).order_by(AcademicActivity.start_date.desc())
+
     def load_activities(self):
-        self.all_activities = []
+        """在后台加载学术活动，完成后填充表格"""
         self.current_activities = []
         self.activity_table.setRowCount(0)
+        self.loader.load('activities', lambda session: snapshot(self._activity_query(session).all()),
+                         self._show_activities,
+                         lambda error: self._on_load_error(f"加载活动数据失败: {error}"))
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+    def _show_activities(self, activities):
+        self.current_activities = activities
+        self._populate_table(activities)
 
-        try:
-            self.all_activities = session.query(AcademicActivity).order_by(
-                AcademicActivity.start_date.desc()
-            ).all()
-            self.current_activities = self.all_activities[:]
-            self._populate_table(self.current_activities)
-        except Exception as e:
-            UIUtils.show_error(self, "错误", f"加载活动数据失败: {e}")
-            print(f"Error loading activities: {e}")
-        finally:
-            session.close()
+    def _on_load_error(self, message):
+        UIUtils.show_error(self, "错误", message)
+        print(message)
 
     def _populate_table(self, activities_list):
         self.activity_table.setSortingEnabled(False)
@@ -437,7 +442,7 @@ class ActivityInterface(QWidget):
                 attachment_path=activity.attachment_path,
                 handle_attachment_func=lambda event, btn: handle_attachment(
                     event, btn, btn.property("item_id"), "activity", 
-                    sessionmaker(bind=self.engine), self, self._get_activity, 
+                    self.sessions, self, self._get_activity, 
                     "attachment_path", None, "activities"
                 ),
                 parent_widget=self,
@@ -450,8 +455,7 @@ class ActivityInterface(QWidget):
     def add_activity(self):
         dialog = ActivityDialog(self)
         if dialog.exec():
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             try:
                 new_activity = AcademicActivity(
                     name=dialog.name_edit.text(),
@@ -468,16 +472,11 @@ class ActivityInterface(QWidget):
 
                 attachment_action, _, new_selected_path = dialog.get_attachment_state()
                 if attachment_action == 'add':
-                    generated_path = self._generate_activity_path(new_activity.type, new_selected_path)
-                    if generated_path:
-                        try:
-                            shutil.copy2(new_selected_path, generated_path)
-                            new_activity.attachment_path = generated_path
-                        except Exception as e:
-                            UIUtils.show_error(self, "附件错误", f"保存附件失败: {e}")
-                    else:
-                        UIUtils.show_error(self, "附件错误", "无法生成附件路径")
-                
+                    try:
+                        new_activity.attachment_path = store_file(new_selected_path)
+                    except OSError as e:
+                        UIUtils.show_error(self, "附件错误", f"保存附件失败: {e}")
+
                 session.add(new_activity)
                 session.commit()
                 UIUtils.show_success(self, "成功", "活动添加成功")
@@ -497,8 +496,7 @@ class ActivityInterface(QWidget):
         row = selected_items[0].row()
         activity_id = self.activity_table.item(row, 0).data(Qt.UserRole)
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             activity = session.query(AcademicActivity).get(activity_id)
             if activity:
@@ -516,42 +514,18 @@ class ActivityInterface(QWidget):
 
                     attachment_action, old_path_db, new_selected_path_dialog = dialog.get_attachment_state()
                     
-                    if attachment_action == 'add': 
-                        generated_path = self._generate_activity_path(activity.type, new_selected_path_dialog)
-                        if generated_path:
-                            try:
-                                shutil.copy2(new_selected_path_dialog, generated_path)
-                                activity.attachment_path = generated_path
-                            except Exception as e:
-                                UIUtils.show_error(self, "附件错误", f"保存新附件失败: {e}")
-                        else:
-                            UIUtils.show_error(self, "附件错误", "无法生成新附件路径")
-                    elif attachment_action == 'replace': 
-                        generated_path = self._generate_activity_path(activity.type, new_selected_path_dialog)
-                        if generated_path:
-                            try:
-                                shutil.copy2(new_selected_path_dialog, generated_path)
-                                if old_path_db and os.path.exists(old_path_db) and os.path.normpath(old_path_db) != os.path.normpath(generated_path):
-                                    try:
-                                        os.remove(old_path_db)
-                                    except OSError as e_remove:
-                                        print(f"Error removing old attachment {old_path_db}: {e_remove}")
-                                activity.attachment_path = generated_path
-                            except Exception as e:
-                                UIUtils.show_error(self, "附件错误", f"替换附件失败: {e}")
-                        else:
-                            UIUtils.show_error(self, "附件错误", "无法生成替换附件路径")
-                    elif attachment_action == 'delete': 
-                        if old_path_db and os.path.exists(old_path_db):
-                            try:
-                                os.remove(old_path_db)
-                                activity.attachment_path = None
-                            except Exception as e:
-                                UIUtils.show_error(self, "附件错误", f"删除旧附件失败: {e}")
-                        else:
-                             activity.attachment_path = None
+                    if attachment_action in ('add', 'replace'):
+                        try:
+                            activity.attachment_path = store_file(new_selected_path_dialog)
+                        except OSError as e:
+                            UIUtils.show_error(self, "附件错误", f"保存附件失败: {e}")
+                    elif attachment_action == 'delete':
+                        activity.attachment_path = None
 
                     session.commit()
+                    # 原附件不再被其他记录引用时删除
+                    if old_path_db and old_path_db != activity.attachment_path:
+                        release(session, [old_path_db])
                     UIUtils.show_success(self, "成功", "活动更新成功")
                     self.load_activities()
         except Exception as e:
@@ -569,23 +543,19 @@ class ActivityInterface(QWidget):
         if not UIUtils.show_confirm(self, "确认", "确定要删除选中的活动吗？"):
             return
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
+        attachment_paths = []
         try:
             rows = set(item.row() for item in selected_items)
             for row in rows:
                 activity_id = self.activity_table.item(row, 0).data(Qt.UserRole)
                 activity = session.query(AcademicActivity).get(activity_id)
                 if activity:
-                    if activity.attachment_path and os.path.exists(activity.attachment_path):
-                        try:
-                            os.remove(activity.attachment_path)
-                            print(f"Successfully removed attachment file: {activity.attachment_path}")
-                        except Exception as e:
-                            print(f"Error removing attachment file {activity.attachment_path}: {e}")
-                            UIUtils.show_warning(self, "附件删除警告", f"无法删除附件文件: {os.path.basename(activity.attachment_path)}. 活动记录仍将删除。")
+                    attachment_paths.append(activity.attachment_path)
                     session.delete(activity)
             session.commit()
+            # 附件不再被其他记录引用时删除
+            release(session, attachment_paths)
             UIUtils.show_success(self, "成功", "活动删除成功")
             self.load_activities()
         except Exception as e:
@@ -595,45 +565,26 @@ class ActivityInterface(QWidget):
             session.close()
 
     def apply_filters(self):
-        filtered_activities = self.all_activities[:]
-
-        # 关键词搜索
-        search_text = self.search_edit.text().lower()
-        if search_text:
-            filtered_activities = [
-                activity for activity in filtered_activities
-                if search_text in activity.name.lower() or
-                   search_text in (activity.description or "").lower() or
-                   search_text in (activity.participants or "").lower() or
-                   search_text in (activity.location or "").lower()
-            ]
-
-        # 类型筛选
-        selected_type = self.type_filter.currentText()
-        if selected_type != "全部类型":
-            filtered_activities = [
-                activity for activity in filtered_activities
-                if activity.type.value == selected_type
-            ]
-
-        # 状态筛选
-        selected_status = self.status_filter.currentText()
-        if selected_status != "全部状态":
-            filtered_activities = [
-                activity for activity in filtered_activities
-                if activity.status.value == selected_status
-            ]
-
-        # 日期范围筛选
-        start_date = self.start_date.date().toPython()
-        end_date = self.end_date.date().toPython()
-        filtered_activities = [
-            activity for activity in filtered_activities
-            if activity.start_date and start_date <= activity.start_date <= end_date
-        ]
-
-        self.current_activities = filtered_activities
-        self._populate_table(self.current_activities)
+        filter_criteria = {
+            'keyword': self.search_edit.text(),
+            'keyword_attributes': ['name', 'description', 'participants', 'location'],
+            'category': self.type_filter.currentText(),
+            'status': self.status_filter.currentText(),
+            'start_date': self.start_date.date().toPython(),
+            'end_date': self.end_date.date().toPython()
+        }
+        attribute_mapping = {
+            'category': 'type',   # 活动类型
+            'date': 'start_date'  # 按活动开始日期筛选
+        }
+
+        # 筛选在数据库中执行，只取回匹配的活动
+        self.loader.load('activities', lambda session: snapshot(FilterUtils.filter_query(
+            self._activity_query(session),
+            AcademicActivity,
+            filter_criteria,
+            attribute_mapping
+        )), self._show_activities, lambda error: self._on_load_error(f"筛选活动失败: {error}"))
 
     def reset_filters(self):
         self.search_edit.clear()
@@ -641,8 +592,7 @@ class ActivityInterface(QWidget):
         self.status_filter.setCurrentText("全部状态")
         self.start_date.setDate(QDate(QDate.currentDate().year(), 1, 1))
         self.end_date.setDate(QDate.currentDate())
-        self.current_activities = self.all_activities[:]
-        self._populate_table(self.current_activities)
+        self.load_activities()
 
     def show_activity_context_menu(self, pos):
         selected_items = self.activity_table.selectedItems()
@@ -669,8 +619,7 @@ class ActivityInterface(QWidget):
         # 附件操作 - 使用通用的attachment_utils函数
         menu.addSeparator()
         
-        Session_ctx = sessionmaker(bind=self.engine)
-        session_ctx = Session_ctx()
+        session_ctx = self.sessions()
         activity_for_menu = session_ctx.query(AcademicActivity).get(activity_id)
         has_attachment = activity_for_menu and activity_for_menu.attachment_path and os.path.exists(activity_for_menu.attachment_path)
         session_ctx.close() # 关闭用于检查附件状态的会话
@@ -776,6 +725,7 @@ class ActivityInterface(QWidget):
                     "活动描述": activity.description
                 })
 
+            import pandas as pd
             df = pd.DataFrame(data)
             df.to_excel(file_path, index=False, engine='openpyxl')
             UIUtils.show_success(self, "成功", "活动信息导出成功")
@@ -783,44 +733,18 @@ class ActivityInterface(QWidget):
             UIUtils.show_error(self, "错误", f"导出失败: {e}")
 
     def export_activity_attachments(self):
-        if not self.current_activities:
+        """导出当前筛选结果中的活动附件"""
+        items = [
+            ExportItem(activity.attachment_path, {
+                '活动ID': activity.id,
+                '活动名称': activity.name,
+                '活动类型': activity.type.value,
+                '开始日期': str(activity.start_date or ''),
+            })
+            for activity in self.current_activities if activity.attachment_path
+        ]
+        if not items:
             UIUtils.show_warning(self, "警告", "没有可导出的活动附件")
             return
 
-        # 选择导出目录
-        export_dir = QFileDialog.getExistingDirectory(self, "选择导出目录")
-        if not export_dir:
-            return
-
-        try:
-            exported_count = 0
-            for activity in self.current_activities:
-                if activity.attachment_path and os.path.exists(activity.attachment_path):
-                    # 构建目标文件路径
-                    file_name = os.path.basename(activity.attachment_path)
-                    target_path = os.path.join(export_dir, file_name)
-
-                    # 如果文件已存在，添加时间戳
-                    if os.path.exists(target_path):
-                        name, ext = os.path.splitext(file_name)
-                        target_path = os.path.join(
-                            export_dir,
-                            f"{name}_{get_timestamp_str()}{ext}"
-                        )
-
-                    # 复制文件
-                    shutil.copy2(activity.attachment_path, target_path)
-                    exported_count += 1
-
-            if exported_count > 0:
-                UIUtils.show_success(
-                    self, "成功",
-                    f"成功导出 {exported_count} 个活动附件"
-                )
-            else:
-                UIUtils.show_info(
-                    self, "提示",
-                    "当前筛选结果中没有可导出的活动附件"
-                )
-        except Exception as e:
-            UIUtils.show_error(self, "错误", f"导出材料失败: {e}")
\ No newline at end of file
+        AttachmentExportDialog(items, "活动附件", "导出活动附件", self).exec()
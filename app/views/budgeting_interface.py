@@ -2,110 +2,257 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTreeWidget, Q
                              QHeaderView)
 from qfluentwidgets import TitleLabel, BodyLabel, FluentIcon, TreeWidget, Dialog, ToolTipFilter, ToolTipPosition
 from PySide6.QtCore import Qt
-from ..models.database import sessionmaker, BudgetCategory, BudgetPlan, BudgetPlanItem
+from ..models.database import BudgetCategory
+from ..models.session import SessionRegistry
+from ..models.budget_plan import (PlanChangeset, TEMP_ID_PREFIX, ITEM_FIELDS, PLAN_FIELDS,
+                                  apply_plan_changes, load_plan_trees)
+from ..utils.data_loader import DataLoader
 from ..utils.ui_utils import UIUtils
 
+# {类别名称: 预算类别}
+_CATEGORIES = {category.value: category for category in BudgetCategory}
+
+
 class BudgetingInterface(QWidget):
     """预算编制界面"""
     
-    def __init__(self, engine=None):
+    def __init__(self, engine=None, sessions=None):
         super().__init__()
         self.engine = engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
+        self.loader = DataLoader(self.sessions, self)
+        self._unloaded_plans = {}  # {预算计划行: 尚未创建子行的 PlanTree}
+        # 上次加载或保存时各行的数据库ID及字段值，保存时与界面上的值比较
+        self._saved_plans = {}  # {预算计划行: (计划ID, 字段值)}
+        self._saved_rows = {}  # {类别行或预算项行: (明细行ID, 字段值)}
+        self._dirty = set()  # 上次加载或保存后修改或新增的行
+        self._reordered = set()  # 在中间插入了子行、需要重新保存子行顺序的行
         self.setup_ui()
         self.load_budget_plans()  # 添加加载预算数据的调用
         # 连接单元格编辑完成信号
         self.budget_tree.itemChanged.connect(self.on_item_changed)
+        self.budget_tree.itemChanged.connect(lambda item, column: self._dirty.add(item))
+        self.budget_tree.itemExpanded.connect(self._ensure_plan_loaded)
 
     def load_budget_plans(self):
-        """加载已保存的预算计划数据"""
+        """在后台读取已保存的预算计划数据"""
+        self.loader.load('budget_plans', load_plan_trees, self._populate_budget_plans,
+                         lambda e: UIUtils.show_error(title='错误', content=f'加载预算数据失败：{str(e)}', parent=self))
+
+    def _populate_budget_plans(self, plans):
+        """添加预算计划行，类别和预算项在第一次展开时才创建"""
+        self.budget_tree.blockSignals(True)
         try:
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
-            
-            # 查询所有预算计划
-            budget_plans = session.query(BudgetPlan).all()
-            
-            for plan in budget_plans:
+            for plan in plans:
                 # 创建顶级项目
                 project_item = QTreeWidgetItem(self.budget_tree)
                 project_item.setText(0, plan.name)
                 project_item.setText(4, f"{plan.total_amount:.2f}")
                 project_item.setText(5, plan.remarks or "")
                 project_item.setFlags(project_item.flags() | Qt.ItemIsEditable)
-                
+
                 # 设置第一级项目的经费数额字体加粗
                 font = project_item.font(4)
                 font.setBold(True)
                 project_item.setFont(4, font)
-                
-                
-                # 添加预算类别
-                for category in BudgetCategory:
-                    category_item = QTreeWidgetItem(project_item)
-                    category_item.setText(0, category.value)
-                    
-                    # 查询该类别的预算项
-                    budget_items = session.query(BudgetPlanItem).filter(
-                        BudgetPlanItem.plan_id == plan.id,
-                        BudgetPlanItem.category == category,
-                        BudgetPlanItem.parent_id.is_(None)
-                    ).all()
-                    
-                    # 设置类别总金额
-                    if budget_items:
-                        category_item.setText(4, f"{budget_items[0].amount:.2f}")
-                        category_item.setText(5, budget_items[0].remarks or "")
-                    
-                    # 查询并添加子项（包括第二级和第三级）
-                    def add_sub_items(parent_item, parent_id):
-                        sub_items = session.query(BudgetPlanItem).filter(
-                            BudgetPlanItem.plan_id == plan.id,
-                            BudgetPlanItem.category == category,
-                            BudgetPlanItem.parent_id == parent_id
-                        ).all()
-                        
-                        for sub_item in sub_items:
-                            item = QTreeWidgetItem(parent_item)
-                            item.setText(0, sub_item.name)
-                            item.setText(1, sub_item.specification or "")
-                            item.setText(2, f"{sub_item.unit_price:.2f}" if sub_item.unit_price else "")
-                            item.setText(3, f"{sub_item.quantity:.0f}" if sub_item.quantity else "")
-                            item.setText(4, f"{sub_item.amount:.2f}" if sub_item.amount else "")
-                            item.setText(5, sub_item.remarks or "")
-                            item.setFlags(item.flags() | Qt.ItemIsEditable)
-                            
-                            # 递归加载子项的子项
-                            add_sub_items(item, sub_item.id)
-                    
-                    # 从第二级开始加载
-                    if budget_items:
-                        add_sub_items(category_item, budget_items[0].id)
-                        
-                    # 检查是否有子项，如果没有子项则设置为可编辑
-                    has_children = False
-                    if budget_items:
-                        # 检查是否有子项
-                        sub_items = session.query(BudgetPlanItem).filter(
-                            BudgetPlanItem.plan_id == plan.id,
-                            BudgetPlanItem.category == category,
-                            BudgetPlanItem.parent_id == budget_items[0].id
-                        ).all()
-                        has_children = len(sub_items) > 0
-                    
-                    # 如果没有子项，则设置为可编辑，否则禁止编辑
-                    if has_children:
-                        category_item.setFlags(category_item.flags() & ~Qt.ItemIsEditable)  # 禁止编辑
-                    else:
-                        category_item.setFlags(category_item.flags() | Qt.ItemIsEditable)  # 允许编辑
-            
-            session.close()
-            
-        except Exception as e:
-            UIUtils.show_error(
-                title='错误',
-                content=f'加载预算数据失败：{str(e)}',
-                parent=self
-            )
+
+                project_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+                self._unloaded_plans[project_item] = plan
+                self._saved_plans[project_item] = (plan.id, self._plan_values(project_item))
+                self._set_item_alignment(project_item)
+        finally:
+            self.budget_tree.blockSignals(False)
+
+    def _ensure_plan_loaded(self, project_item):
+        """为尚未展开过的预算计划行创建类别和预算项"""
+        plan = self._unloaded_plans.pop(project_item, None)
+        if plan is None:
+            return
+        project_item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
+        # 创建期间屏蔽 itemChanged，避免按单价和数量重新计算已保存的经费数额
+        self.budget_tree.blockSignals(True)
+        try:
+            for category in BudgetCategory:
+                category_item = QTreeWidgetItem(project_item)
+                category_item.setText(0, category.value)
+
+                # 设置类别总金额
+                category_node = plan.categories.get(category)
+                if category_node is not None:
+                    category_item.setText(4, f"{category_node.amount:.2f}")
+                    category_item.setText(5, category_node.remarks or "")
+                    self._saved_rows[category_item] = (category_node.id, self._row_values(category_item, category))
+                    self._add_plan_items(category_item, category_node.children, category)
+
+                # 如果没有子项，则设置为可编辑，否则禁止编辑
+                if category_item.childCount():
+                    category_item.setFlags(category_item.flags() & ~Qt.ItemIsEditable)  # 禁止编辑
+                else:
+                    category_item.setFlags(category_item.flags() | Qt.ItemIsEditable)  # 允许编辑
+            self._set_item_alignment(project_item)
+        finally:
+            self.budget_tree.blockSignals(False)
+
+    def _add_plan_items(self, parent_item, nodes, category):
+        """添加预算项（包括第二级和第三级）"""
+        for node in nodes:
+            item = QTreeWidgetItem(parent_item)
+            item.setText(0, node.name)
+            item.setText(1, node.specification or "")
+            item.setText(2, f"{node.unit_price:.2f}" if node.unit_price else "")
+            item.setText(3, f"{node.quantity:.0f}" if node.quantity else "")
+            item.setText(4, f"{node.amount:.2f}" if node.amount else "")
+            item.setText(5, node.remarks or "")
+            item.setFlags(item.flags() | Qt.ItemIsEditable)
+            values = self._row_values(item, category)
+            values['position'] = node.position
+            self._saved_rows[item] = (node.id, values)
+
+            # 递归添加子项的子项
+            self._add_plan_items(item, node.children, category)
+
+    @staticmethod
+    def _number(text):
+        return float(text) if text else 0.0
+
+    @classmethod
+    def _plan_values(cls, project_item):
+        """预算计划行的字段值"""
+        return {'name': project_item.text(0), 'total_amount': cls._number(project_item.text(4)),
+                'remarks': project_item.text(5) or None}
+
+    @classmethod
+    def _row_values(cls, item, category):
+        """类别行或预算项行的字段值，类别行只保存经费数额和备注"""
+        if item.parent().parent() is None:
+            return {'category': category, 'name': None, 'specification': None, 'unit_price': 0.0,
+                    'quantity': 0, 'amount': cls._number(item.text(4)), 'remarks': item.text(5) or None,
+                    'position': None}
+        return {'category': category, 'name': item.text(0), 'specification': item.text(1),
+                'unit_price': cls._number(item.text(2)), 'quantity': cls._number(item.text(3)),
+                'amount': cls._number(item.text(4)), 'remarks': item.text(5) or None,
+                'position': item.parent().indexOfChild(item)}
+
+    @staticmethod
+    def _row_category(item):
+        """行所属的预算类别，类别名称不是预算类别时为 None"""
+        while item.parent().parent() is not None:
+            item = item.parent()
+        return _CATEGORIES.get(item.text(0))
+
+    def _collect_changes(self):
+        """比较修改过的行与上次加载或保存时的值，返回 (变更集, {新增的行: 临时键})"""
+        changes = PlanChangeset()
+        temp_keys = {}
+        item_updates = {}  # {明细行ID: 变化的字段}
+
+        def plan_key(project_item):
+            saved = self._saved_plans.get(project_item)
+            if saved is not None:
+                return saved[0]
+            if project_item not in temp_keys:
+                temp_keys[project_item] = key = f"{TEMP_ID_PREFIX}{len(temp_keys) + 1}"
+                changes.plans_added.append({'id': key, **self._plan_values(project_item)})
+            return temp_keys[project_item]
+
+        def row_key(item, category):
+            saved = self._saved_rows.get(item)
+            if saved is not None:
+                return saved[0]
+            if item not in temp_keys:
+                # 父行先于子行加入变更集
+                parent = item.parent()
+                parent_id = row_key(parent, category) if parent.parent() is not None else None
+                top_item = parent
+                while top_item.parent() is not None:
+                    top_item = top_item.parent()
+                plan_id = plan_key(top_item)
+                temp_keys[item] = key = f"{TEMP_ID_PREFIX}{len(temp_keys) + 1}"
+                changes.items_added.append({'id': key, 'plan_id': plan_id, 'parent_id': parent_id,
+                                            **self._row_values(item, category)})
+            return temp_keys[item]
+
+        # 按层级处理，新增的父行先于子行
+        for item in sorted(self._dirty, key=self._depth):
+            if item.parent() is None:
+                saved = self._saved_plans.get(item)
+                if saved is None:
+                    plan_key(item)
+                    continue
+                plan_id, old_values = saved
+                values = self._plan_values(item)
+                delta = {name: values[name] for name in PLAN_FIELDS if values[name] != old_values[name]}
+                if delta:
+                    changes.plans_changed.append({'id': plan_id, **delta})
+                continue
+
+            category = self._row_category(item)
+            if category is None:
+                continue  # 类别名称被修改为非预算类别的行不保存
+            saved = self._saved_rows.get(item)
+            if saved is None:
+                row_key(item, category)
+                continue
+            row_id, old_values = saved
+            values = self._row_values(item, category)
+            # 顺序只在插入了同级行时保存，旧数据的 position 为空，单独写入会改变其位置
+            delta = {name: values[name] for name in ITEM_FIELDS
+                     if name != 'position' and values[name] != old_values[name]}
+            if delta:
+                item_updates[row_id] = delta
+
+        # 插入子行后重新保存各子行的顺序
+        for parent in self._reordered:
+            for index in range(parent.childCount()):
+                saved = self._saved_rows.get(parent.child(index))
+                if saved is not None and saved[1]['position'] != index:
+                    item_updates.setdefault(saved[0], {})['position'] = index
+        changes.items_changed = [{'id': row_id, **delta} for row_id, delta in item_updates.items()]
+        return changes, temp_keys
+
+    def _mark_saved(self, temp_keys, result):
+        """保存成功后以界面上的值作为新的基准"""
+        for item in self._dirty | temp_keys.keys():
+            if item.parent() is None:
+                saved = self._saved_plans.get(item)
+                plan_id = saved[0] if saved is not None else result.id_map.get(temp_keys.get(item))
+                if plan_id is not None:
+                    self._saved_plans[item] = (plan_id, self._plan_values(item))
+                continue
+            category = self._row_category(item)
+            saved = self._saved_rows.get(item)
+            row_id = saved[0] if saved is not None else result.id_map.get(temp_keys.get(item))
+            if category is not None and row_id is not None:
+                values = self._row_values(item, category)
+                if saved is not None:
+                    values['position'] = saved[1]['position']  # 未插入同级行时不保存顺序
+                self._saved_rows[item] = (row_id, values)
+        for parent in self._reordered:
+            for index in range(parent.childCount()):
+                saved = self._saved_rows.get(parent.child(index))
+                if saved is not None:
+                    saved[1]['position'] = index
+        self._dirty.clear()
+        self._reordered.clear()
+
+    def _forget(self, item):
+        """删除行时移除该行及其子行的记录"""
+        self._unloaded_plans.pop(item, None)
+        self._saved_plans.pop(item, None)
+        self._saved_rows.pop(item, None)
+        self._dirty.discard(item)
+        self._reordered.discard(item)
+        for i in range(item.childCount()):
+            self._forget(item.child(i))
+
+    @staticmethod
+    def _depth(item):
+        depth = 0
+        while item.parent() is not None:
+            item = item.parent()
+            depth += 1
+        return depth
+
     def setup_ui(self):
         """设置UI界面"""
         layout = QVBoxLayout(self)
@@ -182,34 +329,8 @@ class BudgetingInterface(QWidget):
         header.resizeSection(4, 110)  # 经费数额
         header.resizeSection(5, 120)  # 备注
         
-        # 设置单元格对齐方式
-        def set_item_alignment(item):
-            # 型号规格列居中对齐
-            item.setTextAlignment(1, Qt.AlignCenter)
-            # 单价列右对齐
-            item.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)
-            # 数量列居中对齐
-            item.setTextAlignment(3, Qt.AlignCenter)
-            
-            # 根据层级设置经费数额列的对齐方式
-            level = 1
-            parent = item.parent()
-            while parent:
-                level += 1
-                parent = parent.parent()
-            
-            # 第一、二级经费数额居中对齐，第三级右对齐
-            if level <= 2:
-                item.setTextAlignment(4, Qt.AlignCenter)
-            else:
-                item.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)
-            
-            # 递归设置子项的对齐方式
-            for i in range(item.childCount()):
-                set_item_alignment(item.child(i))
-        
         # 连接信号以在添加新项时设置对齐方式
-        self.budget_tree.itemChanged.connect(lambda item, column: set_item_alignment(item))
+        self.budget_tree.itemChanged.connect(lambda item, column: self._set_item_alignment(item))
         
         
         layout.addWidget(self.budget_tree)
@@ -221,6 +342,33 @@ class BudgetingInterface(QWidget):
         delete_btn.clicked.connect(self.delete_item)
         save_btn.clicked.connect(self.save_data)
         export_btn.clicked.connect(self.export_data)
+
+    @staticmethod
+    def _set_item_alignment(item):
+        """设置单元格对齐方式"""
+        # 型号规格列居中对齐
+        item.setTextAlignment(1, Qt.AlignCenter)
+        # 单价列右对齐
+        item.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)
+        # 数量列居中对齐
+        item.setTextAlignment(3, Qt.AlignCenter)
+
+        # 根据层级设置经费数额列的对齐方式
+        level = 1
+        parent = item.parent()
+        while parent:
+            level += 1
+            parent = parent.parent()
+
+        # 第一、二级经费数额居中对齐，第三级右对齐
+        if level <= 2:
+            item.setTextAlignment(4, Qt.AlignCenter)
+        else:
+            item.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)
+
+        # 递归设置子项的对齐方式
+        for i in range(item.childCount()):
+            BudgetingInterface._set_item_alignment(item.child(i))
         
     def add_budget(self):
         """添加新预算项目"""
@@ -250,10 +398,12 @@ class BudgetingInterface(QWidget):
         
         if parent:
             parent.insertChild(parent.indexOfChild(current_item) + 1, new_item)
+            self._reordered.add(parent)
         else:
             self.budget_tree.insertTopLevelItem(
                 self.budget_tree.indexOfTopLevelItem(current_item) + 1, new_item
             )
+        self._dirty.add(new_item)  # 插入前设置的文字不会触发 itemChanged
             
     def add_sub_level(self):
         """添加子级预算项"""
@@ -277,6 +427,7 @@ class BudgetingInterface(QWidget):
             )
             return
             
+        self._ensure_plan_loaded(current_item)
         new_item = QTreeWidgetItem(current_item)
         new_item.setText(0, "请输入该级预算名称")
         new_item.setFlags(new_item.flags() | Qt.ItemIsEditable)
@@ -313,164 +464,59 @@ class BudgetingInterface(QWidget):
             )
             return
             
+        # 按上次加载或保存时记录的ID删除，尚未保存的行只从界面移除
+        changes = PlanChangeset()
+        if not parent:
+            saved = self._saved_plans.get(current_item)
+            if saved is not None:
+                changes.plans_deleted.append(saved[0])
+        else:
+            saved = self._saved_rows.get(current_item)
+            if saved is not None:
+                changes.items_deleted.append(saved[0])
+
         try:
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
-            
-            # 如果是顶级项目，删除整个预算计划及其所有子项
-            if not parent:
-                budget_plan = session.query(BudgetPlan).filter_by(
-                    name=current_item.text(0)
-                ).first()
-                if budget_plan:
-                    session.delete(budget_plan)
-            else:
-                # 获取预算计划
-                top_item = current_item
-                while top_item.parent():
-                    top_item = top_item.parent()
-                budget_plan = session.query(BudgetPlan).filter_by(
-                    name=top_item.text(0)
-                ).first()
-                
-                if budget_plan:
-                    # 获取当前项目的类别
-                    category_item = current_item
-                    while category_item.parent() and category_item.parent().parent():
-                        category_item = category_item.parent()
-                    category = next((c for c in BudgetCategory if c.value == category_item.text(0)), None)
-                    
-                    if category:
-                        # 删除当前项及其子项
-                        budget_item = session.query(BudgetPlanItem).filter_by(
-                            plan_id=budget_plan.id,
-                            category=category,
-                            name=current_item.text(0)
-                        ).first()
-                        if budget_item:
-                            session.delete(budget_item)
-            
-            session.commit()
-            
-            # 删除界面项目
-            if parent:
-                parent.removeChild(current_item)
-            else:
-                self.budget_tree.takeTopLevelItem(
-                    self.budget_tree.indexOfTopLevelItem(current_item)
-                )
-                
+            with self.sessions.unit_of_work() as session:
+                apply_plan_changes(session, changes)
         except Exception as e:
-            session.rollback()
             UIUtils.show_error(
                 title='错误',
                 content=f'删除预算项失败：{str(e)}',
                 parent=self
             )
-        finally:
-            session.close()
-            
+            return
+
+        # 删除界面项目
+        self._forget(current_item)
+        if parent:
+            parent.removeChild(current_item)
+        else:
+            self.budget_tree.takeTopLevelItem(
+                self.budget_tree.indexOfTopLevelItem(current_item)
+            )
+
     def save_data(self):
-        """保存预算数据到数据库"""
+        """保存预算数据到数据库，只写入上次加载或保存以来修改、新增的行"""
         try:
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
-            
-            # 遍历所有顶级项目
-            for i in range(self.budget_tree.topLevelItemCount()):
-                project_item = self.budget_tree.topLevelItem(i)
-                
-                # 查找或创建预算计划
-                budget_plan = session.query(BudgetPlan).filter_by(
-                    name=project_item.text(0)
-                ).first()
-                
-                if budget_plan:
-                    # 更新现有预算计划
-                    budget_plan.total_amount = float(project_item.text(4)) if project_item.text(4) else 0.0
-                    budget_plan.remarks = project_item.text(5) or None
-                else:
-                    # 创建新的预算计划
-                    budget_plan = BudgetPlan(
-                        name=project_item.text(0),
-                        total_amount=float(project_item.text(4)) if project_item.text(4) else 0.0,
-                        remarks=project_item.text(5) or None
-                    )
-                    session.add(budget_plan)
-                    session.flush()  # 获取预算计划ID
-                
-                # 保存预算类别项
-                for j in range(project_item.childCount()):
-                    category_item = project_item.child(j)
-                    category_name = category_item.text(0)
-                    category = next((c for c in BudgetCategory if c.value == category_name), None)
-                    
-                    if category:
-                        # 查找或创建预算类别项
-                        budget_item = session.query(BudgetPlanItem).filter_by(
-                            plan_id=budget_plan.id,
-                            category=category,
-                            parent_id=None
-                        ).first()
-                        
-                        if budget_item:
-                            # 更新现有预算类别项
-                            budget_item.amount = float(category_item.text(4)) if category_item.text(4) else 0.0
-                            budget_item.remarks = category_item.text(5) or None
-                        else:
-                            # 创建新的预算类别项
-                            budget_item = BudgetPlanItem(
-                                plan_id=budget_plan.id,
-                                category=category,
-                                amount=float(category_item.text(4)) if category_item.text(4) else 0.0,
-                                remarks=category_item.text(5) or None
-                            )
-                            session.add(budget_item)
-                            session.flush()
-                        
-                        # 删除旧的子项
-                        session.query(BudgetPlanItem).filter_by(
-                            plan_id=budget_plan.id,
-                            category=category,
-                            parent_id=budget_item.id
-                        ).delete()
-                        
-                        # 保存新的子项
-                        for k in range(category_item.childCount()):
-                            sub_item = category_item.child(k)
-                            budget_sub_item = BudgetPlanItem(
-                                plan_id=budget_plan.id,
-                                parent_id=budget_item.id,
-                                category=category,
-                                name=sub_item.text(0),
-                                specification=sub_item.text(1),
-                                unit_price=float(sub_item.text(2)) if sub_item.text(2) else 0.0,
-                                quantity=float(sub_item.text(3)) if sub_item.text(3) else 0.0,
-                                amount=float(sub_item.text(4)) if sub_item.text(4) else 0.0,
-                                remarks=sub_item.text(5) or None
-                            )
-                            session.add(budget_sub_item)
-                
-            # 提交事务
-            session.commit()
-            
+            changes, temp_keys = self._collect_changes()
+            with self.sessions.unit_of_work() as session:
+                result = apply_plan_changes(session, changes)
+            self._mark_saved(temp_keys, result)
+
             # 显示成功消息
             UIUtils.show_success(
                 title='成功',
                 content='预算数据保存成功！',
                 parent=self
             )
-            
+
         except Exception as e:
-            session.rollback()
             UIUtils.show_error(
                 title='错误',
                 content=f'保存预算数据失败：{str(e)}',
                 parent=self
             )
-        finally:
-            session.close()
-        
+
     def export_data(self):
         """导出预算数据"""
         from PySide6.QtWidgets import QFileDialog
@@ -492,6 +538,7 @@ class BudgetingInterface(QWidget):
         # 获取顶级项目节点
         while current_item.parent():
             current_item = current_item.parent()
+        self._ensure_plan_loaded(current_item)
         
         # 显示导出配置对话框
         dialog = BudgetExportDialog(self)
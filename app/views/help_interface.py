@@ -5,7 +5,10 @@ from qfluentwidgets import (ExpandGroupSettingCard, ScrollArea,
                           FluentIcon, CardWidget, TitleLabel, BodyLabel)
 import os
 from PySide6.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView # Import necessary widgets for table
-from ..models.database import sessionmaker, Actionlog # Import sessionmaker and Actionlog model
+from ..models.database import Actionlog # Import Actionlog model
+from ..models.session import SessionRegistry
+from ..models.data_version import DataFreshness
+from ..utils.data_loader import DataLoader
 import json # Import json for data comparison
 
 def find_diff(old_dict, new_dict):
@@ -27,9 +30,12 @@ def find_diff(old_dict, new_dict):
     return diff
 
 class HelpInterface(ScrollArea):
-    def __init__(self, engine=None): # Accept engine as parameter
+    def __init__(self, engine=None, sessions=None): # Accept engine as parameter
         super().__init__()
         self.engine = engine # Store engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
+        self.loader = DataLoader(self.sessions, self)
+        self.freshness = DataFreshness(engine, ('actionlogs',)) # 操作日志自上次加载后是否有新的写入
         self.setup_ui()
     
     def setup_ui(self):
@@ -309,75 +315,67 @@ class HelpInterface(ScrollArea):
         # self.load_actionlogs() # Will be called when the tab is shown
 
     def showEvent(self, event):
-        """在窗口显示时加载操作日志"""
+        """在窗口显示时加载操作日志，自上次加载后没有新的操作记录时不重新查询"""
         super().showEvent(event)
-        self.load_actionlogs()
+        if self.freshness.is_stale():
+            self.load_actionlogs()
 
 
     def load_actionlogs(self):
-        """加载并显示操作日志"""
+        """在后台加载操作日志，完成后显示"""
         if not self.engine:
             print("数据库引擎未初始化，无法加载操作日志。")
             # Optionally show an info bar
             # UIUtils.show_warning(self, "警告", "数据库引擎未初始化，无法加载操作日志。")
             return
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        self.freshness.mark_fresh()
+        self.loader.load('actionlogs', self._fetch_actionlogs, self._populate_log_table,
+                         self._on_load_error)
 
-        try:
-            # 查询活动记录，按时间倒序排列，限制数量
-            actionlogs = session.query(Actionlog).order_by(Actionlog.timestamp.desc()).limit(100).all() # Limit to 100 for log
+    def _on_load_error(self, error):
+        self.freshness.invalidate() # 下次显示时重试
+        print(f"加载操作日志失败: {error}")
 
-            # 清空现有表格内容
-            self.log_table.setRowCount(0)
+    @staticmethod
+    def _fetch_actionlogs(session):
+        """查询最近的操作日志并计算数据差异（在后台线程中执行），返回各行的显示文本"""
+        # 查询活动记录，按时间倒序排列，限制数量
+        actionlogs = session.query(
+            Actionlog.timestamp, Actionlog.type, Actionlog.action, Actionlog.description,
+            Actionlog.related_info, Actionlog.old_data, Actionlog.new_data
+        ).order_by(Actionlog.timestamp.desc()).limit(100).all() # Limit to 100 for log
 
-            for row, logs in enumerate(actionlogs):
-                self.log_table.insertRow(row)
+        rows = []
+        for logs in actionlogs:
+            # 原数据 和 新数据 (显示差异)
+            old_data = json.loads(logs.old_data) if logs.old_data else {}
+            new_data = json.loads(logs.new_data) if logs.new_data else {}
 
-                # 时间
-                time_item = QTableWidgetItem(logs.timestamp.strftime("%Y-%m-%d %H:%M:%S"))
-                self.log_table.setItem(row, 0, time_item)
+            diff = find_diff(old_data, new_data)
 
-                # 类型
-                type_item = QTableWidgetItem(logs.type)
-                self.log_table.setItem(row, 1, type_item)
+            old_diff_text = ""
+            new_diff_text = ""
 
-                # 动作
-                action_item = QTableWidgetItem(logs.action)
-                self.log_table.setItem(row, 2, action_item)
+            for key, values in diff.items():
+                old_diff_text += f"{key}: {values.get('old')}\n"
+                new_diff_text += f"{key}: {values.get('new')}\n"
 
-                # 描述
-                description_item = QTableWidgetItem(logs.description)
-                self.log_table.setItem(row, 3, description_item)
+            rows.append((
+                logs.timestamp.strftime("%Y-%m-%d %H:%M:%S"), # 时间
+                logs.type, # 类型
+                logs.action, # 动作
+                logs.description, # 描述
+                logs.related_info or "", # 相关信息 Handle None
+                old_diff_text.strip(), # 原数据
+                new_diff_text.strip(), # 新数据
+            ))
+        return rows
 
-                # 相关信息
-                related_info_item = QTableWidgetItem(logs.related_info or "") # Handle None
-                self.log_table.setItem(row, 4, related_info_item)
-
-                # 原数据 和 新数据 (显示差异)
-                old_data = json.loads(logs.old_data) if logs.old_data else {}
-                new_data = json.loads(logs.new_data) if logs.new_data else {}
-                
-                diff = find_diff(old_data, new_data)
-                
-                old_diff_text = ""
-                new_diff_text = ""
-                
-                for key, values in diff.items():
-                    old_diff_text += f"{key}: {values.get('old')}\n"
-                    new_diff_text += f"{key}: {values.get('new')}\n"
-
-                old_data_item = QTableWidgetItem(old_diff_text.strip())
-                self.log_table.setItem(row, 5, old_data_item)
-
-                new_data_item = QTableWidgetItem(new_diff_text.strip())
-                self.log_table.setItem(row, 6, new_data_item)
-
-
-        except Exception as e:
-            print(f"加载操作日志失败: {e}") # Print error for now
-            # Optionally show an info bar
-            # UIUtils.show_error(self, "错误", f"加载操作日志失败: {e}")
-        finally:
-            session.close()
\ No newline at end of file
+    def _populate_log_table(self, rows):
+        # 清空现有表格内容
+        self.log_table.setRowCount(0)
+        self.log_table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.log_table.setItem(row, column, QTableWidgetItem(value))
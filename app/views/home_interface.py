@@ -1,52 +1,54 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QGridLayout
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QPixmap
-from qfluentwidgets import (TitleLabel, ScrollArea, ElevatedCardWidget,
-                          BodyLabel)
-from ..models.database import sessionmaker, Project, get_budget_usage, GanttTask
+from qfluentwidgets import TitleLabel, ScrollArea
+from ..models.database import Project
+from ..models.gantt import load_task_trees
+from ..models.gantt_schedule import load_critical_paths
+from ..models.session import SessionRegistry
+from ..models.budget_usage import query_budget_usage
+from ..utils.data_loader import DataLoader, snapshot
+from ..utils.event_bus import event_bus, EntityKind
+from ..components.project_overview_cards import FundCard, TaskCard, KeyedCardList
 import os
-from collections import defaultdict # 导入 defaultdict
 
 class HomeInterface(QWidget):
-    def __init__(self, engine=None):
+    def __init__(self, engine=None, sessions=None):
         super().__init__()
         self.engine = engine
-        self._signals_connected = False # Add flag to track signal connection
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
+        self.loader = DataLoader(self.sessions, self)
+        self._funds = {}  # {项目ID: 经费快照}
+        self._tasks = {}  # {项目ID: (财务编号, 一级任务, 关键路径)}
+        self._stale = {}  # {'funds'/'tasks': 待重新加载的项目ID集合，None 表示全部项目}
         self.setup_ui()
         self.setup_background()
-
-    def showEvent(self, event):
-        super().showEvent(event)
-        # 获取主窗口实例并连接信号 (只连接一次)
-        if not self._signals_connected:
-            main_window = self.window()
-            if main_window:
-                # 连接项目列表更新信号
-                if hasattr(main_window, 'project_updated'):
-                    main_window.project_updated.connect(self.refresh_data)
-                # 连接预算或支出更新信号
-                if hasattr(main_window, 'budget_or_expense_updated'):
-                    main_window.budget_or_expense_updated.connect(self.refresh_data)
-
-                self._signals_connected = True # Mark signals as connected
-
-    # Removed redundant post_init method which duplicated signal connections from showEvent
+        event_bus().changed.connect(self._on_data_changed)
 
     def refresh_data(self):
-        # 清空现有项目经费布局
-        for i in reversed(range(self.fund_layout.count())):
-            self.fund_layout.itemAt(i).widget().setParent(None)
-
-        # 清空现有项目进度布局
-        while self.task_layout.count():
-            item = self.task_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-
-        # 重新加载数据
+        # 重新加载数据，现有卡片在新数据送达后才替换
         self.load_funds()
         self.load_tasks() # 添加这行来刷新任务概览
 
+    def _on_data_changed(self, changes):
+        """数据变更后只重新加载受影响项目的卡片"""
+        fund_projects = changes.project_ids(EntityKind.PROJECT, EntityKind.BUDGET, EntityKind.EXPENSE)
+        if fund_projects:
+            self.load_funds(fund_projects)
+        task_projects = changes.project_ids(EntityKind.PROJECT, EntityKind.GANTT)
+        if task_projects:
+            self.load_tasks(task_projects)
+
+    def _mark_stale(self, key, project_ids):
+        """记录待重新加载的项目并返回本次要加载的项目
+
+        同一个键的新加载会取消尚未送达的旧加载，因此本次加载要包含之前尚未送达的项目。
+        """
+        pending = self._stale.get(key, set())
+        merged = None if project_ids is None or pending is None else pending | set(project_ids)
+        self._stale[key] = merged
+        return None if merged is None else frozenset(merged)
+
     def setup_background(self):
         # 创建背景标签
         self.background_label = QLabel(self)
@@ -123,6 +125,7 @@ class HomeInterface(QWidget):
         self.fund_layout.setSpacing(10)
         self.fund_layout.setAlignment(Qt.AlignTop)
 
+        self.fund_cards = KeyedCardList(self.fund_layout, self._create_fund_card, "暂无项目经费信息")
         self.fund_overview.setWidget(fund_container)
         fund_section_layout.addWidget(self.fund_overview)
         hbox.addLayout(fund_section_layout)
@@ -157,6 +160,7 @@ class HomeInterface(QWidget):
         self.task_layout.setSpacing(10)
         self.task_layout.setAlignment(Qt.AlignTop)
 
+        self.task_cards = KeyedCardList(self.task_layout, self._create_task_card, "暂无项目任务信息")
         self.task_overview.setWidget(task_container)
         task_section_layout.addWidget(self.task_overview)
         hbox.addLayout(task_section_layout)
@@ -167,232 +171,92 @@ class HomeInterface(QWidget):
         self.load_funds()
         self.load_tasks() # Call the new method
 
-    def load_funds(self):
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
-
-        try:
-            funds = session.query(Project).all()
-
-            # 如果没有项目，显示提示信息
-            if not funds:
-                no_fund_label = BodyLabel("暂无项目经费信息")
-                no_fund_label.setAlignment(Qt.AlignCenter)
-                self.fund_layout.addWidget(no_fund_label)
-                return # 退出方法，不再处理项目卡片
-
-            # 如果有项目，继续现有逻辑
-            for project in funds:
-                card = ElevatedCardWidget()
-                card.setFixedHeight(80)  # 设置卡片高度
-                card_layout = QVBoxLayout(card)
-                card_layout.setContentsMargins(15, 15, 15, 15)
-
-
-
-                # 创建网格布局用于显示项目信息
-                grid_layout = QGridLayout()
-                grid_layout.setSpacing(10)
-
-                # 获取预算使用情况
-                budget_usage = get_budget_usage(session, project.id)
-                total_budget = project.total_budget
-                total_spent = budget_usage['total_spent'] / 10000  # 转换为万元
-                execution_rate = (budget_usage['total_spent'] / (project.total_budget * 10000)) * 100 if project.total_budget > 0 else 0
-
-                # Removed Project title
-
-                
-                # 添加财务编号值
-                project_code_label = QLabel(project.financial_code if project.financial_code else "--")
-                project_code_label.setAlignment(Qt.AlignCenter) # Align center
-                project_code_label.setStyleSheet("font-size: 18px; font-weight: bold;")
-                grid_layout.addWidget(project_code_label, 0, 0, 2, 1, alignment=Qt.AlignCenter) # Add to grid column 0, span 2 rows, center align
-
-                # 添加分隔线
-                line = QLabel()
-                line.setStyleSheet("background-color: #ccc;")
-                line.setFixedWidth(1)
-                grid_layout.addWidget(line, 0, 1, 2, 1) # Add to grid column 1, span 2 rows, remove alignment
-
-                # Add Total Budget title
-                total_budget_title = QLabel("总预算")
-                total_budget_title.setAlignment(Qt.AlignCenter)
-                total_budget_title.setStyleSheet("font-size: 14px; color: #666;")
-                grid_layout.addWidget(total_budget_title, 0, 2, alignment=Qt.AlignCenter) # Add to grid column 2, row 0
-
-                # Add Total Spent title
-                total_spent_title = QLabel("总支出")
-                total_spent_title.setAlignment(Qt.AlignCenter)
-                total_spent_title.setStyleSheet("font-size: 14px; color: #666;")
-                grid_layout.addWidget(total_spent_title, 0, 3, alignment=Qt.AlignCenter) # Add to grid column 3, row 0
-
-                # Add Execution Rate title
-                execution_rate_title = QLabel("执行率")
-                execution_rate_title.setAlignment(Qt.AlignCenter)
-                execution_rate_title.setStyleSheet("font-size: 14px; color: #666;")
-                grid_layout.addWidget(execution_rate_title, 0, 4, alignment=Qt.AlignCenter) # Add to grid column 4, row 0
-
-                # Add Total Budget value
-                total_budget_value = QLabel(f"{total_budget:.2f}<span style='font-size: 14px; font-weight: normal;'> 万元</span>")
-                total_budget_value.setAlignment(Qt.AlignCenter)
-                total_budget_value.setStyleSheet("font-size: 18px; font-weight: bold;")
-                grid_layout.addWidget(total_budget_value, 1, 2, alignment=Qt.AlignCenter) # Add to grid column 2, row 1
-
-                # Add Total Spent value
-                total_spent_value = QLabel(f"{total_spent:.2f}<span style='font-size: 14px; font-weight: normal;'> 万元</span>")
-                total_spent_value.setAlignment(Qt.AlignCenter)
-                total_spent_value.setStyleSheet("font-size: 18px; font-weight: bold;")
-                grid_layout.addWidget(total_spent_value, 1, 3, alignment=Qt.AlignCenter) # Add to grid column 3, row 1
-
-                # Add Execution Rate value
-                execution_rate_value = QLabel(f"{execution_rate:.2f}<span style='font-size: 14px; font-weight: normal;'> %</span>")
-                execution_rate_value.setAlignment(Qt.AlignCenter)
-                execution_rate_value.setStyleSheet("font-size: 18px; font-weight: bold;")
-                grid_layout.addWidget(execution_rate_value, 1, 4, alignment=Qt.AlignCenter) # Add to grid column 4, row 1
-
-                # Set column stretch factors for layout
-                grid_layout.setColumnStretch(0, 1) # Project code column
-                grid_layout.setColumnStretch(1, 0) # Separator column (fixed width)
-                grid_layout.setColumnStretch(2, 1) # Total Budget column
-                grid_layout.setColumnStretch(3, 1) # Total Spent column
-                grid_layout.setColumnStretch(4, 1) # Execution Rate column
-
-                # Set row stretch to ensure vertical centering
-                grid_layout.setRowStretch(0, 1)
-                grid_layout.setRowStretch(1, 1)
-
-                # 添加网格布局到卡片布局
-                card_layout.addLayout(grid_layout)
-
-                # 点击事件
-                card.mousePressEvent = lambda event, p=project: self.open_project_fund(p)
-
-                self.fund_layout.addWidget(card)
-        finally:
-            session.close()
-
-
-    def load_tasks(self):
-        """加载并显示项目进度概览"""
+    def _create_fund_card(self, project_id):
+        card = FundCard(project_id)
+        card.clicked.connect(lambda: self.open_project_fund(project_id))
+        return card
+
+    def _create_task_card(self, project_id):
+        card = TaskCard(project_id)
+        card.clicked.connect(lambda: self.open_project_progress(project_id))
+        return card
+
+    def load_funds(self, project_ids=None):
+        """在后台加载项目经费概览，project_ids 不为 None 时只重新加载这些项目"""
+        project_ids = self._mark_stale('funds', project_ids)
+        self.loader.load('funds', lambda session: self._fetch_funds(session, project_ids), self._populate_funds)
+
+    @staticmethod
+    def _fetch_funds(session, project_ids=None):
+        """查询项目的预算和总支出（在后台线程中执行），返回 (project_ids, 经费快照)"""
+        query = session.query(Project)
+        if project_ids is not None:
+            query = query.filter(Project.id.in_(list(project_ids)))
+        projects = query.all()
+        # 一次聚合查询获取所有项目的预算使用情况
+        usages = query_budget_usage(session, [project.id for project in projects])
+        return project_ids, snapshot(projects, ('id', 'financial_code', 'total_budget'),
+                                     total_spent=lambda project: usages[project.id].total_spent)
+
+    def _populate_funds(self, result):
+        project_ids, funds = result
+        self._stale['funds'] = set()
+        if project_ids is None:
+            self._funds.clear()
+        else:
+            for project_id in project_ids:  # 已删除的项目不在查询结果中
+                self._funds.pop(project_id, None)
+        self._funds.update((project.id, project) for project in funds)
+        # 按项目ID复用已有卡片，只更新重新加载的项目
+        self.fund_cards.sync(sorted(self._funds.items()), FundCard.update_values, project_ids)
+
+    def load_tasks(self, project_ids=None):
+        """在后台加载项目进度概览，project_ids 不为 None 时只重新加载这些项目"""
         if not self.engine:
             # 数据库引擎未初始化，不打印信息
             return
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
-
-        try:
-            # 查询所有一级甘特图任务 (level == 0)，并按项目分组
-            # 使用 group_by 和 order_by 来按项目分组并保持一致的顺序
-            tasks_by_project = session.query(GanttTask).filter(GanttTask.level == 0).order_by(GanttTask.project_id).all()
-
-            # 清空现有布局中的所有小部件
-            while self.task_layout.count():
-                item = self.task_layout.takeAt(0)
-                if item.widget():
-                    item.widget().deleteLater()
-
-            if not tasks_by_project:
-                no_task_label = BodyLabel("暂无项目任务信息")
-                no_task_label.setAlignment(Qt.AlignCenter)
-                self.task_layout.addWidget(no_task_label)
-                return
-
-            # 正在创建项目进度卡片...
-
-            # 按项目ID分组任务
-            grouped_tasks = defaultdict(list)
-            for task in tasks_by_project:
-                grouped_tasks[task.project_id].append(task)
-
-            for project_id, tasks in grouped_tasks.items():
-                if not tasks:
-                    continue # Skip if no tasks for this project
-
-                card = ElevatedCardWidget()
-                card_content_layout = QGridLayout(card) # Use QGridLayout for the card content
-                card_content_layout.setContentsMargins(15, 15, 15, 15)
-                card_content_layout.setSpacing(10) # Adjust spacing
-
-                # 左侧：项目简称
-                project_code_label = QLabel(tasks[0].project.financial_code if tasks[0].project else "--")
-                project_code_label.setStyleSheet("font-size: 18px; font-weight: bold;")
-                project_code_label.setAlignment(Qt.AlignCenter) # 垂直和水平居中对齐
-                project_code_label.setFixedWidth(100) # 设置固定宽度
-                card_content_layout.addWidget(project_code_label, 0, 0, -1, 1, alignment=Qt.AlignCenter) # Add to grid column 0, span rows
-
-                # 添加分隔线
-                line = QLabel()
-                line.setStyleSheet("background-color: #ccc;")
-                line.setFixedWidth(1)
-                card_content_layout.addWidget(line, 0, 1, -1, 1) # Add to grid column 1, span rows, remove alignment
-
-
-                # Task information directly in grid columns 2, 3, 4
-                # Header row (Row 0)
-                task_code_title = QLabel("任务编码")
-                task_code_title.setStyleSheet("font-size: 14px; color: #666;")
-                card_content_layout.addWidget(task_code_title, 0, 2, alignment=Qt.AlignCenter)
-
-                task_name_title = QLabel("任务名称")
-                task_name_title.setStyleSheet("font-size: 14px; color: #666;")
-                card_content_layout.addWidget(task_name_title, 0, 3, alignment=Qt.AlignCenter)
-
-                task_progress_title = QLabel("任务进度")
-                task_progress_title.setStyleSheet("font-size: 14px; color: #666;")
-                card_content_layout.addWidget(task_progress_title, 0, 4, alignment=Qt.AlignCenter)
-
-                # Task rows (Starting from Row 1)
-                for i, task in enumerate(tasks):
-                    row = i + 1 # Start from row 1
-                    task_code_value = QLabel(task.code if task.code else str(i + 1))
-                    task_code_value.setStyleSheet("font-size: 16px; font-weight: bold;")
-                    card_content_layout.addWidget(task_code_value, row, 2, alignment=Qt.AlignCenter)
-
-                    task_name_value = QLabel(task.name)
-                    task_name_value.setStyleSheet("font-size: 16px; font-weight: bold;")
-                    card_content_layout.addWidget(task_name_value, row, 3, alignment=Qt.AlignCenter)
-
-                    task_progress_value = QLabel(f"{task.progress:.2f}<span style='font-size: 14px; font-weight: normal;'> %</span>")
-                    task_progress_value.setStyleSheet("font-size: 16px; font-weight: bold;")
-                    card_content_layout.addWidget(task_progress_value, row, 4, alignment=Qt.AlignCenter)
-
-                # Set column stretch factors for centering and layout
-                card_content_layout.setColumnStretch(0, 1) # Project code column
-                card_content_layout.setColumnStretch(1, 0) # Separator column (fixed width)
-                card_content_layout.setColumnStretch(2, 1) # "编码" column
-                card_content_layout.setColumnStretch(3, 2) # "名称" column (wider)
-                card_content_layout.setColumnStretch(4, 1) # "进度" column
-
-                # 添加点击事件
-                card.mousePressEvent = lambda event, p=tasks[0].project: self.open_project_progress(p) # Pass the project object
-
-                self.task_layout.addWidget(card)
-
-            # 项目进度卡片创建完成。
-
-        except Exception as e:
-            # 加载项目任务失败，不打印详细异常信息
-            pass
-        finally:
-            session.close()
-            # 数据库会话已关闭。
-
-    def open_project_progress(self, project):
+        project_ids = self._mark_stale('tasks', project_ids)
+        self.loader.load('tasks', lambda session: self._fetch_tasks(session, project_ids), self._populate_tasks)
+
+    @staticmethod
+    def _fetch_tasks(session, project_ids=None):
+        """读取项目的任务树，返回一级任务（进度为由子任务汇总的进度）、项目财务编号及关键路径（在后台线程中执行）"""
+        trees = load_task_trees(session, project_ids)
+        financial_codes = dict(session.query(Project.id, Project.financial_code).filter(Project.id.in_(list(trees))))
+        top_tasks = {project_id: [node for node in nodes if node.parent is None] for project_id, nodes in trees.items()}
+        return project_ids, top_tasks, financial_codes, load_critical_paths(session, list(trees))
+
+    def _populate_tasks(self, result):
+        project_ids, top_tasks, financial_codes, critical_paths = result
+        self._stale['tasks'] = set()
+        if project_ids is None:
+            self._tasks.clear()
+        else:
+            for project_id in project_ids:
+                self._tasks.pop(project_id, None)
+        self._tasks.update((project_id, (financial_codes.get(project_id), tasks, critical_paths.get(project_id)))
+                           for project_id, tasks in top_tasks.items() if tasks)
+        self.task_cards.sync(sorted(self._tasks.items()), lambda card, data: card.update_values(*data), project_ids)
+
+    def _get_project(self, project_id):
+        """按ID取回项目对象，供项目经费、项目进度界面选中项目"""
+        if project_id is None:
+            return None
+        with self.sessions.read() as session:
+            return session.get(Project, project_id)
+
+    def open_project_progress(self, project_id):
         """打开项目进度界面并加载项目数据"""
+        project = self._get_project(project_id)
         # 获取主窗口实例
         main_window = self.window()
         if main_window and hasattr(main_window, 'progress_interface'): # Check for progress_interface
-            progress_interface = main_window.progress_interface
+            progress_interface = main_window.progress_interface # 页面尚未创建时此时创建
 
             # 确保只触发一次界面切换
-            if main_window.stackedWidget.currentWidget() != progress_interface:
-                main_window.navigationInterface.setCurrentItem("项目进度") # Use the correct item name
-
-                if main_window.stackedWidget.indexOf(progress_interface) == -1:
-                    main_window.stackedWidget.addWidget(progress_interface)
-                main_window.stackedWidget.setCurrentWidget(progress_interface)
+            if main_window.stackedWidget.currentWidget() is not progress_interface.parent():
+                main_window.switchTo(progress_interface)
 
                 # 加载项目数据
                 # Load project data using the new method
@@ -401,19 +265,16 @@ class HomeInterface(QWidget):
                 else:
                     pass # Warning if method not found, do not print
 
-    def open_project_fund(self, project):
+    def open_project_fund(self, project_id):
+        project = self._get_project(project_id)
         # 获取主窗口实例
         main_window = self.window()
         if main_window and hasattr(main_window, 'project_fund_interface'):
-            budget_interface = main_window.project_fund_interface
+            budget_interface = main_window.project_fund_interface # 页面尚未创建时此时创建
 
             # 确保只触发一次界面切换
-            if main_window.stackedWidget.currentWidget() != budget_interface:
-                main_window.navigationInterface.setCurrentItem("项目经费")
-
-                if main_window.stackedWidget.indexOf(budget_interface) == -1:
-                    main_window.stackedWidget.addWidget(budget_interface)
-                main_window.stackedWidget.setCurrentWidget(budget_interface)
+            if main_window.stackedWidget.currentWidget() is not budget_interface.parent():
+                main_window.switchTo(budget_interface)
 
                 # 加载项目数据
                 budget_interface.load_project_data(project) # Pass the project object
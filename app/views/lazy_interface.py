@@ -0,0 +1,39 @@
+from PySide6.QtCore import Signal
+from PySide6.QtWidgets import QWidget, QVBoxLayout
+from ..utils import startup_profiler
+
+
+class LazyInterface(QWidget):
+    """导航页占位
+
+    主窗口注册导航项时只创建这个空白占位，真正的界面在第一次显示（切换到该页）、
+    第一次通过 widget() 访问或启动后空闲时才由 factory 创建，并放入占位的布局中。
+    占位使用界面的 objectName，导航和路由照常工作。
+    """
+    created = Signal(QWidget)  # 真正的界面创建完成
+
+    def __init__(self, factory, object_name, parent=None):
+        super().__init__(parent)
+        self.setObjectName(object_name)
+        self._factory = factory
+        self._widget = None
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+
+    def is_created(self):
+        return self._widget is not None
+
+    def widget(self):
+        """返回真正的界面，尚未创建时先创建"""
+        if self._widget is None:
+            with startup_profiler.measure(f"创建界面 {self.objectName()}"):
+                widget = self._factory()
+            self._factory = None
+            self._widget = widget
+            self._layout.addWidget(widget)
+            self.created.emit(widget)
+        return self._widget
+
+    def showEvent(self, event):
+        self.widget()
+        super().showEvent(event)
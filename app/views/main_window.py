@@ -1,30 +1,47 @@
-from PySide6.QtCore import Signal
+from PySide6.QtCore import QTimer
 from PySide6.QtGui import QIcon
 from qfluentwidgets import FluentWindow, FluentIcon, NavigationItemPosition
 from ..utils.ui_utils import UIUtils
-from .projecting_interface.project_list import ProjectListWindow
-from .projecting_interface.project_fund import ProjectBudgetWidget
-from .projecting_interface.project_progress import ProjectProgressWidget
-from .projecting_interface.project_document import ProjectDocumentWidget # Import Document Widget
-from .projecting_interface.project_outcome import ProjectOutcomeWidget # Import Outcome Widget
+from ..utils import startup_profiler
+from ..models.session import SessionRegistry
 from .home_interface import HomeInterface
-from .help_interface import HelpInterface
-from .budgeting_interface import BudgetingInterface
-from .tools_interface import ToolsInterface
-from .activity_interface import ActivityInterface # Import Activity Interface
+from .lazy_interface import LazyInterface
+# 这三个模块中定义了数据模型，需在建表和第一次查询之前导入；其余界面模块在创建页面时才导入
+from .projecting_interface import project_document, project_outcome # noqa: F401
+from . import activity_interface # noqa: F401
+from ..models.database import Project
 import os
 import sys # Import sys for path joining robustness if needed, though os should suffice
+from importlib import import_module
+
+# 首次显示后开始在空闲时创建其余页面的延迟，及相邻两个页面之间的间隔（毫秒）
+PREBUILD_DELAY_MS = 500
+PREBUILD_INTERVAL_MS = 50
+
+
+def _lazy_page(attribute):
+    """延迟创建的页面属性，访问时页面尚未创建则立即创建"""
+    return property(lambda self: self._pages[attribute].widget())
+
 
 class MainWindow(FluentWindow):
-    # 定义信号
-    project_updated = Signal()
-    activity_updated = Signal()
-    budget_or_expense_updated = Signal() # 新增信号，用于预算或支出更新
+    projecting_interface = _lazy_page('projecting_interface')
+    project_fund_interface = _lazy_page('project_fund_interface')
+    progress_interface = _lazy_page('progress_interface')
+    document_interface = _lazy_page('document_interface')
+    achievement_interface = _lazy_page('achievement_interface')
+    activity_interface = _lazy_page('activity_interface')
+    search_interface = _lazy_page('search_interface')
+    budget_edit_interface = _lazy_page('budget_edit_interface')
+    tools_interface = _lazy_page('tools_interface')
+    help_interface = _lazy_page('help_interface')
     
-    def __init__(self, engine=None):
+    def __init__(self, engine=None, sessions=None):
         super().__init__()
         self.engine = engine
-        self.project_fund_interface = None
+        self.sessions = sessions or SessionRegistry.for_engine(engine) # 应用级会话注册表，注入各界面
+        self._pages = {}  # {属性名: LazyInterface}
+        self._prebuild_started = False
         
         current_dir = os.path.dirname(os.path.abspath(__file__))
         icon_path = os.path.abspath(os.path.join(current_dir, '..', 'assets', 'icon.ico'))
@@ -40,9 +57,10 @@ class MainWindow(FluentWindow):
 
         self.setMicaEffectEnabled(False)
 
-        # 添加主页导航项
-        self.home_interface = HomeInterface(self.engine)
-        self.home_interface.setObjectName("homeInterface")        
+        # 主页启动后立即显示，直接创建；其余页面先注册占位，第一次切换到该页或启动后空闲时再创建
+        with startup_profiler.measure("创建界面 homeInterface"):
+            self.home_interface = HomeInterface(self.engine, sessions=self.sessions)
+        self.home_interface.setObjectName("homeInterface")
         self.addSubInterface(
             self.home_interface,
             FluentIcon.HOME,
@@ -50,107 +68,153 @@ class MainWindow(FluentWindow):
         )
 
         # 添加项目清单导航项
-        self.projecting_interface = ProjectListWindow(self.engine)
-        self.projecting_interface.setObjectName("projectingInterface")
-        self.addSubInterface(  
-            self.projecting_interface,
-            QIcon(UIUtils.my_svgicon('tab_project')),
-            "项目清单"
+        self._add_lazy_page(
+            'projecting_interface', "projectingInterface",
+            self._page_factory('.projecting_interface.project_list', 'ProjectListWindow', self.engine, sessions=self.sessions),
+            QIcon(UIUtils.my_svgicon('tab_project')), "项目清单"
         )
-        self.projecting_interface.project_list_updated.connect(self.project_updated)
 
         # 添加项目经费导航项
-        self.project_fund_interface = ProjectBudgetWidget(self.engine) 
-        self.project_fund_interface.setObjectName("projectBudgetInterface")
-        self.addSubInterface(
-            self.project_fund_interface,
-            QIcon(UIUtils.my_svgicon('tab_fund')), 
-            "项目经费"
+        self._add_lazy_page(
+            'project_fund_interface', "projectBudgetInterface",
+            self._page_factory('.projecting_interface.project_fund', 'ProjectBudgetWidget', self.engine, sessions=self.sessions),
+            QIcon(UIUtils.my_svgicon('tab_fund')), "项目经费"
         )
-        self.project_fund_interface.budget_updated.connect(self.budget_or_expense_updated)
-        
+
         # 添加项目进度导航项
-        self.progress_interface = ProjectProgressWidget(self.engine) 
-        self.progress_interface.setObjectName("progressInterface")
-        self.addSubInterface(
-            self.progress_interface,
-            QIcon(UIUtils.my_svgicon('tab_progress')), 
-            "项目进度"
+        self._add_lazy_page(
+            'progress_interface', "progressInterface",
+            self._page_factory('.projecting_interface.project_progress', 'ProjectProgressWidget', self.engine, sessions=self.sessions),
+            QIcon(UIUtils.my_svgicon('tab_progress')), "项目进度"
         )
-        # 连接 progress_updated 信号到 HomeInterface 的 refresh_data 槽
-        self.progress_interface.progress_updated.connect(self.home_interface.refresh_data)
-        
+
         # 添加项目文档导航项
-        self.document_interface = ProjectDocumentWidget(self.engine)
-        self.document_interface.setObjectName("documentInterface")
-        self.addSubInterface(
-            self.document_interface,
-            QIcon(UIUtils.my_svgicon('tab_document')), 
-            "项目文档"
+        self._add_lazy_page(
+            'document_interface', "documentInterface",
+            self._page_factory('.projecting_interface.project_document', 'ProjectDocumentWidget', self.engine, sessions=self.sessions),
+            QIcon(UIUtils.my_svgicon('tab_document')), "项目文档"
         )
 
         # 添加项目成果导航项
-        self.achievement_interface = ProjectOutcomeWidget(self.engine) 
-        self.achievement_interface.setObjectName("outcomeInterface")
-        self.addSubInterface(
-            self.achievement_interface,
-            QIcon(UIUtils.my_svgicon('tab_outcome')), 
-            "项目成果"
+        self._add_lazy_page(
+            'achievement_interface', "outcomeInterface",
+            self._page_factory('.projecting_interface.project_outcome', 'ProjectOutcomeWidget', self.engine, sessions=self.sessions),
+            QIcon(UIUtils.my_svgicon('tab_outcome')), "项目成果"
         )
 
         # 添加学术活动导航项
-        self.activity_interface = ActivityInterface(self.engine)
-        self.activity_interface.setObjectName("activityInterface")
-        self.addSubInterface(
-            self.activity_interface,
-            QIcon(UIUtils.my_svgicon('tab_activity')),
-            "学术活动"
+        self._add_lazy_page(
+            'activity_interface', "activityInterface",
+            self._page_factory('.activity_interface', 'ActivityInterface', self.engine, sessions=self.sessions),
+            QIcon(UIUtils.my_svgicon('tab_activity')), "学术活动"
+        )
+
+        # 添加全局搜索导航项
+        self._add_lazy_page(
+            'search_interface', "searchInterface",
+            self._page_factory('.search_interface', 'SearchInterface', self.engine, sessions=self.sessions),
+            FluentIcon.SEARCH, "全局搜索",
+            lambda page: page.result_activated.connect(self._open_search_result)
         )
-        
 
         # 添加预算编制导航项
-        self.budget_edit_interface = BudgetingInterface(self.engine)
-        self.budget_edit_interface.setObjectName("budgetingInterface")
-        self.addSubInterface(
-            self.budget_edit_interface,
-            QIcon(UIUtils.my_svgicon('tab_budget')),
-            "预算编制"
+        self._add_lazy_page(
+            'budget_edit_interface', "budgetingInterface",
+            self._page_factory('.budgeting_interface', 'BudgetingInterface', self.engine, sessions=self.sessions),
+            QIcon(UIUtils.my_svgicon('tab_budget')), "预算编制"
         )
 
         # 添加小工具导航项
-        self.tools_interface = ToolsInterface()
-        self.tools_interface.setObjectName("toolsInterface")
-        self.addSubInterface(
-            self.tools_interface,
-            FluentIcon.DEVELOPER_TOOLS,
-            "小工具"
+        self._add_lazy_page(
+            'tools_interface', "toolsInterface",
+            self._page_factory('.tools_interface', 'ToolsInterface'),
+            FluentIcon.DEVELOPER_TOOLS, "小工具"
         )
 
         # 添加帮助导航项
-        self.help_interface = HelpInterface(self.engine) # Pass the engine
-        self.help_interface.setObjectName("helpInterface")
-        self.addSubInterface(
-            self.help_interface,
-            FluentIcon.HELP,
-            "帮助",
+        self._add_lazy_page(
+            'help_interface', "helpInterface",
+            self._page_factory('.help_interface', 'HelpInterface', self.engine, sessions=self.sessions),
+            FluentIcon.HELP, "帮助",
             position=NavigationItemPosition.BOTTOM
         )
-                
-        if hasattr(self.progress_interface, '_refresh_project_selector'):
-            self.project_updated.connect(self.progress_interface._refresh_project_selector)
-        if hasattr(self.project_fund_interface, '_refresh_project_selector'):
-            self.project_updated.connect(self.project_fund_interface._refresh_project_selector)
-        if hasattr(self.document_interface, '_refresh_project_selector'):
-            self.project_updated.connect(self.document_interface._refresh_project_selector)
-        if hasattr(self.achievement_interface, '_refresh_project_selector'):
-            self.project_updated.connect(self.achievement_interface._refresh_project_selector)
-        if hasattr(self.budget_edit_interface, '_refresh_project_selector'):
-             self.project_updated.connect(self.budget_edit_interface._refresh_project_selector)
 
         # 设置当前页面
         self.navigationInterface.setCurrentItem("主页")
         self.navigationInterface.setExpandWidth(150)
         FluentWindow.updateFrameless(self)
-        
 
+    def _add_lazy_page(self, attribute, object_name, factory, icon, text, on_created=None,
+                       position=NavigationItemPosition.TOP):
+        """注册延迟创建的页面
+
+        Args:
+            attribute: 访问该页面的属性名（见 _lazy_page），访问时页面尚未创建则立即创建
+            object_name: 导航路由使用的 objectName
+            factory: 创建页面的函数
+            on_created: 页面创建后调用，用于连接信号
+        """
+        page = LazyInterface(factory, object_name)
+        if on_created is not None:
+            page.created.connect(on_created)
+        self._pages[attribute] = page
+        self.addSubInterface(page, icon, text, position=position)
+
+    @staticmethod
+    def _page_factory(module, name, *args, **kwargs):
+        """创建页面的函数，创建时才导入页面所在的模块（相对于本包）"""
+        def factory():
+            return getattr(import_module(module, __package__), name)(*args, **kwargs)
+        return factory
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._prebuild_started:
+            self._prebuild_started = True
+            QTimer.singleShot(PREBUILD_DELAY_MS, self._prebuild_next_page)
+
+    def _prebuild_next_page(self):
+        """空闲时逐个创建尚未创建的页面，每次只创建一个，期间界面仍能响应操作"""
+        for page in self._pages.values():
+            if not page.is_created():
+                page.widget()
+                QTimer.singleShot(PREBUILD_INTERVAL_MS, self._prebuild_next_page)
+                return
+
+    def build_all_pages(self):
+        """立即创建全部页面"""
+        for page in self._pages.values():
+            page.widget()
+
+    def switchTo(self, interface):
+        """切换到页面，interface 可以是页面本身或其占位"""
+        for page in self._pages.values():
+            if page.is_created() and page.widget() is interface:
+                interface = page
+                break
+        super().switchTo(interface)
+
+    def _open_search_result(self, entity, entity_id, project_id):
+        """跳转到全局搜索结果所在的界面，并选中所属项目、带入检索词"""
+        interfaces = {
+            'expense': 'project_fund_interface',
+            'document': 'document_interface',
+            'outcome': 'achievement_interface',
+            'activity': 'activity_interface',
+        }
+        if entity not in interfaces:
+            return
+        interface = getattr(self, interfaces[entity])
+        self.switchTo(interface)
+
+        selector = getattr(interface, 'project_selector', None)
+        if selector is not None and project_id is not None:
+            for i in range(selector.count()):
+                data = selector.itemData(i)
+                if isinstance(data, Project) and data.id == project_id:
+                    selector.setCurrentIndex(i)
+                    break
 
+        search_edit = getattr(interface, 'search_edit', None)
+        if search_edit is not None:
+            search_edit.setText(self.search_interface.search_edit.text().strip())
@@ -1,3 +1,16 @@
-from .project_progress import ProjectProgressWidget
-from .project_document import ProjectDocumentWidget
-from .project_outcome import ProjectOutcomeWidget # 更新导入路径和类名
\ No newline at end of file
+# 按需导入各界面：导入本包中的任一模块不会连带导入其它界面模块
+# （如 project_progress 会加载 QtWebEngine）
+_EXPORTS = {
+    'ProjectProgressWidget': 'project_progress',
+    'ProjectDocumentWidget': 'project_document',
+    'ProjectOutcomeWidget': 'project_outcome', # 更新导入路径和类名
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    return getattr(import_module(f'.{_EXPORTS[name]}', __name__), name)
@@ -4,20 +4,27 @@ from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QTableWidgetIte
 from PySide6.QtCore import Qt, QPoint 
 from PySide6.QtGui import QIcon 
 from qfluentwidgets import TitleLabel, FluentIcon, ComboBox, LineEdit, Dialog, BodyLabel, PushButton, TableWidget, TableItemDelegate, RoundMenu, Action, PlainTextEdit, ToolTipFilter, ToolTipPosition
-from ...models.database import Project, sessionmaker 
+from ...models.database import Project 
 from ...utils.ui_utils import UIUtils
-from ...models.database import Base, Actionlog # Project and sessionmaker already imported, add Actionlog
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum as SQLEnum, DateTime, Engine 
+from ...utils.event_bus import event_bus, EntityKind
+from ...models.database import Base, Actionlog # Project already imported, add Actionlog
+from ...models.session import SessionRegistry
+from ...models.data_version import DataFreshness
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum as SQLEnum, DateTime, Engine, Index 
 from enum import Enum
 from datetime import datetime
 from ...utils.attachment_utils import (
     create_attachment_button, # Keep
-    sanitize_filename, ensure_directory_exists, get_timestamp_str, get_attachment_icon_path,
+    sanitize_filename, get_timestamp_str, get_attachment_icon_path,
     view_attachment, download_attachment, ROOT_DIR, # Import necessary utils
     handle_attachment # 添加handle_attachment函数导入
 )
+from ...utils.attachment_store import store_file, release
+from ...utils.attachment_cache import attachment_path_cache
+from ...utils.export_utils import ExportItem
+from ...components.attachment_export_dialog import AttachmentExportDialog
 from ...utils.filter_utils import FilterUtils # Import FilterUtils
-import pandas as pd 
+from ...utils.data_loader import DataLoader, snapshot
 
 class DocumentType(Enum):
     APPLICATION = "申请材料"
@@ -44,6 +51,13 @@ class ProjectDocument(Base):
     upload_time = Column(DateTime, default=datetime.now)  # 上传时间
     keywords = Column(String(200))  # 关键词，用于检索
 
+    __table_args__ = (
+        Index('ix_project_documents_project_upload', 'project_id', 'upload_time'),
+        Index('ix_project_documents_file_path', 'file_path'),  # 附件存储按路径统计引用数
+    )
+
+attachment_path_cache.track(ProjectDocument, 'document', 'file_path')
+
 class DocumentDialog(QDialog):
     def __init__(self, parent=None, document=None):
         self.document = document
@@ -165,32 +179,32 @@ class DocumentDialog(QDialog):
 
 class ProjectDocumentWidget(QWidget):
     # Modify __init__ to accept engine and remove project
-    def __init__(self, engine: Engine, parent=None):
+    def __init__(self, engine: Engine, parent=None, sessions=None):
         super().__init__(parent=parent)
         self.engine = engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         self.current_project = None
-        self.all_documents = [] # Store all loaded documents
+        self.load_all = False # 是否显示全部项目的文档
         self.current_documents = [] # Store currently displayed documents
+        self.loader = DataLoader(self.sessions, self)
+        self.freshness = DataFreshness(engine, ('project_documents',)) # 文档数据自上次加载后是否被修改
         self.setup_ui()
+        event_bus().changed.connect(self._on_data_changed)
 
     def showEvent(self, event):
-        """在窗口显示时连接信号"""
+        """切换回本页时，文档自上次加载后被修改过（含其它程序修改数据库文件）才重新加载"""
         super().showEvent(event)
-        # 尝试连接信号
-        try:
-            main_window = self.window()
-            if main_window and hasattr(main_window, 'project_updated'):
-                # 先断开旧连接，防止重复连接
-                try:
-                    main_window.project_updated.disconnect(self._refresh_project_selector)
-                except RuntimeError:
-                    pass # 信号未连接，忽略错误
-                main_window.project_updated.connect(self._refresh_project_selector)
-                print("ProjectDocumentWidget: Connected to project_updated signal.")
-            else:
-                 print("ProjectDocumentWidget: Could not find main window or project_updated signal.")
-        except Exception as e:
-            print(f"ProjectDocumentWidget: Error connecting signal: {e}")
+        if (self.current_project or self.load_all) and self.freshness.is_stale():
+            self.load_documents(load_all=self.load_all)
+
+    def _on_data_changed(self, changes):
+        """项目新增、修改或删除时增量更新项目选择下拉框"""
+        if not changes.affects(EntityKind.PROJECT):
+            return
+        if not self.project_selector.isEnabled(): # 原先没有项目或加载出错，整体重建
+            self._refresh_project_selector()
+        elif UIUtils.apply_project_changes(self.project_selector, self.sessions, changes):
+            self._on_project_selected(self.project_selector.currentIndex()) # 选中的项目已被删除
 
     def _refresh_project_selector(self):
         """刷新项目选择下拉框的内容"""
@@ -206,8 +220,7 @@ class ProjectDocumentWidget(QWidget):
         self.project_selector.clear()
         self.project_selector.addItem("请选择项目...", userData=None) # 添加默认提示项
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             projects = session.query(Project).order_by(Project.financial_code).all()
             if not projects:
@@ -246,7 +259,7 @@ class ProjectDocumentWidget(QWidget):
         selector_label = TitleLabel("项目文档-", self)
         selector_label.setToolTip("用于创建和管理项目的文档信息")
         selector_label.installEventFilter(ToolTipFilter(selector_label, showDelay=300, position=ToolTipPosition.RIGHT))
-        self.project_selector = UIUtils.create_project_selector(self.engine, self)
+        self.project_selector = UIUtils.create_project_selector(self.sessions, self)
 
         # 手动添加“全部数据”选项
         self.project_selector.insertItem(0, "全部文档", userData="all")
@@ -364,38 +377,57 @@ class ProjectDocumentWidget(QWidget):
             self.load_documents() # Load documents for the selected project
         else:
             self.current_project = None
+            self.loader.cancel('documents')
             self.document_table.setRowCount(0) # Clear table if no project selected
             UIUtils.show_info(self, "项目文档", "请选择一个项目以查看文档")
 
+    def _document_scope(self):
+        """Returns the project ID whose documents are shown, None for all projects.
+           Raises LookupError if no project is selected and load_all is False.
+        """
+        if self.load_all:
+            return None
+        if self.current_project:
+            return self.current_project.id
+        raise LookupError("No project selected")
+
+    def _document_query(self, session, project_id):
+        """Returns the document query for the given project (all projects if project_id is None),
+           ordered by upload time.
+        """
+        query = session.query(ProjectDocument).order_by(ProjectDocument.upload_time.desc())
+        if project_id is None:
+            return query
+        return query.filter(ProjectDocument.project_id == project_id)
+
     def load_documents(self, load_all=False):
-        """Loads documents into memory and populates the table.
+        """Loads documents in the background and populates the table when done.
            If load_all is True, loads documents for all projects.
            Otherwise, loads documents for the current project.
         """
-        self.all_documents = []
+        self.load_all = load_all
         self.current_documents = []
         self.document_table.setRowCount(0)
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
-
         try:
-            if load_all:
-                print("DocumentWidget: Loading all documents.")
-                self.all_documents = session.query(ProjectDocument).order_by(ProjectDocument.upload_time.desc()).all()
-            elif self.current_project:
-                print(f"DocumentWidget: Loading documents for project ID: {self.current_project.id}")
-                self.all_documents = session.query(ProjectDocument).filter(
-                    ProjectDocument.project_id == self.current_project.id
-                ).order_by(ProjectDocument.upload_time.desc()).all()
-            else:
-                print("DocumentWidget: No project selected and load_all is False, cannot load documents.")
-                return
+            project_id = self._document_scope()
+        except LookupError:
+            print("DocumentWidget: No project selected and load_all is False, cannot load documents.")
+            self.loader.cancel('documents')
+            return
 
-            self.current_documents = self.all_documents[:] # Initial view shows all
-            self._populate_table(self.current_documents)
-        finally:
-            session.close()
+        self.freshness.mark_fresh()
+        self.loader.load('documents',
+                         lambda session: snapshot(self._document_query(session, project_id).all()),
+                         self._show_documents, self._on_load_error)
+
+    def _show_documents(self, documents):
+        self.current_documents = documents
+        self._populate_table(documents)
+
+    def _on_load_error(self, error):
+        self.freshness.invalidate() # 下次显示时重试
+        UIUtils.show_error(self, "错误", f"加载文档失败：{str(error)}")
 
     def _populate_table(self, documents_list):
         """Populates the table based on the provided list of ProjectDocument objects."""
@@ -455,12 +487,17 @@ class ProjectDocumentWidget(QWidget):
             'doc_type': 'doc_type' # Map filter key 'doc_type' to object attribute 'doc_type'
         }
 
-        self.current_documents = FilterUtils.apply_filters(
-            self.all_documents,
+        # 筛选在数据库中执行，只取回匹配的文档
+        try:
+            project_id = self._document_scope()
+        except LookupError:
+            return
+        self.loader.load('documents', lambda session: snapshot(FilterUtils.filter_query(
+            self._document_query(session, project_id),
+            ProjectDocument,
             filter_criteria,
             attribute_mapping
-        )
-        self._populate_table(self.current_documents)
+        )), self._show_documents, self._on_load_error)
 
     def reset_filters(self):
         """Resets filter inputs and reapplies filters."""
@@ -485,28 +522,15 @@ class ProjectDocumentWidget(QWidget):
 
             doc_type_enum = DocumentType(dialog.type_combo.currentText())
 
-            # --- Generate new path using specific rule ---
-            new_file_path = self._generate_document_path(
-                project=self.current_project,
-                doc_type_enum=doc_type_enum,
-                original_filename=source_file_path
-            )
-            if not new_file_path:
-                 UIUtils.show_error(self, "错误", "无法生成文档保存路径")
-                 return
-            # --- End path generation ---
-
-            # Ensure directory exists and copy file
+            # 文件按内容保存到附件存储，相同内容的文件只保存一份
             try:
-                ensure_directory_exists(os.path.dirname(new_file_path))
-                shutil.copy2(source_file_path, new_file_path)
+                new_file_path = store_file(source_file_path)
             except (IOError, OSError) as e:
                 UIUtils.show_error(self, "文件复制错误", f"无法复制文件到目标目录：{e}")
                 return # Stop if copy fails
 
             # Save to database
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             try:
                 document = ProjectDocument(
                     project_id=self.current_project.id,
@@ -538,12 +562,8 @@ class ProjectDocumentWidget(QWidget):
             except Exception as db_err:
                 session.rollback()
                 UIUtils.show_error(self, "数据库错误", f"保存文档信息失败：{db_err}")
-                # Attempt to remove the copied file if DB save failed
-                try:
-                    if os.path.exists(new_file_path):
-                        os.remove(new_file_path)
-                except OSError as remove_err:
-                     print(f"警告: 移除复制的文件失败: {remove_err}")
+                # 保存失败时，文件没有被其他记录引用则删除
+                release(session, [new_file_path])
             finally:
                 session.close()
 
@@ -563,8 +583,7 @@ class ProjectDocumentWidget(QWidget):
         doc_id = id_item.data(Qt.UserRole)
 
         # Use the stored engine
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
 
         try:
             document = session.query(ProjectDocument).filter(
@@ -635,9 +654,9 @@ class ProjectDocumentWidget(QWidget):
         confirm_dialog.yesButton.setText('确认删除')
 
         if confirm_dialog.exec():
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             deleted_count = 0
+            file_paths = []
             try:
                 for doc_id in doc_ids_to_delete:
                     document = session.query(ProjectDocument).filter(
@@ -645,14 +664,7 @@ class ProjectDocumentWidget(QWidget):
                         ProjectDocument.project_id == self.current_project.id
                     ).first()
                     if document:
-                        # 删除文件
-                        if document.file_path and os.path.exists(document.file_path):
-                            try:
-                                os.remove(document.file_path)
-                            except OSError as e:
-                                print(f"Warning: Could not delete document file {document.file_path}: {e}")
-                                # Decide if deletion should proceed or stop
-
+                        file_paths.append(document.file_path)
                         session.delete(document)
                         deleted_count += 1
 
@@ -668,6 +680,8 @@ class ProjectDocumentWidget(QWidget):
                         session.add(actionlog)
 
                 session.commit() # 在循环外部统一提交
+                # 文件不再被其他记录引用时删除
+                release(session, file_paths)
                 self.load_documents()
                 UIUtils.show_success(self, "成功", f"成功删除 {deleted_count} 条文档记录")
             except Exception as e:
@@ -687,8 +701,7 @@ class ProjectDocumentWidget(QWidget):
         if not id_item: return
         doc_id = id_item.data(Qt.UserRole)
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             document = session.query(ProjectDocument).get(doc_id)
             if not document or not document.file_path or not os.path.exists(document.file_path):
@@ -720,7 +733,6 @@ class ProjectDocumentWidget(QWidget):
     def handle_document_attachment(self, event, btn):
         """处理文档附件操作，使用通用附件处理函数"""
         doc_id = btn.property("item_id")
-        Session = sessionmaker(bind=self.engine)
         
         # 定义获取文档对象的函数
         def get_document(session, doc_id):
@@ -732,7 +744,7 @@ class ProjectDocumentWidget(QWidget):
             btn=btn,
             item_id=doc_id,
             item_type="document",
-            session_maker=Session,
+            session_maker=self.sessions,
             parent_widget=self,
             get_item_func=get_document,
             attachment_attr="file_path",
@@ -786,6 +798,7 @@ class ProjectDocumentWidget(QWidget):
                 })
 
             # 创建DataFrame并导出
+            import pandas as pd
             df = pd.DataFrame(data)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             export_path = os.path.join(export_dir, f"文档信息_{self.current_project.financial_code}_{timestamp}.xlsx")
@@ -798,46 +811,22 @@ class ProjectDocumentWidget(QWidget):
 
     def export_document_attachments(self):
         """导出文档附件"""
-        if not self.current_project or not self.current_documents:
+        items = [
+            ExportItem(doc.file_path, {
+                '文档ID': doc.id,
+                '文档名称': doc.name,
+                '文档类型': doc.doc_type.value,
+                '版本': doc.version or '',
+            })
+            for doc in self.current_documents if doc.file_path
+        ]
+        if not self.current_project or not items:
             UIUtils.show_warning(self, "警告", "没有可导出的文档附件")
             return
 
-        export_dir = QFileDialog.getExistingDirectory(
-            self, "选择导出目录",
-            os.path.expanduser("~")
-        )
-        if not export_dir:
-            return
-
-        try:
-            # 创建项目子目录
-            project_dir = os.path.join(export_dir, f"文档附件_{self.current_project.financial_code}")
-            os.makedirs(project_dir, exist_ok=True)
-
-            # 导出附件
-            exported_count = 0
-            for doc in self.current_documents:
-                if doc.file_path and os.path.exists(doc.file_path):
-                    filename = os.path.basename(doc.file_path)
-                    dest_path = os.path.join(project_dir, filename)
-                    
-                    # 避免文件名冲突
-                    counter = 1
-                    while os.path.exists(dest_path):
-                        base, ext = os.path.splitext(filename)
-                        dest_path = os.path.join(project_dir, f"{base}_{counter}{ext}")
-                        counter += 1
-                    
-                    shutil.copy2(doc.file_path, dest_path)
-                    exported_count += 1
-
-            if exported_count > 0:
-                UIUtils.show_success(self, "成功", f"成功导出 {exported_count} 个文档附件到: {project_dir}")
-            else:
-                UIUtils.show_warning(self, "警告", "没有找到可导出的文档附件")
-
-        except Exception as e:
-            UIUtils.show_error(self, "错误", f"导出文档附件失败: {str(e)}")
+        AttachmentExportDialog(
+            items, f"文档附件_{self.current_project.financial_code}", "导出文档附件", self
+        ).exec()
 
     def copy_cell_content(self, item):
         """复制单元格内容"""
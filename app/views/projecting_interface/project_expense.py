@@ -1,27 +1,33 @@
 import os
-import shutil # Added for file operations
 import sys # Needed for platform check in view_attachment (though it's in utils now)
 import subprocess # Needed for platform check in view_attachment (though it's in utils now)
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                                  QStackedWidget, QSplitter,
                                  QFileDialog, QTableWidgetItem, # Added QFileDialog here if not present
                                  QHeaderView)
-from PySide6.QtCore import Qt, Signal, QDate, QPoint # Added QPoint
+from PySide6.QtCore import Qt, QDate, QPoint # Added QPoint
 from PySide6.QtGui import QIcon # Added for button icon updates
-from qfluentwidgets import (FluentIcon, TableWidget, PushButton, ComboBox, CompactDateEdit,
+from qfluentwidgets import (FluentIcon, TableWidget, TableView, PushButton, ComboBox, CompactDateEdit,
                            LineEdit, TableItemDelegate, Dialog, RoundMenu, Action) # Added Dialog, RoundMenu, Action, ToolButton
-from ...models.database import sessionmaker, BudgetCategory, Expense, BudgetItem, Actionlog # Import Expense
+from ...models.database import BudgetCategory, Expense, BudgetItem, BudgetRollup, Actionlog # Import Expense
+from ...models.session import SessionRegistry
 from datetime import datetime
 from ...components.expense_dialog import ExpenseDialog
+from ...components.expense_table_model import ExpenseTableModel, ExpenseProxyModel, EXPENSE_FIELDS
+from ...components.attachment_delegate import AttachmentDelegate
 from ...utils.ui_utils import UIUtils
 from ...utils.attachment_utils import (
-    create_attachment_button,
     sanitize_filename, ensure_directory_exists, get_timestamp_str, get_attachment_icon_path,
     view_attachment, download_attachment, ROOT_DIR,
     generate_attachment_path, handle_attachment, execute_attachment_action
 )
+from ...utils.attachment_store import store_file, release
+from ...utils.export_utils import ExportItem
+from ...components.attachment_export_dialog import AttachmentExportDialog
 from ...utils.filter_utils import FilterUtils # Import FilterUtils
-from collections import defaultdict
+from ...utils.data_loader import DataLoader
+from ...utils.event_bus import event_bus, EntityKind, Operation
+from ...utils.import_utils import ExpenseImporter
 import pandas as pd # For export
 import json # For storing actionlog data
 
@@ -29,16 +35,13 @@ import json # For storing actionlog data
 CURRENT_OPERATOR = "系统用户"
 
 class ProjectExpenseWidget(QWidget):
-    # 添加信号，用于通知预算管理窗口更新数据
-    expense_updated = Signal()
-
-    def __init__(self, engine, project, budget):
+    def __init__(self, engine, project, budget, sessions=None):
         super().__init__()
         self.engine = engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         self.project = project
         self.budget = budget
-        self.all_expenses = [] # Store all loaded expenses
-        self.current_expenses = [] # Store currently displayed/sorted/filtered expenses
+        self.loader = DataLoader(self.sessions, self)
 
         self.setup_ui()
         self.load_expenses() # This will now populate the lists and call _populate_table
@@ -92,20 +95,23 @@ class ProjectExpenseWidget(QWidget):
         top_layout = QVBoxLayout(top_widget)
         top_layout.setContentsMargins(0, 0, 0, 0)  # 设置边距
 
-        self.expense_table = TableWidget()
-        self.expense_table.setColumnCount(9)
-        self.expense_table.setHorizontalHeaderLabels([
-             "支出ID", "费用类别", "开支内容", "规格型号", "供应商",
-            "报账金额(元)", "报账日期", "备注", "凭证附件"
-        ])
+        # 支出数据保存在列存储模型中，视图只为可见行绘制，附件列由委托绘制
+        self.expense_model = ExpenseTableModel(self)
+        self.expense_proxy = ExpenseProxyModel(self)
+        self.expense_proxy.setSourceModel(self.expense_model)
+
+        self.expense_table = TableView()
+        self.expense_table.setModel(self.expense_proxy)
         # 禁止直接编辑表格
-        self.expense_table.setEditTriggers(TableWidget.NoEditTriggers)
+        self.expense_table.setEditTriggers(TableView.NoEditTriggers)
 
         # 设置表格样式
         self.expense_table.setBorderVisible(True)
         self.expense_table.setBorderRadius(8)
         self.expense_table.setWordWrap(False)
-        self.expense_table.setItemDelegate(TableItemDelegate(self.expense_table))
+        self.expense_delegate = AttachmentDelegate(self.expense_table, ExpenseTableModel.ATTACHMENT_COLUMN, 'expense')
+        self.expense_delegate.attachment_clicked.connect(lambda cell: self.handle_voucher_wrapper(None, cell))
+        self.expense_table.setItemDelegate(self.expense_delegate)
 
         # 设置表格样式
         UIUtils.set_table_style(self.expense_table)
@@ -138,8 +144,12 @@ class ProjectExpenseWidget(QWidget):
         header.setSectionsMovable(True) # 可移动列
         header.setStretchLastSection(True) # 最后一列自动填充剩余空间
 
-        self.expense_table.setSelectionMode(TableWidget.ExtendedSelection)
-        self.expense_table.setSelectionBehavior(TableWidget.SelectRows) # 允许扩展选择整行
+        self.expense_table.setSelectionMode(TableView.ExtendedSelection)
+        self.expense_table.setSelectionBehavior(TableView.SelectRows) # 允许扩展选择整行
+
+        # 默认按报账日期倒序，排序在模型的全部数据上进行
+        header.setSortIndicator(ExpenseTableModel.DATE_COLUMN, Qt.DescendingOrder)
+        self.expense_table.setSortingEnabled(True)
 
 
         top_layout.addWidget(self.expense_table) # 添加到布局中
@@ -149,6 +159,15 @@ class ProjectExpenseWidget(QWidget):
         filter_layout = QHBoxLayout(filter_toolbar)
         filter_layout.setContentsMargins(0, 5, 0, 11)  # 设置边距，增加上下间距
 
+        # 关键词搜索
+        self.search_edit = LineEdit()
+        self.search_edit.setPlaceholderText("搜索开支内容、规格、供应商、备注")
+        self.search_edit.setFixedWidth(200)
+        self.search_edit.textChanged.connect(self.apply_filters)
+        filter_layout.addWidget(self.search_edit)
+
+        filter_layout.addSpacing(10)
+
         # 类别筛选
         filter_layout.addWidget(QLabel("费用类别:"))
         self.category_combo = ComboBox()
@@ -276,90 +295,31 @@ class ProjectExpenseWidget(QWidget):
             budget_widget.setCurrentWidget(budget_widget.widget(0))
             budget_widget.removeWidget(self)
 
-    def load_expenses(self):
-        """加载所有支出数据到内存并首次填充表格"""
-        try:
-            Session = sessionmaker(bind=self.engine)
-            with Session() as session:
-                # 查询所有相关支出数据
-                self.all_expenses = session.query(Expense).filter(
-                    Expense.budget_id == self.budget.id
-                ).order_by(Expense.date.desc()).all()
-                self.current_expenses = self.all_expenses[:]
-                self._populate_table(self.current_expenses)
+    def _expense_query(self, session):
+        """当前预算下的支出查询（按日期倒序），只选取表格需要的列"""
+        return session.query(*[getattr(Expense, field) for field in EXPENSE_FIELDS]).filter(
+            Expense.budget_id == self.budget.id
+        ).order_by(Expense.date.desc())
 
-        except Exception as e:
-            UIUtils.show_error(
-                title='错误',
-                content=f'加载支出数据失败：{str(e)}',
-                parent=self
-            )
+    def load_expenses(self):
+        """在后台加载当前预算的支出数据，完成后填充表格"""
+        self.loader.load('expenses', lambda session: self._expense_query(session).all(),
+                         self._populate_table, self._on_load_error)
+
+    def _on_load_error(self, error):
+        UIUtils.show_error(
+            title='错误',
+            content=f'加载支出数据失败：{str(error)}',
+            parent=self
+        )
 
     def _populate_table(self, expenses_list):
-        """根据给定的支出列表填充表格"""
-        self.expense_table.setSortingEnabled(False) # Disable sorting during population
-
-        # Clear existing cell widgets in the attachment column before repopulating
-        for i in range(self.expense_table.rowCount()):
-            self.expense_table.removeCellWidget(i, 8) # Column 8 is for attachments
-
-        # Set the row count based on the number of expenses
-        self.expense_table.setRowCount(len(expenses_list))
-
-        for row, expense in enumerate(expenses_list):
-            # self.expense_table.insertRow(row) # Remove insertRow
-
-            id_item = QTableWidgetItem(str(expense.id))
-            id_item.setTextAlignment(Qt.AlignCenter)
-            id_item.setData(Qt.UserRole, expense.id) # Store ID for potential use elsewhere
-            self.expense_table.setItem(row, 0, id_item)
-
-            cat_item = QTableWidgetItem(expense.category.value)
-            cat_item.setTextAlignment(Qt.AlignCenter)
-            self.expense_table.setItem(row, 1, cat_item)
-
-            cont_item = QTableWidgetItem(expense.content)
-            cont_item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-            self.expense_table.setItem(row, 2, cont_item)
-
-            spec_item = QTableWidgetItem(expense.specification or "")
-            spec_item.setTextAlignment(Qt.AlignCenter)
-            self.expense_table.setItem(row, 3, spec_item)
-
-            supp_item = QTableWidgetItem(expense.supplier or "")
-            supp_item.setTextAlignment(Qt.AlignCenter)
-            self.expense_table.setItem(row, 4, supp_item)
-
-            amount_item = QTableWidgetItem()
-            amount_item.setData(Qt.DisplayRole, expense.amount) # Set float directly for display role
-            amount_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            self.expense_table.setItem(row, 5, amount_item)
-
-            date_str = expense.date.strftime("%Y-%m-%d")
-            date_item = QTableWidgetItem(date_str)
-            date_item.setTextAlignment(Qt.AlignCenter)
-            date_item.setData(Qt.UserRole + 1, expense.date)
-            self.expense_table.setItem(row, 6, date_item)
-
-            remark_item = QTableWidgetItem(expense.remarks or "")
-            remark_item.setTextAlignment(Qt.AlignCenter)
-            self.expense_table.setItem(row, 7, remark_item)
-
-            container = create_attachment_button(
-                item_id=expense.id, # Pass correct ID from the expense object
-                attachment_path=expense.voucher_path, # Pass correct path
-                handle_attachment_func=self.handle_voucher_wrapper, # Pass the wrapper function
-                parent_widget=self,
-                item_type='expense'
-            )
-            self.expense_table.setCellWidget(row, 8, container)
-
-        self.expense_table.setSortingEnabled(True) # Re-enable sorting after population
+        """用给定的支出替换表格数据，视图滚动时再分批显示后续行"""
+        self.expense_model.set_expenses(expenses_list)
 
     def load_statistics(self):
         """加载统计数据"""
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
 
         try:
             # 设置行数为2（预算行和分类小计行）
@@ -425,17 +385,16 @@ class ProjectExpenseWidget(QWidget):
             subtotal_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)  # 不可编辑
             self.stats_table.setItem(1, 0, subtotal_item)
 
+            # 从预算执行汇总表读取各类别支出
+            rollups = dict(session.query(BudgetRollup.category, BudgetRollup.spent_amount).filter(
+                BudgetRollup.budget_id == self.budget.id
+            ).all())
+
             # 加载各类别统计数据
             category_amounts = {}
             for category in BudgetCategory:
-                # 获取该类别的所有支出记录
-                expenses = session.query(Expense).filter_by(
-                    budget_id=self.budget.id,
-                    category=category
-                ).all()
-
                 # 计算该类别的总支出金额
-                category_amount = sum(expense.amount for expense in expenses) / 10000  # 转换为万元
+                category_amount = (rollups.get(category) or 0.0) / 10000  # 转换为万元
                 category_amounts[category] = category_amount
                 total_amount += category_amount
 
@@ -458,80 +417,41 @@ class ProjectExpenseWidget(QWidget):
         finally:
             session.close()
 
-    def add_expenses(self, expenses_data):
-        """批量添加支出"""
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+    def _expenses_changed(self, operation, expense_ids=()):
+        """发出支出变更通知，expense_ids 未知时（批量导入）为空"""
+        event_bus().publish(EntityKind.EXPENSE, operation, expense_ids, project_ids=[self.project.id])
 
-        try:
-            for data in expenses_data:
-                # 创建支出记录
-                expense = Expense(
-                    project_id=self.project.id,
-                    budget_id=self.budget.id,
-                    category=BudgetCategory(data['类别']),
-                    content=data['开支内容'],
-                    specification=data['规格型号'],
-                    supplier=data['供应商'],
-                    amount=float(data['报账金额']),
-                    date=data['报账日期'],
-                    remarks=data.get('备注', '')
-                )
-                session.add(expense)
-                session.flush() # Flush to get expense ID if needed for actionlog
-
-                # 添加活动记录
-                actionlog = Actionlog(
-                    project_id=self.project.id,
-                    budget_id=self.budget.id,
-                    expense_id=expense.id,
-                    type="支出",
-                    action="批量导入",
-                    description=f"批量导入支出：{expense.content}，金额：{expense.amount:.2f}元",
-                    operator=CURRENT_OPERATOR, # Use placeholder operator
-                    category=expense.category.value,
-                    amount=expense.amount,
-                    related_info=f"项目: {self.project.financial_code}, 预算: {self.budget.year}"
-                )
-                session.add(actionlog)
-
-                # 更新预算子项的已支出金额
-                budget_item = session.query(BudgetItem).filter_by(
-                    budget_id=self.budget.id,
-                    category=BudgetCategory(data['类别'])
-                ).first()
+    def import_expenses(self, file_path):
+        """从 Excel/CSV 文件批量导入支出
 
-                if budget_item:
-                    budget_item.spent_amount += float(data['报账金额']) / 10000
-
-                # 更新预算总额的已支出金额
-                self.budget = session.merge(self.budget)
-                self.budget.spent_amount += float(data['报账金额']) / 10000
-
-            session.commit()
+        Returns:
+            ImportResult: 导入的行数及未导入行的原因
+        """
+        importer = ExpenseImporter(
+            self.sessions, self.project.id, self.budget.id,
+            operator=CURRENT_OPERATOR, # Use placeholder operator
+            related_info=f"项目: {self.project.financial_code}, 预算: {self.budget.year}"
+        )
+        result = importer.run(file_path)
+        if result.imported:
             self.load_expenses() # Reload all data after batch add
             self.load_statistics()
-            # 发送信号通知预算管理窗口更新数据
-            self.expense_updated.emit()
-
-        except Exception as e:
-            session.rollback()
-            UIUtils.show_error(
-                title='错误',
-                content=f"批量导入支出失败：{str(e)}",
-                parent=self
-            )
-        finally:
-            session.close()
+            # 通知预算管理窗口及主页更新数据
+            self._expenses_changed(Operation.CREATED)
+        return result
 
     def add_expense(self):
         """添加单个支出"""
         dialog = ExpenseDialog(engine=self.engine, budget=self.budget, parent=self)
         if dialog.exec():
             data = dialog.get_data()
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
+            voucher_path = None
             try:
+                # 凭证按内容保存到附件存储
+                if data.get('voucher_path'):
+                    voucher_path = store_file(data['voucher_path'])
+
                 # 创建支出记录
                 expense = Expense(
                     project_id=self.project.id,
@@ -543,7 +463,7 @@ class ProjectExpenseWidget(QWidget):
                     amount=data['amount'],
                     date=data['date'],
                     remarks=data['remarks'],
-                    voucher_path=data.get('voucher_path') # Get voucher path from dialog
+                    voucher_path=voucher_path
                 )
                 session.add(expense)
                 session.flush() # Flush to get expense ID
@@ -562,24 +482,12 @@ class ProjectExpenseWidget(QWidget):
                 )
                 session.add(actionlog)
 
-                # 更新预算子项的已支出金额
-                budget_item = session.query(BudgetItem).filter_by(
-                    budget_id=self.budget.id,
-                    category=data['category']
-                ).first()
-
-                if budget_item:
-                    budget_item.spent_amount += data['amount'] / 10000
-
-                # 更新预算总额的已支出金额
-                self.budget = session.merge(self.budget)
-                self.budget.spent_amount += data['amount'] / 10000
-
+                # 预算及子项的已支出金额由数据库触发器随支出写入同步更新
                 session.commit()
                 self.load_expenses() # Reload data after adding
                 self.load_statistics()
-                # 发送信号通知预算管理窗口更新数据
-                self.expense_updated.emit()
+                # 通知预算管理窗口及主页更新数据
+                self._expenses_changed(Operation.CREATED, [expense.id])
                 UIUtils.show_success(
                     title='成功',
                     content='支出添加成功',
@@ -592,13 +500,14 @@ class ProjectExpenseWidget(QWidget):
                     content=f'添加支出失败：{str(e)}',
                     parent=self
                 )
+                release(session, [voucher_path])
             finally:
                 session.close()
 
     def edit_expense(self):
         """编辑选中的支出"""
-        selected_items = self.expense_table.selectedItems()
-        if not selected_items:
+        selected_rows = self.expense_table.selectionModel().selectedRows()
+        if not selected_rows:
             UIUtils.show_warning(
                 title='警告',
                 content='请先选择要编辑的支出记录',
@@ -606,14 +515,9 @@ class ProjectExpenseWidget(QWidget):
             )
             return
 
-        row = selected_items[0].row()
-        expense_id_item = self.expense_table.item(row, 0)
-        if not expense_id_item: return # Should not happen if row is selected
-
-        expense_id = expense_id_item.data(Qt.UserRole)
+        expense_id = selected_rows[0].data(Qt.UserRole)
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             expense = session.query(Expense).get(expense_id)
             if not expense:
@@ -634,12 +538,12 @@ class ProjectExpenseWidget(QWidget):
                 'remarks': expense.remarks,
                 'voucher_path': expense.voucher_path
             }
-            old_amount = expense.amount
-            old_category = expense.category
-
             dialog = ExpenseDialog(engine=self.engine, budget=self.budget, expense=expense, parent=self)
             if dialog.exec():
                 data = dialog.get_data()
+                old_voucher_path = expense.voucher_path
+                if data.get('voucher_path'):
+                    data['voucher_path'] = store_file(data['voucher_path'])
 
                 # 更新支出记录
                 expense.category = data['category']
@@ -649,7 +553,7 @@ class ProjectExpenseWidget(QWidget):
                 expense.amount = data['amount']
                 expense.date = data['date']
                 expense.remarks = data['remarks']
-                expense.voucher_path = data.get('voucher_path') # Update voucher path
+                expense.voucher_path = data.get('voucher_path')
 
                 new_data_dict = {
                     'category': expense.category.value,
@@ -678,39 +582,14 @@ class ProjectExpenseWidget(QWidget):
                 )
                 session.add(actionlog)
 
-                # --- 更新预算金额 ---
-                amount_diff = data['amount'] - old_amount
-                category_changed = (data['category'] != old_category)
-
-                # 如果类别改变，先从旧类别减去旧金额
-                if category_changed:
-                    old_budget_item = session.query(BudgetItem).filter_by(
-                        budget_id=self.budget.id,
-                        category=old_category
-                    ).first()
-                    if old_budget_item:
-                        old_budget_item.spent_amount -= old_amount / 10000
-
-                # 更新新类别（或同一类别）的金额
-                new_budget_item = session.query(BudgetItem).filter_by(
-                    budget_id=self.budget.id,
-                    category=data['category']
-                ).first()
-                if new_budget_item:
-                    if category_changed:
-                        new_budget_item.spent_amount += data['amount'] / 10000 # Add new amount to new category
-                    else:
-                        new_budget_item.spent_amount += amount_diff / 10000 # Adjust amount in the same category
-
-                # 更新预算总额的已支出金额
-                self.budget = session.merge(self.budget)
-                self.budget.spent_amount += amount_diff / 10000
-
+                # 预算及子项的已支出金额由数据库触发器随支出写入同步更新
                 session.commit()
+                if old_voucher_path != expense.voucher_path:
+                    release(session, [old_voucher_path])
                 self.load_expenses() # Reload data after editing
                 self.load_statistics()
-                # 发送信号通知预算管理窗口更新数据
-                self.expense_updated.emit()
+                # 通知预算管理窗口及主页更新数据
+                self._expenses_changed(Operation.UPDATED, [expense.id])
                 UIUtils.show_success(
                     title='成功',
                     content='支出编辑成功',
@@ -728,7 +607,7 @@ class ProjectExpenseWidget(QWidget):
 
     def delete_expense(self):
         """批量删除支出"""
-        selected_rows = sorted(list(set(item.row() for item in self.expense_table.selectedItems())), reverse=True)
+        selected_rows = self.expense_table.selectionModel().selectedRows()
         if not selected_rows:
             UIUtils.show_warning(
                 title='警告',
@@ -737,11 +616,7 @@ class ProjectExpenseWidget(QWidget):
             )
             return
 
-        expense_ids_to_delete = []
-        for row in selected_rows:
-            id_item = self.expense_table.item(row, 0)
-            if id_item:
-                expense_ids_to_delete.append(id_item.data(Qt.UserRole))
+        expense_ids_to_delete = [index.data(Qt.UserRole) for index in selected_rows if index.data(Qt.UserRole) is not None]
 
         if not expense_ids_to_delete:
             UIUtils.show_error(self, "错误", "无法获取选中的支出ID")
@@ -757,18 +632,14 @@ class ProjectExpenseWidget(QWidget):
         confirm_dialog.yesButton.setText('确认删除')
 
         if confirm_dialog.exec():
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             deleted_count = 0
-            total_amount_deleted = 0.0
-            category_amounts_deleted = defaultdict(float)
+            voucher_paths = []
 
             try:
                 for expense_id in expense_ids_to_delete:
                     expense = session.query(Expense).get(expense_id)
                     if expense:
-                        amount_deleted = expense.amount
-                        category_deleted = expense.category
                         old_data_dict = {
                             'category': expense.category.value,
                             'content': expense.content,
@@ -792,36 +663,18 @@ class ProjectExpenseWidget(QWidget):
                         )
                         session.add(actionlog)
 
-                        # 删除凭证文件（如果存在）
-                        if expense.voucher_path and os.path.exists(expense.voucher_path):
-                            try:
-                                os.remove(expense.voucher_path)
-                            except OSError as e:
-                                print(f"Warning: Could not delete voucher file {expense.voucher_path}: {e}")
-
+                        voucher_paths.append(expense.voucher_path)
                         session.delete(expense)
                         deleted_count += 1
-                        total_amount_deleted += amount_deleted
-                        category_amounts_deleted[category_deleted] += amount_deleted
-
-                # 更新预算金额
-                for category, amount in category_amounts_deleted.items():
-                    budget_item = session.query(BudgetItem).filter_by(
-                        budget_id=self.budget.id,
-                        category=category
-                    ).first()
-                    if budget_item:
-                        budget_item.spent_amount -= amount / 10000
-
-                # 更新预算总额
-                self.budget = session.merge(self.budget)
-                self.budget.spent_amount -= total_amount_deleted / 10000
 
+                # 预算及子项的已支出金额由数据库触发器随支出删除同步更新
                 session.commit()
+                # 凭证文件不再被其他支出引用时删除
+                release(session, voucher_paths)
                 self.load_expenses() # Reload data after deleting
                 self.load_statistics()
-                # 发送信号通知预算管理窗口更新数据
-                self.expense_updated.emit()
+                # 通知预算管理窗口及主页更新数据
+                self._expenses_changed(Operation.DELETED, expense_ids_to_delete)
                 UIUtils.show_success(
                     title='成功',
                     content=f'成功删除 {deleted_count} 条支出记录',
@@ -845,12 +698,13 @@ class ProjectExpenseWidget(QWidget):
         """处理凭证附件操作的包装函数"""
         handle_attachment(
             event, btn, btn.property("item_id"), "expense", 
-            sessionmaker(bind=self.engine), self, self._get_expense, 
+            self.sessions, self, self._get_expense, 
             "voucher_path", "project_attr", "vouchers"
         )
 
     def reset_filters(self):
         """重置所有筛选条件"""
+        self.search_edit.clear()
         self.category_combo.setCurrentText("全部")
         start_date = QDate(self.project.start_date.year, self.project.start_date.month, self.project.start_date.day)
         self.start_date.setDate(start_date)
@@ -881,6 +735,8 @@ class ProjectExpenseWidget(QWidget):
 
 
         filter_criteria = {
+            'keyword': self.search_edit.text().strip(),
+            'keyword_attributes': ['content', 'specification', 'supplier', 'remarks'],
             'category': category_filter,
             'start_date': start_date,
             'end_date': end_date,
@@ -894,13 +750,13 @@ class ProjectExpenseWidget(QWidget):
             'amount': 'amount'      # Explicitly map 'amount' for clarity if needed by FilterUtils internals
         }
 
-        self.current_expenses = FilterUtils.apply_filters(
-            self.all_expenses,
+        # 筛选在数据库中执行，只取回匹配的支出；与 load_expenses 共用加载键，新的筛选取消未完成的加载
+        self.loader.load('expenses', lambda session: FilterUtils.filter_query(
+            self._expense_query(session),
+            Expense,
             filter_criteria,
             attribute_mapping
-        )
-
-        self._populate_table(self.current_expenses)
+        ), self._populate_table, self._on_load_error)
 
     def export_expense_excel(self):
         """导出支出信息到Excel"""
@@ -917,7 +773,7 @@ class ProjectExpenseWidget(QWidget):
 
         try:
             expenses_to_export = []
-            for expense in self.current_expenses: # Use the currently displayed list
+            for expense in self.expense_model.records(): # Use the currently displayed list
                 expense_data = {
                     '费用类别': expense.category.value,
                     '开支内容': expense.content,
@@ -986,54 +842,24 @@ class ProjectExpenseWidget(QWidget):
             print(f"Error exporting expense Excel: {e}") # Log for debugging
 
     def export_expense_vouchers(self):
-        """导出支出凭证"""
-        # 选择导出目录
-        export_dir = QFileDialog.getExistingDirectory(
-            self,
-            "选择凭证导出目录",
-            "",
-            QFileDialog.ShowDirsOnly | QFileDialog.DontResolveSymlinks
-        )
-
-        if not export_dir:
-            return
-
-        # 获取当前显示的支出记录的凭证路径
-        vouchers_to_export = []
-        for expense in self.current_expenses:
-            if expense.voucher_path and os.path.exists(expense.voucher_path):
-                vouchers_to_export.append(expense.voucher_path)
-
-        if not vouchers_to_export:
+        """导出当前筛选结果中的支出凭证"""
+        items = [
+            ExportItem(expense.voucher_path, {
+                '支出ID': expense.id,
+                '费用类别': expense.category.value if expense.category else '',
+                '开支内容': expense.content,
+                '金额(元)': f"{expense.amount:.2f}",
+                '报账日期': str(expense.date or ''),
+            })
+            for expense in self.expense_model.records() if expense.voucher_path
+        ]
+        if not items:
             UIUtils.show_info(self, "提示", "当前筛选结果中没有找到有效的支出凭证文件。")
             return
 
-        copied_count = 0
-        errors = []
-        try:
-            # 创建目标子目录（可选，但推荐）
-            target_subdir = os.path.join(export_dir, f"凭证_{self.project.financial_code}_{self.budget.year}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-            os.makedirs(target_subdir, exist_ok=True)
-
-            for voucher_path in vouchers_to_export:
-                try:
-                    # 构建目标文件路径，保留原始文件名
-                    dest_path = os.path.join(target_subdir, os.path.basename(voucher_path))
-                    # 复制文件
-                    shutil.copy2(voucher_path, dest_path)
-                    copied_count += 1
-                except Exception as copy_e:
-                    errors.append(f"无法复制文件 {os.path.basename(voucher_path)}: {copy_e}")
-
-            if errors:
-                error_message = "\n".join(errors)
-                UIUtils.show_warning(self, "导出警告", f"成功导出 {copied_count} 个凭证文件，但遇到以下错误：\n{error_message}\n\n文件已导出到：\n{target_subdir}")
-            else:
-                UIUtils.show_success(self, "成功", f"成功导出 {copied_count} 个凭证文件到：\n{target_subdir}")
-
-        except Exception as e:
-            UIUtils.show_error(self, "导出错误", f"导出凭证文件时发生意外错误：{e}")
-            print(f"Error exporting expense vouchers: {e}") # Log for debugging
+        AttachmentExportDialog(
+            items, f"凭证_{self.project.financial_code}_{self.budget.year}", "导出支出凭证", self
+        ).exec()
 
     def validate_amount_input(self):
         """验证金额输入框的内容，确保是有效的数字"""
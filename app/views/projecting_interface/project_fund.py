@@ -3,51 +3,55 @@ import sys
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QSplitter,
                                 QTreeWidgetItem, QApplication) # Keep QStackedWidget for now, might be used by parent, Added QApplication for clipboard
 from qfluentwidgets import TreeWidget, FluentIcon, ToolButton, Dialog, TitleLabel, ToolTipFilter, ToolTipPosition # Added ComboBox
-from PySide6.QtCore import Qt, QSize, Signal
+from PySide6.QtCore import Qt, QSize
 from PySide6.QtGui import QIcon 
 from ...components.budget_dialog import BudgetDialog, TotalBudgetDialog
 
 # 需要在文件顶部导入
-from ...models.database import Project, sessionmaker
-from ...models.database import sessionmaker, Budget, BudgetCategory, BudgetItem, Expense, Actionlog, Project # Added Project
+from ...models.database import Project
+from ...models.database import Budget, BudgetCategory, BudgetItem, Expense, Actionlog, Project # Added Project
+from ...models.session import SessionRegistry
+from ...models.data_version import DataFreshness
 from sqlalchemy import Engine # Added Engine
 from datetime import datetime
 from sqlalchemy import func
 from ...components.progress_bar_delegate import ProgressBarDelegate
 from ...utils.ui_utils import UIUtils
+from ...utils.event_bus import event_bus, EntityKind, Operation
 from ...components.budget_chart_widget import BudgetChartWidget
+from ...models.budget_usage import get_budget_usage
+from ...utils.data_loader import DataLoader, snapshot, snapshot_one
 
 class ProjectBudgetWidget(QWidget):
-    # 添加信号用于通知项目清单窗口更新数据
-    budget_updated = Signal()
-
-    def __init__(self, engine: Engine, parent=None):
+    def __init__(self, engine: Engine, parent=None, sessions=None):
         super().__init__(parent)
         self.engine = engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         self.current_project = None # Track selected project
         self.budget = None # Keep this? Might relate to selected budget row
+        self.loader = DataLoader(self.sessions, self)
+        # 预算数据的新鲜度，支出写入时触发器同步更新预算及子项的已支出金额
+        self.freshness = DataFreshness(engine, ('budgets', 'budget_items', 'expenses'))
         self.setup_ui()
+        event_bus().changed.connect(self._on_data_changed)
 
     def showEvent(self, event):
-        """在窗口显示时连接信号"""
+        """切换回本页时，预算或支出自上次加载后被修改过（含其它程序修改数据库文件）才重新加载"""
         super().showEvent(event)
-        # 尝试连接信号
-        try:
-            main_window = self.window()
-            if main_window and hasattr(main_window, 'project_updated'):
-                # 先断开旧连接，防止重复连接
-                try:
-                    main_window.project_updated.disconnect(self._refresh_project_selector)
-                except RuntimeError:
-                    pass # 信号未连接，忽略错误
-                main_window.project_updated.connect(self._refresh_project_selector)
-                # print("ProjectBudgetWidget: Connected to project_updated signal.") # Removed print
-            else:
-                 # print("ProjectBudgetWidget: Could not find main window or project_updated signal.") # Removed print
-                 pass # Do nothing if signal not found
-        except Exception as e:
-            # print(f"ProjectBudgetWidget: Error connecting signal: {e}") # Removed print
-            pass # Ignore connection errors silently for now
+        if self.current_project and self.freshness.is_stale():
+            self.load_budgets()
+
+    def _on_data_changed(self, changes):
+        """项目变更时增量更新项目选择下拉框，当前项目的支出变更时重新加载预算"""
+        if changes.affects(EntityKind.PROJECT):
+            if not self.project_selector.isEnabled(): # 原先没有项目或加载出错，整体重建
+                self._refresh_project_selector()
+            elif UIUtils.apply_project_changes(self.project_selector, self.sessions, changes):
+                self._on_project_selected(self.project_selector.currentIndex()) # 选中的项目已被删除
+                return
+        # 预算只在本界面修改（修改后已直接重新加载），这里只处理支出
+        if self.current_project and self.current_project.id in changes.project_ids(EntityKind.EXPENSE):
+            self.load_budgets()
 
     def _refresh_project_selector(self):
         """刷新项目选择下拉框的内容"""
@@ -63,8 +67,7 @@ class ProjectBudgetWidget(QWidget):
         self.project_selector.clear()
         self.project_selector.addItem("请选择项目...", userData=None) # 添加默认提示项
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             projects = session.query(Project).order_by(Project.financial_code).all()
             if not projects:
@@ -104,7 +107,7 @@ class ProjectBudgetWidget(QWidget):
         selector_label = TitleLabel("项目经费-", self)
         selector_label.setToolTip("用于创建和管理项目的经费预算信息")
         selector_label.installEventFilter(ToolTipFilter(selector_label, showDelay=300, position=ToolTipPosition.RIGHT))
-        self.project_selector = UIUtils.create_project_selector(self.engine, self)
+        self.project_selector = UIUtils.create_project_selector(self.sessions, self)
         selector_layout.addWidget(selector_label)
         selector_layout.addWidget(self.project_selector)
         selector_layout.addStretch()
@@ -216,6 +219,7 @@ class ProjectBudgetWidget(QWidget):
         else:
             self.current_project = None
             #self.title_label.setText("项目预算管理") # Reset title
+            self.loader.cancel_all() # 丢弃上一个项目尚未完成的加载
             self.budget_tree.clear() # Clear tree if no project selected
             self.chart_widget.clear_charts() # Clear charts
             #UIUtils.show_info(self, "项目经费", "请选择一个项目以查看经费")
@@ -231,10 +235,8 @@ class ProjectBudgetWidget(QWidget):
         if main_window:
             # 创建项目预算界面
             from app.views.projecting_interface.project_expense import ProjectExpenseWidget
-            expense_widget = ProjectExpenseWidget(self.engine, self.current_project, budget) # Added missing project argument
+            expense_widget = ProjectExpenseWidget(self.engine, self.current_project, budget, sessions=self.sessions) # Added missing project argument
             expense_widget.setObjectName(f"projectExpenseInterface_{budget.id}")
-            # 连接信号：当支出更新时，刷新预算数据
-            expense_widget.expense_updated.connect(self.load_budgets)
             # 检查是否已存在相同预算的支出窗口
             for i in range(main_window.stackedWidget.count()):
                 widget = main_window.stackedWidget.widget(i)
@@ -247,136 +249,265 @@ class ProjectBudgetWidget(QWidget):
 
 
     def load_budgets(self):
-        """加载预算数据"""
+        """在后台加载预算数据，完成后重建预算树"""
         self.budget_tree.clear()
         self.chart_widget.clear_charts() # Clear charts on load/reload
 
         if not self.current_project:
             # print("BudgetWidget: No project selected, cannot load budgets.") # Removed print
+            self.loader.cancel('budgets')
             return
 
+        project_id = self.current_project.id
+        self.freshness.mark_fresh()
+        self.loader.load('budgets', lambda session: self._fetch_budgets(session, project_id),
+                         self._populate_budget_tree, self._on_load_error)
+
+    def _on_load_error(self, error):
+        self.freshness.invalidate() # 下次显示时重试
+        UIUtils.show_error(self, "错误", f"加载预算数据失败：{str(error)}")
+
+    def _fetch_budgets(self, session, project_id):
+        """查询项目的预算数据（在后台线程中执行），返回不可变快照；项目没有总预算时返回 None"""
+        # 加载总预算
+        total_budget = session.query(Budget).filter(
+            Budget.project_id == project_id,
+            Budget.year.is_(None)
+        ).order_by(Budget.id.asc()).first()
+        if not total_budget:
+            return None
+
+        # 一次聚合查询获取项目各年度、各科目的支出（元）
+        usage = get_budget_usage(session, project_id)
+
+        total_snapshot = snapshot_one(total_budget)
+        total_items = snapshot(
+            session.query(BudgetItem).filter_by(budget_id=total_budget.id).all(),
+            budget=lambda item: total_snapshot,
+        )
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
-
-        try:
-            # print(f"BudgetWidget: Loading budgets for project ID: {self.current_project.id}") # Removed print
-            # 加载总预算
+        # 总预算图表所需的支出（只取图表用到的列）
+        total_expenses = session.query(Expense.category, Expense.amount, Expense.date).filter(
+            Expense.budget_id.in_(
+                session.query(Budget.id).filter(Budget.project_id == project_id)
+            )
+        ).all()
+
+        # 加载年度预算，按ID升序排序，使新添加的预算显示在最下方
+        annual_budgets = snapshot(session.query(Budget).filter(
+            Budget.project_id == project_id,
+            Budget.year.isnot(None)  # 排除总预算
+        ).order_by(Budget.id.asc()).all())
+
+        # 一次性加载所有年度预算子项，按预算ID分组
+        annual_items = {}
+        if annual_budgets:
+            for item in snapshot(session.query(BudgetItem).filter(
+                BudgetItem.budget_id.in_([budget.id for budget in annual_budgets])
+            ).all()):
+                annual_items.setdefault(item.budget_id, []).append(item)
+
+        return {
+            'usage': usage,
+            'total_budget': total_snapshot,
+            'total_items': total_items,
+            'total_expenses': total_expenses,
+            'annual_budgets': annual_budgets,
+            'annual_items': annual_items,
+        }
+
+    def _create_total_budget(self, project_id):
+        """为没有总预算的项目创建总预算及各科目子项（在 GUI 线程中执行），返回总预算ID"""
+        with self.sessions.unit_of_work() as session:
             total_budget = session.query(Budget).filter(
-                Budget.project_id == self.current_project.id, # Use current_project.id
+                Budget.project_id == project_id,
                 Budget.year.is_(None)
             ).order_by(Budget.id.asc()).first()
-
-            if not total_budget:
-                # 如果没有找到总预算，创建一个
-                total_budget = Budget(
-                    project_id=self.current_project.id, # Use current_project.id
-                    year=None,
-                    total_amount=0.0,
+            if total_budget:
+                return None
+            total_budget = Budget(
+                project_id=project_id,
+                year=None,
+                total_amount=0.0,
+                spent_amount=0.0
+            )
+            session.add(total_budget)
+            session.flush()
+
+            # 创建总预算子项
+            for category in BudgetCategory:
+                session.add(BudgetItem(
+                    budget_id=total_budget.id,
+                    category=category,
+                    amount=0.0,
                     spent_amount=0.0
-                )
-                session.add(total_budget)
-                session.flush()
-
-                # 创建总预算子项
-                for category in BudgetCategory:
-                    budget_item = BudgetItem(
-                        budget_id=total_budget.id,
-                        category=category,
-                        amount=0.0,
-                        spent_amount=0.0
-                    )
-                    session.add(budget_item)
-                session.commit()
+                ))
+            return total_budget.id
 
-            # 计算所有年度预算的总支出
-            total_spent = session.query(func.sum(Budget.spent_amount)).filter(
-                Budget.project_id == self.current_project.id, # Use current_project.id
-                Budget.year.isnot(None)  # 只计算年度预算
-            ).scalar() or 0.0
-
-            # 创建总预算树项
-            total_item = QTreeWidgetItem(self.budget_tree)
-            total_item.setText(0, " 总预算")
-
-            # 获取总预算子项
-            budget_items = session.query(BudgetItem).filter_by(budget_id=total_budget.id).all()
-
-            # 设置总预算行的字体为加粗和行高
-            font = total_item.font(0)
-
-            # 根据平台调整字号
-            if sys.platform == 'darwin':  # macOS
-                current_size = font.pointSize()
-                font.setPointSize(current_size + 1 if current_size > 0 else 10) # Use a default size of 10 if item font size is invalid
-            else:  # Windows/Linux
-                current_size = font.pointSize()
-                font.setPointSize(current_size if current_size > 0 else 10) # Use a default size of 10 if item font size is invalid
-
-            font.setBold(True)
-            for i in range(6):  # 设置所有列的字体为加粗
-                total_item.setFont(i, font)
-
-            total_item.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)  # 预算额右对齐
-            total_item.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)  # 支出额右对齐
-            total_item.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)  # 结余额右对齐
-            total_item.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)  # 执行率右对齐
-
-            total_item.setText(1, f"{total_budget.total_amount:,.2f}")  # 预算额
-            total_item.setText(2, f"{total_spent:,.2f}")  # 支出额
-            total_item.setText(3, f"{total_budget.total_amount - total_spent:,.2f}")  # 结余额
-
-            if total_budget.total_amount > 0:
-                execution_rate = (total_spent / total_budget.total_amount) * 100
-                total_item.setText(4, f"{execution_rate:.2f}%")
-
-            # 计算各科目的总支出
-            category_totals = {}
+    def _populate_budget_tree(self, data):
+        """按查询结果重建预算树；项目还没有总预算时先创建再重新加载"""
+        if data is None:
+            try:
+                budget_id = self._create_total_budget(self.current_project.id)
+            except Exception as e:
+                self._on_load_error(e)
+                return
+            if budget_id is not None:
+                self._budgets_changed(Operation.CREATED, [budget_id])
+            self.load_budgets()
+            return
+
+        self.budget_tree.clear()
+        usage = data['usage']
+        total_budget = data['total_budget']
+
+        # 计算所有年度预算的总支出
+        total_spent = usage.annual_spent() / 10000
+
+        # 创建总预算树项
+        total_item = QTreeWidgetItem(self.budget_tree)
+        total_item.setText(0, " 总预算")
+
+        # 获取总预算子项
+        budget_items = data['total_items']
+
+        # 设置总预算行的字体为加粗和行高
+        font = total_item.font(0)
+
+        # 根据平台调整字号
+        if sys.platform == 'darwin':  # macOS
+            current_size = font.pointSize()
+            font.setPointSize(current_size + 1 if current_size > 0 else 10) # Use a default size of 10 if item font size is invalid
+        else:  # Windows/Linux
+            current_size = font.pointSize()
+            font.setPointSize(current_size if current_size > 0 else 10) # Use a default size of 10 if item font size is invalid
+
+        font.setBold(True)
+        for i in range(6):  # 设置所有列的字体为加粗
+            total_item.setFont(i, font)
+
+        total_item.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)  # 预算额右对齐
+        total_item.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)  # 支出额右对齐
+        total_item.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)  # 结余额右对齐
+        total_item.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)  # 执行率右对齐
+
+        total_item.setText(1, f"{total_budget.total_amount:,.2f}")  # 预算额
+        total_item.setText(2, f"{total_spent:,.2f}")  # 支出额
+        total_item.setText(3, f"{total_budget.total_amount - total_spent:,.2f}")  # 结余额
+
+        if total_budget.total_amount > 0:
+            execution_rate = (total_spent / total_budget.total_amount) * 100
+            total_item.setText(4, f"{execution_rate:.2f}%")
+
+        # 计算各科目在所有年度预算中的总支出
+        category_totals = {
+            category: usage.annual_spent(category) / 10000
+            for category in BudgetCategory
+        }
+
+        # 添加总预算子项
+        first_child = None
+        for i, category in enumerate(BudgetCategory):
+            child = QTreeWidgetItem(total_item)
+            if i == 0:
+                first_child = child
+            child.setText(0, category.value)
+
+            # 设置子项字体为加粗
+            child.setFont(0, font)  # 科目名称加粗
+            child.setFont(1, font)  # 预算额加粗
+            child.setFont(2, font)  # 支出额加粗
+            child.setFont(3, font)  # 结余额加粗
+            child.setFont(4, font)  # 执行率加粗
+
+            child.setTextAlignment(0, Qt.AlignCenter | Qt.AlignVCenter)
+            child.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)
+            child.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)
+            child.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)
+            child.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)
+
+            # 查找该类别的预算子项
+            budget_item = next((item for item in budget_items if item.category == category), None)
+            if budget_item:
+                category_spent = category_totals[category]  # 使用计算的科目总支出
+                child.setText(1, f"{budget_item.amount:,.2f}")
+                child.setText(2, f"{category_spent:,.2f}")
+                child.setText(3, f"{budget_item.amount - category_spent:,.2f}")
+
+                if budget_item.amount > 0:
+                    execution_rate = (category_spent / budget_item.amount) * 100
+                    child.setText(4, f"{execution_rate:.2f}%")
+            else:
+                # 如果没有找到预算子项，显示0
+                child.setText(1, "0.00")
+                child.setText(2, "0.00")
+                child.setText(3, "0.00")
+
+        # 更新总预算图表
+        self.chart_widget.update_charts(budget_items=budget_items, expenses=data['total_expenses'])
+
+        # 年度预算及其子项
+        annual_budgets = data['annual_budgets']
+        annual_items = data['annual_items']
+
+        for budget in annual_budgets:
+            budget_spent = usage.spent(year=budget.year) / 10000
+            year_item = QTreeWidgetItem(self.budget_tree)
+            year_item.setText(0, f" {budget.year}年度")
+
+            year_item.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)  # 预算额右对齐
+            year_item.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)  # 支出额右对齐
+            year_item.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)  # 结余额右对齐
+            year_item.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)  # 执行率右对齐
+
+            year_item.setText(1, f"{budget.total_amount:,.2f}")  # 预算额
+            year_item.setText(2, f"{budget_spent:,.2f}")  # 支出额
+            year_item.setText(3, f"{budget.total_amount - budget_spent:,.2f}")  # 结余额
+
+            if budget.total_amount > 0:
+                execution_rate = (budget_spent / budget.total_amount) * 100
+                year_item.setText(4, f"{execution_rate:.2f}%")
+
+            # 添加支出管理按钮
+            btn_widget = QWidget()
+            btn_layout = QHBoxLayout(btn_widget)
+            btn_layout.setContentsMargins(0, 0, 0, 0)
+
+            expense_btn = ToolButton()
+            expense_btn.setIcon(QIcon(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'assets', 'icons', 'expense.svg'))))
+            expense_btn.setToolTip("支出管理")
+            expense_btn.clicked.connect(lambda checked=False, b=budget: self.open_project_expense(b))
+            btn_layout.addWidget(expense_btn)
+            # 按钮大小 - 增加尺寸以提高用户体验
+            expense_btn.setFixedSize(26, 26)
+            # 设置图标大小
+            expense_btn.setIconSize(QSize(20, 20))
+
+            self.budget_tree.setItemWidget(year_item, 5, btn_widget)
+
+            # 移除统计图表相关代码
+
+            # 加载年度预算子项
+            budget_items = annual_items.get(budget.id, [])
             for category in BudgetCategory:
-                # 计算该科目在所有年度预算中的总支出
-                category_spent = session.query(func.sum(BudgetItem.spent_amount)).filter(
-                    BudgetItem.budget_id.in_(
-                        session.query(Budget.id).filter(
-                            Budget.project_id == self.current_project.id, # Use current_project.id
-                            Budget.year.isnot(None)  # 只计算年度预算
-                        )
-                    ),
-                    BudgetItem.category == category
-                ).scalar() or 0.0
-                category_totals[category] = category_spent
-
-            # 添加总预算子项
-            budget_items = session.query(BudgetItem).filter_by(budget_id=total_budget.id).all()
-            first_child = None
-            for i, category in enumerate(BudgetCategory):
-                child = QTreeWidgetItem(total_item)
-                if i == 0:
-                    first_child = child
+                child = QTreeWidgetItem(year_item)
                 child.setText(0, category.value)
-
-                # 设置子项字体为加粗
-                child.setFont(0, font)  # 科目名称加粗
-                child.setFont(1, font)  # 预算额加粗
-                child.setFont(2, font)  # 支出额加粗
-                child.setFont(3, font)  # 结余额加粗
-                child.setFont(4, font)  # 执行率加粗
-
-                child.setTextAlignment(0, Qt.AlignCenter | Qt.AlignVCenter)
-                child.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)
-                child.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)
-                child.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)
-                child.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)
+                child.setTextAlignment(0, Qt.AlignCenter | Qt.AlignVCenter)  # 费用类别居中对齐
+                child.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)  # 预算额右对齐
+                child.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)  # 支出额右对齐
+                child.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)  # 结余额右对齐
+                child.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)  # 执行率右对齐
 
                 # 查找该类别的预算子项
                 budget_item = next((item for item in budget_items if item.category == category), None)
                 if budget_item:
-                    category_spent = category_totals[category]  # 使用计算的科目总支出
+                    item_spent = usage.spent(year=budget.year, category=category) / 10000
                     child.setText(1, f"{budget_item.amount:,.2f}")
-                    child.setText(2, f"{category_spent:,.2f}")
-                    child.setText(3, f"{budget_item.amount - category_spent:,.2f}")
+                    child.setText(2, f"{item_spent:,.2f}")
+                    child.setText(3, f"{budget_item.amount - item_spent:,.2f}")
 
                     if budget_item.amount > 0:
-                        execution_rate = (category_spent / budget_item.amount) * 100
+                        execution_rate = (item_spent / budget_item.amount) * 100
                         child.setText(4, f"{execution_rate:.2f}%")
                 else:
                     # 如果没有找到预算子项，显示0
@@ -384,99 +515,19 @@ class ProjectBudgetWidget(QWidget):
                     child.setText(2, "0.00")
                     child.setText(3, "0.00")
 
-            # 更新总预算图表
-            total_expenses = session.query(Expense).filter(
-                Expense.budget_id.in_(
-                    session.query(Budget.id).filter(
-                        Budget.project_id == self.current_project.id # Use current_project.id
-                    )
-                )
-            ).all()
-            self.chart_widget.update_charts(budget_items=budget_items, expenses=total_expenses)
-
-            # 加载年度预算
-            annual_budgets = session.query(Budget).filter(
-                Budget.project_id == self.current_project.id, # Use current_project.id
-                Budget.year.isnot(None)  # 排除总预算
-            ).order_by(Budget.id.asc()).all()  # 按ID升序排序，使新添加的预算显示在最下方
-
-            for budget in annual_budgets:
-                year_item = QTreeWidgetItem(self.budget_tree)
-                year_item.setText(0, f" {budget.year}年度")
-
-                year_item.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)  # 预算额右对齐
-                year_item.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)  # 支出额右对齐
-                year_item.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)  # 结余额右对齐
-                year_item.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)  # 执行率右对齐
-
-                year_item.setText(1, f"{budget.total_amount:,.2f}")  # 预算额
-                year_item.setText(2, f"{budget.spent_amount:,.2f}")  # 支出额
-                year_item.setText(3, f"{budget.total_amount - budget.spent_amount:,.2f}")  # 结余额
-
-                if budget.total_amount > 0:
-                    execution_rate = (budget.spent_amount / budget.total_amount) * 100
-                    year_item.setText(4, f"{execution_rate:.2f}%")
-
-                # 添加支出管理按钮
-                btn_widget = QWidget()
-                btn_layout = QHBoxLayout(btn_widget)
-                btn_layout.setContentsMargins(0, 0, 0, 0)
-
-                expense_btn = ToolButton()
-                expense_btn.setIcon(QIcon(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'assets', 'icons', 'expense.svg'))))
-                expense_btn.setToolTip("支出管理")
-                expense_btn.clicked.connect(lambda checked=False, b=budget: self.open_project_expense(b))
-                btn_layout.addWidget(expense_btn)
-                # 按钮大小 - 增加尺寸以提高用户体验
-                expense_btn.setFixedSize(26, 26)
-                # 设置图标大小
-                expense_btn.setIconSize(QSize(20, 20))
-
-                self.budget_tree.setItemWidget(year_item, 5, btn_widget)
-
-                # 移除统计图表相关代码
-
-                # 加载年度预算子项
-                budget_items = session.query(BudgetItem).filter_by(budget_id=budget.id).all()
-                for category in BudgetCategory:
-                    child = QTreeWidgetItem(year_item)
-                    child.setText(0, category.value)
-                    child.setTextAlignment(0, Qt.AlignCenter | Qt.AlignVCenter)  # 费用类别居中对齐
-                    child.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)  # 预算额右对齐
-                    child.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)  # 支出额右对齐
-                    child.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)  # 结余额右对齐
-                    child.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)  # 执行率右对齐
-
-                    # 查找该类别的预算子项
-                    budget_item = next((item for item in budget_items if item.category == category), None)
-                    if budget_item:
-                        child.setText(1, f"{budget_item.amount:,.2f}")
-                        child.setText(2, f"{budget_item.spent_amount:,.2f}")
-                        child.setText(3, f"{budget_item.amount - budget_item.spent_amount:,.2f}")
-
-                        if budget_item.amount > 0:
-                            execution_rate = (budget_item.spent_amount / budget_item.amount) * 100
-                            child.setText(4, f"{execution_rate:.2f}%")
-                    else:
-                        # 如果没有找到预算子项，显示0
-                        child.setText(1, "0.00")
-                        child.setText(2, "0.00")
-                        child.setText(3, "0.00")
-
-                    # 如果是设备费类别，保存引用以便后续添加图表
-                    if category == BudgetCategory.EQUIPMENT:
-                        first_child = child
+                # 如果是设备费类别，保存引用以便后续添加图表
+                if category == BudgetCategory.EQUIPMENT:
+                    first_child = child
 
-                # 移除统计图表相关代码
+            # 移除统计图表相关代码
 
-            # 默认折叠所有项
-            self.budget_tree.collapseAll()
-            # 禁用自动调整列宽，使用手动设置的列宽
-            # 预算加载完成后发射信号，通知主页等更新
-            self.budget_updated.emit()
+        # 默认折叠所有项
+        self.budget_tree.collapseAll()
+        # 禁用自动调整列宽，使用手动设置的列宽
 
-        finally:
-            session.close()
+    def _budgets_changed(self, operation, budget_ids):
+        """通知主页等界面当前项目的预算已变更"""
+        event_bus().publish(EntityKind.BUDGET, operation, budget_ids, project_ids=[self.current_project.id])
 
     def calculate_annual_budgets_total(self, session, exclude_year=None):
         """计算年度预算总和"""
@@ -494,8 +545,7 @@ class ProjectBudgetWidget(QWidget):
             UIUtils.show_warning(self, "警告", "请先选择一个项目")
             return
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
 
         try:
             # 检查总预算是否已设置
@@ -513,7 +563,7 @@ class ProjectBudgetWidget(QWidget):
                 session.close()
                 return
 
-            temp_dialog = BudgetDialog(project=self.current_project, engine=self.engine, parent=self) # Pass project and engine
+            temp_dialog = BudgetDialog(project=self.current_project, engine=self.engine, parent=self, sessions=self.sessions) # Pass project and engine
             temp_dialog.update_balance_amounts() # This might need adjustment
             total_balance_text = temp_dialog.total_balance_label.text().replace(' 万元', '').replace(',', '')
             try:
@@ -535,10 +585,10 @@ class ProjectBudgetWidget(QWidget):
 
             session.close()
 
-            dialog = BudgetDialog(project=self.current_project, engine=self.engine, parent=self) # Pass project and engine
+            dialog = BudgetDialog(project=self.current_project, engine=self.engine, parent=self, sessions=self.sessions) # Pass project and engine
             if dialog.exec():
                 # 重新打开会话进行后续操作
-                session = Session()
+                session = self.sessions()
                 try:
                     data = dialog.get_data()
 
@@ -556,7 +606,7 @@ class ProjectBudgetWidget(QWidget):
                         )
                         return # Keep session open for potential next action? No, close it.
 
-                    temp_session = Session()
+                    temp_session = self.sessions()
                     try:
                         # 获取总预算信息
                         current_total_budget = temp_session.query(Budget).filter(
@@ -568,10 +618,7 @@ class ProjectBudgetWidget(QWidget):
                              return # 必须有总预算才能继续
 
                         # 计算所有年度预算的实际已支出总额
-                        total_spent_all_years = temp_session.query(func.sum(Budget.spent_amount)).filter(
-                            Budget.project_id == self.current_project.id,
-                            Budget.year.isnot(None)
-                        ).scalar() or 0.0
+                        total_spent_all_years = get_budget_usage(temp_session, self.current_project.id).annual_spent() / 10000
 
                         # 计算实际剩余金额
                         actual_remaining_balance = current_total_budget.total_amount - total_spent_all_years
@@ -622,6 +669,7 @@ class ProjectBudgetWidget(QWidget):
 
                     session.commit()
                     self.load_budgets()
+                    self._budgets_changed(Operation.CREATED, [budget.id])
                     UIUtils.show_success(self, "成功", f"{data['year']}年度预算添加成功")
                 except Exception as e:
                     session.rollback()
@@ -654,8 +702,7 @@ class ProjectBudgetWidget(QWidget):
         )
 
         if confirm_dialog.exec():
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             try:
                 if budget_type == " 总预算": # Note the leading space
                     # 删除总预算及其所有子项和关联支出
@@ -692,6 +739,7 @@ class ProjectBudgetWidget(QWidget):
 
                         session.commit()
                         self.load_budgets() # 重新加载以显示空状态或默认状态
+                        self._budgets_changed(Operation.DELETED, [budget.id])
                         UIUtils.show_success(self, "成功", "总预算已删除")
                     else:
                         UIUtils.show_error(self, "错误", "未找到总预算")
@@ -727,6 +775,7 @@ class ProjectBudgetWidget(QWidget):
 
                         session.commit()
                         self.load_budgets() # 重新加载
+                        self._budgets_changed(Operation.DELETED, [budget.id])
                         UIUtils.show_success(self, "成功", f"{year}年度预算已删除")
                     else:
                         UIUtils.show_error(self, "错误", f"未找到{year}年度预算")
@@ -752,8 +801,7 @@ class ProjectBudgetWidget(QWidget):
 
         budget_type = selected_item.text(0)
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             if budget_type == " 总预算": # Note the leading space
                 # 编辑总预算
@@ -770,7 +818,7 @@ class ProjectBudgetWidget(QWidget):
                 # 获取总预算子项
                 budget_items = session.query(BudgetItem).filter_by(budget_id=budget.id).all()
 
-                dialog = TotalBudgetDialog(project=self.current_project, engine=self.engine, parent=self, budget=budget) # Pass project and engine
+                dialog = TotalBudgetDialog(project=self.current_project, engine=self.engine, parent=self, budget=budget, sessions=self.sessions) # Pass project and engine
                 if dialog.exec():
                     data = dialog.get_data()
 
@@ -821,7 +869,7 @@ class ProjectBudgetWidget(QWidget):
 
                     session.commit()
                     self.load_budgets()
-                    self.budget_updated.emit() # 发射信号
+                    self._budgets_changed(Operation.UPDATED, [budget.id])
                     UIUtils.show_success(self, "成功", "总预算更新成功")
 
             elif budget_type.startswith(" ") and budget_type.endswith("年度"): # Check with leading space
@@ -846,7 +894,7 @@ class ProjectBudgetWidget(QWidget):
                 # 获取年度预算子项
                 budget_items = session.query(BudgetItem).filter_by(budget_id=budget.id).all()
 
-                dialog = BudgetDialog(project=self.current_project, engine=self.engine, parent=self, budget=budget) # Pass project and engine
+                dialog = BudgetDialog(project=self.current_project, engine=self.engine, parent=self, budget=budget, sessions=self.sessions) # Pass project and engine
                 if dialog.exec():
                     data = dialog.get_data()
 
@@ -926,7 +974,7 @@ class ProjectBudgetWidget(QWidget):
 
                     session.commit()
                     self.load_budgets()
-                    self.budget_updated.emit() # 发射信号
+                    self._budgets_changed(Operation.UPDATED, [budget.id])
                     UIUtils.show_success(self, "成功", f"{year}年度预算更新成功")
             else:
                  UIUtils.show_warning(self, "警告", "不能直接编辑预算科目，请编辑对应的年度或总预算。")
@@ -939,55 +987,67 @@ class ProjectBudgetWidget(QWidget):
                 session.close()
 
     def on_budget_selection_changed(self):
-        """当预算树选择项改变时更新图表"""
+        """当预算树选择项改变时在后台加载并更新图表"""
         selected_item = self.budget_tree.currentItem()
         if not selected_item or not self.current_project:
+            self.loader.cancel('chart')
             self.chart_widget.clear_charts()
             return
 
         budget_type = selected_item.text(0).strip()
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
-        try:
-            budget_items = []
-            expenses = []
-
-            if budget_type == "总预算":
-                total_budget = session.query(Budget).filter(
-                    Budget.project_id == self.current_project.id,
-                    Budget.year.is_(None)
-                ).first()
-                if total_budget:
-                    budget_items = session.query(BudgetItem).filter_by(budget_id=total_budget.id).all()
-                    # 获取所有年度预算的支出
-                    expenses = session.query(Expense).filter(
-                        Expense.budget_id.in_(
-                            session.query(Budget.id).filter(
-                                Budget.project_id == self.current_project.id,
-                                Budget.year.isnot(None) # Only annual expenses for total view
-                            )
+        project_id = self.current_project.id
+        self.loader.load('chart', lambda session: self._fetch_chart_data(session, project_id, budget_type),
+                         self._update_charts, self._on_chart_error)
+
+    def _fetch_chart_data(self, session, project_id, budget_type):
+        """查询所选预算的子项和支出（在后台线程中执行）"""
+        budget = None
+        expenses = []
+        if budget_type == "总预算":
+            budget = session.query(Budget).filter(
+                Budget.project_id == project_id,
+                Budget.year.is_(None)
+            ).first()
+            if budget:
+                # 获取所有年度预算的支出
+                expenses = session.query(Expense.category, Expense.amount, Expense.date).filter(
+                    Expense.budget_id.in_(
+                        session.query(Budget.id).filter(
+                            Budget.project_id == project_id,
+                            Budget.year.isnot(None) # Only annual expenses for total view
                         )
-                    ).all()
-            elif budget_type.endswith("年度"):
-                try:
-                    year = int(budget_type.replace("年度", "").strip())
-                    budget = session.query(Budget).filter(
-                        Budget.project_id == self.current_project.id,
-                        Budget.year == year
-                    ).first()
-                    if budget:
-                        budget_items = session.query(BudgetItem).filter_by(budget_id=budget.id).all()
-                        expenses = session.query(Expense).filter_by(budget_id=budget.id).all()
-                except ValueError:
-                    pass # Ignore if year parsing fails
+                    )
+                ).all()
+        elif budget_type.endswith("年度"):
+            try:
+                year = int(budget_type.replace("年度", "").strip())
+            except ValueError:
+                return [], [] # Ignore if year parsing fails
+            budget = session.query(Budget).filter(
+                Budget.project_id == project_id,
+                Budget.year == year
+            ).first()
+            if budget:
+                expenses = session.query(Expense.category, Expense.amount, Expense.date).filter_by(
+                    budget_id=budget.id
+                ).all()
+
+        if not budget:
+            return [], []
+        budget_snapshot = snapshot_one(budget)
+        budget_items = snapshot(
+            session.query(BudgetItem).filter_by(budget_id=budget.id).all(),
+            budget=lambda item: budget_snapshot,
+        )
+        return budget_items, expenses
 
-            self.chart_widget.update_charts(budget_items=budget_items, expenses=expenses)
-        except Exception as e:
-            print(f"Error updating charts on selection change: {e}")
-            self.chart_widget.clear_charts()
-        finally:
-            if session.is_active:
-                session.close()
+    def _update_charts(self, data):
+        budget_items, expenses = data
+        self.chart_widget.update_charts(budget_items=budget_items, expenses=expenses)
+
+    def _on_chart_error(self, error):
+        print(f"Error updating charts on selection change: {error}")
+        self.chart_widget.clear_charts()
 
     def load_project_data(self, project: Project):
         """Loads the data for the given project."""
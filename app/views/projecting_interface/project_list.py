@@ -1,22 +1,24 @@
 from PySide6.QtWidgets import (QWidget, QHeaderView, QVBoxLayout, QHBoxLayout,
                                  QTableWidgetItem, QStackedWidget, QApplication)
 from qfluentwidgets import Dialog, BodyLabel, ToolTipFilter, ToolTipPosition
-from PySide6.QtCore import Qt, Signal # 导入 Signal
+from PySide6.QtCore import Qt
 from qfluentwidgets import FluentIcon, TableWidget, TableItemDelegate, RoundMenu, Action
 import os # 导入 os 模块
 import shutil # 导入 shutil 模块
 from ...components.project_dialog import ProjectDialog
-from ...models.database import init_db, add_project_to_db, sessionmaker, Project, Budget, Expense, Actionlog, GanttTask, GanttDependency # 导入 GanttTask 和 GanttDependency
+from ...models.database import init_db, add_project_to_db, Project, Budget, Expense, Actionlog, GanttTask, GanttDependency, GanttTaskSchedule # 导入甘特图相关模型
+from ...models.gantt_payload import gantt_payload_cache
+from ...models.session import SessionRegistry
 from ...utils.ui_utils import UIUtils
+from ...utils.attachment_store import release
+from ...utils.event_bus import event_bus, EntityKind, Operation
 from datetime import datetime
 
 class ProjectListWindow(QWidget):
-    # 定义一个信号，当项目列表更新时发射
-    project_list_updated = Signal()
-
-    def __init__(self, engine=None):
+    def __init__(self, engine=None, sessions=None):
         super().__init__()
         self.engine = engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         
         
         self.project = None
@@ -140,13 +142,16 @@ class ProjectListWindow(QWidget):
         layout.addWidget(self.project_table)
         self.refresh_project_table()
 
+    def _project_changed(self, operation, project_id):
+        """通知其它界面项目已新增、修改或删除"""
+        event_bus().publish(EntityKind.PROJECT, operation, [project_id])
+
     def refresh_project_table(self):
         # 清空现有表格
         self.project_table.setRowCount(0)
         
         # 从数据库获取项目数据
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         
         try:
             projects = session.query(Project).order_by(Project.id.asc()).all()
@@ -270,8 +275,7 @@ class ProjectListWindow(QWidget):
             
             # 添加项目到数据库
             try:
-                Session = sessionmaker(bind=self.engine)
-                session = Session()
+                session = self.sessions()
                 
                 # 创建新项目
                 project = Project(
@@ -305,7 +309,7 @@ class ProjectListWindow(QWidget):
                 
                 # 刷新项目列表
                 self.refresh_project_table()
-                self.project_list_updated.emit() # 发射信号
+                self._project_changed(Operation.CREATED, project.id)
                 
                 # 显示成功消息
                 UIUtils.show_success(
@@ -336,8 +340,7 @@ class ProjectListWindow(QWidget):
         row = selected_rows[0].row()
         project_id = self.project_table.item(row, 0).data(Qt.UserRole)
         
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         
         try:
             project = session.query(Project).filter(Project.id == project_id).first()
@@ -383,7 +386,7 @@ class ProjectListWindow(QWidget):
                     
                     session.commit()
                     self.refresh_project_table()
-                    self.project_list_updated.emit() # 发射信号
+                    self._project_changed(Operation.UPDATED, project.id)
             else:
                 UIUtils.show_warning(
                     title='警告',
@@ -421,8 +424,7 @@ class ProjectListWindow(QWidget):
         )
         
         if confirm_dialog.exec():
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             project_doc_dir = None
             project_voucher_dir = None
             voucher_files_to_delete = []
@@ -471,22 +473,18 @@ class ProjectListWindow(QWidget):
 
                 session.query(GanttTask).filter(GanttTask.project_id == project_id).delete(synchronize_session='fetch')
                 session.query(GanttDependency).filter(GanttDependency.project_id == project_id).delete(synchronize_session='fetch')
+                session.query(GanttTaskSchedule).filter(GanttTaskSchedule.project_id == project_id).delete(synchronize_session='fetch')
                 # 如果需要删除项目相关的 *其他* 活动记录，需要更复杂的查询逻辑，这里暂时保留刚添加的删除记录
 
 
                 session.delete(project)
                 session.commit() # 提交数据库事务
+                gantt_payload_cache.invalidate(project_id)
 
                 # --- 3. 文件系统清理 (数据库提交成功后执行) ---
                 try:
-                    # 删除凭证文件
-                    deleted_files_count = 0
-                    for file_path in voucher_files_to_delete:
-                        try:
-                            os.remove(file_path)
-                            deleted_files_count += 1
-                        except OSError as e:
-                            print(f"删除凭证文件失败 {file_path}: {e}")
+                    # 删除不再被其他记录引用的凭证文件
+                    deleted_files_count = release(session, voucher_files_to_delete)
                     if deleted_files_count > 0:
                         print(f"共删除了 {deleted_files_count} 个凭证文件。")
 
@@ -526,7 +524,7 @@ class ProjectListWindow(QWidget):
                     )
                     # 即使文件清理失败，也要刷新表格并显示成功信息（因为数据库已成功）
                     self.refresh_project_table()
-                    self.project_list_updated.emit() # 发射信号 (部分成功)
+                    self._project_changed(Operation.DELETED, project_id) # 部分成功
                     UIUtils.show_success(
                         title='部分成功',
                         content='项目数据库记录已删除，但文件清理时遇到问题。详情请查看日志。',
@@ -536,7 +534,7 @@ class ProjectListWindow(QWidget):
 
                 # --- 4. 完成 ---
                 self.refresh_project_table()
-                self.project_list_updated.emit() # 发射信号 (完全成功)
+                self._project_changed(Operation.DELETED, project_id) # 完全成功
                 UIUtils.show_success(
                     title='成功',
                     content=f'项目 "{project_name_for_log}" 及其所有关联数据和文件已成功删除。',
@@ -571,8 +569,7 @@ class ProjectListWindow(QWidget):
             
     def add_budget(self, budget_data):
         """添加项目预算"""
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         
         try:
             # 创建新的预算记录
@@ -628,8 +625,7 @@ class ProjectListWindow(QWidget):
             
         try:
             # 创建数据库会话
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             
             # 获取项目信息
             project = session.query(Project).get(project_id)
@@ -742,8 +738,7 @@ class ProjectListWindow(QWidget):
                 raise Exception("数据格式不正确")
             
             # 创建数据库会话
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             
             try:
                 # 检查项目是否已存在
@@ -799,7 +794,6 @@ class ProjectListWindow(QWidget):
                         if existing_budget:
                             # 如果存在，更新现有记录
                             existing_budget.total_amount = budget_data['total_amount']
-                            existing_budget.spent_amount = budget_data['spent_amount']
                             budget = existing_budget
                         else:
                             # 如果不存在，创建新记录
@@ -807,7 +801,7 @@ class ProjectListWindow(QWidget):
                                 project_id=project.id,
                                 year=budget_data['year'],
                                 total_amount=budget_data['total_amount'],
-                                spent_amount=budget_data['spent_amount']
+                                spent_amount=0.0  # 已支出金额由导入支出时的触发器累计
                             )
                             session.add(budget)
                     except KeyError as e:
@@ -826,7 +820,7 @@ class ProjectListWindow(QWidget):
                                 budget_id=budget.id,
                                 category=BudgetCategory(item_data['category']),
                                 amount=item_data['amount'],
-                                spent_amount=item_data['spent_amount']
+                                spent_amount=0.0  # 已支出金额由导入支出时的触发器累计
                             )
                         except KeyError as e:
                             raise Exception(f"预算项数据缺少必要字段：{str(e)}")
@@ -875,6 +869,9 @@ class ProjectListWindow(QWidget):
                 
                 # 刷新项目表格
                 self.refresh_project_table()
+                if existing_project:
+                    self._project_changed(Operation.DELETED, existing_project.id)
+                self._project_changed(Operation.CREATED, project.id)
                 
                 # 如果当前有打开的支出管理窗口，刷新其数据
                 if hasattr(self, 'expense_widget') and self.expense_widget is not None:
@@ -1,13 +1,14 @@
 import os # Ensure os is imported
-import shutil # Add shutil
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTableWidgetItem, QDialog, QHeaderView, QFileDialog, QApplication 
 from PySide6.QtCore import Qt, QPoint, QDate 
 from PySide6.QtGui import QIcon 
 from qfluentwidgets import TitleLabel, FluentIcon, LineEdit, ComboBox, DateEdit, CompactDateEdit, BodyLabel, PushButton, TableWidget, TableItemDelegate, Dialog, RoundMenu, Action, PlainTextEdit, ToolTipFilter, ToolTipPosition
 from ...utils.ui_utils import UIUtils
-from ...models.database import Project, Base, sessionmaker, Actionlog # Import Actionlog
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Enum as SQLEnum, Engine 
+from ...utils.event_bus import event_bus, EntityKind
+from ...models.database import Project, Base, Actionlog # Import Actionlog
+from ...models.session import SessionRegistry
+from ...models.data_version import DataFreshness
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Enum as SQLEnum, Engine, Index 
 from enum import Enum
 from datetime import datetime
 from ...utils.attachment_utils import (
@@ -16,8 +17,12 @@ from ...utils.attachment_utils import (
     view_attachment, download_attachment, ROOT_DIR,
     generate_attachment_path, handle_attachment, execute_attachment_action # 添加新导入的函数
 )
+from ...utils.attachment_store import release
+from ...utils.attachment_cache import attachment_path_cache
+from ...utils.export_utils import ExportItem
+from ...components.attachment_export_dialog import AttachmentExportDialog
 from ...utils.filter_utils import FilterUtils 
-import pandas as pd 
+from ...utils.data_loader import DataLoader, snapshot
 
 class OutcomeType(Enum):
     PAPER = "论文"
@@ -50,6 +55,13 @@ class ProjectOutcome(Base): # 重命名模型类
     remarks = Column(String(200))  # 备注
     attachment_path = Column(String(500)) # 新增：附件文件路径
 
+    __table_args__ = (
+        Index('ix_project_outcome_project_publish', 'project_id', 'publish_date'),
+        Index('ix_project_outcome_attachment_path', 'attachment_path'),  # 附件存储按路径统计引用数
+    )
+
+attachment_path_cache.track(ProjectOutcome, 'outcome', 'attachment_path')
+
 class OutcomeDialog(QDialog):
     def __init__(self, parent=None, outcome=None, project=None):
         super().__init__(parent)
@@ -175,33 +187,33 @@ class OutcomeDialog(QDialog):
        
 
 class ProjectOutcomeWidget(QWidget): 
-    def __init__(self, engine: Engine, parent=None):
+    def __init__(self, engine: Engine, parent=None, sessions=None):
         super().__init__(parent=parent)       
         self.engine = engine # Store engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         self.current_project = None # Track selected project
-        self.all_outcomes = [] # Store all loaded outcomes
+        self.load_all = False # 是否显示全部项目的成果
         self.current_outcomes = [] # Store currently displayed outcomes
+        self.loader = DataLoader(self.sessions, self)
+        self.freshness = DataFreshness(engine, ('project_outcome',)) # 成果数据自上次加载后是否被修改
         self.setup_ui()
-        
+        event_bus().changed.connect(self._on_data_changed)
 
     def showEvent(self, event):
-        """在窗口显示时连接信号"""
+        """切换回本页时，成果自上次加载后被修改过（含其它程序修改数据库文件）才重新加载"""
         super().showEvent(event)
-        # 尝试连接信号
-        try:
-            main_window = self.window()
-            if main_window and hasattr(main_window, 'project_updated'):
-                # 先断开旧连接，防止重复连接
-                try:
-                    main_window.project_updated.disconnect(self._refresh_project_selector)
-                except RuntimeError:
-                    pass # 信号未连接，忽略错误
-                main_window.project_updated.connect(self._refresh_project_selector)
-                print("ProjectOutcomeWidget: Connected to project_updated signal.")
-            else:
-                 print("ProjectOutcomeWidget: Could not find main window or project_updated signal.")
-        except Exception as e:
-            print(f"ProjectOutcomeWidget: Error connecting signal: {e}")
+        if (self.current_project or self.load_all) and self.freshness.is_stale():
+            self.load_outcome(load_all=self.load_all)
+        
+
+    def _on_data_changed(self, changes):
+        """项目新增、修改或删除时增量更新项目选择下拉框"""
+        if not changes.affects(EntityKind.PROJECT):
+            return
+        if not self.project_selector.isEnabled(): # 原先没有项目或加载出错，整体重建
+            self._refresh_project_selector()
+        elif UIUtils.apply_project_changes(self.project_selector, self.sessions, changes):
+            self._on_project_selected(self.project_selector.currentIndex()) # 选中的项目已被删除
 
     def _refresh_project_selector(self):
         """刷新项目选择下拉框的内容"""
@@ -217,8 +229,7 @@ class ProjectOutcomeWidget(QWidget):
         self.project_selector.clear()
         self.project_selector.addItem("请选择项目...", userData=None) # 添加默认提示项
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             projects = session.query(Project).order_by(Project.financial_code).all()
             if not projects:
@@ -257,7 +268,7 @@ class ProjectOutcomeWidget(QWidget):
         selector_label = TitleLabel("项目成果-", self)
         selector_label.setToolTip("用于创建和管理项目的成果信息")
         selector_label.installEventFilter(ToolTipFilter(selector_label, showDelay=300, position=ToolTipPosition.RIGHT))
-        self.project_selector = UIUtils.create_project_selector(self.engine, self)
+        self.project_selector = UIUtils.create_project_selector(self.sessions, self)
 
         # 手动添加“全部数据”选项
         self.project_selector.insertItem(0, "全部成果", userData="all")
@@ -401,41 +412,58 @@ class ProjectOutcomeWidget(QWidget):
             self.load_outcome() # Load outcome for the selected project
         else:
             self.current_project = None
+            self.loader.cancel('outcomes')
             self.outcome_table.setRowCount(0) # Clear table if no project selected
             UIUtils.show_info(self, "项目成果", "请选择一个项目以查看成果")
 
+    def _outcome_scope(self):
+        """Returns the project ID whose outcomes are shown, None for all projects.
+           Raises LookupError if no project is selected and load_all is False.
+        """
+        if self.load_all:
+            return None
+        if self.current_project:
+            return self.current_project.id
+        raise LookupError("No project selected")
+
+    def _outcome_query(self, session, project_id):
+        """Returns the outcome query for the given project (all projects if project_id is None),
+           ordered by publish date.
+        """
+        query = session.query(ProjectOutcome).order_by(ProjectOutcome.publish_date.desc())
+        if project_id is None:
+            return query
+        return query.filter(ProjectOutcome.project_id == project_id)
+
     def load_outcome(self, load_all=False):
-        """Loads outcomes into memory and populates the table.
+        """Loads outcomes in the background and populates the table when done.
            If load_all is True, loads outcomes for all projects.
            Otherwise, loads outcomes for the current project.
         """
-        self.all_outcomes = []
+        self.load_all = load_all
         self.current_outcomes = []
         self.outcome_table.setRowCount(0) # Clear table first
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
-
         try:
-            if load_all:
-                print("OutcomeWidget: Loading all outcomes.")
-                self.all_outcomes = session.query(ProjectOutcome).order_by(ProjectOutcome.publish_date.desc()).all()
-            elif self.current_project:
-                print(f"OutcomeWidget: Loading outcome for project ID: {self.current_project.id}")
-                self.all_outcomes = session.query(ProjectOutcome).filter(
-                    ProjectOutcome.project_id == self.current_project.id
-                ).order_by(ProjectOutcome.publish_date.desc()).all() # Order by publish date
-            else:
-                print("OutcomeWidget: No project selected and load_all is False, cannot load outcome.")
-                return
+            project_id = self._outcome_scope()
+        except LookupError:
+            print("OutcomeWidget: No project selected and load_all is False, cannot load outcome.")
+            self.loader.cancel('outcomes')
+            return
 
-            self.current_outcomes = self.all_outcomes[:] # Initial view shows all
-            self._populate_table(self.current_outcomes)
-        except Exception as e:
-             UIUtils.show_error(self, "错误", f"加载成果数据失败: {e}")
-             print(f"Error loading outcomes: {e}")
-        finally:
-            session.close()
+        self.freshness.mark_fresh()
+        self.loader.load('outcomes',
+                         lambda session: snapshot(self._outcome_query(session, project_id).all()),
+                         self._show_outcomes, self._on_load_error)
+
+    def _show_outcomes(self, outcomes):
+        self.current_outcomes = outcomes
+        self._populate_table(outcomes)
+
+    def _on_load_error(self, error):
+        self.freshness.invalidate() # 下次显示时重试
+        UIUtils.show_error(self, "错误", f"加载成果数据失败: {error}")
+        print(f"Error loading outcomes: {error}")
 
     def _populate_table(self, outcomes_list):
         """Populates the table based on the provided list of ProjectOutcome objects."""
@@ -497,7 +525,9 @@ class ProjectOutcomeWidget(QWidget):
 
     def apply_filters(self):
         """Applies filters based on search keyword, type, status, and date range using FilterUtils."""
-        if not self.all_outcomes: # Don't filter if nothing is loaded
+        try:
+            project_id = self._outcome_scope()
+        except LookupError: # Don't filter if nothing is loaded
              return
 
         keyword = self.search_edit.text() # Keep original case, FilterUtils handles lowercasing
@@ -524,15 +554,13 @@ class ProjectOutcomeWidget(QWidget):
             'date': 'publish_date'  # 使用发表/授权日期进行筛选
         }
 
-        # Apply filters using FilterUtils
-        self.current_outcomes = FilterUtils.apply_filters(
-            self.all_outcomes,
+        # Apply filters in the database using FilterUtils, then update the table with filtered data
+        self.loader.load('outcomes', lambda session: snapshot(FilterUtils.filter_query(
+            self._outcome_query(session, project_id),
+            ProjectOutcome,
             filter_criteria,
             attribute_mapping
-        )
-
-        # Update the table with filtered data
-        self._populate_table(self.current_outcomes)
+        )), self._show_outcomes, self._on_load_error)
         
     def reset_filters(self):
         """Resets all filter inputs and reapplies filters."""
@@ -559,8 +587,7 @@ class ProjectOutcomeWidget(QWidget):
         # Assuming attachment is added/replaced via the button after creation.
         dialog = OutcomeDialog(self, project=self.current_project)
         if dialog.exec():
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             try:
                 outcome = ProjectOutcome(
                     project_id=self.current_project.id,
@@ -602,7 +629,6 @@ class ProjectOutcomeWidget(QWidget):
     def _handle_outcome_attachment_new(self, event, btn):
         """处理成果附件操作，使用通用附件处理函数"""
         outcome_id = btn.property("item_id")
-        Session = sessionmaker(bind=self.engine)
         
         # 定义获取成果对象的函数
         def get_outcome(session, outcome_id):
@@ -614,7 +640,7 @@ class ProjectOutcomeWidget(QWidget):
             btn=btn,
             item_id=outcome_id,
             item_type="outcome",
-            session_maker=Session,
+            session_maker=self.sessions,
             parent_widget=self,
             get_item_func=get_outcome,
             attachment_attr="attachment_path",
@@ -639,8 +665,7 @@ class ProjectOutcomeWidget(QWidget):
         outcome_id = id_item.data(Qt.UserRole)
 
         # Use the stored engine
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
 
         try:
             outcome = session.query(ProjectOutcome).filter(
@@ -715,9 +740,9 @@ class ProjectOutcomeWidget(QWidget):
 
         if confirm_dialog.exec():
             # Use the stored engine
-            Session = sessionmaker(bind=self.engine)
-            session = Session()
+            session = self.sessions()
             deleted_count = 0
+            attachment_paths = []
             try:
                 for outcome_id in outcome_ids_to_delete:
                     outcome = session.query(ProjectOutcome).filter(
@@ -725,14 +750,7 @@ class ProjectOutcomeWidget(QWidget):
                         ProjectOutcome.project_id == self.current_project.id
                     ).first()
                     if outcome:
-                        # 删除附件文件
-                        if outcome.attachment_path and os.path.exists(outcome.attachment_path):
-                            try:
-                                os.remove(outcome.attachment_path)
-                            except OSError as e:
-                                print(f"Warning: Could not delete attachment file {outcome.attachment_path}: {e}")
-                                # Decide if deletion should proceed or stop
-
+                        attachment_paths.append(outcome.attachment_path)
                         session.delete(outcome)
                         deleted_count += 1
 
@@ -748,6 +766,8 @@ class ProjectOutcomeWidget(QWidget):
                         session.add(actionlog)
 
                 session.commit() # 在循环外部统一提交
+                # 附件不再被其他记录引用时删除
+                release(session, attachment_paths)
                 self.load_outcome() # Reload all outcomes
                 UIUtils.show_success(self, "成功", f"成功删除 {deleted_count} 条成果记录")
             except Exception as e: # Catch potential DB errors
@@ -802,6 +822,7 @@ class ProjectOutcomeWidget(QWidget):
                     "附件路径": outcome.attachment_path or ""
                 })
 
+            import pandas as pd
             # 创建DataFrame并导出
             df = pd.DataFrame(data)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -815,46 +836,22 @@ class ProjectOutcomeWidget(QWidget):
 
     def export_outcome_attachments(self):
         """导出成果附件"""
-        if not self.current_project or not self.current_outcomes:
+        items = [
+            ExportItem(outcome.attachment_path, {
+                '成果ID': outcome.id,
+                '成果名称': outcome.name,
+                '成果类型': outcome.type.value,
+                '成果状态': outcome.status.value if outcome.status else '',
+            })
+            for outcome in self.current_outcomes if outcome.attachment_path
+        ]
+        if not self.current_project or not items:
             UIUtils.show_warning(self, "警告", "没有可导出的成果附件")
             return
 
-        export_dir = QFileDialog.getExistingDirectory(
-            self, "选择导出目录",
-            os.path.expanduser("~")
-        )
-        if not export_dir:
-            return
-
-        try:
-            # 创建项目子目录
-            project_dir = os.path.join(export_dir, f"成果附件_{self.current_project.financial_code}")
-            os.makedirs(project_dir, exist_ok=True)
-
-            # 导出附件
-            exported_count = 0
-            for outcome in self.current_outcomes:
-                if outcome.attachment_path and os.path.exists(outcome.attachment_path):
-                    filename = os.path.basename(outcome.attachment_path)
-                    dest_path = os.path.join(project_dir, filename)
-                    
-                    # 避免文件名冲突
-                    counter = 1
-                    while os.path.exists(dest_path):
-                        base, ext = os.path.splitext(filename)
-                        dest_path = os.path.join(project_dir, f"{base}_{counter}{ext}")
-                        counter += 1
-                    
-                    shutil.copy2(outcome.attachment_path, dest_path)
-                    exported_count += 1
-
-            if exported_count > 0:
-                UIUtils.show_success(self, "成功", f"成功导出 {exported_count} 个成果附件到: {project_dir}")
-            else:
-                UIUtils.show_warning(self, "警告", "没有找到可导出的成果附件")
-
-        except Exception as e:
-            UIUtils.show_error(self, "错误", f"导出成果附件失败: {str(e)}")
+        AttachmentExportDialog(
+            items, f"成果附件_{self.current_project.financial_code}", "导出成果附件", self
+        ).exec()
 
     def copy_cell_content(self, item):
         """复制单元格内容"""
@@ -1,54 +1,57 @@
 import json
-from datetime import datetime, timezone
+import logging
+from datetime import datetime
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QFileDialog # Added QHBoxLayout, QLabel, QFileDialog
 from PySide6.QtWebChannel import QWebChannel
 from PySide6.QtCore import QUrl, Signal, QObject, Slot
 from qfluentwidgets import TitleLabel, InfoBar, InfoBarPosition, ToolTipFilter, ToolTipPosition
 from qframelesswindow.webengine import FramelessWebEngineView
 from app.utils.ui_utils import UIUtils
+from app.utils.event_bus import event_bus, EntityKind, Operation
 # 需要在文件顶部导入
-from app.models.database import Project, sessionmaker, Actionlog # Import Actionlog
-from app.models.database import sessionmaker, GanttTask, GanttDependency, Project, Actionlog # Import Actionlog
-from enum import Enum # Import Enum
+from app.models.database import Project
+from app.models.gantt import GanttChangeset, apply_gantt_changes
+from app.models.gantt_schedule import load_schedule
+from app.models.gantt_payload import PAGE_SIZE, encode, gantt_payload_cache
+from app.models.session import SessionRegistry
+from app.models.data_version import DataFreshness
 import os # 确保导入 os 模块
 import csv
 from io import StringIO # 用于 CSV 写入内存
-import pandas as pd # Import pandas
+
+logger = logging.getLogger(__name__)
+
 
 class ProjectProgressWidget(QWidget):
     """项目进度管理组件，集成jQueryGantt甘特图"""
 
-    # 定义信号
-    progress_updated = Signal()
-
-    def __init__(self, engine=None, parent=None):
+    def __init__(self, engine=None, parent=None, sessions=None):
         super().__init__(parent)        
         self.engine = engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         self.setObjectName("projectProgressWidget")
         self.current_project = None # Track the currently selected project in the widget
+        # 甘特图数据自上次加载后是否被其它界面或其它程序修改
+        self.freshness = DataFreshness(engine, ('gantt_tasks', 'gantt_dependencies', 'gantt_task_schedules'))
         self.setup_ui()
+        event_bus().changed.connect(self._on_data_changed)
 
     def showEvent(self, event):
-        """在窗口显示时连接信号"""
+        """切换回本页时，甘特图数据自上次加载后被修改过才重新加载"""
         super().showEvent(event)
-        # 尝试连接信号
-        try:
-            main_window = self.window()
-            if main_window and hasattr(main_window, 'project_updated'):
-                # 先断开旧连接，防止重复连接
-                try:
-                    main_window.project_updated.disconnect(self._refresh_project_selector)
-                except RuntimeError:
-                    pass # 信号未连接，忽略错误
-                main_window.project_updated.connect(self._refresh_project_selector)
-                # print("ProjectProgressWidget: Connected to project_updated signal.") # Removed print
-            else:
-                 # print("ProjectProgressWidget: Could not find main window or project_updated signal.") # Removed print
-                 pass # Do nothing if signal not found
-        except Exception as e:
-            # print(f"ProjectProgressWidget: Error connecting signal: {e}") # Removed print
-            pass # Ignore connection errors silently
+        if self.current_project and self.freshness.is_stale():
+            gantt_payload_cache.invalidate(self.current_project.id) # 缓存不知道其它程序的修改
+            self.freshness.mark_fresh()
+            self.web_view.page().runJavaScript("loadInitialData();")
 
+    def _on_data_changed(self, changes):
+        """项目新增、修改或删除时增量更新项目选择下拉框"""
+        if not changes.affects(EntityKind.PROJECT):
+            return
+        if not self.project_selector.isEnabled(): # 原先没有项目或加载出错，整体重建
+            self._refresh_project_selector()
+        elif UIUtils.apply_project_changes(self.project_selector, self.sessions, changes):
+            self._on_project_selected(self.project_selector.currentIndex()) # 选中的项目已被删除
 
     def _refresh_project_selector(self):
         """刷新项目选择下拉框的内容"""
@@ -65,8 +68,7 @@ class ProjectProgressWidget(QWidget):
         self.project_selector.clear()
         self.project_selector.addItem("请选择项目...", userData=None) # 添加默认提示项
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        session = self.sessions()
         try:
             projects = session.query(Project).order_by(Project.financial_code).all()
             if not projects:
@@ -108,7 +110,7 @@ class ProjectProgressWidget(QWidget):
         selector_label = TitleLabel("项目进度-", self)
         selector_label.setToolTip("以甘特图形式管理项目任务进度")
         selector_label.installEventFilter(ToolTipFilter(selector_label, showDelay=300, position=ToolTipPosition.RIGHT))
-        self.project_selector = UIUtils.create_project_selector(self.engine, self)
+        self.project_selector = UIUtils.create_project_selector(self.sessions, self)
         selector_layout.addWidget(selector_label)
         selector_layout.addWidget(self.project_selector)
         selector_layout.addStretch()
@@ -118,7 +120,7 @@ class ProjectProgressWidget(QWidget):
         self.layout.addWidget(self.web_view) # Add web_view *after* selector
 
         self.channel = QWebChannel(self.web_view.page())
-        self.gantt_bridge = GanttBridge(self.engine, self.web_view, parent=self) # Pass web_view
+        self.gantt_bridge = GanttBridge(self.engine, self.web_view, parent=self, sessions=self.sessions) # Pass web_view
         self.channel.registerObject("ganttBridge", self.gantt_bridge) # 注册对象，JS端将通过 'ganttBridge' 访问
         self.web_view.page().setWebChannel(self.channel)
         # 连接保存信号到信息提示
@@ -137,6 +139,7 @@ class ProjectProgressWidget(QWidget):
             self.current_project = selected_project
             UIUtils.show_success(self, "项目进度", f"项目已选择: {self.current_project.name}")
             self.gantt_bridge.set_project(self.current_project)
+            self.freshness.mark_fresh()
             self.web_view.page().runJavaScript("loadInitialData();")
         else:
             self.current_project = None
@@ -245,35 +248,15 @@ class ProjectProgressWidget(QWidget):
                     // Define functions to load/clear data, called by Python later
                     window.loadInitialData = function() {{ // Escape braces
                         console.log("loadInitialData called by Python.");
-                        if (window.ganttBridge && window.ganttBridge.load_gantt_data) {{ // Escape braces
-                            window.ganttBridge.load_gantt_data(function(jsonData) {{ // Escape braces
-                                if (jsonData) {{ // Escape braces
-                                    try {{ // Escape braces
-                                        var projectData = JSON.parse(jsonData);
-                                        if (typeof ge !== 'undefined' && ge.loadProject) {{ // Escape braces
-                                            console.log("Loading project data into Gantt:", projectData);
-                                            ge.loadProject(projectData);
-                                            ge.redraw();
-                                            console.log("Gantt data loaded/reloaded from Python.");
-                                        }} else {{ // Escape braces
-                                            console.error("Gantt object 'ge' not found or loadProject method missing.");
-                                        }} // Escape braces
-                                    }} catch (e) {{ // Escape braces
-                                        console.error("Error parsing or loading Gantt data:", e, jsonData);
-                                    }} // Escape braces
-                                }} else {{ // Escape braces
-                                    console.warn("Received empty data from load_gantt_data.");
-                                }} // Escape braces
-                            }}); // Escape braces
-                        }} else {{ // Escape braces
-                             console.error("ganttBridge or load_gantt_data function not available.");
-                        }} // Escape braces
+                        loadGanttFromBridge(); // 分页加载，见 gantt.html
                     }}; // Escape braces
 
                     window.clearGantt = function() {{ // Escape braces
                         console.log("clearGantt called by Python.");
                          if (typeof ge !== 'undefined' && ge.reset) {{ // Escape braces
+                             ganttLoadSequence++; // 丢弃尚未返回的分页
                              ge.reset(); // Clear the gantt chart
+                             ganttBaseline = null;
                              console.log("Gantt chart cleared.");
                          }} else {{ // Escape braces
                              console.error("Gantt object 'ge' not found or reset method missing.");
@@ -318,12 +301,14 @@ class GanttBridge(QObject):
     """用于在Python和JavaScript之间通过QWebChannel通信的桥梁类"""
     data_saved = Signal(bool, str) # 信号：保存是否成功，消息
 
-    def __init__(self, engine, web_view, parent=None): # Added web_view parameter
+    def __init__(self, engine, web_view, parent=None, sessions=None): # Added web_view parameter
         super().__init__(parent)
         self.engine = engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
         self.web_view = web_view # Store web_view instance for PNG export
         self.project = None # Project will be set later
-        self.Session = sessionmaker(bind=self.engine)
+        self.Session = self.sessions
+        self._view = None # 页面正在加载或已加载的可见任务
 
     def set_project(self, project):
         """Sets the current project for the bridge."""
@@ -331,507 +316,95 @@ class GanttBridge(QObject):
         # print(f"GanttBridge project set to: {project.name if project else 'None'}") # Removed print
 
     @Slot(result=str) # 返回JSON字符串
-    def load_gantt_data(self):
-        """从数据库加载指定项目的甘特图数据"""
+    def open_gantt_view(self):
+        """开始加载当前项目的甘特图：返回项目信息和可见任务数，任务由 load_gantt_page 分页获取
+
+        折叠任务的子孙任务不发送（见 app.models.gantt_payload），展开时由 load_gantt_subtrees 获取。
+        """
+        project_data = {
+            "tasks": [], "total": 0, "pageSize": PAGE_SIZE, "selectedRow": -1, "deletedTaskIds": [],
+            "resources": [], "roles": [], "canWrite": False, "canDelete": False,
+            "canWriteOnParent": False, "canAdd": False
+        }
+        self._view = None
         if not self.project:
-            # print("GanttBridge: No project selected, returning empty data.") # Removed print
-            return json.dumps({
-                "tasks": [], "selectedRow": -1, "deletedTaskIds": [],
-                "resources": [], "roles": [], "canWrite": False, "canDelete": False,
-                "canWriteOnParent": False, "canAdd": False
-            })
-
-        session = self.Session()
-        try:
-            # print(f"GanttBridge: Loading data for project ID: {self.project.id}") # Removed print
-            # 按照 order 字段排序加载任务
-            tasks_db = session.query(GanttTask).filter(GanttTask.project_id == self.project.id).order_by(GanttTask.order).all()
-            dependencies_db = session.query(GanttDependency).filter(GanttDependency.project_id == self.project.id).all()
-
-            tasks_json = []
-            for task in tasks_db:
-                # 打印任务ID和进度，用于调试
-                print(f"Loading task {task.gantt_id}: progress = {task.progress}")
-
-                start_ms = int(task.start_date.replace(tzinfo=timezone.utc).timestamp() * 1000) if task.start_date else None
-                end_ms = int(task.end_date.replace(tzinfo=timezone.utc).timestamp() * 1000) if task.end_date else None
-
-                # 确保进度值是浮点数且在0-100之间
-                progress = float(task.progress) if task.progress is not None else 0.0
-                progress = max(0.0, min(100.0, progress))
-                
-                tasks_json.append({
-                    "id": task.gantt_id, # 使用存储的gantt_id
-                    "name": task.name,
-                    "progress": progress,  # 使用处理后的进度值
-                    "progressByWorklog": task.progress_by_worklog,
-                    "relevance": 0, # 示例值，根据需要调整
-                    "type": "", # 示例值
-                    "typeId": "", # 示例值
-                    "description": task.description,
-                    "code": task.code,
-                    "level": task.level,
-                    "status": task.status,
-                    "depends": self._get_task_dependencies(task.gantt_id, dependencies_db),
-                    "canWrite": True, # 假设可写
-                    "start": start_ms,
-                    "duration": task.duration,
-                    "end": end_ms,
-                    "startIsMilestone": task.start_is_milestone,
-                    "endIsMilestone": task.end_is_milestone,
-                    "collapsed": task.collapsed,
-                    "assigs": [], # 假设没有分配资源
-                    "hasChild": task.has_child,
-                    "responsible": task.responsible # 添加负责人字段
-                })
-
-            project_data = {
-                "tasks": tasks_json,
-                "selectedRow": 0 if tasks_json else -1, # 选中第一行或不选
-                "deletedTaskIds": [], # 初始为空
-                "resources": [], # 暂不处理资源
-                "roles": [], # 暂不处理角色
-                "canWrite": True,
-                "canDelete": True,
-                "canWriteOnParent": True,
-                "canAdd": True
-            }
-            # print(f"Loaded {len(tasks_json)} tasks for project {self.project.id}") # Removed print
-            return json.dumps(project_data, default=str) # 使用default=str处理日期等
+            return encode(project_data)
 
+        try:
+            self._view = gantt_payload_cache.get(self.sessions, self.project.id).open_view()
         except Exception as e:
-            # print(f"Error loading Gantt data: {e}") # Removed print
-            session.rollback()
-            return json.dumps({
-                "tasks": [], "selectedRow": -1, "deletedTaskIds": [],
-                "resources": [], "roles": [], "canWrite": True, "canDelete": True,
-                "canWriteOnParent": True, "canAdd": True
-            })
-        finally:
-            session.close()
-
-    def _get_task_dependencies(self, task_gantt_id, all_dependencies):
-        """获取指定任务的依赖字符串"""
-        deps = []
-        for dep in all_dependencies:
-            if dep.successor_gantt_id == task_gantt_id:
-                deps.append(str(dep.predecessor_gantt_id))
-        return ",".join(deps)
+            logger.exception("加载甘特图数据失败")
+            self.data_saved.emit(False, f"加载甘特图数据失败: {e}")
+            return encode(project_data)
+
+        project_data.update({
+            "total": len(self._view),
+            "selectedRow": 0 if len(self._view) else -1, # 选中第一行或不选
+            "canWrite": True,
+            "canDelete": True,
+            "canWriteOnParent": True,
+            "canAdd": True
+        })
+        return encode(project_data)
+
+    @Slot(int, result=str)
+    def load_gantt_page(self, start):
+        """返回 open_gantt_view 打开的可见任务中从 start 开始的一页"""
+        if self._view is None:
+            return encode({"start": start, "tasks": []})
+        return self._view.page(start)
+
+    @Slot(str, bool, result=str)
+    def load_gantt_subtrees(self, task_ids_json, expand_all):
+        """返回折叠任务的子树，用于展开子任务尚未加载的任务
+
+        Args:
+            task_ids_json: 任务ID列表的JSON字符串
+            expand_all: 是否连同子树中的折叠任务一并返回
+        """
+        if not self.project:
+            return encode({"subtrees": [], "links": []})
+        try:
+            plan = gantt_payload_cache.get(self.sessions, self.project.id)
+            return plan.subtree_payload(json.loads(task_ids_json), expand_all)
+        except Exception as e:
+            logger.exception("加载甘特图子任务失败")
+            self.data_saved.emit(False, f"加载子任务失败: {e}")
+            return encode({"subtrees": [], "links": []})
 
-    @Slot(str, result=str) # 接收JSON字符串，返回包含ID映射的JSON字符串或错误信息
-    def save_gantt_data(self, project_json_str):
+    @Slot(str, result=str) # 接收变更集JSON字符串，返回包含ID映射的JSON字符串或错误信息
+    def save_gantt_data(self, changeset_json_str):
         """
-        将甘特图数据保存到数据库。
-        成功时返回包含临时ID到持久化ID映射的JSON字符串。
+        将甘特图的变更集（新增、修改、删除的任务及依赖，格式见 app.models.gantt）保存到数据库。
+        成功时返回新增任务的临时ID到持久化ID的映射，以及重新汇总后进度变化的父任务。
         失败时返回包含错误信息的JSON字符串。
         """
         if not self.project:
-            # print("GanttBridge: No project selected, cannot save data.") # Removed print
             error_message = "未选择项目，无法保存数据。"
             self.data_saved.emit(False, error_message)
             return json.dumps({"success": False, "error": error_message})
 
-        session = self.Session()
-        new_task_id_map = {} # 存储临时ID到新数据库ID的映射
+        freshness = self.parent().freshness
+        was_fresh = not freshness.is_stale()
         try:
-            # print(f"GanttBridge: Saving data for project ID: {self.project.id}") # Removed print
-            project_data = json.loads(project_json_str)
-            tasks_data = project_data.get("tasks", [])
-            deleted_task_ids = project_data.get("deletedTaskIds", [])
-
-            # --- 事务开始 ---
-            # 1. 处理删除的任务
-            if deleted_task_ids:
-                # 记录删除的任务
-                for deleted_gantt_id in deleted_task_ids:
-                    task_to_delete = session.query(GanttTask).filter(
-                        GanttTask.project_id == self.project.id,
-                        GanttTask.gantt_id == deleted_gantt_id
-                    ).first()
-                    if task_to_delete:
-                        old_data_str = json.dumps({
-                            "id": task_to_delete.gantt_id,
-                            "name": task_to_delete.name,
-                            "code": task_to_delete.code,
-                            "level": task_to_delete.level,
-                            "status": task_to_delete.status,
-                            "start_date": str(task_to_delete.start_date),
-                            "duration": task_to_delete.duration,
-                            "end_date": str(task_to_delete.end_date),
-                            "progress": task_to_delete.progress,
-                            "responsible": task_to_delete.responsible
-                        }, default=str, ensure_ascii=False)
-
-                        actionlog = Actionlog(
-                            project_id=self.project.id,
-                            gantt_task_id=task_to_delete.id, # 关联到数据库中的任务ID
-                            type="任务",
-                            action="删除",
-                            description=f"删除任务：{task_to_delete.name} (ID: {task_to_delete.gantt_id})",
-                            operator="系统用户",
-                            old_data=old_data_str,
-                            related_info=f"项目: {self.project.financial_code}"
-                        )
-                        session.add(actionlog)
-
-                # 先删除依赖这些任务的记录
-                session.query(GanttDependency).filter(
-                    GanttDependency.project_id == self.project.id,
-                    (GanttDependency.predecessor_gantt_id.in_(deleted_task_ids)) |
-                    (GanttDependency.successor_gantt_id.in_(deleted_task_ids))
-                ).delete(synchronize_session=False)
-                # 再删除任务本身
-                session.query(GanttTask).filter(
-                    GanttTask.project_id == self.project.id,
-                    GanttTask.gantt_id.in_(deleted_task_ids)
-                ).delete(synchronize_session=False)
-                # print(f"Deleted tasks: {deleted_task_ids}") # Removed print
-
-            # 2. 处理更新和新增的任务
-            existing_tasks_db = session.query(GanttTask).filter(GanttTask.project_id == self.project.id).all()
-            existing_task_map = {task.gantt_id: task for task in existing_tasks_db}
-            processed_gantt_ids = set() # 存储处理过的持久化ID
-            all_dependencies_to_save = []
-
-            for index, task_data in enumerate(tasks_data): # 添加 enumerate 获取索引
-                gantt_id = str(task_data["id"]) # 确保是字符串
-                depends_str = task_data.get("depends", "")
-
-                start_dt = datetime.fromtimestamp(task_data["start"] / 1000, tz=timezone.utc) if task_data.get("start") is not None else None
-                end_dt = datetime.fromtimestamp(task_data["end"] / 1000, tz=timezone.utc) if task_data.get("end") is not None else None
-
-                # 处理进度值，确保是浮点数且在0-100之间
-                progress = task_data.get("progress", 0)
-                try:
-                    progress = float(progress)
-                    progress = max(0.0, min(100.0, progress))
-                    print(f"Processing task {task_data['name']}, progress = {progress}")
-                except (TypeError, ValueError):
-                    progress = 0.0
-                    print(f"Invalid progress value for task {task_data['name']}, defaulting to 0")
-
-
-                task_obj_data = {
-                    "project_id": self.project.id,
-                    "name": task_data["name"],
-                    "code": task_data.get("code"),
-                    "level": task_data.get("level", 0),
-                    "status": task_data.get("status"),
-                    "start_date": start_dt,
-                    "duration": task_data.get("duration"),
-                    "end_date": end_dt,
-                    "start_is_milestone": task_data.get("startIsMilestone", False),
-                    "end_is_milestone": task_data.get("endIsMilestone", False),
-                    "progress": progress,  # 使用处理后的进度值
-                    "progress_by_worklog": task_data.get("progressByWorklog", False),
-                    "description": task_data.get("description"),
-                    "collapsed": task_data.get("collapsed", False),
-                    "has_child": task_data.get("hasChild", False),
-                    "responsible": task_data.get("responsible"), # 添加负责人字段
-                    "order": index # 添加 order 字段
-                }
-
-                current_gantt_id = None # 用于依赖关系处理
-                is_new_task = gantt_id.startswith("tmp_")
-
-                if is_new_task:
-                    # 新任务：插入数据库
-                    new_task = GanttTask(gantt_id=gantt_id, **task_obj_data)
-                    session.add(new_task)
-                    session.flush()
-                    persistent_gantt_id = str(new_task.id)
-                    new_task.gantt_id = persistent_gantt_id
-                    new_task_id_map[gantt_id] = persistent_gantt_id
-
-                    # 添加操作日志 (新增任务)
-                    actionlog = Actionlog(
-                        project_id=self.project.id,
-                        gantt_task_id=new_task.id, # 关联到新创建的任务ID
-                        type="任务",
-                        action="新增",
-                        description=f"新增任务：{new_task.name} (ID: {new_task.gantt_id})",
-                        operator="系统用户", # TODO: 获取当前登录用户
-                        new_data=json.dumps({
-                            "id": new_task.gantt_id,
-                            "name": new_task.name,
-                            "code": new_task.code,
-                            "level": new_task.level,
-                            "status": new_task.status,
-                            "start_date": str(new_task.start_date),
-                            "duration": new_task.duration,
-                            "end_date": str(new_task.end_date),
-                            "progress": new_task.progress,
-                            "responsible": new_task.responsible
-                        }, default=str, ensure_ascii=False),
-                        related_info=f"项目: {self.project.financial_code}"
-                    )
-                    session.add(actionlog)
-
-                    # print(f"Added new task: {gantt_id} -> {persistent_gantt_id}") # Removed print
-                    current_gantt_id = persistent_gantt_id
-                    processed_gantt_ids.add(current_gantt_id)
-                elif gantt_id in existing_task_map:
-                    # 现有任务：更新数据库
-                    existing_task = existing_task_map.pop(gantt_id) # 从map中取出并移除，表示已处理
-
-                    # 记录旧数据
-                    old_data = {
-                        "id": existing_task.gantt_id,
-                        "name": existing_task.name,
-                        "code": existing_task.code,
-                        "level": existing_task.level,
-                        "status": existing_task.status,
-                        "start_date": str(existing_task.start_date),
-                        "duration": existing_task.duration,
-                        "end_date": str(existing_task.end_date),
-                        "progress": existing_task.progress,
-                        "responsible": existing_task.responsible
-                    }
-                    old_data_str = json.dumps(old_data, default=str, ensure_ascii=False)
-
-
-                    # 检查数据是否有变化
-                    data_changed = False
-                    for key, value in task_obj_data.items():
-                        # 比较新旧数据，注意处理日期和枚举类型
-                        old_value = getattr(existing_task, key)
-                        if isinstance(old_value, datetime) and isinstance(value, datetime):
-                            if old_value.replace(tzinfo=None) != value.replace(tzinfo=None): # 忽略时区比较
-                                data_changed = True
-                                break
-                        elif isinstance(old_value, Enum) and isinstance(value, Enum):
-                             if old_value != value:
-                                 data_changed = True
-                                 break
-                        elif old_value != value:
-                            data_changed = True
-                            break
-
-                    if data_changed:
-                        for key, value in task_obj_data.items():
-                            setattr(existing_task, key, value)
-
-                        # 记录新数据
-                        new_data = {
-                            "id": existing_task.gantt_id,
-                            "name": existing_task.name,
-                            "code": existing_task.code,
-                            "level": existing_task.level,
-                            "status": existing_task.status,
-                            "start_date": str(existing_task.start_date),
-                            "duration": existing_task.duration,
-                            "end_date": str(existing_task.end_date),
-                            "progress": existing_task.progress,
-                            "responsible": existing_task.responsible
-                        }
-                        new_data_str = json.dumps(new_data, default=str, ensure_ascii=False)
-
-                        # 添加操作日志 (编辑任务)
-                        actionlog = Actionlog(
-                            project_id=self.project.id,
-                            gantt_task_id=existing_task.id, # 关联到数据库中的任务ID
-                            type="任务",
-                            action="编辑",
-                            description=f"编辑任务：{existing_task.name} (ID: {existing_task.gantt_id})",
-                            operator="系统用户", # TODO: 获取当前登录用户
-                            old_data=old_data_str,
-                            new_data=new_data_str,
-                            related_info=f"项目: {self.project.financial_code}"
-                        )
-                        session.add(actionlog)
-                        # print(f"Recorded edit for task: {gantt_id}") # Added print for debugging
-                    # else:
-                        # print(f"Task data for {gantt_id} unchanged, no edit log recorded.") # Added print for debugging
-
-
-                    # print(f"Updated task: {gantt_id}") # Removed print
-                    current_gantt_id = gantt_id
-                    processed_gantt_ids.add(current_gantt_id)
-                else:
-                    # print(f"Task with persistent id {gantt_id} not found in DB, attempting to insert.") # Removed print
-                    new_task = GanttTask(gantt_id=gantt_id, **task_obj_data)
-                    try:
-                        session.add(new_task)
-                        session.flush()
-
-                        # 添加操作日志 (新增任务 - 持久化ID)
-                        actionlog = Actionlog(
-                            project_id=self.project.id,
-                            gantt_task_id=new_task.id, # 关联到新创建的任务ID
-                            type="任务",
-                            action="新增",
-                            description=f"新增任务：{new_task.name} (ID: {new_task.gantt_id})",
-                            operator="系统用户", # TODO: 获取当前登录用户
-                            new_data=json.dumps({
-                                "id": new_task.gantt_id,
-                                "name": new_task.name,
-                                "code": new_task.code,
-                                "level": new_task.level,
-                                "status": new_task.status,
-                                "start_date": str(new_task.start_date),
-                                "duration": new_task.duration,
-                                "end_date": str(new_task.end_date),
-                                "progress": new_task.progress,
-                                "responsible": new_task.responsible
-                            }, default=str, ensure_ascii=False),
-                            related_info=f"项目: {self.project.financial_code}"
-                        )
-                        session.add(actionlog)
-
-                        # print(f"Inserted task with provided persistent id: {gantt_id}") # Removed print
-                        current_gantt_id = gantt_id
-                        processed_gantt_ids.add(current_gantt_id)
-                    except Exception as insert_err:
-                        # print(f"Failed to insert task with id {gantt_id}: {insert_err}") # Removed print
-                        session.rollback() # 回滚单条插入错误，继续处理其他任务
-                        continue # 跳过此任务的依赖处理
-
-                if current_gantt_id and depends_str:
-                    predecessor_ids = depends_str.split(',')
-                    for pred_id_raw in predecessor_ids:
-                        pred_id = pred_id_raw.strip()
-                        if pred_id: # 确保ID不为空
-                            all_dependencies_to_save.append({
-                                "predecessor": pred_id,
-                                "successor": current_gantt_id # 使用当前任务的持久化ID
-                            })
-
-            # 3. 处理依赖关系 (在所有任务处理完之后)
-            # 先删除该项目的所有旧依赖
-            session.query(GanttDependency).filter(GanttDependency.project_id == self.project.id).delete(synchronize_session=False)
-            # print("Cleared old dependencies.") # Removed print
-
-            # 添加新的依赖关系
-            added_deps_count = 0
-            for dep_data in all_dependencies_to_save:
-                pred_id = dep_data["predecessor"]
-                succ_id = dep_data["successor"] # 这个ID应该是持久化的
-
-                final_pred_id = new_task_id_map.get(pred_id, pred_id)
-
-                if final_pred_id in processed_gantt_ids and succ_id in processed_gantt_ids:
-                    # 检查是否已存在相同的依赖（理论上不会，因为先清空了）
-                    existing_dep = session.query(GanttDependency).filter_by(
-                        project_id=self.project.id,
-                        predecessor_gantt_id=final_pred_id,
-                        successor_gantt_id=succ_id
-                    ).first()
-                    if not existing_dep:
-                        new_dependency = GanttDependency(
-                            project_id=self.project.id,
-                            predecessor_gantt_id=final_pred_id,
-                            successor_gantt_id=succ_id,
-                            type="FS" # 假设默认为 FS 类型
-                        )
-                        session.add(new_dependency)
-                        added_deps_count += 1
-                else:
-                     print(f"Skipping dependency: Pred '{final_pred_id}' or Succ '{succ_id}' not found in processed tasks.")
-
-
-            # --- 依赖关系处理 ---
-            # 先删除该项目的所有旧依赖
-            session.query(GanttDependency).filter(GanttDependency.project_id == self.project.id).delete(synchronize_session=False)
-            print("Cleared old dependencies.")
-
-            added_deps_count = 0
-            for dep_data in all_dependencies_to_save:
-                pred_id_orig = dep_data["predecessor"]
-                succ_id_orig = dep_data["successor"] # 这个ID应该是持久化的
-
-                final_pred_id = new_task_id_map.get(pred_id_orig, pred_id_orig)
-                final_succ_id = new_task_id_map.get(succ_id_orig, succ_id_orig) # 后继ID也可能来自新任务
-
-                if final_pred_id in processed_gantt_ids and final_succ_id in processed_gantt_ids:
-                    new_dependency = GanttDependency(
-                        project_id=self.project.id,
-                        predecessor_gantt_id=final_pred_id,
-                        successor_gantt_id=final_succ_id,
-                        type="FS" # 假设默认为 FS 类型
-                    )
-                    session.add(new_dependency)
-                    added_deps_count += 1
-                else:
-                     print(f"Skipping dependency: Pred '{final_pred_id}' (orig: {pred_id_orig}) or Succ '{final_succ_id}' (orig: {succ_id_orig}) not found in processed tasks.")
-
-            # --- 重新计算父任务进度 ---
-            def calculate_parent_task_progress(parent_task, children_tasks):
-                """计算父任务的进度"""
-                if not children_tasks:
-                    return parent_task.progress or 0
-
-                total_weight = 0
-                weighted_progress = 0
-
-                for child in children_tasks:
-                    # 使用 duration 作为权重，如果 duration 为 None 或 0，使用默认权重 1
-                    weight = max(child.duration or 1, 1)  # 确保权重至少为1
-                    total_weight += weight
-                    # 使用子任务的进度，如果为 None，默认为 0
-                    child_progress = max(min(child.progress or 0, 100), 0)  # 确保进度在0-100之间
-                    weighted_progress += child_progress * weight
-
-                # 计算加权平均进度，保留两位小数
-                if total_weight > 0:
-                    return round(weighted_progress / total_weight, 2)
-                return 0
-
-            try:
-                # 按层级和ID排序获取所有任务
-                all_tasks_after_save = session.query(GanttTask).filter(
-                    GanttTask.project_id == self.project.id
-                ).order_by(GanttTask.level.desc(), GanttTask.id).all()
-
-                # 创建任务层级映射
-                tasks_by_level = {}
-                for task in all_tasks_after_save:
-                    if task.level not in tasks_by_level:
-                        tasks_by_level[task.level] = []
-                    tasks_by_level[task.level].append(task)
-
-                # 从底层开始向上计算父任务进度
-                max_level = max(tasks_by_level.keys()) if tasks_by_level else 0
-                for level in range(max_level - 1, -1, -1):  # 从最深层级-1开始向上
-                    if level not in tasks_by_level:
-                        continue
-
-                    for parent_task in tasks_by_level[level]:
-                        if not parent_task.has_child:
-                            continue
-
-                        # 获取直接子任务
-                        children_tasks = [task for task in tasks_by_level.get(level + 1, [])
-                                        if task.level == parent_task.level + 1]
-
-                        # 计算并更新父任务进度
-                        new_progress = calculate_parent_task_progress(parent_task, children_tasks)
-                        if parent_task.progress != new_progress:
-                            parent_task.progress = new_progress
-                            logging.info(f"更新父任务 '{parent_task.name}' 的进度为: {new_progress}%")
-
-            except Exception as e:
-                logging.error(f"计算父任务进度时出错: {str(e)}")
-                raise
-
-
-            # --- 事务提交 ---
-            session.commit()
-            # print(f"Saved/Updated {len(processed_gantt_ids)} tasks and added {added_deps_count} dependencies. Parent progress recalculated.") # Removed print
-            self.data_saved.emit(True, "甘特图数据保存成功！")
-            # 数据保存成功后，调用JS函数刷新甘特图
-            self.web_view.page().runJavaScript("loadInitialData();")
-            # 发出信号通知进度数据已更新
-            self.parent().progress_updated.emit() # 假设父级是 ProjectProgressWidget
-            return json.dumps({"success": True, "id_map": new_task_id_map})
-
+            changes = GanttChangeset.from_json(json.loads(changeset_json_str))
+            with self.sessions.unit_of_work() as session:
+                result = apply_gantt_changes(session, self.project, changes)
         except Exception as e:
-            session.rollback()
-            # print(f"Error saving Gantt data: {e}") # Removed print
+            gantt_payload_cache.invalidate(self.project.id)
             error_message = f"保存失败: {e}"
             self.data_saved.emit(False, error_message)
             return json.dumps({"success": False, "error": error_message})
-        finally:
-            session.close()
+
+        gantt_payload_cache.invalidate(self.project.id)
+        if was_fresh:
+            freshness.mark_fresh() # 本页保存的修改已显示在甘特图中，切换回本页时不必重新加载
+        if result.schedule_error:
+            self.data_saved.emit(True, f"甘特图数据保存成功，但关键路径无法计算：{result.schedule_error}")
+        else:
+            self.data_saved.emit(True, "甘特图数据保存成功！")
+        event_bus().publish(EntityKind.GANTT, Operation.UPDATED, project_ids=[self.project.id])
+        return json.dumps({"success": True, "id_map": result.id_map, "progress": result.progress})
 
 
 
@@ -908,6 +481,17 @@ class GanttBridge(QObject):
             try:
                 gantt_data = json.loads(gantt_json_str)
                 tasks = gantt_data.get("tasks", [])
+                # 关键路径取自最近一次保存时的计算结果，未保存的任务没有这两项
+                with self.sessions.read() as session:
+                    schedule = load_schedule(session, self.project.id)
+
+                def total_float(task):
+                    item = schedule.get(str(task.get("id")))
+                    return item.total_float if item else ""
+
+                def is_critical(task):
+                    item = schedule.get(str(task.get("id")))
+                    return ("是" if item.is_critical else "否") if item else ""
 
                 if export_format == "JSON":
                     with open(filePath, 'w', encoding='utf-8') as f:
@@ -916,7 +500,7 @@ class GanttBridge(QObject):
                 elif export_format == "CSV":
                     output = StringIO()
                     writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-                    header = ["ID", "名称", "层级", "开始日期", "结束日期", "工期(天)", "进度(%)", "依赖项", "状态", "描述"]
+                    header = ["ID", "名称", "层级", "开始日期", "结束日期", "工期(天)", "进度(%)", "依赖项", "状态", "描述", "总时差(天)", "关键任务"]
                     writer.writerow(header)
                     for task in tasks:
                         start_str = datetime.fromtimestamp(task["start"] / 1000).strftime('%Y-%m-%d') if task.get("start") else ""
@@ -925,7 +509,8 @@ class GanttBridge(QObject):
                         writer.writerow([
                             task.get("id", ""), task.get("name", ""), task.get("level", ""),
                             start_str, end_str, duration_days, task.get("progress", ""),
-                            task.get("depends", ""), task.get("status", ""), task.get("description", "")
+                            task.get("depends", ""), task.get("status", ""), task.get("description", ""),
+                            total_float(task), is_critical(task)
                         ])
                     with open(filePath, 'w', encoding='utf-8-sig', newline='') as f:
                         f.write(output.getvalue())
@@ -946,9 +531,11 @@ class GanttBridge(QObject):
                             if task.get('depends'): f.write(f"{indent}依赖: {task.get('depends')}\n")
                             if task.get('description'): f.write(f"{indent}描述: {task.get('description')}\n")
                             f.write(f"{indent}状态: {task.get('status', 'N/A')}\n")
+                            if is_critical(task): f.write(f"{indent}总时差: {total_float(task)} 天，关键任务: {is_critical(task)}\n")
                             f.write("-" * 30 + "\n")
 
                 elif export_format == "XLSX":
+                    import pandas as pd # 只有导出 Excel 时才需要 pandas，延迟到此时加载
                     tasks_for_df = []
                     for task in tasks:
                         start_str = pd.to_datetime(task["start"] / 1000, unit='s').strftime('%Y-%m-%d') if task.get("start") else None
@@ -963,10 +550,12 @@ class GanttBridge(QObject):
                             "进度(%)": task.get("progress", ""),
                             "依赖项": task.get("depends", ""),
                             "状态": task.get("status", ""),
-                            "描述": task.get("description", "")
+                            "描述": task.get("description", ""),
+                            "总时差(天)": total_float(task),
+                            "关键任务": is_critical(task)
                         })
                     df = pd.DataFrame(tasks_for_df)
-                    df = df[["ID", "名称", "开始日期", "结束日期", "工期(天)", "进度(%)", "依赖项", "状态", "描述"]]
+                    df = df[["ID", "名称", "开始日期", "结束日期", "工期(天)", "进度(%)", "依赖项", "状态", "描述", "总时差(天)", "关键任务"]]
                     df.to_excel(filePath, index=False, engine='openpyxl')
 
 
@@ -0,0 +1,130 @@
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QTableWidgetItem, QHeaderView
+from PySide6.QtCore import Qt, Signal, QTimer
+from qfluentwidgets import TitleLabel, SearchLineEdit, ComboBox, BodyLabel, TableWidget, TableItemDelegate, ToolTipFilter, ToolTipPosition
+from ..utils.ui_utils import UIUtils
+from ..models.database import Project
+from ..models.session import SessionRegistry
+from ..models.search import SEARCH_SOURCES, search
+
+
+class SearchInterface(QWidget):
+    """全局搜索界面：在支出、项目文档、项目成果和学术活动中检索关键词"""
+
+    # 双击检索结果时发出：(实体名, 记录ID, 项目ID)
+    result_activated = Signal(str, int, object)
+
+    RESULT_LIMIT = 200
+
+    def __init__(self, engine=None, parent=None, sessions=None):
+        super().__init__(parent=parent)
+        self.engine = engine
+        self.sessions = sessions or SessionRegistry.for_engine(engine)
+        self.hits = []
+        # 输入停顿后再检索，避免每输入一个字符都查询一次
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.run_search)
+        self.setup_ui()
+
+    def setup_ui(self):
+        self.main_layout = QVBoxLayout(self)
+        self.main_layout.setContentsMargins(18, 18, 18, 18)
+        self.main_layout.setSpacing(10)
+
+        # 标题
+        title_layout = QHBoxLayout()
+        title_label = TitleLabel("全局搜索", self)
+        title_label.setToolTip("在支出、项目文档、项目成果和学术活动中搜索关键词")
+        title_label.installEventFilter(ToolTipFilter(title_label, showDelay=300, position=ToolTipPosition.RIGHT))
+        title_layout.addWidget(title_label)
+        title_layout.addStretch()
+        self.main_layout.addLayout(title_layout)
+
+        # 搜索栏
+        search_layout = QHBoxLayout()
+        self.search_edit = SearchLineEdit()
+        self.search_edit.setPlaceholderText("输入关键词，多个关键词以空格分隔")
+        self.search_edit.textChanged.connect(lambda: self.search_timer.start())
+        self.search_edit.searchSignal.connect(lambda _: self.run_search())
+        search_layout.addWidget(self.search_edit)
+
+        self.entity_combo = ComboBox()
+        self.entity_combo.addItem("全部类型", userData=None)
+        for entity, source in SEARCH_SOURCES.items():
+            self.entity_combo.addItem(source['label'], userData=entity)
+        self.entity_combo.currentIndexChanged.connect(lambda _: self.run_search())
+        search_layout.addWidget(self.entity_combo)
+        self.main_layout.addLayout(search_layout)
+
+        # 结果列表
+        self.result_table = TableWidget()
+        self.result_table.setColumnCount(4)
+        self.result_table.setHorizontalHeaderLabels(["类型", "标题", "匹配内容", "所属项目"])
+        self.result_table.setWordWrap(False)
+        self.result_table.setItemDelegate(TableItemDelegate(self.result_table))
+        UIUtils.set_table_style(self.result_table)
+
+        header = self.result_table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.resizeSection(0, 80)   # 类型
+        header.resizeSection(1, 260)  # 标题
+        header.resizeSection(2, 480)  # 匹配内容
+        header.setStretchLastSection(True)
+
+        self.result_table.setSelectionMode(TableWidget.SingleSelection)
+        self.result_table.setSelectionBehavior(TableWidget.SelectRows)
+        self.result_table.setEditTriggers(TableWidget.NoEditTriggers)
+        self.result_table.cellDoubleClicked.connect(self._on_result_double_clicked)
+        self.main_layout.addWidget(self.result_table)
+
+        self.status_label = BodyLabel("")
+        self.main_layout.addWidget(self.status_label)
+
+    def run_search(self):
+        """按当前关键词和类型检索并更新结果列表"""
+        self.search_timer.stop()
+        keyword = self.search_edit.text().strip()
+        entity = self.entity_combo.currentData()
+
+        if not keyword:
+            self.hits = []
+            self._populate_table({})
+            self.status_label.setText("")
+            return
+
+        try:
+            with self.sessions.read() as session:
+                self.hits = search(
+                    session, keyword,
+                    entities=[entity] if entity else None,
+                    limit=self.RESULT_LIMIT,
+                    highlight=('【', '】'),
+                )
+                project_ids = {hit.project_id for hit in self.hits if hit.project_id is not None}
+                projects = {
+                    project.id: project.financial_code
+                    for project in session.query(Project).filter(Project.id.in_(project_ids))
+                } if project_ids else {}
+        except Exception as e:
+            UIUtils.show_error(self, "错误", f"搜索失败：{str(e)}")
+            return
+
+        self._populate_table(projects)
+        self.status_label.setText(f"共找到 {len(self.hits)} 条结果" + (f"（仅显示前 {self.RESULT_LIMIT} 条）" if len(self.hits) >= self.RESULT_LIMIT else ""))
+
+    def _populate_table(self, projects):
+        self.result_table.setRowCount(0)
+        self.result_table.setRowCount(len(self.hits))
+        for row, hit in enumerate(self.hits):
+            values = [hit.label, hit.title, hit.snippet, projects.get(hit.project_id, "")]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(value or "")
+                item.setTextAlignment(Qt.AlignCenter if col in (0, 3) else Qt.AlignLeft | Qt.AlignVCenter)
+                UIUtils.set_item_tooltip(item)
+                self.result_table.setItem(row, col, item)
+
+    def _on_result_double_clicked(self, row, column):
+        if 0 <= row < len(self.hits):
+            hit = self.hits[row]
+            self.result_activated.emit(hit.entity, hit.entity_id, hit.project_id)
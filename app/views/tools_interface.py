@@ -3,7 +3,6 @@ from PySide6.QtGui import QIcon
 from PySide6.QtCore import Qt
 from qfluentwidgets import CardWidget, TitleLabel, FluentIcon, PushButton
 from ..tools.IndirectCostCalculator import IndirectCostCalculator
-from ..tools.TreeList import TreeListApp
 import os
 
 class ToolsInterface(QWidget):
@@ -104,5 +103,6 @@ class ToolsInterface(QWidget):
         
     def open_treelist(self):
         """打开树形列表工具"""
+        from ..tools.TreeList import TreeListApp # 依赖 openpyxl，打开工具时才导入
         self.treelist = TreeListApp()
         self.treelist.show()
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+预算编制计划加载基准测试
+
+在临时数据库中生成若干预算计划，每个计划含指定条数的预算项（部分预算项带子项），
+对比两种读取方式的查询次数和耗时：
+
+- 逐层查询：按 计划 × 类别 × 父级 逐层查询明细，每个预算项再查询一次子项（改为
+  load_plan_trees 之前预算编制界面的方式）；
+- 一次查询：load_plan_trees() 一条查询读取全部明细，在内存中构建树。
+
+同时测量预算编制界面从创建到显示出计划列表的耗时，以及展开最大的计划（创建其全部
+行）的耗时。
+
+用法：
+    python benchmarks/bench_budget_plan_load.py [--plans 5] [--items 500] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from bench_startup import make_database
+
+
+def make_plans(sessions, plans, items):
+    """生成预算计划，每个计划的预算项平均分到各类别，每 5 项中有 1 项带一个子项"""
+    from app.models.database import BudgetCategory, BudgetPlan, BudgetPlanItem
+    categories = list(BudgetCategory)
+    with sessions.unit_of_work() as session:
+        for number in range(plans):
+            plan = BudgetPlan(name=f"基准测试预算{number + 1}", total_amount=0.0)
+            session.add(plan)
+            session.flush()
+            roots = [BudgetPlanItem(plan_id=plan.id, category=category, amount=0.0) for category in categories]
+            session.add_all(roots)
+            session.flush()
+            for index in range(items):
+                root = roots[index % len(roots)]
+                item = BudgetPlanItem(plan_id=plan.id, parent_id=root.id, category=root.category,
+                                      name=f"预算项{index}", specification="规格", unit_price=100.0,
+                                      quantity=2, amount=200.0)
+                session.add(item)
+                if index % 5 == 0:
+                    session.flush()
+                    session.add(BudgetPlanItem(plan_id=plan.id, parent_id=item.id, category=root.category,
+                                               name=f"子项{index}", amount=50.0))
+
+
+def load_by_levels(session):
+    """逐层查询明细，返回读取的明细行数"""
+    from app.models.database import BudgetCategory, BudgetPlan, BudgetPlanItem
+    count = 0
+
+    def add_sub_items(plan, category, parent_id):
+        nonlocal count
+        sub_items = session.query(BudgetPlanItem).filter(
+            BudgetPlanItem.plan_id == plan.id,
+            BudgetPlanItem.category == category,
+            BudgetPlanItem.parent_id == parent_id
+        ).all()
+        for sub_item in sub_items:
+            count += 1
+            add_sub_items(plan, category, sub_item.id)
+
+    for plan in session.query(BudgetPlan).all():
+        for category in BudgetCategory:
+            budget_items = session.query(BudgetPlanItem).filter(
+                BudgetPlanItem.plan_id == plan.id,
+                BudgetPlanItem.category == category,
+                BudgetPlanItem.parent_id.is_(None)
+            ).all()
+            if budget_items:
+                count += 1
+                add_sub_items(plan, category, budget_items[0].id)
+                # 判断类别行是否有子项
+                session.query(BudgetPlanItem).filter(
+                    BudgetPlanItem.plan_id == plan.id,
+                    BudgetPlanItem.category == category,
+                    BudgetPlanItem.parent_id == budget_items[0].id
+                ).all()
+    return count
+
+
+def load_at_once(session):
+    """一次查询读取明细，返回读取的明细行数"""
+    from app.models.budget_plan import load_plan_trees
+    return sum(tree.item_count for tree in load_plan_trees(session))
+
+
+def measure(sessions, load, repeat):
+    """返回 (最快耗时, 查询次数, 明细行数)"""
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+    event.listen(sessions.engine, 'before_cursor_execute', count)
+    times = []
+    try:
+        for _ in range(repeat):
+            statements[0] = 0
+            started = time.perf_counter()
+            with sessions.read() as session:
+                rows = load(session)
+            times.append(time.perf_counter() - started)
+    finally:
+        event.remove(sessions.engine, 'before_cursor_execute', count)
+    return min(times), statements[0], rows
+
+
+def measure_interface(app, engine, sessions):
+    """返回 (界面显示出计划列表, 展开最大的计划) 的耗时"""
+    from app.views.budgeting_interface import BudgetingInterface
+    started = time.perf_counter()
+    page = BudgetingInterface(engine, sessions=sessions)
+    page.show()
+    while page.loader.is_loading('budget_plans'):
+        app.processEvents()
+        time.sleep(0.001)
+    app.processEvents()
+    opened = time.perf_counter() - started
+
+    largest = max((page.budget_tree.topLevelItem(i) for i in range(page.budget_tree.topLevelItemCount())),
+                  key=lambda item: page._unloaded_plans[item].item_count)
+    started = time.perf_counter()
+    largest.setExpanded(True)
+    app.processEvents()
+    expanded = time.perf_counter() - started
+    page.close()
+    page.deleteLater()
+    return opened, expanded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预算编制计划加载基准测试")
+    parser.add_argument('--plans', type=int, default=5, help="预算计划数")
+    parser.add_argument('--items', type=int, default=500, help="每个计划的预算项数")
+    parser.add_argument('--repeat', type=int, default=5, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    from app.models.engine import create_db_engine
+    from app.models.session import SessionRegistry
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        make_database(path, 1)
+        engine = create_db_engine(path)
+        sessions = SessionRegistry(engine, expire_on_commit=False)
+        make_plans(sessions, args.plans, args.items)
+
+        results = {name: measure(sessions, load, args.repeat)
+                   for name, load in (("逐层查询", load_by_levels), ("一次查询", load_at_once))}
+        opened, expanded = measure_interface(app, engine, sessions)
+        engine.dispose()
+
+    print(f"预算计划 {args.plans} 个，每个计划预算项 {args.items} 条")
+    baseline = results["逐层查询"][0]
+    for name, (best, statements, rows) in results.items():
+        print(f"  {name}: {best * 1000:9.1f} ms  查询 {statements:6d} 次  明细 {rows:6d} 行  "
+              f"相对逐层查询 {baseline / best:7.1f} 倍")
+    print(f"  预算编制界面显示计划列表 {opened * 1000:.1f} ms，展开最大的计划 {expanded * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
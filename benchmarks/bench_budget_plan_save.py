@@ -0,0 +1,143 @@
+"""
+预算编制保存基准测试
+
+在临时数据库中生成一个含指定条数预算项的预算计划，在预算编制界面中展开后修改若干个
+预算项的数量（经费数额及上级合计随之更新），对比两种保存方式的语句数和耗时：
+
+- 整体保存：遍历整棵树，逐个计划、类别按名称查询，删除各类别下的预算项后全部重新插入
+  （改为变更集之前 save_data 的方式）；
+- 增量保存：只比较修改过的行与上次加载或保存时的值，apply_plan_changes() 批量写入
+  变化的字段。
+
+语句数按执行次数统计，批量更新的 executemany 计为一条。
+
+用法：
+    python benchmarks/bench_budget_plan_save.py [--items 500] [--edits 1 10 100] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from bench_startup import make_database
+from bench_budget_plan_load import make_plans
+
+
+def save_whole_tree(session, tree):
+    """整体保存界面上的全部计划"""
+    from app.models.database import BudgetCategory, BudgetPlan, BudgetPlanItem
+    for i in range(tree.topLevelItemCount()):
+        project_item = tree.topLevelItem(i)
+        budget_plan = session.query(BudgetPlan).filter_by(name=project_item.text(0)).first()
+        budget_plan.total_amount = float(project_item.text(4)) if project_item.text(4) else 0.0
+        budget_plan.remarks = project_item.text(5) or None
+        for j in range(project_item.childCount()):
+            category_item = project_item.child(j)
+            category = next((c for c in BudgetCategory if c.value == category_item.text(0)), None)
+            budget_item = session.query(BudgetPlanItem).filter_by(
+                plan_id=budget_plan.id, category=category, parent_id=None).first()
+            budget_item.amount = float(category_item.text(4)) if category_item.text(4) else 0.0
+            budget_item.remarks = category_item.text(5) or None
+            session.query(BudgetPlanItem).filter_by(
+                plan_id=budget_plan.id, category=category, parent_id=budget_item.id).delete()
+            for k in range(category_item.childCount()):
+                sub_item = category_item.child(k)
+                session.add(BudgetPlanItem(
+                    plan_id=budget_plan.id, parent_id=budget_item.id, category=category,
+                    name=sub_item.text(0), specification=sub_item.text(1),
+                    unit_price=float(sub_item.text(2)) if sub_item.text(2) else 0.0,
+                    quantity=float(sub_item.text(3)) if sub_item.text(3) else 0.0,
+                    amount=float(sub_item.text(4)) if sub_item.text(4) else 0.0,
+                    remarks=sub_item.text(5) or None))
+
+
+def save_changes(session, page):
+    """只保存修改过的行"""
+    from app.models.budget_plan import apply_plan_changes
+    changes, temp_keys = page._collect_changes()
+    page._mark_saved(temp_keys, apply_plan_changes(session, changes))
+
+
+def open_page(app, engine, sessions):
+    """创建预算编制界面并展开第一个计划"""
+    from app.views.budgeting_interface import BudgetingInterface
+    page = BudgetingInterface(engine, sessions=sessions)
+    while page.loader.is_loading('budget_plans'):
+        app.processEvents()
+        time.sleep(0.001)
+    app.processEvents()
+    page.budget_tree.topLevelItem(0).setExpanded(True)
+    return page
+
+
+def edit(page, count, round_number):
+    """修改前 count 个预算项的数量"""
+    plan_item = page.budget_tree.topLevelItem(0)
+    items = [plan_item.child(j).child(k) for j in range(plan_item.childCount())
+             for k in range(plan_item.child(j).childCount())]
+    for item in items[:count]:
+        item.setText(3, str(3 + round_number % 2))
+
+
+def measure(app, engine, sessions, save, edits, repeat):
+    """返回 (最快耗时, 语句数)"""
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+    page = open_page(app, engine, sessions)
+    times = []
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        for round_number in range(repeat):
+            edit(page, edits, round_number)
+            statements[0] = 0
+            started = time.perf_counter()
+            with sessions.unit_of_work() as session:
+                save(session, page)
+            times.append(time.perf_counter() - started)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    page.close()
+    page.deleteLater()
+    return min(times), statements[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预算编制保存基准测试")
+    parser.add_argument('--items', type=int, default=500, help="预算项数")
+    parser.add_argument('--edits', type=int, nargs='+', default=[1, 10, 100], help="每次保存前修改的预算项数")
+    parser.add_argument('--repeat', type=int, default=5, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    from app.models.engine import create_db_engine
+    from app.models.session import SessionRegistry
+
+    savers = (("整体保存", lambda session, page: save_whole_tree(session, page.budget_tree)),
+              ("增量保存", save_changes))
+    print(f"预算计划 1 个，预算项 {args.items} 条")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        make_database(path, 1)
+        engine = create_db_engine(path)
+        sessions = SessionRegistry(engine, expire_on_commit=False)
+        make_plans(sessions, 1, args.items)
+        for edits in args.edits:
+            results = {name: measure(app, engine, sessions, save, edits, args.repeat) for name, save in savers}
+            baseline = results["整体保存"][0]
+            for name, (best, statements) in results.items():
+                print(f"  修改 {edits:4d} 项  {name}: {best * 1000:8.1f} ms  语句 {statements:5d} 条  "
+                      f"相对整体保存 {baseline / best:7.1f} 倍")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
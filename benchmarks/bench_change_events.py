@@ -0,0 +1,122 @@
+"""
+数据变更通知基准测试
+
+在含若干项目的临时数据库上创建主页，模拟连续保存若干条支出（如批量录入），对比主页的更新方式：
+
+- 全局刷新：每次保存后发射无参数的全局信号，主页重新加载全部项目的经费和进度概览
+  （使用事件总线之前的方式）；
+- 事件总线：每次保存发布一个支出变更事件，合并窗口内的事件合并后只送达一次，主页只重新
+  加载涉及的项目。
+
+耗时从第一次保存通知开始，到主页显示最新数据、事件循环空闲为止。同时输出事件总线的
+发布、送达及合并计数。
+
+用法：
+    python benchmarks/bench_change_events.py [--projects 100] [--events 500] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+
+from bench_startup import make_database
+
+# 处理一次界面事件的耗时低于此值（秒）时认为事件循环已空闲
+IDLE_TICK = 0.002
+
+
+def wait_loaded(app, home):
+    """处理界面事件，直到主页的后台加载全部送达且事件循环空闲"""
+    from app.utils.event_bus import event_bus
+    while True:
+        tick = time.perf_counter()
+        app.processEvents()
+        busy = home.loader.is_loading('funds') or home.loader.is_loading('tasks') or event_bus().has_pending()
+        if not busy and time.perf_counter() - tick < IDLE_TICK:
+            return
+        if busy:
+            time.sleep(0.001)
+
+
+def count_loads(home):
+    """统计主页发起的后台加载次数"""
+    counter = [0]
+    load = home.loader.load
+
+    def counted(*args, **kwargs):
+        counter[0] += 1
+        return load(*args, **kwargs)
+    home.loader.load = counted
+    return counter
+
+
+def run_global(app, home, events):
+    """每次保存后重新加载全部项目（与全局信号连接 refresh_data 相同）"""
+    for _ in range(events):
+        home.refresh_data()
+        wait_loaded(app, home)
+
+
+def run_bus(app, home, events):
+    """每次保存发布一个支出变更事件"""
+    from app.utils.event_bus import event_bus, EntityKind, Operation
+    for number in range(events):
+        event_bus().publish(EntityKind.EXPENSE, Operation.CREATED, [number], project_ids=[1])
+    wait_loaded(app, home)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据变更通知基准测试")
+    parser.add_argument('--projects', type=int, default=100, help="项目数")
+    parser.add_argument('--events', type=int, default=500, help="连续保存的支出条数")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])
+    from app.views.home_interface import HomeInterface
+    from app.models.engine import create_db_engine
+    from app.models.session import SessionRegistry
+    from app.utils.event_bus import event_bus
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        make_database(path, args.projects)
+        engine = create_db_engine(path)
+        sessions = SessionRegistry(engine, expire_on_commit=False)
+
+        results = {}
+        for name, run in (("全局刷新", run_global), ("事件总线", run_bus)):
+            times, loads = [], 0
+            for _ in range(args.repeat):
+                home = HomeInterface(engine, sessions=sessions)
+                home.resize(1200, 800)
+                home.show()
+                wait_loaded(app, home)
+                counter = count_loads(home)
+                started = time.perf_counter()
+                run(app, home, args.events)
+                times.append(time.perf_counter() - started)
+                loads = counter[0]
+                home.close()
+                home.deleteLater()
+                app.processEvents()
+            results[name] = (min(times), loads)
+        stats = event_bus().stats()
+        engine.dispose()
+
+    print(f"项目 {args.projects} 个，连续保存 {args.events} 条支出")
+    baseline = results["全局刷新"][0]
+    for name, (best, loads) in results.items():
+        print(f"  {name}: {best * 1000:9.1f} ms  主页后台加载 {loads:5d} 次  相对全局刷新 {baseline / best:7.1f} 倍")
+    print(f"  事件总线计数（{args.repeat} 轮合计）：发布 {stats.published}，送达 {stats.delivered}，"
+          f"合并 {stats.coalesced}，送达次数 {stats.batches}")
+
+
+if __name__ == '__main__':
+    main()
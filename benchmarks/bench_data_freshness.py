@@ -0,0 +1,164 @@
+"""
+切换界面时的数据新鲜度检查基准测试
+
+在含若干项目和操作日志的临时数据库上创建帮助界面（操作日志），模拟多次切换离开再切换
+回来，对比两种方式：
+
+- 每次显示都重新加载：切换回来即在后台查询操作日志并重新填充表格（使用新鲜度检查之前
+  的方式）；
+- 新鲜度检查：切换回来时比较 actionlogs 表的新鲜度令牌，未被修改时不查询。
+
+耗时从第一次切换开始，到最后一次切换后的加载送达、事件循环空闲为止。随后检查三种修改
+能否被正确识别：本进程写入其它表（不应重新加载）、本进程写入操作日志、其它程序通过
+sqlite3 写入同一数据库文件（均应重新加载）。
+
+用法：
+    python benchmarks/bench_data_freshness.py [--projects 100] [--logs 2000] [--switches 200] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+
+from bench_startup import make_database
+
+# 处理一次界面事件的耗时低于此值（秒）时认为事件循环已空闲
+IDLE_TICK = 0.002
+
+
+def add_actionlogs(path, count):
+    """写入若干条带变更前后数据的操作日志"""
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany(
+            "INSERT INTO actionlogs (type, action, description, operator, timestamp, old_data, new_data) "
+            "VALUES ('支出', '编辑', ?, '基准测试', datetime('2024-01-01', ? || ' seconds'), ?, ?)",
+            [(f"编辑支出{number}", number, json.dumps({'金额': number}), json.dumps({'金额': number + 1}))
+             for number in range(count)])
+    connection.close()
+
+
+def wait_loaded(app, page):
+    """处理界面事件，直到页面的后台加载送达且事件循环空闲"""
+    while True:
+        tick = time.perf_counter()
+        app.processEvents()
+        busy = page.loader.is_loading('actionlogs')
+        if not busy and time.perf_counter() - tick < IDLE_TICK:
+            return
+        if busy:
+            time.sleep(0.001)
+
+
+def count_loads(page):
+    """统计页面发起的后台加载次数"""
+    counter = [0]
+    load = page.loader.load
+
+    def counted(*args, **kwargs):
+        counter[0] += 1
+        return load(*args, **kwargs)
+    page.loader.load = counted
+    return counter
+
+
+def switch(app, page, always_reload):
+    """切换离开再切换回来"""
+    page.hide()
+    if always_reload:
+        page.freshness.invalidate()
+    page.show()
+    wait_loaded(app, page)
+
+
+def reloaded_after(app, page, counter, modify):
+    """执行修改后切换一次，返回是否重新加载"""
+    before = counter[0]
+    modify()
+    switch(app, page, always_reload=False)
+    return counter[0] > before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="切换界面时的数据新鲜度检查基准测试")
+    parser.add_argument('--projects', type=int, default=100, help="项目数")
+    parser.add_argument('--logs', type=int, default=2000, help="操作日志条数")
+    parser.add_argument('--switches', type=int, default=200, help="切换次数")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])
+    from app.views.help_interface import HelpInterface
+    from app.models.database import Actionlog, Expense
+    from app.models.engine import create_db_engine
+    from app.models.session import SessionRegistry
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        make_database(path, args.projects)
+        add_actionlogs(path, args.logs)
+        engine = create_db_engine(path)
+        sessions = SessionRegistry(engine, expire_on_commit=False)
+
+        results = {}
+        for name, always_reload in (("每次重新加载", True), ("新鲜度检查", False)):
+            times, loads = [], 0
+            for _ in range(args.repeat):
+                page = HelpInterface(engine, sessions=sessions)
+                page.resize(1200, 800)
+                page.show()
+                wait_loaded(app, page)
+                counter = count_loads(page)
+                started = time.perf_counter()
+                for _ in range(args.switches):
+                    switch(app, page, always_reload)
+                times.append(time.perf_counter() - started)
+                loads = counter[0]
+                page.close()
+                page.deleteLater()
+                app.processEvents()
+            results[name] = (min(times), loads)
+
+        page = HelpInterface(engine, sessions=sessions)
+        page.show()
+        wait_loaded(app, page)
+        counter = count_loads(page)
+
+        def write_expense():
+            with sessions.unit_of_work() as session:
+                session.query(Expense).filter(Expense.id == 1).update({Expense.amount: 2.0})
+
+        def write_actionlog():
+            with sessions.unit_of_work() as session:
+                session.add(Actionlog(type='支出', action='新增', description='基准测试', operator='基准测试'))
+
+        def write_external():
+            add_actionlogs(path, 1)
+
+        checks = (("本进程修改支出", write_expense, False),
+                  ("本进程新增操作日志", write_actionlog, True),
+                  ("其它程序新增操作日志", write_external, True))
+        detected = [(name, reloaded_after(app, page, counter, modify), expected)
+                    for name, modify, expected in checks]
+        page.close()
+        engine.dispose()
+
+    print(f"项目 {args.projects} 个，操作日志 {args.logs} 条，切换 {args.switches} 次")
+    baseline = results["每次重新加载"][0]
+    for name, (best, loads) in results.items():
+        print(f"  {name}: {best * 1000:9.1f} ms  后台加载 {loads:5d} 次  相对每次重新加载 {baseline / best:7.1f} 倍")
+    for name, reloaded, expected in detected:
+        status = "正确" if reloaded == expected else "错误"
+        print(f"  {name}后切换：{'重新加载' if reloaded else '未重新加载'}（{status}）")
+
+
+if __name__ == '__main__':
+    main()
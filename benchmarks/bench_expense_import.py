@@ -0,0 +1,160 @@
+"""
+支出批量导入吞吐量基准测试
+
+生成一个含 3 万行支出（其中少量为不合格行）的导入文件，分别用旧流程与 ExpenseImporter
+导入到临时数据库，对比耗时和每秒导入行数：
+
+- 旧流程：pd.read_excel 整表读取、逐列校验后以 iterrows 生成字典，逐行写入支出和操作记录，
+  预算汇总由触发器逐行更新。旧流程遇到不合格行会中止导入，此处预先剔除不合格行再计时，
+  且写入使用 Core 语句而非 ORM，结果偏向旧流程；
+- 新流程：ExpenseImporter 分块读取、向量化校验、批量写入并按批聚合汇总。
+
+用法：
+    python benchmarks/bench_expense_import.py [--rows 30000] [--format xlsx|csv]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import Table, Column, Integer, select, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.database import (Base, Project, Budget, BudgetItem, BudgetRollup, Expense, Actionlog,
+                                 BudgetCategory)
+from app.models.engine import create_db_engine
+from app.models.session import SessionRegistry
+from app.utils.import_utils import ExpenseImporter, SHEET_NAME
+
+# 操作记录表引用的项目文档、项目成果表由界面模块定义，基准测试只需表存在
+for table_name in ('project_documents', 'project_outcome'):
+    if table_name not in Base.metadata.tables:
+        Table(table_name, Base.metadata, Column('id', Integer, primary_key=True))
+
+TABLES = [model.__table__ for model in (Project, Budget, BudgetItem, Expense, BudgetRollup, Actionlog)]
+CATEGORIES = [category.value for category in BudgetCategory]
+INVALID_EVERY = 500  # 每隔多少行放入一个不合格行
+
+
+def make_file(path, rows, file_format):
+    rng = random.Random(42)
+    start = date(2024, 1, 1)
+    data = {
+        '费用类别': [], '开支内容': [], '规格型号': [], '供应商': [], '报账金额': [], '报账日期': [], '备注': [],
+    }
+    for i in range(rows):
+        invalid = i % INVALID_EVERY == INVALID_EVERY - 1
+        data['费用类别'].append("未知类别" if invalid else rng.choice(CATEGORIES))
+        data['开支内容'].append(f"采购物品{i}")
+        data['规格型号'].append(f"型号{rng.randint(1, 50)}")
+        data['供应商'].append(f"供应商{rng.randint(1, 200)}")
+        data['报账金额'].append(round(rng.uniform(10, 5000), 2))
+        data['报账日期'].append((start + timedelta(days=rng.randint(0, 364))).strftime('%Y-%m-%d'))
+        data['备注'].append("" if i % 3 else "年终结算")
+    df = pd.DataFrame(data)
+    if file_format == 'csv':
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, sheet_name=SHEET_NAME, index=False)
+    return sum(1 for i in range(rows) if i % INVALID_EVERY == INVALID_EVERY - 1)
+
+
+def make_database(path):
+    engine = create_db_engine(path)
+    Base.metadata.create_all(engine, tables=TABLES)
+    with engine.begin() as conn:
+        conn.execute(Project.__table__.insert(), [{"id": 1, "name": "基准测试项目", "financial_code": "BENCH",
+                                                   "total_budget": 1000.0}])
+        conn.execute(Budget.__table__.insert(), [{"id": 1, "project_id": 1, "year": 2024,
+                                                  "total_amount": 500.0, "spent_amount": 0.0}])
+        conn.execute(BudgetItem.__table__.insert(), [
+            {"budget_id": 1, "category": category.name, "amount": 50.0, "spent_amount": 0.0}
+            for category in BudgetCategory
+        ])
+    return engine
+
+
+def legacy_import(engine, path, file_format):
+    """旧流程：整表读取 + iterrows + 逐行写入"""
+    df = pd.read_csv(path) if file_format == 'csv' else pd.read_excel(path, sheet_name=SHEET_NAME)
+    df = df[df['费用类别'].isin(CATEGORIES)]  # 旧流程遇到不合格行会中止，预先剔除
+    df['报账金额'] = pd.to_numeric(df['报账金额'])
+    df['报账日期'] = pd.to_datetime(df['报账日期'], format=None)
+    expenses = []
+    for _, row in df.iterrows():
+        expenses.append({
+            '类别': row['费用类别'],
+            '开支内容': row['开支内容'],
+            '报账金额': float(row['报账金额']),
+            '规格型号': row['规格型号'] if pd.notna(row['规格型号']) else None,
+            '供应商': row['供应商'] if pd.notna(row['供应商']) else None,
+            '报账日期': row['报账日期'].to_pydatetime() if pd.notna(row['报账日期']) else datetime.now(),
+            '备注': row['备注'] if pd.notna(row['备注']) else None,
+        })
+
+    with engine.begin() as conn:
+        for data in expenses:
+            category = BudgetCategory(data['类别'])
+            expense_id = conn.execute(Expense.__table__.insert().returning(Expense.__table__.c.id), {
+                "project_id": 1, "budget_id": 1, "category": category, "content": data['开支内容'],
+                "specification": data['规格型号'], "supplier": data['供应商'], "amount": data['报账金额'],
+                "date": data['报账日期'].date(), "remarks": data['备注'],
+            }).scalar()
+            conn.execute(select(BudgetItem.__table__).where(
+                BudgetItem.__table__.c.budget_id == 1, BudgetItem.__table__.c.category == category.name))
+            conn.execute(Actionlog.__table__.insert(), {
+                "project_id": 1, "budget_id": 1, "expense_id": expense_id, "type": "支出", "action": "批量导入",
+                "description": f"批量导入支出：{data['开支内容']}，金额：{data['报账金额']:.2f}元",
+                "operator": "系统用户", "category": category.value, "amount": data['报账金额'],
+                "related_info": "项目: BENCH, 预算: 2024",
+            })
+    return len(expenses)
+
+
+def check_rollup(engine):
+    """校验汇总表与支出合计一致"""
+    with engine.connect() as conn:
+        expected = conn.execute(text("SELECT ROUND(SUM(amount), 2) FROM expenses")).scalar()
+        rollup = conn.execute(text("SELECT ROUND(SUM(spent_amount), 2) FROM budget_rollups")).scalar()
+        budget = conn.execute(text("SELECT ROUND(spent_amount * 10000, 2) FROM budgets WHERE id = 1")).scalar()
+    return expected == rollup == budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比支出批量导入的吞吐量")
+    parser.add_argument('--rows', type=int, default=30000, help="导入文件的行数")
+    parser.add_argument('--format', choices=('xlsx', 'csv'), default='xlsx', help="导入文件格式")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"import.{args.format}")
+        invalid = make_file(path, args.rows, args.format)
+        print(f"导入文件 {args.rows} 行（{args.format}），其中不合格行 {invalid} 行")
+
+        engine = make_database(os.path.join(tmp_dir, 'legacy.db'))
+        started = time.perf_counter()
+        imported = legacy_import(engine, path, args.format)
+        legacy = time.perf_counter() - started
+        print(f"旧流程    导入 {imported} 行，耗时 {legacy:7.2f} s，{imported / legacy:9.0f} 行/秒，"
+              f"汇总一致: {check_rollup(engine)}")
+        engine.dispose()
+
+        engine = make_database(os.path.join(tmp_dir, 'bulk.db'))
+        importer = ExpenseImporter(SessionRegistry(engine), 1, 1, "系统用户", "项目: BENCH, 预算: 2024")
+        result = importer.run(path)
+        print(f"批量导入  导入 {result.imported} 行，耗时 {result.elapsed:7.2f} s，"
+              f"{result.rows_per_second:9.0f} 行/秒，未导入 {len(result.errors)} 行，汇总一致: {check_rollup(engine)}")
+        engine.dispose()
+
+        if result.elapsed > 0:
+            print(f"导入耗时降低 {legacy / result.elapsed:.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+甘特图保存基准测试
+
+在临时数据库中生成一个含 5000 个任务（两级父任务）和依赖连线的项目计划，
+分别用旧流程与 apply_gantt_changes 保存以下编辑，对比耗时：
+
+- 移动一个任务条（修改一个任务的开始、结束日期）；
+- 批量编辑：修改 100 个任务、新增 20 个任务、删除 10 个任务。
+
+旧流程：页面提交整个计划，逐个任务读取 ORM 对象比较各字段，每个修改的任务写入完整快照的
+操作记录，删除并重建项目的全部依赖（两遍），再按层级重新汇总父任务进度；
+新流程：页面只提交变更集，批量写入。两者使用同一个数据库文件的副本。
+
+用法：
+    python benchmarks/bench_gantt_save.py [--tasks 5000] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.database import Base, Project, GanttTask, GanttDependency, Actionlog
+from app.models.engine import create_db_engine
+from app.models.gantt import GanttChangeset, apply_gantt_changes
+from app.models.session import SessionRegistry
+
+# 注册定义在视图模块中的模型，Actionlog 的关系映射依赖它们（旧流程使用 ORM 写入操作记录）
+from app.views.projecting_interface import project_document, project_outcome  # noqa: F401,E402
+
+CHILDREN_PER_PARENT = 25
+DAY_MS = 24 * 3600 * 1000
+START_MS = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def make_plan(tasks):
+    """生成计划：每 CHILDREN_PER_PARENT 个任务一组，组首为父任务，组内顺序依赖"""
+    rng = random.Random(42)
+    plan, links = [], []
+    for index in range(tasks):
+        parent = index % CHILDREN_PER_PARENT == 0
+        start = START_MS + rng.randint(0, 300) * DAY_MS
+        duration = rng.randint(1, 20)
+        plan.append({
+            "id": str(index + 1), "name": f"任务{index + 1}", "code": f"T{index + 1}", "level": 0 if parent else 1,
+            "status": "STATUS_ACTIVE", "start": start, "duration": duration, "end": start + duration * DAY_MS - 1,
+            "startIsMilestone": False, "endIsMilestone": False, "progress": 0.0 if parent else float(rng.randint(0, 100)),
+            "progressByWorklog": False, "description": "", "collapsed": False, "hasChild": parent, "responsible": "张三",
+        })
+        if not parent and index % CHILDREN_PER_PARENT > 1:
+            links.append({"from": str(index), "to": str(index + 1), "lag": 0})
+    return plan, links
+
+
+def make_database(path, plan, links):
+    engine = create_db_engine(path)
+    Base.metadata.create_all(engine)
+    sessions = SessionRegistry(engine)
+    with sessions.unit_of_work() as session:
+        session.add(Project(id=1, name="基准测试项目", financial_code="BENCH"))
+    with sessions.unit_of_work() as session:
+        project = session.get(Project, 1)
+        added = [dict(task, id=f"tmp_{task['id']}", order=row) for row, task in enumerate(plan)]
+        linked = [{"from": f"tmp_{link['from']}", "to": f"tmp_{link['to']}", "lag": 0} for link in links]
+        apply_gantt_changes(session, project, GanttChangeset(added=added, links_added=linked))
+    engine.dispose()
+
+
+def _ms(value):
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc) if value is not None else None
+
+
+def _snapshot(task):
+    return json.dumps({
+        "id": task.gantt_id, "name": task.name, "code": task.code, "level": task.level, "status": task.status,
+        "start_date": str(task.start_date), "duration": task.duration, "end_date": str(task.end_date),
+        "progress": task.progress, "responsible": task.responsible,
+    }, default=str, ensure_ascii=False)
+
+
+def legacy_save(session, project, payload):
+    """旧流程（GanttBridge.save_gantt_data 改为增量保存之前的实现，去掉了调试输出）"""
+    for deleted_id in payload["deletedTaskIds"]:
+        task = session.query(GanttTask).filter_by(project_id=project.id, gantt_id=deleted_id).first()
+        if task:
+            session.add(Actionlog(project_id=project.id, gantt_task_id=task.id, type="任务", action="删除",
+                                  description=f"删除任务：{task.name}", operator="系统用户", old_data=_snapshot(task)))
+    if payload["deletedTaskIds"]:
+        session.query(GanttDependency).filter(
+            GanttDependency.project_id == project.id,
+            GanttDependency.predecessor_gantt_id.in_(payload["deletedTaskIds"]) |
+            GanttDependency.successor_gantt_id.in_(payload["deletedTaskIds"])
+        ).delete(synchronize_session=False)
+        session.query(GanttTask).filter(GanttTask.project_id == project.id,
+                                        GanttTask.gantt_id.in_(payload["deletedTaskIds"])).delete(synchronize_session=False)
+
+    existing = {task.gantt_id: task for task in session.query(GanttTask).filter_by(project_id=project.id)}
+    id_map, processed, dependencies = {}, set(), []
+    for index, data in enumerate(payload["tasks"]):
+        values = {
+            "project_id": project.id, "name": data["name"], "code": data.get("code"), "level": data.get("level", 0),
+            "status": data.get("status"), "start_date": _ms(data.get("start")), "duration": data.get("duration"),
+            "end_date": _ms(data.get("end")), "start_is_milestone": data.get("startIsMilestone", False),
+            "end_is_milestone": data.get("endIsMilestone", False), "progress": float(data.get("progress", 0)),
+            "progress_by_worklog": data.get("progressByWorklog", False), "description": data.get("description"),
+            "collapsed": data.get("collapsed", False), "has_child": data.get("hasChild", False),
+            "responsible": data.get("responsible"), "order": index,
+        }
+        gantt_id = str(data["id"])
+        if gantt_id.startswith("tmp_"):
+            task = GanttTask(gantt_id=gantt_id, **values)
+            session.add(task)
+            session.flush()
+            task.gantt_id = id_map[gantt_id] = str(task.id)
+            session.add(Actionlog(project_id=project.id, gantt_task_id=task.id, type="任务", action="新增",
+                                  description=f"新增任务：{task.name}", operator="系统用户", new_data=_snapshot(task)))
+            gantt_id = task.gantt_id
+        else:
+            task = existing[gantt_id]
+            old_data = _snapshot(task)
+            changed = False
+            for key, value in values.items():
+                old_value = getattr(task, key)
+                if isinstance(old_value, datetime) and isinstance(value, datetime):
+                    changed = old_value.replace(tzinfo=None) != value.replace(tzinfo=None)
+                else:
+                    changed = old_value != value
+                if changed:
+                    break
+            if changed:
+                for key, value in values.items():
+                    setattr(task, key, value)
+                session.add(Actionlog(project_id=project.id, gantt_task_id=task.id, type="任务", action="编辑",
+                                      description=f"编辑任务：{task.name}", operator="系统用户",
+                                      old_data=old_data, new_data=_snapshot(task)))
+        processed.add(gantt_id)
+        for predecessor in filter(None, (data.get("depends") or "").split(",")):
+            dependencies.append((predecessor.strip(), gantt_id))
+
+    for _ in range(2):  # 旧实现中依赖删除重建的代码出现了两遍
+        session.query(GanttDependency).filter_by(project_id=project.id).delete(synchronize_session=False)
+        for predecessor, successor in dependencies:
+            predecessor = id_map.get(predecessor, predecessor)
+            if predecessor in processed and successor in processed:
+                session.add(GanttDependency(project_id=project.id, predecessor_gantt_id=predecessor,
+                                            successor_gantt_id=successor, type="FS"))
+        session.flush()
+
+    tasks_by_level = {}
+    for task in session.query(GanttTask).filter_by(project_id=project.id).order_by(GanttTask.level.desc(), GanttTask.id):
+        tasks_by_level.setdefault(task.level, []).append(task)
+    for level in range(max(tasks_by_level) - 1, -1, -1):
+        for parent in tasks_by_level.get(level, []):
+            children = tasks_by_level.get(level + 1, [])
+            if parent.has_child and children:
+                weight = sum(max(child.duration or 1, 1) for child in children)
+                parent.progress = round(sum(max(min(child.progress or 0, 100), 0) * max(child.duration or 1, 1)
+                                            for child in children) / weight, 2)
+
+
+def edit_plan(plan, links, moved, edited, added, deleted):
+    """对计划做编辑，返回 (旧流程的完整计划, 新流程的变更集)"""
+    rng = random.Random(7)
+    plan = [dict(task) for task in plan]
+    changes = GanttChangeset()
+
+    candidates = [task for task in plan if task["level"] == 1]
+    for task in rng.sample(candidates, moved + edited):
+        task["start"] += 2 * DAY_MS
+        task["end"] += 2 * DAY_MS
+        delta = {"id": task["id"], "start": task["start"], "end": task["end"]}
+        if len(changes.changed) >= moved:
+            task["progress"] = min(task["progress"] + 10, 100.0)
+            delta["progress"] = task["progress"]
+        changes.changed.append(delta)
+
+    removed = {task["id"] for task in rng.sample(candidates, deleted)}
+    changes.deleted = sorted(removed)
+    for index in range(added):
+        plan.append(dict(candidates[index], id=f"tmp_new{index}", name=f"新任务{index}"))
+    plan = [task for task in plan if task["id"] not in removed]
+    changes.added = [dict(task, order=row) for row, task in enumerate(plan) if task["id"].startswith("tmp_")]
+    changes.links_removed = [link for link in links if link["from"] in removed or link["to"] in removed]
+
+    # 旧流程：依赖字符串按任务ID给出（旧实现的理解）
+    depends = {}
+    for link in links:
+        if link["from"] not in removed and link["to"] not in removed:
+            depends.setdefault(link["to"], []).append(link["from"])
+    payload = {"tasks": [dict(task, depends=",".join(depends.get(task["id"], []))) for task in plan],
+               "deletedTaskIds": sorted(removed)}
+    return payload, changes
+
+
+def timed(database, save):
+    engine = create_db_engine(database)
+    sessions = SessionRegistry(engine)
+    started = time.perf_counter()
+    with sessions.unit_of_work() as session:
+        save(session, session.get(Project, 1))
+    elapsed = time.perf_counter() - started
+    with sessions.read() as session:
+        counts = (session.scalar(select(func.count()).select_from(GanttTask)),
+                  session.scalar(select(func.count()).select_from(GanttDependency)))
+    engine.dispose()
+    return elapsed, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="甘特图保存基准测试")
+    parser.add_argument('--tasks', type=int, default=5000, help="任务数")
+    parser.add_argument('--repeat', type=int, default=3, help="每种流程重复次数，取最快一次")
+    args = parser.parse_args()
+
+    plan, links = make_plan(args.tasks)
+    scenarios = {
+        "移动一个任务条": dict(moved=1, edited=0, added=0, deleted=0),
+        "批量编辑(改100/增20/删10)": dict(moved=0, edited=100, added=20, deleted=10),
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        template = os.path.join(directory, 'template.db')
+        make_database(template, plan, links)
+        print(f"任务 {len(plan)} 个，依赖 {len(links)} 条")
+        for title, edits in scenarios.items():
+            payload, changes = edit_plan(plan, links, **edits)
+            results = {}
+            for name, save in (("旧流程", lambda session, project: legacy_save(session, project, payload)),
+                               ("变更集", lambda session, project: apply_gantt_changes(session, project, changes))):
+                best = None
+                for attempt in range(args.repeat):
+                    database = os.path.join(directory, f'run_{attempt}.db')
+                    shutil.copyfile(template, database)
+                    elapsed, counts = timed(database, save)
+                    best = elapsed if best is None else min(best, elapsed)
+                    os.remove(database)
+                results[name] = (best, counts)
+            legacy, incremental = results["旧流程"][0], results["变更集"][0]
+            print(f"{title}:")
+            for name, (elapsed, (tasks, dependencies)) in results.items():
+                print(f"  {name}: {elapsed * 1000:8.1f} ms  （保存后任务 {tasks} 个，依赖 {dependencies} 条）")
+            print(f"  加速 {legacy / incremental:.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
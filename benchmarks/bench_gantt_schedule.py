@@ -0,0 +1,65 @@
+"""
+甘特图进度计算基准测试
+
+生成不同规模的计划（两级父任务，子任务之间为链式 FS 依赖，另有随机的 SS/FF 依赖），
+测量 compute_schedule() 的耗时，检查耗时随任务数和依赖数近似线性增长。
+
+用法：
+    python benchmarks/bench_gantt_schedule.py [--sizes 1000 5000 20000 50000] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.gantt_schedule import ScheduleTask, compute_schedule
+
+CHILDREN_PER_PARENT = 25
+
+
+def make_plan(size):
+    rng = random.Random(42)
+    origin = date(2024, 1, 1)
+    tasks, dependencies = [], []
+    for index in range(size):
+        parent = index % CHILDREN_PER_PARENT == 0
+        tasks.append(ScheduleTask(f"t{index}", 0 if parent else 1, origin + timedelta(days=rng.randint(0, 300)),
+                                  None if parent else rng.randint(1, 20)))
+        if not parent and index % CHILDREN_PER_PARENT > 1:
+            dependencies.append((f"t{index - 1}", f"t{index}", 'FS', rng.randint(0, 2)))
+        if not parent and index > CHILDREN_PER_PARENT and rng.random() < 0.2:
+            source = rng.randrange(max(index - 200, 1), index)
+            if source % CHILDREN_PER_PARENT:
+                dependencies.append((f"t{source}", f"t{index}", rng.choice(('SS', 'FF')), 0))
+    return tasks, dependencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="甘特图进度计算基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000, 50000], help="任务数")
+    parser.add_argument('--repeat', type=int, default=3, help="每种规模重复次数，取最快一次")
+    args = parser.parse_args()
+
+    baseline = None
+    for size in args.sizes:
+        tasks, dependencies = make_plan(size)
+        best, schedule = None, None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            schedule = compute_schedule(tasks, dependencies)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        per_item = best / (len(tasks) + len(dependencies))
+        baseline = baseline or per_item
+        print(f"任务 {size:6d} 个，依赖 {len(dependencies):6d} 条: {best * 1000:8.1f} ms"
+              f"  每个任务/依赖 {per_item * 1e6:5.2f} µs（相对最小规模 {per_item / baseline:4.2f} 倍）"
+              f"  关键任务 {len(schedule.critical_path)} 个")
+
+
+if __name__ == '__main__':
+    main()
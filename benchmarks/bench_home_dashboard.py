@@ -0,0 +1,126 @@
+"""
+主页概览卡片刷新基准测试
+
+用若干项目的经费和一级任务数据填充主页的项目经费、项目进度概览，对比：
+
+- 首次填充：为每个项目创建卡片（按项目复用卡片之前，每次刷新都要这样重建全部卡片）；
+- 刷新：数据中只有一个项目的支出和一个任务的进度变化，复用卡片并只更新变化的数值；
+- 增删：新增一个项目、删除一个项目。
+
+耗时包含处理完由此产生的界面事件（重新布局、绘制等，直到事件循环空闲）的时间。
+
+用法：
+    python benchmarks/bench_home_dashboard.py [--projects 300] [--tasks 5] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass, replace
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication, QScrollArea, QVBoxLayout, QWidget
+from PySide6.QtCore import Qt
+
+from app.components.project_overview_cards import FundCard, KeyedCardList, TaskCard
+from app.models.gantt_schedule import CriticalPathSummary
+
+# 处理一次界面事件的耗时低于此值（秒）时认为事件循环已空闲
+IDLE_TICK = 0.002
+
+
+@dataclass
+class Fund:
+    id: int
+    financial_code: str
+    total_budget: float
+    total_spent: float
+
+
+@dataclass
+class Task:
+    code: str
+    name: str
+    progress: float
+
+
+def make_data(projects, tasks):
+    funds = [Fund(index, f"BENCH{index:04d}", 100.0, 10000.0 * index % 900000) for index in range(projects)]
+    task_items = [(index, (f"BENCH{index:04d}", [Task(f"T{n}", f"任务{n}", 10.0 * n) for n in range(tasks)],
+                           CriticalPathSummary(date(2025, 1, 1), ["任务1", "任务2"]))) for index in range(projects)]
+    return funds, task_items
+
+
+def make_section(window):
+    area = QScrollArea(window)
+    area.setWidgetResizable(True)
+    container = QWidget()
+    layout = QVBoxLayout(container)
+    layout.setAlignment(Qt.AlignTop)
+    area.setWidget(container)
+    window.layout().addWidget(area)
+    return layout
+
+
+def timed(app, func):
+    """执行 func 并处理界面事件直到空闲，返回耗时"""
+    started = time.perf_counter()
+    func()
+    while True:
+        tick = time.perf_counter()
+        app.processEvents()
+        if time.perf_counter() - tick < IDLE_TICK:
+            return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="主页概览卡片刷新基准测试")
+    parser.add_argument('--projects', type=int, default=300, help="项目数")
+    parser.add_argument('--tasks', type=int, default=5, help="每个项目的一级任务数")
+    parser.add_argument('--repeat', type=int, default=5, help="每种操作重复次数，取最快一次")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])
+    funds, task_items = make_data(args.projects, args.tasks)
+    results = {"首次填充": [], "刷新": [], "增删": []}
+    for _ in range(args.repeat):
+        window = QWidget()
+        QVBoxLayout(window)
+        window.resize(1200, 800)
+        window.show()
+        fund_cards = KeyedCardList(make_section(window), FundCard, "暂无项目经费信息")
+        task_cards = KeyedCardList(make_section(window), TaskCard, "暂无项目任务信息")
+        update_task = lambda card, data: card.update_values(*data)
+
+        def populate(funds, task_items):
+            fund_cards.sync([(fund.id, fund) for fund in funds], FundCard.update_values)
+            task_cards.sync(task_items, update_task)
+
+        results["首次填充"].append(timed(app, lambda: populate(funds, task_items)))
+
+        changed_funds = list(funds)
+        changed_funds[1] = replace(funds[1], total_spent=funds[1].total_spent + 5000)
+        changed_tasks = list(task_items)
+        code, tasks, critical = task_items[1][1]
+        changed_tasks[1] = (1, (code, [replace(tasks[0], progress=55.0)] + tasks[1:], critical))
+        results["刷新"].append(timed(app, lambda: populate(changed_funds, changed_tasks)))
+
+        new_fund = Fund(args.projects, "NEW", 50.0, 0.0)
+        new_tasks = (args.projects, ("NEW", [Task("T0", "新任务", 0.0)], None))
+        results["增删"].append(timed(app, lambda: populate(changed_funds[1:] + [new_fund],
+                                                          changed_tasks[1:] + [new_tasks])))
+        window.close()
+        window.deleteLater()
+        app.processEvents()
+
+    print(f"项目 {args.projects} 个，每个项目一级任务 {args.tasks} 个")
+    first = min(results["首次填充"])
+    for name, times in results.items():
+        best = min(times)
+        print(f"  {name}: {best * 1000:8.1f} ms  相对首次填充 {first / best:6.1f} 倍")
+
+if __name__ == '__main__':
+    main()
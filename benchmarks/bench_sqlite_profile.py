@@ -0,0 +1,101 @@
+"""
+SQLite 调优配置提交延迟基准测试
+
+在含 5 万条支出的临时数据库上，分别使用旧版配置（回滚日志 + FULL 同步）与默认调优配置
+（WAL + NORMAL 同步等），逐条插入支出并提交，对比单次提交延迟。
+
+用法：
+    python benchmarks/bench_sqlite_profile.py [--expenses 50000] [--commits 300]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.database import Base, Project, Budget, BudgetItem, BudgetRollup, Expense, BudgetCategory
+from app.models.engine import create_db_engine, DEFAULT_SQLITE_SETTINGS, LEGACY_SQLITE_SETTINGS
+
+TABLES = [model.__table__ for model in (Project, Budget, BudgetItem, Expense, BudgetRollup)]
+CATEGORIES = [category.name for category in BudgetCategory]
+
+
+def seed(engine, expense_count):
+    """创建表结构并批量写入测试支出"""
+    Base.metadata.create_all(engine, tables=TABLES)
+    with engine.begin() as conn:
+        conn.execute(Project.__table__.insert(), [{"id": 1, "name": "基准测试项目", "total_budget": 1000.0}])
+        conn.execute(Budget.__table__.insert(), [
+            {"id": year - 2019, "project_id": 1, "year": year, "total_amount": 200.0, "spent_amount": 0.0}
+            for year in range(2020, 2025)
+        ])
+        conn.execute(BudgetItem.__table__.insert(), [
+            {"budget_id": budget_id, "category": category, "amount": 20.0, "spent_amount": 0.0}
+            for budget_id in range(1, 6) for category in CATEGORIES
+        ])
+        rng = random.Random(42)
+        start = date(2020, 1, 1)
+        rows = [{
+            "project_id": 1,
+            "budget_id": rng.randint(1, 5),
+            "category": rng.choice(CATEGORIES),
+            "content": f"支出{i}",
+            "supplier": "供应商",
+            "amount": round(rng.uniform(10, 5000), 2),
+            "date": start + timedelta(days=rng.randint(0, 1800)),
+        } for i in range(expense_count)]
+        conn.execute(Expense.__table__.insert(), rows)
+
+
+def measure_commits(engine, commits):
+    """逐条插入支出并提交，返回每次提交耗时（毫秒）"""
+    rng = random.Random(7)
+    latencies = []
+    for i in range(commits):
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(Expense.__table__.insert(), {
+                "project_id": 1,
+                "budget_id": rng.randint(1, 5),
+                "category": rng.choice(CATEGORIES),
+                "content": f"新增支出{i}",
+                "amount": 100.0,
+                "date": date(2024, 6, 1),
+            })
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run_profile(name, settings, expense_count, commits):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'bench.db'), settings=settings)
+        seed(engine, expense_count)
+        latencies = measure_commits(engine, commits)
+        engine.dispose()
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<8} 平均 {statistics.mean(latencies):7.3f} ms  中位数 {statistics.median(latencies):7.3f} ms  P95 {p95:7.3f} ms")
+    return statistics.mean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 SQLite 调优配置的提交延迟")
+    parser.add_argument('--expenses', type=int, default=50000, help="预置支出条数")
+    parser.add_argument('--commits', type=int, default=300, help="测量的提交次数")
+    args = parser.parse_args()
+
+    print(f"预置 {args.expenses} 条支出，逐条提交 {args.commits} 次")
+    legacy = run_profile("旧版配置", LEGACY_SQLITE_SETTINGS, args.expenses, args.commits)
+    tuned = run_profile("调优配置", DEFAULT_SQLITE_SETTINGS, args.expenses, args.commits)
+    if tuned > 0:
+        print(f"平均提交延迟降低 {legacy / tuned:.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+主窗口冷启动基准测试
+
+在含若干项目、预算和支出的临时数据库上创建主窗口并等待首次绘制完成，对比：
+
+- 全部创建：创建主窗口后立即创建全部页面（延迟创建页面之前的启动流程）；
+- 延迟创建：只创建主页，其余页面第一次切换到该页或空闲时再创建。
+
+每种流程在独立的子进程中运行，模块导入耗时不计入对比（两种流程相同）。
+
+用法：
+    python benchmarks/bench_startup.py [--projects 50] [--repeat 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_database(path, projects):
+    from datetime import date
+    from app.models.database import Base, Budget, BudgetCategory, Expense, Project
+    from app.models.engine import create_db_engine
+    from app.models.session import SessionRegistry
+    # 注册定义在视图模块中的模型（Actionlog 的关系映射依赖它们），create_all 一并建表
+    from app.views import activity_interface  # noqa: F401
+    from app.views.projecting_interface import project_document, project_outcome  # noqa: F401
+
+    engine = create_db_engine(path)
+    Base.metadata.create_all(engine)
+    sessions = SessionRegistry(engine)
+    with sessions.unit_of_work() as session:
+        for index in range(projects):
+            project = Project(name=f"基准测试项目{index + 1}", financial_code=f"BENCH{index + 1:03d}",
+                              total_budget=100.0)
+            session.add(project)
+            session.flush()
+            budget = Budget(project_id=project.id, year=None, total_amount=100.0)
+            session.add(budget)
+            session.flush()
+            session.add_all(Expense(project_id=project.id, budget_id=budget.id, category=BudgetCategory.EQUIPMENT,
+                                    content=f"支出{number}", amount=1.0, date=date(2024, 1, 1))
+                            for number in range(20))
+    engine.dispose()
+
+
+def run_once(path, eager):
+    """在当前进程中创建主窗口，返回 (创建主窗口, 首次绘制完成) 的耗时（秒）"""
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    from app.views.main_window import MainWindow
+    from app.models.engine import create_db_engine
+    from app.models.session import SessionRegistry
+
+    engine = create_db_engine(path)
+    sessions = SessionRegistry(engine, expire_on_commit=False, autoflush=True)
+    started = time.perf_counter()
+    window = MainWindow(engine, sessions)
+    if eager:
+        window.build_all_pages()
+    constructed = time.perf_counter()
+    window.show()
+    app.processEvents()
+    painted = time.perf_counter()
+    return constructed - started, painted - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="主窗口冷启动基准测试")
+    parser.add_argument('--projects', type=int, default=50, help="项目数")
+    parser.add_argument('--repeat', type=int, default=3, help="每种流程重复次数，取最快一次")
+    parser.add_argument('--child', choices=['eager', 'lazy'], help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        constructed, painted = run_once(args.database, args.child == 'eager')
+        print(f"{constructed} {painted}")
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        make_database(path, args.projects)
+        results = {}
+        for name, mode in (("全部创建", 'eager'), ("延迟创建", 'lazy')):
+            best = None
+            for _ in range(args.repeat):
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, '--database', path],
+                                        check=True, capture_output=True, text=True).stdout
+                constructed, painted = map(float, output.split()[-2:])
+                best = (constructed, painted) if best is None or painted < best[1] else best
+            results[name] = best
+
+        print(f"项目 {args.projects} 个")
+        eager = results["全部创建"][1]
+        for name, (constructed, painted) in results.items():
+            print(f"  {name}: 创建主窗口 {constructed * 1000:8.1f} ms  首次绘制完成 {painted * 1000:8.1f} ms"
+                  f"  加速 {eager / painted:5.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
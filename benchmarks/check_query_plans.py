@@ -0,0 +1,121 @@
+"""
+热点查询执行计划检查
+
+在临时数据库上按模型声明建表，对各界面的热点查询执行 EXPLAIN QUERY PLAN，
+确认每条查询都通过索引定位数据，而不是全表扫描或临时排序。任一查询未命中索引时
+以非零状态退出，可用于修改模型或查询后的回归检查。
+
+用法：
+    python benchmarks/check_query_plans.py [-v]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+from app.models.database import (
+    Base, Actionlog, Budget, BudgetCategory, BudgetItem, BudgetPlanItem, BudgetRollup, Expense, GanttTask
+)
+from app.models.engine import create_db_engine
+
+
+def core_queries():
+    """数据库模型上的热点查询：{名称: select 语句}"""
+    expenses = Expense.__table__
+    budgets = Budget.__table__
+    budget_items = BudgetItem.__table__
+    plan_items = BudgetPlanItem.__table__
+    actionlogs = Actionlog.__table__
+    gantt_tasks = GanttTask.__table__
+    rollups = BudgetRollup.__table__
+    return {
+        "支出列表（按预算，日期倒序）": select(expenses).where(expenses.c.budget_id == 1).order_by(expenses.c.date.desc()),
+        "项目支出": select(expenses).where(expenses.c.project_id == 1),
+        "项目分类支出": select(expenses).where(
+            expenses.c.project_id == 1, expenses.c.category == BudgetCategory.MATERIAL
+        ),
+        "预算子项": select(budget_items).where(budget_items.c.budget_id == 1),
+        "项目预算": select(budgets).where(budgets.c.project_id == 1),
+        "项目总预算": select(budgets).where(budgets.c.project_id == 1, budgets.c.year.is_(None)),
+        "预算编制一级明细": select(plan_items).where(
+            plan_items.c.plan_id == 1, plan_items.c.category == BudgetCategory.MATERIAL, plan_items.c.parent_id.is_(None)
+        ),
+        "预算编制子项": select(plan_items).where(
+            plan_items.c.plan_id == 1, plan_items.c.category == BudgetCategory.MATERIAL, plan_items.c.parent_id == 1
+        ),
+        "预算编制子项（按父级）": select(plan_items).where(plan_items.c.parent_id == 1),
+        "最近操作记录": select(actionlogs).order_by(actionlogs.c.timestamp.desc()).limit(100),
+        "甘特图任务": select(gantt_tasks).where(gantt_tasks.c.project_id == 1),
+        "甘特图顶层任务": select(gantt_tasks).where(gantt_tasks.c.project_id == 1, gantt_tasks.c.level == 0),
+        "项目预算执行汇总": select(rollups).where(rollups.c.project_id.in_([1, 2, 3])),
+    }
+
+
+def view_queries():
+    """视图模块中定义的模型（项目文档、成果、学术活动）上的热点查询"""
+    from app.views.projecting_interface.project_document import ProjectDocument
+    from app.views.projecting_interface.project_outcome import ProjectOutcome
+    from app.views.activity_interface import AcademicActivity
+
+    documents = ProjectDocument.__table__
+    outcomes = ProjectOutcome.__table__
+    activities = AcademicActivity.__table__
+    return {
+        "项目文档": select(documents).where(documents.c.project_id == 1).order_by(documents.c.upload_time.desc()),
+        "项目成果": select(outcomes).where(outcomes.c.project_id == 1).order_by(outcomes.c.publish_date.desc()),
+        "学术活动": select(activities).order_by(activities.c.start_date.desc()),
+    }
+
+
+def explain(connection, statement):
+    """返回语句的执行计划明细行"""
+    compiled = statement.compile(connection, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+
+
+def plan_problems(plan):
+    """找出执行计划中的全表扫描和临时排序"""
+    problems = []
+    for detail in plan:
+        if re.fullmatch(r"SCAN \w+", detail):
+            problems.append(f"全表扫描: {detail}")
+        elif "USE TEMP B-TREE" in detail:
+            problems.append(f"临时排序: {detail}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查热点查询是否命中索引")
+    parser.add_argument('-v', '--verbose', action='store_true', help="输出每条查询的执行计划")
+    args = parser.parse_args()
+
+    # 视图模型需先导入：建表时 actionlogs 的外键引用项目文档、成果表
+    queries = core_queries()
+    queries.update(view_queries())
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'plans.db'))
+        Base.metadata.create_all(engine)
+        with engine.connect() as connection:
+            for name, statement in queries.items():
+                plan = explain(connection, statement)
+                problems = plan_problems(plan)
+                print(f"[{'失败' if problems else '通过'}] {name}")
+                if args.verbose or problems:
+                    for detail in plan:
+                        print(f"        {detail}")
+                failures += bool(problems)
+        engine.dispose()
+
+    print(f"共 {len(queries)} 条查询，{failures} 条未命中索引")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
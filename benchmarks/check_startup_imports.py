@@ -0,0 +1,85 @@
+"""
+启动导入耗时回归检查
+
+在独立的子进程中导入 run.py（只执行模块级导入，不启动界面），检查：
+
+- 启动时不应导入的重型依赖（pandas、openpyxl、QtCharts、QtWebEngine 等）没有被导入，
+  它们应在导出、打开对应页面等真正用到时才导入；
+- 导入耗时（多次运行取最快一次）不超过预算。
+
+任一项不满足时以非零状态退出，可用于修改导入关系后的回归检查。预算与机器性能有关，
+可用 --budget 调整；需要查看各模块的耗时时使用 python run.py --profile-startup。
+
+用法：
+    python benchmarks/check_startup_imports.py [--budget 1500] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认的导入耗时预算（毫秒）
+DEFAULT_BUDGET_MS = 1500
+
+# 启动时不应导入的模块
+DEFERRED_MODULES = (
+    'pandas',
+    'openpyxl',
+    'PySide6.QtCharts',
+    'PySide6.QtWebEngineCore',
+    'PySide6.QtWebEngineWidgets',
+    'PySide6.QtWebChannel',
+    'app.views.projecting_interface.project_progress',
+    'app.views.projecting_interface.project_expense',
+    'app.utils.import_utils',
+)
+
+_CHILD_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import run
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure_once():
+    """在子进程中导入 run.py，返回 (耗时秒数, 已导入的模块名集合)"""
+    output = subprocess.run([sys.executable, '-c', _CHILD_SCRIPT.format(root=ROOT)], cwd=ROOT,
+                            check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["elapsed"], set(result["modules"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查启动导入耗时和重型依赖是否延迟导入")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS, help="导入耗时预算（毫秒）")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    best, modules = None, set()
+    for _ in range(args.repeat):
+        elapsed, modules = measure_once()
+        best = elapsed if best is None else min(best, elapsed)
+
+    failures = 0
+    for name in DEFERRED_MODULES:
+        imported = name in modules
+        print(f"[{'失败' if imported else '通过'}] 启动时未导入 {name}")
+        failures += imported
+
+    over_budget = best * 1000 > args.budget
+    print(f"[{'失败' if over_budget else '通过'}] 导入耗时 {best * 1000:.1f} ms（预算 {args.budget:.0f} ms），"
+          f"共导入 {len(modules)} 个模块")
+    failures += over_budget
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
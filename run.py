@@ -1,9 +1,20 @@
 import sys
 import os
-from PySide6.QtWidgets import QApplication
+from app.utils import startup_profiler
+
+# python run.py --profile-startup：输出各模块导入、启动各阶段及各界面的创建耗时
+# 需在导入其它模块之前启用，才能统计到它们的导入耗时
+if '--profile-startup' in sys.argv:
+    sys.argv.remove('--profile-startup')
+    startup_profiler.enable()
+
+from PySide6.QtWidgets import QApplication, QMessageBox
+from PySide6.QtCore import QTimer
 from PySide6.QtGui import QFont, QIcon  # 将QFont导入提前
 from app.views.main_window import MainWindow
 from app.models.database import init_db, migrate_db, Base
+from app.models.session import SessionRegistry
+from app.utils.attachment_store import legacy_attachment_paths
 import logging
 #import matplotlib as mpl
 
@@ -52,20 +63,44 @@ def main():
         os.makedirs(db_dir)
     
     # 初始化数据库
-    engine = init_db(db_path)
-    
-    # 检查数据库是否存在，不存在则初始化
-    if not os.path.exists(db_path):
-        logging.info("初始化数据库")
-        Base.metadata.create_all(engine)
-    else:
-        # 如果数据库已存在，执行迁移
-        logging.info("执行数据库迁移")
-        migrate_db(engine)
+    with startup_profiler.measure("初始化数据库"):
+        engine = init_db(db_path)
+
+        # 检查数据库是否存在，不存在则初始化
+        if not os.path.exists(db_path):
+            logging.info("初始化数据库")
+            Base.metadata.create_all(engine)
+        else:
+            # 如果数据库已存在，执行迁移。迁移失败时结构不完整，提示后退出，不以旧结构启动
+            logging.info("执行数据库迁移")
+            try:
+                migrate_db(engine)
+            except Exception as e:
+                QMessageBox.critical(None, "数据库迁移失败",
+                                     f"数据库迁移失败，程序无法启动：\n{e}\n\n数据库文件：{db_path}")
+                sys.exit(1)
     
+    # 应用级数据库会话注册表，由主窗口注入各界面
+    sessions = SessionRegistry(engine, expire_on_commit=False, autoflush=True)
+
+    # 旧版按项目目录保存的附件一次性迁入附件存储（已迁移时只执行几条查询），
+    # 有待迁移的文件时在后台线程迁移并显示进度
+    migration_dialog = None
+    with startup_profiler.measure("迁移旧版附件"):
+        with sessions.read() as session:
+            legacy = legacy_attachment_paths(session)
+        if legacy:
+            from app.components.attachment_migration_dialog import AttachmentMigrationDialog
+            migration_dialog = AttachmentMigrationDialog(sessions, legacy)
+            migration_dialog.exec()
+
     # 创建主窗口
-    window = MainWindow(engine)
+    with startup_profiler.measure("创建主窗口"):
+        window = MainWindow(engine, sessions)
     window.show()
+    if migration_dialog is not None:
+        migration_dialog.show_result(window)
+    QTimer.singleShot(0, startup_profiler.report) # 首次显示后输出启动耗时报告（未启用时不输出）
 
     sys.exit(app.exec())
 